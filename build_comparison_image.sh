@@ -8,9 +8,14 @@ echo "🚀 Building SadTalker vs Wav2Lip comparison Docker image..."
 DOCKER_USERNAME="smsj68"
 IMAGE_NAME="runpod-talking-head-comparison"
 IMAGE_TAG="latest"
+
+# 이미지에 넣을 handler (runpod_unified_handler.py: 두 모델 상주 + model 필드 라우팅)
+HANDLER="${HANDLER:-runpod_comparison_handler.py}"
+# 성능 결과 저장소에서 이미지 버전별 비교에 사용 (기본: 현재 커밋)
+IMAGE_VERSION="${IMAGE_VERSION:-$(git rev-parse --short HEAD 2>/dev/null || echo dev)}"
 FULL_IMAGE_NAME="${DOCKER_USERNAME}/${IMAGE_NAME}:${IMAGE_TAG}"
 
-echo "📦 Image name: ${FULL_IMAGE_NAME}"
+echo "📦 Image name: ${FULL_IMAGE_NAME} (handler: ${HANDLER})"
 
 # M1/M2 Mac용 크로스 플랫폼 빌드 설정
 if [[ $(uname -m) == "arm64" ]]; then
@@ -24,6 +29,8 @@ if [[ $(uname -m) == "arm64" ]]; then
     docker buildx build \
         --platform linux/amd64 \
         --file Dockerfile.comparison \
+        --build-arg HANDLER=${HANDLER} \
+        --build-arg IMAGE_VERSION=${IMAGE_VERSION} \
         --tag ${FULL_IMAGE_NAME} \
         --push \
         .
@@ -33,6 +40,8 @@ else
     # 일반 빌드
     docker build \
         --file Dockerfile.comparison \
+        --build-arg HANDLER=${HANDLER} \
+        --build-arg IMAGE_VERSION=${IMAGE_VERSION} \
         --tag ${FULL_IMAGE_NAME} \
         .
     
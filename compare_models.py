@@ -4,12 +4,13 @@ RunPod Serverless: SadTalker vs Wav2Lip 비교 테스트
 두 개의 서로 다른 엔드포인트를 호출해서 결과를 비교합니다.
 """
 
-import requests
 import json
 import time
 import os
 from typing import Dict, Any, Optional
 
+from talking_head.dispatcher import EndpointDispatcher
+
 # RunPod API 설정
 RUNPOD_API_KEY = os.getenv('RUNPOD_API_KEY')
 
@@ -22,36 +23,43 @@ GITHUB_IMAGE_URL = "https://raw.githubusercontent.com/Su-minn/runpod-talking-hea
 GITHUB_AUDIO_WAV_URL = "https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets/test.wav"
 GITHUB_AUDIO_MP3_URL = "https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets/test.mp3"
 
-def call_runpod_endpoint(endpoint_id: str, api_key: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """RunPod Serverless 엔드포인트 호출"""
+# 모델명 → EndpointDispatcher
+DISPATCHERS: Dict[str, EndpointDispatcher] = {}
+
+def call_runpod_endpoint(endpoint_id: str, api_key: str, payload: Dict[str, Any],
+                         model: str = "default") -> Optional[Dict[str, Any]]:
+    """
+    RunPod Serverless 엔드포인트 호출
+
+    재시도 / hedge 디스패처로 실행합니다 (endpoint_id 를 쉼표로 여러 개 주면 느린 워커 대신 다른 엔드포인트 사용).
+    """
     
     if not endpoint_id:
         print(f"❌ Endpoint ID not provided")
         return None
     
-    url = f"https://api.runpod.ai/v2/{endpoint_id}/runsync"
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {api_key}'
-    }
+    endpoint_ids = [e.strip() for e in endpoint_id.split(",") if e.strip()]
+    dispatcher = DISPATCHERS.get(model)
+    if dispatcher is None or dispatcher.endpoints[model] != endpoint_ids:
+        # 모델별로 유지해야 완료 시간 기록으로 hedge 지연을 계산할 수 있음
+        dispatcher = EndpointDispatcher(api_key, {model: endpoint_ids})
+        DISPATCHERS[model] = dispatcher
     
     try:
         print(f"🔄 Calling RunPod endpoint: {endpoint_id}")
         print(f"📝 Payload: {json.dumps(payload, indent=2)}")
         
         start_time = time.time()
-        response = requests.post(url, headers=headers, json=payload, timeout=1800)  # 30분 타임아웃
+        result = dispatcher.run(model, payload, timeout=1800)  # 30분 타임아웃
         api_call_time = time.time() - start_time
         
-        if response.status_code == 200:
-            result = response.json()
+        if result.get('status') == 'COMPLETED':
             print(f"✅ API call completed in {api_call_time:.2f}s")
             print(f"📊 Response: {json.dumps(result, indent=2)}")
             return result
         else:
-            print(f"❌ API call failed: {response.status_code}")
-            print(f"📄 Response: {response.text}")
+            print(f"❌ API call failed: {result.get('status')}")
+            print(f"📄 Response: {json.dumps(result, indent=2)}")
             return None
             
     except Exception as e:
@@ -72,13 +80,14 @@ def test_sadtalker():
                 "preprocess": "crop",
                 "enhancer": "gfpgan",
                 "pose_style": 0,
-                "face_model_resolution": 256
+                "face_model_resolution": 256,
+                "score_quality": True  # 자동 립싱크 / 충실도 점수 (talking_head.quality)
             }
         }
     }
     
     start_time = time.time()
-    result = call_runpod_endpoint(SADTALKER_ENDPOINT_ID, RUNPOD_API_KEY, payload)
+    result = call_runpod_endpoint(SADTALKER_ENDPOINT_ID, RUNPOD_API_KEY, payload, model="sadtalker")
     total_time = time.time() - start_time
     
     if result:
@@ -115,13 +124,14 @@ def test_wav2lip():
                 "pad_left": 0,
                 "pad_right": 0,
                 "resize_factor": 1,
-                "nosmooth": False
+                "nosmooth": False,
+                "score_quality": True  # 자동 립싱크 / 충실도 점수 (talking_head.quality)
             }
         }
     }
     
     start_time = time.time()
-    result = call_runpod_endpoint(WAV2LIP_ENDPOINT_ID, RUNPOD_API_KEY, payload)
+    result = call_runpod_endpoint(WAV2LIP_ENDPOINT_ID, RUNPOD_API_KEY, payload, model="wav2lip")
     total_time = time.time() - start_time
     
     if result:
@@ -224,7 +234,13 @@ def compare_results(sadtalker_result: Dict, wav2lip_result: Dict):
     print("\n🎯 SUMMARY:")
     print(f"   Speed Winner:  {'Wav2Lip' if time_diff > 0 else 'SadTalker'}")
     print(f"   Cost Winner:   {'Wav2Lip' if cost_diff > 0 else 'SadTalker'}")
-    print(f"   Quality:       Manual comparison needed")
+    sad_quality = sadtalker_result.get('result', {}).get('output', {}).get('quality_score')
+    wav_quality = wav2lip_result.get('result', {}).get('output', {}).get('quality_score')
+    if sad_quality is not None and wav_quality is not None:
+        print(f"   Quality:       {'SadTalker' if sad_quality > wav_quality else 'Wav2Lip'} "
+              f"(score {sad_quality:.3f} vs {wav_quality:.3f})")
+    else:
+        print(f"   Quality:       Manual comparison needed (no automatic score returned)")
     
     # 상세 비용 분석
     print("\n💡 DETAILED COST ANALYSIS:")
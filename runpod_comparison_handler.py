@@ -14,6 +14,15 @@ import base64
 from urllib.parse import urlparse
 import logging
 
+from talking_head.enhance import enhance_metrics_path, run_enhancement
+from talking_head.inputs import describe_input, fetch_input
+from talking_head.launcher import launcher_command, launcher_env
+from talking_head.metrics import read_metrics
+from talking_head.pipeline import Pipeline
+from talking_head.profiling import collect_artifacts, wrap_command
+from talking_head.quality import try_score
+from talking_head.rusage import record_usage, run_with_rusage
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,30 +44,38 @@ def download_file(url, destination):
         logger.error(f"Failed to download {url}: {str(e)}")
         raise
 
-def run_sadtalker(image_path, audio_path, output_dir):
+def run_sadtalker(image_path, audio_path, output_dir, options=None):
     """SadTalker 실행"""
     start_time = time.time()
     
     try:
         logger.info("Starting SadTalker processing...")
         
-        # SadTalker 실행 명령어
-        cmd = [
-            "python", "/workspace/SadTalker/inference.py",
+        options = options or {}
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # SadTalker 실행 명령어 (런처를 통해 백엔드 패치 적용)
+        inference_args = [
             "--driven_audio", audio_path,
             "--source_image", image_path,
             "--result_dir", output_dir,
-            "--still", "--preprocess", "full",
-            "--enhancer", "gfpgan"
+            "--still", "--preprocess", "full"
         ]
+        if options.get('backend') in ('onnx', 'int8'):
+            inference_args.append("--cpu")
+        
+        cmd = launcher_command("sadtalker", inference_args)
+        env = launcher_env(options, os.path.join(output_dir, "launcher_metrics.json"))
+        cmd = wrap_command(cmd, env)
         
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd="/workspace/SadTalker")
+        result = run_with_rusage(cmd, cwd="/workspace/SadTalker", env=env)
         
         processing_time = time.time() - start_time
+        record_usage("sadtalker", result.rusage, backend=options.get('backend', 'pytorch'))
         
         if result.returncode != 0:
             logger.error(f"SadTalker failed: {result.stderr}")
-            return None, processing_time, result.stderr
+            return None, processing_time, result.stderr, result.rusage
         
         # 결과 파일 찾기
         output_files = []
@@ -68,17 +85,23 @@ def run_sadtalker(image_path, audio_path, output_dir):
                     output_files.append(os.path.join(root, file))
         
         if not output_files:
-            return None, processing_time, "No output video found"
+            return None, processing_time, "No output video found", result.rusage
+        
+        # GFPGAN 향상은 추론과 분리된 단계에서 실행 (talking_head.enhance)
+        enhanced_output = os.path.join(output_dir, "result_enhanced.mp4")
+        run_enhancement(output_files[0], enhanced_output, options, env)
+        output_files = [enhanced_output]
+        processing_time = time.time() - start_time
         
         logger.info(f"SadTalker completed in {processing_time:.2f} seconds")
-        return output_files[0], processing_time, None
+        return output_files[0], processing_time, None, result.rusage
         
     except Exception as e:
         processing_time = time.time() - start_time
         logger.error(f"SadTalker error: {str(e)}")
-        return None, processing_time, str(e)
+        return None, processing_time, str(e), None
 
-def run_wav2lip(image_path, audio_path, output_dir):
+def run_wav2lip(image_path, audio_path, output_dir, options=None):
     """Wav2Lip 실행"""
     start_time = time.time()
     
@@ -89,33 +112,35 @@ def run_wav2lip(image_path, audio_path, output_dir):
         output_path = os.path.join(output_dir, "wav2lip_result.mp4")
         os.makedirs(output_dir, exist_ok=True)
         
-        # Wav2Lip 실행 명령어
-        cmd = [
-            "python", "/workspace/Wav2Lip/inference.py",
+        # Wav2Lip 실행 명령어 (런처를 통해 백엔드 패치 적용)
+        cmd = launcher_command("wav2lip", [
             "--checkpoint_path", "/workspace/Wav2Lip/checkpoints/wav2lip_gan.pth",
             "--face", image_path,
             "--audio", audio_path,
             "--outfile", output_path
-        ]
+        ])
+        env = launcher_env(options or {}, os.path.join(output_dir, "launcher_metrics.json"))
+        cmd = wrap_command(cmd, env)
         
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd="/workspace/Wav2Lip")
+        result = run_with_rusage(cmd, cwd="/workspace/Wav2Lip", env=env)
         
         processing_time = time.time() - start_time
+        record_usage("wav2lip", result.rusage, backend=(options or {}).get('backend', 'pytorch'))
         
         if result.returncode != 0:
             logger.error(f"Wav2Lip failed: {result.stderr}")
-            return None, processing_time, result.stderr
+            return None, processing_time, result.stderr, result.rusage
         
         if not os.path.exists(output_path):
-            return None, processing_time, "No output video found"
+            return None, processing_time, "No output video found", result.rusage
         
         logger.info(f"Wav2Lip completed in {processing_time:.2f} seconds")
-        return output_path, processing_time, None
+        return output_path, processing_time, None, result.rusage
         
     except Exception as e:
         processing_time = time.time() - start_time
         logger.error(f"Wav2Lip error: {str(e)}")
-        return None, processing_time, str(e)
+        return None, processing_time, str(e), None
 
 def encode_video_to_base64(video_path):
     """비디오 파일을 base64로 인코딩"""
@@ -137,6 +162,13 @@ def get_file_size(file_path):
     except:
         return 0
 
+def _higher_quality(quality):
+    """자동 품질 점수가 더 높은 모델 (두 점수가 모두 있을 때만)"""
+    scores = {model: (q or {}).get("quality_score") for model, q in quality.items()}
+    if any(score is None for score in scores.values()):
+        return None
+    return max(scores, key=scores.get)
+
 def handler(event):
     """
     RunPod handler function - SadTalker vs Wav2Lip 비교
@@ -144,7 +176,13 @@ def handler(event):
     event['input'] = {
         'input_image_url': 'https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets/profile.png',
         'input_audio_url': 'https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets/test.wav',
-        'return_videos': False  # True이면 base64로 비디오 반환, False이면 파일 정보만
+        # URL 대신 'input_image_base64' / 'input_audio_base64' (base64 또는 data URI) 도 가능
+        'return_videos': False,  # True이면 base64로 비디오 반환, False이면 파일 정보만
+        'options': {'backend': 'pytorch',  # 두 모델 공통 실행 옵션 ('pytorch', 'onnx', 'int8')
+                    'paste_engine': 'vectorized',  # SadTalker preprocess=full 붙여넣기 ('vectorized', 'upstream')
+                    'face_detector': 's3fd',  # Wav2Lip 얼굴 검출기 ('s3fd', 'yunet', 'haar', 'hog')
+                    'score_quality': True,  # 립싱크 / 입 밖 SSIM·PSNR 자동 점수 (모델별 quality 항목)
+                    'profile': False}  # True/'py-spy', 'cprofile', 'torch' 이면 모델별 profile 항목 반환
     }
     """
     
@@ -154,38 +192,43 @@ def handler(event):
     try:
         # 입력 받기
         input_data = event['input']
-        image_url = input_data['input_image_url']
-        audio_url = input_data['input_audio_url']
         return_videos = input_data.get('return_videos', False)
+        options = input_data.get('options', {})
         
         # 작업 디렉토리 생성
         job_id = event.get('id', str(int(time.time())))
         work_dir = f"/tmp/{job_id}"
         os.makedirs(work_dir, exist_ok=True)
         
-        # 입력 파일 다운로드
-        image_path = os.path.join(work_dir, "input_image.png")
-        audio_path = os.path.join(work_dir, "input_audio.wav")
-        
-        download_file(image_url, image_path)
-        download_file(audio_url, audio_path)
-        
         # 출력 디렉토리 생성
         sadtalker_output_dir = os.path.join(work_dir, "sadtalker_output")
         wav2lip_output_dir = os.path.join(work_dir, "wav2lip_output")
         
-        # 두 모델 동시 실행 (순차적으로)
-        logger.info("Running both models...")
+        # 잡 단계 DAG: 입력 준비 (URL 다운로드 또는 인라인 base64 디코딩)는 동시에,
+        # 두 모델은 GPU 를 나눠 쓰지 않도록 순차적으로 (wav2lip 이 sadtalker 뒤에 오도록 의존 관계 지정)
+        pipeline = Pipeline()
+        pipeline.add("image", lambda: fetch_input(input_data, 'image', os.path.join(work_dir, "input_image.png"),
+                                                  download_file))
+        pipeline.add("audio", lambda: fetch_input(input_data, 'audio', os.path.join(work_dir, "input_audio.wav"),
+                                                  download_file))
+        pipeline.add("sadtalker", lambda image_path, audio_path: run_sadtalker(
+            image_path, audio_path, sadtalker_output_dir, options
+        ), deps=("image", "audio"))
+        pipeline.add("wav2lip", lambda image_path, audio_path, _: run_wav2lip(
+            image_path, audio_path, wav2lip_output_dir, options
+        ), deps=("image", "audio", "sadtalker"))
+        if options.get('score_quality', True):
+            # 품질 점수는 CPU 에서 다음 모델 추론과 겹쳐 실행
+            for model in ("sadtalker", "wav2lip"):
+                pipeline.add(f"{model}_quality", lambda image_path, model_result: try_score(model_result[0], image_path),
+                             deps=("image", model))
         
-        # SadTalker 실행
-        sadtalker_video, sadtalker_time, sadtalker_error = run_sadtalker(
-            image_path, audio_path, sadtalker_output_dir
-        )
+        logger.info("Running both models...")
+        pipeline.run()
+        sadtalker_video, sadtalker_time, sadtalker_error, sadtalker_usage = pipeline.results["sadtalker"]
+        wav2lip_video, wav2lip_time, wav2lip_error, wav2lip_usage = pipeline.results["wav2lip"]
         
-        # Wav2Lip 실행
-        wav2lip_video, wav2lip_time, wav2lip_error = run_wav2lip(
-            image_path, audio_path, wav2lip_output_dir
-        )
+        quality = {model: pipeline.results.get(f"{model}_quality") for model in ("sadtalker", "wav2lip")}
         
         # 전체 처리 시간
         total_time = time.time() - overall_start_time
@@ -199,22 +242,42 @@ def handler(event):
                     "processing_time": round(sadtalker_time, 2),
                     "success": sadtalker_video is not None,
                     "error": sadtalker_error,
-                    "output_file_size_mb": get_file_size(sadtalker_video) if sadtalker_video else 0
+                    "output_file_size_mb": get_file_size(sadtalker_video) if sadtalker_video else 0,
+                    "launcher_metrics": read_metrics(os.path.join(sadtalker_output_dir, "launcher_metrics.json")),
+                    "enhance": read_metrics(enhance_metrics_path(
+                        os.path.join(sadtalker_output_dir, "result_enhanced.mp4"))).get("enhance"),
+                    "resource_usage": sadtalker_usage,
+                    "quality": quality["sadtalker"],
+                    "quality_score": (quality["sadtalker"] or {}).get("quality_score")
                 },
                 "wav2lip": {
                     "processing_time": round(wav2lip_time, 2),
                     "success": wav2lip_video is not None,
                     "error": wav2lip_error,
-                    "output_file_size_mb": get_file_size(wav2lip_video) if wav2lip_video else 0
+                    "output_file_size_mb": get_file_size(wav2lip_video) if wav2lip_video else 0,
+                    "launcher_metrics": read_metrics(os.path.join(wav2lip_output_dir, "launcher_metrics.json")),
+                    "resource_usage": wav2lip_usage,
+                    "quality": quality["wav2lip"],
+                    "quality_score": (quality["wav2lip"] or {}).get("quality_score")
                 }
             },
             "analysis": {
                 "faster_model": "sadtalker" if sadtalker_time < wav2lip_time else "wav2lip",
                 "time_difference": abs(round(sadtalker_time - wav2lip_time, 2)),
-                "both_succeeded": (sadtalker_video is not None) and (wav2lip_video is not None)
-            }
+                "both_succeeded": (sadtalker_video is not None) and (wav2lip_video is not None),
+                "higher_quality_model": _higher_quality(quality)
+            },
+            "pipeline": pipeline.report()
         }
         
+        # 프로파일 아티팩트 (options.profile, 런처 환경의 TALKING_HEAD_PROFILE_DIR = <출력 디렉토리>/profile)
+        if options.get('profile'):
+            for model, output_dir in (("sadtalker", sadtalker_output_dir), ("wav2lip", wav2lip_output_dir)):
+                model_result = result["comparison"][model]
+                model_result["profile"] = collect_artifacts(
+                    os.path.join(output_dir, "profile"), f"{job_id}_{model}", model_result["launcher_metrics"]
+                )
+        
         # 비디오 파일 반환 (옵션)
         if return_videos:
             if sadtalker_video:
@@ -224,8 +287,9 @@ def handler(event):
         
         # 추가 메타데이터
         result["metadata"] = {
-            "input_image_url": image_url,
-            "input_audio_url": audio_url,
+            "input_image_url": describe_input(input_data, 'image'),
+            "input_audio_url": describe_input(input_data, 'audio'),
+            "backend": options.get('backend', 'pytorch'),
             "processing_date": time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime()),
             "python_version": subprocess.check_output(["python", "--version"]).decode().strip()
         }
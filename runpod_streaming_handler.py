@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+RunPod Serverless Handler: Wav2Lip 라이브 스트리밍 (제너레이터 핸들러)
+
+오디오 조각을 받는 대로 몇 초 단위로 렌더링해 fMP4 / HLS 세그먼트를 yield 합니다 (talking_head.streaming).
+결과는 /stream/{job_id} 로 세그먼트가 나오는 즉시 받을 수 있고, 첫 세그먼트까지 걸린 시간은
+세그먼트 / summary 의 time_to_first_segment 로 기록됩니다.
+모델은 상주 워커(talking_head.residency)에 올려 세그먼트마다 다시 로드하지 않습니다.
+
+빌드: HANDLER=runpod_streaming_handler.py ./build_comparison_image.sh
+
+event['input'] = {
+    'input_image_url': 'https://example.com/face.png',  # 또는 input_image_base64 (정지 이미지)
+    'input_audio_chunks': ['data:audio/wav;base64,...', ...],  # 또는 아래 중 하나
+    # 'input_audio_chunk_url': 'https://example.com/stream/abc/{seq}.wav',  # 호출자가 올리는 조각 (204 = 끝)
+    # 'input_audio_url': 'https://example.com/audio.wav',  # 전체 오디오를 잘라 스트리밍
+    'options': {
+        'segment_format': 'fmp4',  # 'fmp4' 또는 'hls' (MPEG-TS + m3u8)
+        'segment_seconds': 2.0,    # 세그먼트 길이
+        'context_seconds': 0.2,    # 세그먼트 뒤에 붙여 렌더링 후 잘라내는 다음 오디오 (mel 창 lookahead)
+        'chunk_timeout': 10.0,     # input_audio_chunk_url: 다음 조각을 기다리는 최대 시간
+        'skip_silence': False,     # 무음 구간은 추론 없이 원본 얼굴로 채움 (talking_head.silence)
+        'render_fps': 12.5,        # 키프레임만 추론하고 사이 프레임은 보간 (talking_head.interpolation)
+        'face_detector': 'yunet',  # CPU 경량 얼굴 검출기 (talking_head.face_detectors, 기본 s3fd)
+        'quality': 'high', 'pad_bottom': 10, 'resize_factor': 1, 'nosmooth': False,
+        'backend': 'pytorch'       # handler_runpod.py 와 같은 wav2lip 옵션
+    }
+}
+"""
+
+import logging
+import os
+import shutil
+import time
+
+from talking_head.residency import RESIDENT_ENV
+
+# 세그먼트마다 모델을 다시 로드하지 않도록 기본으로 상주 모드 사용
+os.environ.setdefault(RESIDENT_ENV, "1")
+
+from talking_head.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
+with STARTUP.phase("import_requests"):
+    import requests
+
+with STARTUP.phase("import_talking_head"):
+    from talking_head.inputs import fetch_input
+    from talking_head.launcher import launcher_env
+    from talking_head.residency import resident_enabled, run_inference
+    from talking_head.rusage import record_usage
+    from talking_head.streaming import stream_segments
+
+# 로깅 설정
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS = {
+    "high": "/workspace/Wav2Lip/checkpoints/wav2lip_gan.pth",
+    "low": "/workspace/Wav2Lip/checkpoints/wav2lip.pth",
+}
+
+
+def download_file(url, destination):
+    """URL에서 파일 다운로드"""
+    try:
+        logger.info(f"Downloading from {url}")
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'wb') as f:
+            f.write(response.content)
+
+        logger.info(f"Downloaded {len(response.content)} bytes to {destination}")
+        return destination
+    except Exception as e:
+        logger.error(f"Download failed: {e}")
+        raise
+
+
+def segment_args(face_path, audio_path, output_path, options):
+    """세그먼트 하나의 wav2lip inference.py 인자"""
+    inference_args = [
+        "--checkpoint_path", CHECKPOINTS["high" if options.get('quality', 'high') == 'high' else "low"],
+        "--face", face_path,
+        "--audio", audio_path,
+        "--outfile", output_path,
+        "--resize_factor", str(options.get('resize_factor', 1)),
+        "--pad_top", str(options.get('pad_top', 0)),
+        "--pad_bottom", str(options.get('pad_bottom', 10)),
+        "--pad_left", str(options.get('pad_left', 0)),
+        "--pad_right", str(options.get('pad_right', 0))
+    ]
+    if options.get('nosmooth', False):
+        inference_args.append("--nosmooth")
+    return inference_args
+
+
+def handler(event):
+    """오디오 조각 → 세그먼트 스트리밍 (제너레이터)"""
+    start_time = time.time()
+    input_data = event.get('input', {})
+    options = input_data.get('options', {})
+    job_id = event.get('id', str(int(time.time())))
+    work_dir = f"/tmp/wav2lip_stream_{job_id}"
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        logger.info(f"Starting Wav2Lip streaming job {job_id}")
+        face_path = fetch_input(input_data, 'image', f"{work_dir}/input_face.png", download_file)
+        metrics_path = f"{work_dir}/launcher_metrics.json"
+        env = launcher_env(options, metrics_path)
+
+        def render(audio_path, output_path):
+            result = run_inference("wav2lip", segment_args(face_path, audio_path, output_path, options),
+                                   env, timeout=300)
+            if result.returncode != 0:
+                raise Exception(f"Wav2Lip segment failed: {result.stderr}")
+            if not os.path.exists(output_path):
+                raise Exception("No output video generated")
+            record_usage("wav2lip", getattr(result, 'rusage', None), backend=options.get('backend', 'pytorch'),
+                         streaming=True, resident=resident_enabled())
+
+        for output in stream_segments(input_data, work_dir, render, download_file, options, start_time):
+            if output["type"] == "segment":
+                logger.info(f"Segment {output['sequence']} ready at {output['time_since_start']:.2f}s "
+                            f"(first segment {output['time_to_first_segment']:.2f}s)")
+            else:
+                output.update({
+                    "model": "wav2lip",
+                    "resident": resident_enabled(),
+                    "image_version": os.environ.get("TALKING_HEAD_IMAGE_VERSION"),
+                })
+            yield output
+
+    except Exception as e:
+        logger.error(f"Error in Wav2Lip streaming handler: {str(e)}")
+        yield {
+            "type": "summary",
+            "status": "error",
+            "error": str(e),
+            "model": "wav2lip",
+            "processing_time": time.time() - start_time
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def warmup_args(image_path, audio_path, work_dir):
+    """워밍업 잡 인자 (상주 워커에 기본 체크포인트를 미리 로드)"""
+    return segment_args(image_path, audio_path, f"{work_dir}/warmup.mp4", {'nosmooth': True})
+
+
+# RunPod 시작 (워밍업 → 세그먼트를 yield 하는 대로 /stream 으로 전달)
+if __name__ == "__main__":
+    STARTUP.warmup("wav2lip", warmup_args)
+    with STARTUP.phase("import_runpod"):
+        import runpod
+    STARTUP.mark_ready()
+    runpod.serverless.start({
+        "handler": handler,
+        "return_aggregate_stream": True
+    })
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+RunPod Serverless Handler: SadTalker + Wav2Lip 통합 (모델 상주)
+
+하나의 엔드포인트에서 입력의 model 필드로 두 모델을 모두 처리합니다.
+모델은 상주 워커(talking_head.residency)에 로드된 채로 유지되며, 메모리 한도를 넘으면
+가장 오래 사용되지 않은 모델부터 내립니다. 유휴 용량을 두 엔드포인트로 나누지 않고 공유합니다.
+
+event['input'] = {
+    'model': 'wav2lip',  # 'wav2lip' 또는 'sadtalker'
+    'input_image_url': 'https://example.com/face.png',
+    'input_audio_url': 'https://example.com/audio.wav',
+    'options': {...}  # 각 모델 handler_runpod.py 의 options 와 동일
+}
+"""
+
+import importlib.util
+import logging
+import os
+
+from talking_head.residency import RESIDENT_ENV
+
+# 통합 엔드포인트는 기본으로 상주 모드 사용
+os.environ.setdefault(RESIDENT_ENV, "1")
+
+from talking_head.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
+from talking_head.cpu_scheduler import async_handler, shared_scheduler
+from talking_head.residency import registry, resident_enabled
+
+# 로깅 설정
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 모델별 handler_runpod.py 위치 (이미지에서는 /workspace/handlers/<model>/handler_runpod.py)
+HANDLER_DIR = os.environ.get("TALKING_HEAD_HANDLER_DIR", os.path.dirname(os.path.abspath(__file__)))
+MODELS = ("wav2lip", "sadtalker")
+DEFAULT_MODEL = "wav2lip"
+
+
+def load_model_handler(model):
+    """모델 디렉토리의 handler_runpod.py 를 모듈로 로드"""
+    path = os.path.join(HANDLER_DIR, model, "handler_runpod.py")
+    spec = importlib.util.spec_from_file_location(f"{model}_handler_runpod", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+with STARTUP.phase("import_handlers"):
+    HANDLERS = {model: load_model_handler(model) for model in MODELS}
+
+
+def handler(event):
+    """입력의 model 필드로 모델 핸들러에 전달"""
+    input_data = event.get('input', {})
+    model = input_data.get('model', DEFAULT_MODEL)
+
+    if model not in HANDLERS:
+        return {
+            "status": "error",
+            "error": f"Unknown model '{model}' (expected one of {', '.join(MODELS)})",
+        }
+
+    response = HANDLERS[model].handler(event)
+    if resident_enabled():
+        response["residency"] = registry().stats()
+    return response
+
+
+# RunPod 시작 (두 모델 워밍업 → 상주 워커에 로드된 상태로 트래픽 수신)
+if __name__ == "__main__":
+    for model, module in HANDLERS.items():
+        STARTUP.warmup(model, module.warmup_args)
+    with STARTUP.phase("import_runpod"):
+        import runpod
+    STARTUP.mark_ready()
+
+    scheduler = shared_scheduler()
+    runpod.serverless.start({
+        "handler": async_handler(STARTUP.attach(handler), scheduler.max_concurrency),
+        "concurrency_modifier": scheduler.concurrency_modifier
+    })
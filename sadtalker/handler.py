@@ -1,13 +1,28 @@
-import runpod
 import os
 import time
 import subprocess
-import requests
 import tempfile
 import shutil
 import json
 from urllib.parse import urlparse
 
+# 콜드 스타트 단계별 시간 기록 (첫 잡 응답의 startup 항목)
+from talking_head.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
+with STARTUP.phase("import_runpod"):
+    import runpod
+with STARTUP.phase("import_requests"):
+    import requests
+
+from talking_head.enhance import run_enhancement
+from talking_head.inputs import describe_input, fetch_input
+from talking_head.launcher import launcher_command, launcher_env
+from talking_head.metrics import read_metrics
+from talking_head.pipeline import Pipeline
+from talking_head.profiling import PROFILE_DIR_ENV, collect_artifacts, wrap_command
+from talking_head.rusage import record_usage, run_with_rusage
+
 def download_file(url, destination):
     """URL에서 파일 다운로드"""
     try:
@@ -24,6 +39,17 @@ def download_file(url, destination):
         print(f"Download failed: {str(e)}")
         raise
 
+def request_args(image_path, audio_path, result_dir):
+    """SadTalker 실행 인자 (요청 / 워밍업 공통)"""
+    return [
+        "--driven_audio", audio_path,
+        "--source_image", image_path,
+        "--result_dir", result_dir,
+        "--still",  # 정적 모드 (더 빠름)
+        "--preprocess", "crop",  # 얼굴 크롭
+        "--cpu"  # CPU 모드 (GPU 메모리 절약용, 필요시 제거)
+    ]
+
 def handler(event):
     """
     SadTalker RunPod handler function
@@ -31,7 +57,10 @@ def handler(event):
     Input format:
     {
         'input_image_url': 'https://example.com/face.png',
-        'input_audio_url': 'https://example.com/audio.wav'
+        'input_audio_url': 'https://example.com/audio.wav',
+        # URL 대신 'input_image_base64' / 'input_audio_base64' (base64 또는 data URI) 도 가능
+        'options': {'backend': 'pytorch',  # 선택: 'pytorch', 'onnx' (ONNX Runtime CPU), 'int8'
+                    'profile': False}  # 선택: True/'py-spy', 'cprofile', 'torch' (응답 profile 항목)
     }
     
     Output format:
@@ -49,11 +78,11 @@ def handler(event):
         
         # 입력 받기
         input_data = event['input']
-        image_url = input_data['input_image_url']
-        audio_url = input_data['input_audio_url']
+        options = input_data.get('options', {})
+        backend = options.get('backend', 'pytorch')
         
-        print(f"Image URL: {image_url}")
-        print(f"Audio URL: {audio_url}")
+        print(f"Image: {describe_input(input_data, 'image')}")
+        print(f"Audio: {describe_input(input_data, 'audio')}")
         
         # 작업 디렉토리 생성
         job_id = event.get('id', str(int(time.time())))
@@ -62,34 +91,34 @@ def handler(event):
         
         print(f"Work directory: {work_dir}")
         
-        # 파일 다운로드
-        image_path = download_file(image_url, f"{work_dir}/input_image.png")
-        audio_path = download_file(audio_url, f"{work_dir}/input_audio.wav")
+        # 입력 파일 준비 (URL 다운로드 또는 인라인 base64 디코딩, 이미지 / 오디오 동시 진행)
+        pipeline = Pipeline()
+        pipeline.add("image", lambda: fetch_input(input_data, 'image', f"{work_dir}/input_image.png", download_file))
+        pipeline.add("audio", lambda: fetch_input(input_data, 'audio', f"{work_dir}/input_audio.wav", download_file))
+        pipeline.run()
+        image_path, audio_path = pipeline.results["image"], pipeline.results["audio"]
         
         # 결과 디렉토리
         result_dir = f"{work_dir}/results"
         os.makedirs(result_dir, exist_ok=True)
         
-        # SadTalker 실행 명령어
-        cmd = [
-            "python", "/workspace/SadTalker/inference.py",
-            "--driven_audio", audio_path,
-            "--source_image", image_path,
-            "--result_dir", result_dir,
-            "--still",  # 정적 모드 (더 빠름)
-            "--preprocess", "crop",  # 얼굴 크롭
-            "--enhancer", "gfpgan",  # 품질 향상
-            "--cpu"  # CPU 모드 (GPU 메모리 절약용, 필요시 제거)
-        ]
-        
-        print(f"Running SadTalker command:")
+        # SadTalker 실행 인자
+        inference_args = request_args(image_path, audio_path, result_dir)
+        
+        # 런처를 통해 실행 (백엔드 패치 적용)
+        cmd = launcher_command("sadtalker", inference_args)
+        metrics_path = f"{work_dir}/launcher_metrics.json"
+        env = launcher_env(options, metrics_path)
+        # options.profile 이 py-spy 이면 샘플링 프로파일러로 감쌈
+        cmd = wrap_command(cmd, env)
+        
+        print(f"Running SadTalker command ({backend}):")
         print(f"  {' '.join(cmd)}")
         
-        # SadTalker 실행
-        process = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True,
+        # SadTalker 실행 (자원 사용량 rusage 함께 기록)
+        process = run_with_rusage(
+            cmd,
+            env=env,
             cwd="/workspace/SadTalker",
             timeout=1800  # 30분 타임아웃
         )
@@ -114,10 +143,19 @@ def handler(event):
         # 가장 최근 생성된 파일 선택
         actual_output = max(output_files, key=os.path.getctime)
         
+        record_usage("sadtalker", process.rusage, backend=backend, job_id=job_id)
+        
+        # GFPGAN 품질 향상 (추론과 분리된 단계: 배치 + 얼굴 영역 한정, CPU 에서는 프로세스 풀)
+        enhanced_output = f"{work_dir}/result_enhanced.mp4"
+        enhance_stats = run_enhancement(actual_output, enhanced_output, options, env)
+        print(f"Face enhancement: {enhance_stats.get('per_frame_time')}s/frame")
+        actual_output = enhanced_output
+        
         # 최종 출력 경로로 복사
         final_output = f"/tmp/sadtalker_output_{job_id}.mp4"
         shutil.copy2(actual_output, final_output)
         
+        launcher_metrics = read_metrics(metrics_path)
         processing_time = time.time() - start_time
         
         print(f"=== SadTalker Processing Completed ===")
@@ -131,9 +169,16 @@ def handler(event):
             "output_video_url": f"file://{final_output}",
             "processing_time": processing_time,
             "model": "sadtalker",
+            "backend": backend,
             "success": True,
             "job_id": job_id,
-            "output_file_size": os.path.getsize(final_output)
+            "output_file_size": os.path.getsize(final_output),
+            "launcher_metrics": launcher_metrics,
+            "enhance": enhance_stats,
+            "resource_usage": process.rusage,
+            "pipeline": pipeline.report(),
+            "profile": (collect_artifacts(env[PROFILE_DIR_ENV], job_id, launcher_metrics)
+                        if options.get('profile') else None)
         }
         
     except subprocess.TimeoutExpired:
@@ -156,5 +201,11 @@ def handler(event):
             "processing_time": time.time() - start_time
         }
 
-# RunPod Serverless 시작
-runpod.serverless.start({"handler": handler}) 
\ No newline at end of file
+def warmup_args(image_path, audio_path, work_dir):
+    """워밍업 잡 인자 (실제 요청과 같은 디바이스 / 경로를 미리 실행)"""
+    return request_args(image_path, audio_path, f"{work_dir}/results")
+
+# RunPod Serverless 시작 (워밍업 잡을 먼저 실행한 뒤 트래픽 수신)
+STARTUP.warmup("sadtalker", warmup_args)
+STARTUP.mark_ready()
+runpod.serverless.start({"handler": STARTUP.attach(handler)}) 
\ No newline at end of file
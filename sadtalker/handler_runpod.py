@@ -4,19 +4,49 @@ RunPod Serverless Handler: SadTalker
 사용할 Docker 이미지: vinthony/sadtalker
 """
 
-import runpod
 import os
 import time
 import subprocess
-import requests
 import json
 import logging
 from urllib.parse import urlparse
 
+# 콜드 스타트 단계별 시간 기록 (첫 잡 응답의 startup 항목)
+from talking_head.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
+with STARTUP.phase("import_requests"):
+    import requests
+
+with STARTUP.phase("import_talking_head"):
+    from talking_head.cpu_scheduler import async_handler, shared_scheduler
+    from talking_head.enhance import run_enhancement
+    from talking_head.inputs import fetch_input, has_input
+    from talking_head.launcher import launcher_command, launcher_env
+    from talking_head.media import audio_duration
+    from talking_head.metrics import read_metrics
+    from talking_head.pipeline import Pipeline
+    from talking_head.profiling import PROFILE_DIR_ENV, collect_artifacts, profile_mode
+    from talking_head.quality import try_score
+    from talking_head.residency import resident_enabled, run_inference
+    from talking_head.result_cache import ResultCache, cache_key, model_version
+    from talking_head.rusage import record_usage
+    from talking_head.single_flight import SingleFlight
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+with STARTUP.phase("init"):
+    # 워커 내 동시 잡 CPU 분할 (잡마다 겹치지 않는 코어 집합 할당)
+    CPU_SCHEDULER = shared_scheduler()
+
+    # 입력 해시 + 옵션 기반 결과 캐시 (네트워크 볼륨이 있으면 워커끼리 공유)
+    RESULT_CACHE = ResultCache()
+
+    # 동시에 들어온 동일 잡은 실행 중인 추론 하나에 합침
+    IN_FLIGHT = SingleFlight()
+
 def download_file(url, destination):
     """URL에서 파일 다운로드"""
     try:
@@ -41,12 +71,32 @@ def handler(event):
     {
         'input_image_url': 'https://example.com/face.png',
         'input_audio_url': 'https://example.com/audio.mp3',
+        # URL 대신 'input_image_base64' / 'input_audio_base64' (base64 또는 data URI) 로 직접 전달 가능
         'options': {
             'still_mode': True,  # 정적 모드 (빠름)
             'preprocess': 'crop',  # 전처리 방식
-            'enhancer': 'gfpgan',  # 얼굴 향상
+            'paste_engine': 'vectorized',  # preprocess=full 붙여넣기: 'vectorized' (사전 계산 + 배치 합성) 또는 'upstream'
+            'enhancer': 'gfpgan',  # 얼굴 향상 (gfpgan 은 추론 후 별도 단계에서 배치 / 얼굴 영역 한정으로 실행)
+            'enhance_batch_size': 8,  # gfpgan: 한 번에 GFPGAN 에 넣는 얼굴 수
+            'enhance_workers': 4,  # gfpgan: 프로세스 수 (기본: GPU 1, CPU 코어 수 / 2, 최대 4)
+            'enhance_keyframe_interval': 1,  # gfpgan: N 프레임마다만 GFPGAN 실행, 사이 프레임은 잔차 전파
             'pose_style': 0,  # 포즈 스타일 (0-45)
-            'face_model_resolution': 256  # 얼굴 모델 해상도
+            'face_model_resolution': 256,  # 얼굴 모델 해상도
+            'backend': 'pytorch',  # 실행 백엔드 ('pytorch', 'onnx', 'int8' - onnx/int8 은 CPU 실행)
+            'onnx_intra_op_threads': 8,  # ONNX Runtime intra-op 스레드 수 (기본: 할당된 CPU 수)
+            'onnx_inter_op_threads': 1,  # ONNX Runtime inter-op 스레드 수
+            'parity_check': False,  # ONNX 출력을 PyTorch 출력과 비교
+            'quality_samples': 2,  # int8: FP32 경로와 비교할 호출 수
+            'int8_min_psnr_db': 30.0,  # int8: 허용 최소 PSNR (응답의 acceptable 판정)
+            'use_cache': True,  # 같은 입력/옵션의 이전 결과 재사용
+            'mmap_checkpoints': True,  # 변환된 체크포인트를 mmap 으로 로드 (프로세스 간 메모리 공유)
+            'skip_silence': False,  # 무음 구간은 추론 없이 원본 얼굴로 채움 (결과는 silence 항목)
+            'min_silence_seconds': 0.5,  # skip_silence: 이보다 짧은 무음은 그대로 렌더링
+            'render_fps': 12.5,  # 내부 렌더링 프레임레이트 (기본 25: 모든 프레임 추론, 낮추면 키프레임만 추론하고 보간)
+            'interpolation': 'blend',  # render_fps: 'blend' 또는 'flow' (optical flow warp)
+            'mel_engine': 'numpy',  # mel-spectrogram 계산: 'numpy' (배치 FFT) 또는 'librosa' (업스트림)
+            'score_quality': False,  # 립싱크 / 입 밖 SSIM·PSNR 자동 점수 (결과는 quality, quality_score 항목)
+            'profile': False  # 프로파일러 아래에서 실행 (True/'py-spy', 'cprofile', 'torch'), 결과는 profile 항목
         }
     }
     """
@@ -55,12 +105,11 @@ def handler(event):
     try:
         # 입력 파라미터 받기
         input_data = event.get('input', {})
-        image_url = input_data.get('input_image_url')
-        audio_url = input_data.get('input_audio_url')
         options = input_data.get('options', {})
         
-        if not image_url or not audio_url:
-            raise ValueError("input_image_url and input_audio_url are required")
+        if not has_input(input_data, 'image') or not has_input(input_data, 'audio'):
+            raise ValueError("input_image_url (or input_image_base64) and input_audio_url "
+                             "(or input_audio_base64) are required")
         
         # 작업 디렉토리 생성
         job_id = event.get('id', str(int(time.time())))
@@ -69,84 +118,243 @@ def handler(event):
         
         logger.info(f"Starting SadTalker job {job_id}")
         
-        # 파일 다운로드
-        image_path = download_file(image_url, f"{work_dir}/input_image.png")
-        audio_path = download_file(audio_url, f"{work_dir}/input_audio.wav")
-        
         # SadTalker 옵션 설정
         still_mode = options.get('still_mode', True)
         preprocess = options.get('preprocess', 'crop')
         enhancer = options.get('enhancer', 'gfpgan')
         pose_style = options.get('pose_style', 0)
         resolution = options.get('face_model_resolution', 256)
+        backend = options.get('backend', 'pytorch')
+        
+        # 캐시 / single-flight 키 (기본값이 적용된 실제 옵션 + 입력 내용 + 체크포인트 버전)
+        use_cache = options.get('use_cache', True)
+        # 프로파일링 요청은 실제로 실행해야 하므로 캐시 조회 / 다른 잡과의 합치기를 하지 않음
+        profile = profile_mode(options.get('profile'))
+        effective_options = {
+            'still_mode': still_mode,
+            'preprocess': preprocess,
+            'enhancer': enhancer,
+            'pose_style': pose_style,
+            'face_model_resolution': resolution,
+            'backend': backend
+        }
+        if 'paste_engine' in options:
+            effective_options['paste_engine'] = options['paste_engine']
+        if enhancer == 'gfpgan' and int(options.get('enhance_keyframe_interval', 1)) > 1:
+            effective_options['enhance_keyframe_interval'] = int(options['enhance_keyframe_interval'])
+        if options.get('skip_silence'):
+            # 출력이 달라지므로 캐시 키에 포함 (기본값이면 키를 바꾸지 않음)
+            effective_options['skip_silence'] = True
+            effective_options['min_silence_seconds'] = float(options.get('min_silence_seconds', 0.5))
+        if options.get('render_fps'):
+            effective_options['render_fps'] = float(options['render_fps'])
+            effective_options['interpolation'] = options.get('interpolation', 'blend')
+        if options.get('mel_engine', 'numpy') != 'numpy':
+            effective_options['mel_engine'] = options['mel_engine']
+        version_paths = ["/workspace/SadTalker/checkpoints", "/workspace/SadTalker/gfpgan/weights"]
+        if backend != 'pytorch':
+            version_paths.append("/workspace/onnx")
         
-        # 출력 디렉토리
-        output_dir = f"{work_dir}/results"
-        os.makedirs(output_dir, exist_ok=True)
+        # 잡 단계 DAG: 입력 준비 (URL 다운로드 또는 인라인 base64 디코딩), 오디오 길이 측정, 캐시 키 해시를
+        # 의존 관계대로 겹쳐 실행하고 응답의 pipeline 항목에 임계 경로 기록
+        pipeline = Pipeline()
+        pipeline.add("image", lambda: fetch_input(input_data, 'image', f"{work_dir}/input_image.png", download_file))
+        pipeline.add("audio", lambda: fetch_input(input_data, 'audio', f"{work_dir}/input_audio.wav", download_file))
+        pipeline.add("audio_seconds", audio_duration, deps=("audio",))
+        pipeline.add("model_version", lambda: model_version(version_paths))
+        pipeline.add("cache_key", lambda image, audio, version: cache_key("sadtalker", [image, audio],
+                                                                          effective_options, version),
+                     deps=("image", "audio", "model_version"))
+        pipeline.run()
+        image_path, audio_path, key = (pipeline.results[name] for name in ("image", "audio", "cache_key"))
+        audio_seconds = pipeline.results["audio_seconds"]
+        if use_cache and not profile:
+            cached = RESULT_CACHE.get(key)
+            if cached:
+                processing_time = time.time() - start_time
+                logger.info(f"SadTalker cache hit {key[:12]} in {processing_time:.2f}s")
+                return {
+                    "status": "success",
+                    "output_video_url": f"file://{cached['video_path']}",
+                    "processing_time": processing_time,
+                    "file_size": os.path.getsize(cached['video_path']),
+                    "model": "sadtalker",
+                    "backend": backend,
+                    "options_used": options,
+                    "cache_hit": True,
+                    "audio_seconds": audio_seconds,
+                    "cached_processing_time": cached.get('processing_time'),
+                    "pipeline": pipeline.report(),
+                    "message": f"SadTalker result served from cache in {processing_time:.2f} seconds"
+                }
         
-        # SadTalker 실행 명령 구성
-        cmd = [
-            "python", "/workspace/SadTalker/inference.py",
-            "--driven_audio", audio_path,
-            "--source_image", image_path,
-            "--result_dir", output_dir,
-            "--size", str(resolution),
-            "--pose_style", str(pose_style)
-        ]
+        def render():
+            # 출력 디렉토리
+            output_dir = f"{work_dir}/results"
+            os.makedirs(output_dir, exist_ok=True)
         
-        if still_mode:
-            cmd.append("--still")
+            # SadTalker 실행 인자 구성 (워밍업 잡과 같은 빌더)
+            inference_args = request_args(image_path, audio_path, output_dir, options)
+            enhance_stage = enhancer == 'gfpgan'
         
-        if preprocess:
-            cmd.extend(["--preprocess", preprocess])
+            # 런처를 통해 실행 (백엔드 패치 적용)
+            cmd = launcher_command("sadtalker", inference_args)
+            metrics_path = f"{work_dir}/launcher_metrics.json"
+            env = launcher_env(options, metrics_path)
         
-        if enhancer:
-            cmd.extend(["--enhancer", enhancer])
+            logger.info(f"Executing SadTalker ({backend}): {' '.join(cmd)}")
         
-        logger.info(f"Executing SadTalker: {' '.join(cmd)}")
+            def inference():
+                # SadTalker 실행 (할당된 CPU 슬롯에 고정, TALKING_HEAD_RESIDENT=1 이면 상주 워커에서 실행)
+                with CPU_SCHEDULER.slot() as slot:
+                    run_start = time.time()
+                    result = run_inference(
+                        "sadtalker",
+                        inference_args,
+                        slot.apply(env),
+                        timeout=1200,  # 20분 타임아웃
+                    )
+                    if result.returncode == 0:
+                        CPU_SCHEDULER.record(slot, audio_seconds, time.time() - run_start)
         
-        # SadTalker 실행
-        result = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True, 
-            timeout=1200  # 20분 타임아웃
-        )
+                if result.returncode != 0:
+                    logger.error(f"SadTalker failed: {result.stderr}")
+                    raise Exception(f"SadTalker execution failed: {result.stderr}")
         
-        if result.returncode != 0:
-            logger.error(f"SadTalker failed: {result.stderr}")
-            raise Exception(f"SadTalker execution failed: {result.stderr}")
+                # 결과 파일 찾기
+                output_files = []
+                for root, dirs, files in os.walk(output_dir):
+                    for file in files:
+                        if file.endswith('.mp4'):
+                            output_files.append(os.path.join(root, file))
         
-        # 결과 파일 찾기
-        output_files = []
-        for root, dirs, files in os.walk(output_dir):
-            for file in files:
-                if file.endswith('.mp4'):
-                    output_files.append(os.path.join(root, file))
+                if not output_files:
+                    raise Exception("No output video generated")
+                return result, slot, output_files[0]
         
-        if not output_files:
-            raise Exception("No output video generated")
+            def enhance(inference_result):
+                # 얼굴 향상 (배치 + 얼굴 영역 한정, CPU 에서는 프로세스 풀) - 별도 CPU 슬롯에서 실행
+                raw_video = inference_result[2]
+                if not enhance_stage:
+                    return raw_video, None
+                enhanced_video = f"{work_dir}/result_enhanced.mp4"
+                with CPU_SCHEDULER.slot() as enhance_slot:
+                    stats = run_enhancement(raw_video, enhanced_video, options, enhance_slot.apply(env))
+                logger.info(f"Face enhancement: {stats.get('frames')} frames, "
+                            f"{stats.get('per_frame_time')}s/frame")
+                return enhanced_video, stats
         
-        output_video = output_files[0]
-        file_size = os.path.getsize(output_video)
+            def store(enhance_result):
+                # 실제 환경에서는 S3나 다른 스토리지에 업로드
+                # 여기서는 임시로 로컬 경로 반환 (캐시에 저장하면 작업 디렉토리 정리 후에도 유지됨)
+                output_video = enhance_result[0]
+                if not use_cache:
+                    return f"file://{output_video}"
+                cached_path = RESULT_CACHE.put(key, output_video, {"processing_time": time.time() - start_time,
+                                                                    "options": effective_options})
+                return f"file://{cached_path}"
         
-        # 실제 환경에서는 S3나 다른 스토리지에 업로드
-        # 여기서는 임시로 로컬 경로 반환
-        output_url = f"file://{output_video}"
+            def usage(inference_result):
+                # 자식 프로세스 CPU / 메모리 / I/O 사용량 (용량 계획용 로그에도 기록)
+                result, slot, _ = inference_result
+                resource_usage = getattr(result, 'rusage', None)
+                record_usage("sadtalker", resource_usage, backend=backend, audio_seconds=audio_seconds,
+                             concurrency=slot.concurrency, threads=slot.threads, resident=resident_enabled())
+                return read_metrics(metrics_path), resource_usage
         
-        processing_time = time.time() - start_time
+            def artifacts(usage_result):
+                # flamegraph / cProfile / torch trace (작업 디렉토리 정리 전에 보관 위치로 이동)
+                return collect_artifacts(env[PROFILE_DIR_ENV], job_id, usage_result[0]) if profile else None
         
-        logger.info(f"SadTalker completed in {processing_time:.2f}s")
+            # 결과 저장과 메트릭 / 프로파일 수집은 추론이 끝나면 동시에 진행
+            stages = Pipeline()
+            stages.add("inference", inference)
+            stages.add("enhance", enhance, deps=("inference",))
+            stages.add("store", store, deps=("enhance",))
+            stages.add("usage", usage, deps=("inference",))
+            stages.add("profile", artifacts, deps=("usage",))
+            if options.get('score_quality'):
+                stages.add("quality", lambda enhanced: try_score(enhanced[0], image_path), deps=("enhance",))
+            stages.run()
+            pipeline.attach("render", stages)
         
-        return {
-            "status": "success",
-            "output_video_url": output_url,
-            "processing_time": processing_time,
-            "file_size": file_size,
-            "model": "sadtalker",
-            "options_used": options,
-            "message": f"SadTalker processing completed successfully in {processing_time:.2f} seconds"
-        }
+            result, slot, _ = stages.results["inference"]
+            output_video, enhance_stats = stages.results["enhance"]
+            output_url = stages.results["store"]
+            launcher_metrics, resource_usage = stages.results["usage"]
+            file_size = os.path.getsize(output_video)
+            processing_time = time.time() - start_time
+        
+            logger.info(f"SadTalker completed in {processing_time:.2f}s")
+        
+            response = {
+                "status": "success",
+                "output_video_url": output_url,
+                "processing_time": processing_time,
+                "file_size": file_size,
+                "model": "sadtalker",
+                "backend": backend,
+                "options_used": options,
+                "launcher_metrics": launcher_metrics,
+                "enhance": enhance_stats,
+                "cpu_slot": slot.info(),
+                "resident": resident_enabled(),
+                "image_version": os.environ.get("TALKING_HEAD_IMAGE_VERSION"),
+                "resource_usage": resource_usage,
+                "cache_hit": False,
+                "audio_seconds": audio_seconds,
+                "message": f"SadTalker processing completed successfully in {processing_time:.2f} seconds"
+            }
+        
+            if profile:
+                response["profile"] = stages.results["profile"]
+
+            if options.get('score_quality'):
+                # 자동 품질 점수 (talking_head.quality, sweep_benchmark 의 quality_score)
+                response["quality"] = stages.results["quality"]
+                response["quality_score"] = (stages.results["quality"] or {}).get("quality_score")
+
+            if options.get('skip_silence'):
+                # 생략한 프레임 비율 / 추정 절약 시간 (talking_head.silence)
+                response["silence"] = launcher_metrics.get("silence")
+        
+            if 'full' in (preprocess or ''):
+                # 원본 이미지 붙여넣기 시간 (talking_head.paste)
+                response["paste"] = launcher_metrics.get("paste")
+        
+            if options.get('render_fps'):
+                # 보간한 프레임 비율 / 추정 절약 시간 (talking_head.interpolation)
+                response["interpolation"] = launcher_metrics.get("interpolation")
+        
+            if backend in ('onnx', 'int8'):
+                # 이미지 빌드 시 export 단계에서 기록된 PyTorch 대비 정확도
+                from talking_head.onnx_backend import load_parity_report
+                response["onnx_parity"] = load_parity_report()
+        
+            if backend == 'int8':
+                # FP32 경로 대비 품질 (테넌트별 INT8 사용 여부 판단용)
+                from talking_head.quantization import DEFAULT_MIN_PSNR_DB, quality_summary
+                response["int8_quality"] = quality_summary(
+                    launcher_metrics, options.get('int8_min_psnr_db', DEFAULT_MIN_PSNR_DB)
+                )
+        
+            return response
+        
+        # 같은 키의 잡이 이미 실행 중이면 그 결과를 함께 받음
+        flight_key = f"{key}:profile:{job_id}" if profile else key
+        pipeline.add("render", lambda _: IN_FLIGHT.do(flight_key, render, job_id), deps=("cache_key",))
+        pipeline.run()
+        response, flight = pipeline.results["render"]
+        response = dict(response)
+        response["single_flight"] = flight.info()
+        response["pipeline"] = pipeline.report()
+        if not flight.leader:
+            processing_time = time.time() - start_time
+            response["processing_time"] = processing_time
+            response["message"] = (f"SadTalker result shared from in-flight job {flight.leader_id} "
+                                   f"in {processing_time:.2f} seconds")
+        
+        return response
         
     except subprocess.TimeoutExpired:
         return {
@@ -172,6 +380,48 @@ def handler(event):
         except:
             pass
 
-# RunPod 시작
+def request_args(image_path, audio_path, output_dir, options):
+    """요청 options (기본값 적용) → inference.py 인자 (핸들러 / 워밍업 공용)"""
+    still_mode = options.get('still_mode', True)
+    preprocess = options.get('preprocess', 'crop')
+    enhancer = options.get('enhancer', 'gfpgan')
+    backend = options.get('backend', 'pytorch')
+
+    inference_args = [
+        "--driven_audio", audio_path,
+        "--source_image", image_path,
+        "--result_dir", output_dir,
+        "--size", str(options.get('face_model_resolution', 256)),
+        "--pose_style", str(options.get('pose_style', 0))
+    ]
+
+    if still_mode:
+        inference_args.append("--still")
+
+    if preprocess:
+        inference_args.extend(["--preprocess", preprocess])
+
+    # gfpgan 은 추론과 분리된 enhance 단계에서 실행 (talking_head.enhance), 그 외 enhancer 는 업스트림 그대로
+    if enhancer and enhancer != 'gfpgan':
+        inference_args.extend(["--enhancer", enhancer])
+
+    if backend in ('onnx', 'int8'):
+        # ONNX Runtime 은 CPU 에서 실행되므로 나머지 PyTorch 연산도 CPU 에 둠
+        inference_args.append("--cpu")
+
+    return inference_args
+
+def warmup_args(image_path, audio_path, work_dir):
+    """워밍업 잡 인자 (기본 옵션 요청과 같은 인자, 워밍업 env 와 같은 pytorch 백엔드)"""
+    return request_args(image_path, audio_path, f"{work_dir}/results", {})
+
+# RunPod 시작 (워밍업 잡을 먼저 실행한 뒤 트래픽 수신)
 if __name__ == "__main__":
-    runpod.serverless.start({"handler": handler}) 
\ No newline at end of file
+    STARTUP.warmup("sadtalker", warmup_args)
+    with STARTUP.phase("import_runpod"):
+        import runpod
+    STARTUP.mark_ready()
+    runpod.serverless.start({
+        "handler": async_handler(STARTUP.attach(handler), CPU_SCHEDULER.max_concurrency),
+        "concurrency_modifier": CPU_SCHEDULER.concurrency_modifier
+    }) 
\ No newline at end of file
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+옵션 스윕 벤치마크
+
+핸들러가 받는 옵션 조합을 동시에 실행해 실행 시간 / 비용 / 출력 크기 / 품질 점수를 기록하고,
+어느 지표로도 다른 조합보다 나쁘지 않은 (Pareto 최적) 조합을 출력합니다.
+
+사용법:
+    export RUNPOD_API_KEY=... SADTALKER_ENDPOINT=... WAV2LIP_ENDPOINT=...
+    python sweep_benchmark.py sadtalker --concurrency 4
+    python sweep_benchmark.py wav2lip --grid '{"resize_factor": [1, 2, 4]}' --repeats 2
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from talking_head.results_store import ResultsStore, host_profile, new_run_id
+from test_comparison import TalkingHeadTester
+
+# GitHub Raw URLs (assets/)
+DEFAULT_IMAGE_URL = "https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets/profile.png"
+DEFAULT_AUDIO_URL = "https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets/test.wav"
+
+# 모델별 스윕 범위 (핸들러 options 이름 그대로)
+DEFAULT_GRIDS = {
+    "sadtalker": {
+        "still_mode": [True, False],
+        "preprocess": ["crop", "full"],
+        "enhancer": ["gfpgan", None],
+        "pose_style": [0, 23, 45],  # 포즈 스타일 범위(0-45)의 양 끝과 가운데
+        "face_model_resolution": [256, 512],
+    },
+    "wav2lip": {
+        "quality": ["high", "low"],
+        "resize_factor": [1, 2],
+        "nosmooth": [False, True],
+    },
+}
+
+ENDPOINT_ENVS = {"sadtalker": "SADTALKER_ENDPOINT", "wav2lip": "WAV2LIP_ENDPOINT"}
+
+TIMEOUTS = {"sadtalker": 1800, "wav2lip": 600}
+
+# 응답에 측정된 품질 점수가 없을 때 쓰는 옵션별 상대 품질 (0~1, 높을수록 좋음)
+NOMINAL_QUALITY = {
+    "face_model_resolution": {256: 0.0, 512: 0.25},
+    "enhancer": {None: 0.0, "gfpgan": 0.25, "RestoreFormer": 0.25},
+    "preprocess": {"crop": 0.0, "resize": 0.05, "extcrop": 0.05, "full": 0.15, "extfull": 0.15},
+    "still_mode": {True: 0.0, False: 0.1},
+    "quality": {"low": 0.0, "medium": 0.2, "high": 0.4},
+    "resize_factor": {1: 0.3, 2: 0.15, 4: 0.0},
+    "nosmooth": {True: 0.0, False: 0.1},
+}
+
+# Pareto 비교 지표 (이름, 클수록 좋은지)
+OBJECTIVES = [
+    ("execution_time", False),
+    ("cost", False),
+    ("file_size", False),
+    ("quality_score", True),
+]
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """옵션별 후보 목록 → 모든 조합"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def nominal_quality(options: Dict) -> float:
+    """옵션만으로 추정한 상대 품질 (측정 점수가 없을 때의 대체값)"""
+    score = 0.0
+    for name, value in options.items():
+        score += NOMINAL_QUALITY.get(name, {}).get(value, 0.0)
+    return round(score, 3)
+
+
+def dominates(a: Dict, b: Dict) -> bool:
+    """a 가 모든 지표에서 b 이상이고 하나 이상에서 더 좋으면 True"""
+    better = False
+    for name, maximize in OBJECTIVES:
+        x, y = (a[name], b[name]) if maximize else (b[name], a[name])
+        if x < y:
+            return False
+        if x > y:
+            better = True
+    return better
+
+
+def unscored(results: List[Dict]) -> List[Dict]:
+    """
+    측정 점수가 있는 조합이 하나라도 있을 때 옵션 추정치만 있는 성공 조합
+
+    측정 점수(talking_head.quality)와 옵션 가중치 합은 척도가 달라 같은 frontier 에서 비교하지 않습니다.
+    """
+    succeeded = [r for r in results if r.get("success")]
+    if not any(r["quality_source"] == "measured" for r in succeeded):
+        return []
+    return [r for r in succeeded if r["quality_source"] != "measured"]
+
+
+def pareto_frontier(results: List[Dict]) -> List[Dict]:
+    """성공한 결과 중 다른 결과에 지배되지 않는 것 (실행 시간 순, unscored 조합 제외)"""
+    excluded = unscored(results)
+    candidates = [r for r in results if r.get("success") and not any(r is e for e in excluded)]
+    frontier = [r for r in candidates if not any(dominates(other, r) for other in candidates)]
+    return sorted(frontier, key=lambda r: r["execution_time"])
+
+
+def summarize(config: Dict, runs: List[Dict], tester: TalkingHeadTester, gpu_type: str) -> Dict:
+    """같은 조합의 반복 실행 → 평균 지표"""
+    succeeded = [r for r in runs if r.get("success")]
+    summary = {"options": config, "runs": len(runs), "success": bool(succeeded)}
+    if not succeeded:
+        summary["error"] = runs[-1].get("error") if runs else "not run"
+        return summary
+
+    execution_time = sum(r["execution_time"] for r in succeeded) / len(succeeded)
+    # 핸들러가 품질을 측정해 돌려주면 그 값을, 아니면 옵션 기반 추정치를 사용
+    measured = [r.get("quality_score", r["processing_details"].get("quality_score")) for r in succeeded]
+    measured = [q for q in measured if q is not None]
+
+    summary.update({
+        "execution_time": round(execution_time, 2),
+        "total_time": round(sum(r["total_time"] for r in succeeded) / len(succeeded), 2),
+        "cost": round(tester.calculate_cost(execution_time, gpu_type), 6),
+        "file_size": int(sum(r["file_size"] for r in succeeded) / len(succeeded)),
+        "quality_score": (round(sum(measured) / len(measured), 3) if measured
+                          else nominal_quality(config)),
+        "quality_source": "measured" if measured else "nominal",
+        "failures": len(runs) - len(succeeded),
+    })
+    return summary
+
+
+def run_sweep(tester: TalkingHeadTester, model: str, endpoint_id: str, image_url: str, audio_url: str,
+              configs: List[Dict], repeats: int = 1, concurrency: int = 4,
+              gpu_type: str = "rtx_4090", store: Optional[ResultsStore] = None,
+              run_id: Optional[str] = None) -> List[Dict]:
+    """조합별로 repeats 번씩 동시 실행 (결과 캐시는 끔, store 가 있으면 잡별 결과 기록)"""
+    runs = {i: [] for i in range(len(configs))}
+    host = host_profile(gpu_type=gpu_type, endpoint_id=endpoint_id)
+
+    def run_one(config):
+        # 핸들러가 출력 영상의 립싱크 / 충실도 점수를 계산해 quality_score 로 돌려줌 (talking_head.quality)
+        options = dict(config, use_cache=False, score_quality=True)
+        result = tester.test_endpoint(endpoint_id, image_url, audio_url, model,
+                                      timeout=TIMEOUTS[model], options=options)
+        if result is None:
+            return {"success": False, "error": "API error"}
+        # handler_runpod.py 는 잡 자체는 COMPLETED 이고 output.status 로 실패를 알림
+        if result.get("success") and result["processing_details"].get("status") == "error":
+            return {"success": False, "error": result["processing_details"].get("error")}
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(run_one, config): i
+                   for i, config in enumerate(configs) for _ in range(repeats)}
+        for future in as_completed(futures):
+            run = future.result()
+            runs[futures[future]].append(run)
+            if store:
+                # sqlite 연결은 스레드 간 공유할 수 없으므로 메인 스레드에서 기록
+                execution_time = run.get("execution_time")
+                details = run.get("processing_details") or {}
+                store.record(run_id, "sweep", model, configs[futures[future]], run.get("success"),
+                             latency=execution_time,
+                             cost=tester.calculate_cost(execution_time, gpu_type) if execution_time else None,
+                             file_size=run.get("file_size"), host=host, error=run.get("error"),
+                             version=details.get("image_version"), delay_time=run.get("delay_time"),
+                             audio_seconds=details.get("audio_seconds"), cache_hit=details.get("cache_hit"))
+
+    return [summarize(config, runs[i], tester, gpu_type) for i, config in enumerate(configs)]
+
+
+def print_frontier(frontier: List[Dict], excluded: Optional[List[Dict]] = None) -> None:
+    print("\n" + "=" * 60)
+    print(f"📈 Pareto 최적 조합 ({len(frontier)}개)")
+    print("=" * 60)
+    for r in frontier:
+        _print_result(r)
+    if excluded:
+        print(f"\n⚠️  품질 점수 측정 실패로 frontier 에서 제외된 조합 ({len(excluded)}개, 옵션 추정치)")
+        for r in excluded:
+            _print_result(r)
+
+
+def _print_result(r: Dict) -> None:
+    options = ", ".join(f"{k}={v}" for k, v in sorted(r["options"].items()))
+    print(f"{r['execution_time']:>8.1f}초 | ${r['cost']:.4f} | {r['file_size'] / (1024 * 1024):6.2f}MB | "
+          f"품질 {r['quality_score']:.2f} ({r['quality_source']}) | {options}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Talking head option sweep / Pareto frontier")
+    parser.add_argument("model", choices=sorted(DEFAULT_GRIDS))
+    parser.add_argument("--endpoint", help="엔드포인트 ID (기본: SADTALKER_ENDPOINT / WAV2LIP_ENDPOINT)")
+    parser.add_argument("--image-url", default=DEFAULT_IMAGE_URL)
+    parser.add_argument("--audio-url", default=DEFAULT_AUDIO_URL)
+    parser.add_argument("--grid", help="기본 스윕 범위를 덮어쓸 JSON (예: '{\"resize_factor\": [1, 2, 4]}')")
+    parser.add_argument("--repeats", type=int, default=1, help="조합당 반복 횟수")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시 요청 수")
+    parser.add_argument("--gpu-type", default="rtx_4090", help="비용 계산용 GPU 타입")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: sweep_results_<model>_<timestamp>.json)")
+    parser.add_argument("--no-store", action="store_true", help="성능 결과 저장소(SQLite)에 기록하지 않음")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("RUNPOD_API_KEY")
+    # test_comparison.py 는 *_ENDPOINT, compare_models.py 는 *_ENDPOINT_ID 사용
+    env_name = ENDPOINT_ENVS[args.model]
+    endpoint_id = args.endpoint or os.getenv(env_name) or os.getenv(f"{env_name}_ID")
+    if not api_key or not endpoint_id:
+        print(f"⚠️  RUNPOD_API_KEY 와 {env_name} (또는 --endpoint) 설정이 필요합니다")
+        return 2
+
+    grid = dict(DEFAULT_GRIDS[args.model])
+    if args.grid:
+        grid.update(json.loads(args.grid))
+    configs = expand_grid(grid)
+
+    print(f"🔬 {args.model} 옵션 스윕: {len(configs)}개 조합 × {args.repeats}회, 동시 {args.concurrency}개")
+    tester = TalkingHeadTester(api_key)
+    store = None if args.no_store else ResultsStore()
+    run_id = new_run_id("sweep")
+    results = run_sweep(tester, args.model, endpoint_id, args.image_url, args.audio_url, configs,
+                        repeats=args.repeats, concurrency=args.concurrency, gpu_type=args.gpu_type,
+                        store=store, run_id=run_id)
+    frontier = pareto_frontier(results)
+    excluded = unscored(results)
+    print_frontier(frontier, excluded)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output = args.output or f"sweep_results_{args.model}_{timestamp}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": timestamp,
+            "model": args.model,
+            "endpoint_id": endpoint_id,
+            "grid": grid,
+            "gpu_type": args.gpu_type,
+            "results": results,
+            "pareto_frontier": frontier,
+            "unscored": excluded,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 결과 저장됨: {output}")
+    if store:
+        store.close()
+        print(f"📈 결과 저장소 기록: {run_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""
+SadTalker / Wav2Lip RunPod 핸들러 공용 모듈
+
+각 핸들러(sadtalker/, wav2lip/, runpod_comparison_handler.py)가 함께 사용하는
+실행 런처와 백엔드 구현을 모아둡니다. Docker 이미지에서는 /workspace/talking_head 로 복사됩니다.
+"""
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+메모리 매핑(mmap) 체크포인트 로더
+
+torch.load 는 체크포인트를 프로세스마다 unpickle 해서 개인 메모리(anonymous)에 올리므로,
+한 워커에서 여러 잡을 동시에 실행하면 같은 가중치가 잡 수만큼 메모리에 복제됩니다.
+
+이미지 빌드 시 .pth 체크포인트를 safetensors 형식으로 변환해 두고, 런처에서 torch.load /
+safetensors.torch.load_file 을 파일을 mmap 한 텐서를 반환하도록 교체합니다.
+load_state_dict 이후 모델 파라미터가 이 mmap 텐서를 그대로 가리키도록 바꾸므로 (CPU 실행 시)
+가중치는 페이지 캐시에 한 번만 올라가고 모든 프로세스가 공유합니다.
+
+이미지 빌드 시 변환:
+    python -m talking_head.checkpoints convert --model wav2lip --output-dir /workspace/checkpoints_mmap
+
+전/후 비교 (로드 시간, RSS):
+    python -m talking_head.checkpoints bench /workspace/Wav2Lip/checkpoints/wav2lip_gan.pth
+
+요청 시 options.mmap_checkpoints = False 로 끄면 원래 torch.load 경로를 사용하며,
+두 경우 모두 응답의 launcher_metrics.memory 에 프로세스 RSS 가 기록됩니다.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+from talking_head.launcher import CHECKPOINT_STORE_ENV, MODEL_DIRS
+from talking_head.metrics import before_write, report
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = "/workspace/checkpoints_mmap"
+
+# 모델별 변환 대상 체크포인트 (리포지토리 기준 glob)
+CHECKPOINT_PATTERNS = {
+    "wav2lip": ["checkpoints/*.pth", "face_detection/detection/sfd/*.pth"],
+    "sadtalker": ["checkpoints/*.pth", "checkpoints/*.pth.tar", "gfpgan/weights/*.pth"],
+}
+
+MANIFEST_FILE = "manifest.json"
+
+# safetensors dtype 문자열 → torch dtype 이름
+_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+# 매핑된 파일 (텐서가 버퍼를 참조하는 동안 유지)
+_mapped = []
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+# ---------------------------------------------------------------------------
+# 변환 (이미지 빌드 시)
+# ---------------------------------------------------------------------------
+
+def _encode(obj, tensors, prefix):
+    """체크포인트 객체 → JSON 구조 (텐서는 tensors 에 모으고 이름으로 참조)"""
+    import torch
+
+    if isinstance(obj, torch.Tensor):
+        name = f"t{len(tensors)}:{prefix}"
+        # 저장소를 공유하는 텐서가 있으면 safetensors 가 거부하므로 복사본으로 저장
+        tensors[name] = obj.detach().cpu().contiguous().clone()
+        return {"__tensor__": name}
+    if isinstance(obj, dict):
+        return {"__dict__": [[_encode(k, tensors, prefix), _encode(v, tensors, f"{prefix}.{k}")]
+                             for k, v in obj.items()]}
+    if isinstance(obj, (list, tuple)):
+        items = [_encode(v, tensors, f"{prefix}.{i}") for i, v in enumerate(obj)]
+        return {"__tuple__": items} if isinstance(obj, tuple) else items
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    raise TypeError(f"Unsupported checkpoint value at {prefix}: {type(obj).__name__}")
+
+
+def convert_file(source, target):
+    """.pth 체크포인트 하나를 safetensors 로 변환 (구조는 __metadata__ 에 JSON 으로 저장)"""
+    import torch
+    from safetensors.torch import save_file
+
+    checkpoint = torch.load(source, map_location="cpu")
+    tensors = {}
+    structure = _encode(checkpoint, tensors, "root")
+    save_file(tensors, target, metadata={"structure": json.dumps(structure)})
+
+
+def convert(model, output_dir=DEFAULT_STORE_DIR):
+    """
+    모델의 체크포인트를 모두 변환하고 manifest.json 갱신
+
+    Returns:
+        원본 경로별 변환 결과
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    repo_dir = MODEL_DIRS[model]
+    results = {}
+    for pattern in CHECKPOINT_PATTERNS[model]:
+        for source in sorted(glob.glob(os.path.join(repo_dir, pattern))):
+            source = os.path.realpath(source)
+            name = f"{model}_{os.path.relpath(source, repo_dir).replace(os.sep, '_')}.safetensors"
+            target = os.path.join(output_dir, name)
+            try:
+                start = time.time()
+                convert_file(source, target)
+            except Exception as e:
+                logger.error(f"Checkpoint conversion failed for {source}: {e}")
+                results[source] = {"error": str(e)}
+                continue
+
+            manifest[source] = dict(_file_signature(source), file=name)
+            results[source] = {
+                "file": name,
+                "size_mb": round(os.path.getsize(target) / (1024 * 1024), 2),
+                "convert_time": round(time.time() - start, 2),
+            }
+            logger.info(f"Converted {source} -> {target}")
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    return results
+
+
+# ---------------------------------------------------------------------------
+# mmap 로드 (런처에서 설치)
+# ---------------------------------------------------------------------------
+
+def load_mmap(path):
+    """
+    safetensors 파일을 mmap 해서 텐서 딕셔너리와 메타데이터 반환
+
+    MAP_PRIVATE(ACCESS_COPY) 매핑이므로 쓰기 전까지는 페이지 캐시를 공유합니다.
+    """
+    import torch
+
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    _mapped.append(buffer)
+
+    metadata = header.pop("__metadata__", None) or {}
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        count = (end - begin) // torch.tensor([], dtype=dtype).element_size()
+        if count:
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + begin)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        tensor = tensor.reshape(info["shape"])
+        tensor._talking_head_mmap = True
+        tensors[name] = tensor
+    return tensors, metadata
+
+
+def _decode(obj, tensors):
+    if isinstance(obj, list):
+        return [_decode(v, tensors) for v in obj]
+    if isinstance(obj, dict):
+        if "__tensor__" in obj:
+            return tensors[obj["__tensor__"]]
+        if "__tuple__" in obj:
+            return tuple(_decode(v, tensors) for v in obj["__tuple__"])
+        return {_decode(k, tensors): _decode(v, tensors) for k, v in obj["__dict__"]}
+    return obj
+
+
+def _wants_cpu(map_location):
+    """원래 torch.load 가 텐서를 CPU 에 둘 요청인지 (아니면 원본 경로 사용)"""
+    import torch
+
+    if map_location is None:
+        return not torch.cuda.is_available()
+    if callable(map_location):
+        # 업스트림의 lambda storage, loc: storage 패턴 (CPU 로드)
+        return True
+    return str(map_location).startswith("cpu")
+
+
+class MmapCheckpointStore:
+    """manifest 로 원본 체크포인트 경로 → 변환된 safetensors 파일을 찾는 로더"""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.loaded = []
+        self.aliased_bytes = 0
+
+    def lookup(self, path):
+        if not isinstance(path, (str, os.PathLike)):
+            return None
+        source = os.path.realpath(os.fspath(path))
+        entry = self.manifest.get(source)
+        if not entry or not os.path.exists(source):
+            return None
+        # 원본이 바뀌었으면 변환본을 쓰지 않음
+        signature = _file_signature(source)
+        if signature["size"] != entry["size"] or signature["mtime"] != entry["mtime"]:
+            logger.warning(f"Converted checkpoint is stale, using torch.load: {source}")
+            return None
+        target = os.path.join(self.store_dir, entry["file"])
+        return target if os.path.exists(target) else None
+
+    def load(self, target):
+        tensors, metadata = load_mmap(target)
+        self.loaded.append(os.path.basename(target))
+        if "structure" in metadata:
+            return _decode(json.loads(metadata["structure"]), tensors)
+        return tensors
+
+    def alias_parameters(self, module, state_dict):
+        """load_state_dict 가 복사한 파라미터를 mmap 텐서로 교체 (zero-copy)"""
+        import torch
+
+        targets = dict(module.named_parameters())
+        targets.update(module.named_buffers())
+        for name, value in state_dict.items():
+            if not getattr(value, "_talking_head_mmap", False) or name not in targets:
+                continue
+            current = targets[name]
+            if (current.device.type == "cpu" and current.dtype == value.dtype
+                    and current.shape == value.shape):
+                with torch.no_grad():
+                    current.data = value
+                self.aliased_bytes += value.numel() * value.element_size()
+
+    def stats(self):
+        return {
+            "store_dir": self.store_dir,
+            "files": list(self.loaded),
+            "aliased_mb": round(self.aliased_bytes / (1024 * 1024), 2),
+        }
+
+
+def install(store_dir=None):
+    """런처용: torch.load / safetensors.torch.load_file / Module.load_state_dict 패치"""
+    import torch
+
+    store_dir = store_dir or os.environ.get(CHECKPOINT_STORE_ENV, DEFAULT_STORE_DIR)
+    try:
+        store = MmapCheckpointStore(store_dir)
+    except (OSError, ValueError):
+        logger.info(f"No converted checkpoints in {store_dir}, using torch.load")
+        return None
+
+    original_load = torch.load
+
+    def load(f, map_location=None, *args, **kwargs):
+        target = store.lookup(f)
+        if target and _wants_cpu(map_location):
+            return store.load(target)
+        return original_load(f, map_location, *args, **kwargs)
+
+    torch.load = load
+
+    try:
+        import safetensors.torch
+
+        original_load_file = safetensors.torch.load_file
+
+        def load_file(filename, device="cpu"):
+            # SadTalker 체크포인트는 이미 safetensors 이므로 변환 없이 바로 mmap
+            if str(device) == "cpu":
+                return store.load(os.fspath(filename))
+            return original_load_file(filename, device)
+
+        safetensors.torch.load_file = load_file
+    except ImportError:
+        pass
+
+    original_load_state_dict = torch.nn.Module.load_state_dict
+
+    def load_state_dict(self, state_dict, strict=True):
+        result = original_load_state_dict(self, state_dict, strict)
+        store.alias_parameters(self, state_dict)
+        return result
+
+    torch.nn.Module.load_state_dict = load_state_dict
+
+    before_write(lambda: report("checkpoints", **store.stats()))
+    logger.info(f"Memory-mapped checkpoint loading enabled ({store_dir})")
+    return store
+
+
+# ---------------------------------------------------------------------------
+# 메모리 측정
+# ---------------------------------------------------------------------------
+
+def memory_usage():
+    """
+    현재 프로세스 메모리 (MB, /proc/self/status)
+
+    rss_anon 은 프로세스 개인 메모리, rss_file 은 다른 프로세스와 공유 가능한 파일 매핑입니다.
+    """
+    fields = {"VmRSS": "rss", "VmHWM": "peak_rss", "RssAnon": "rss_anon", "RssFile": "rss_file"}
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return usage
+
+
+def bench(path, store_dir=DEFAULT_STORE_DIR):
+    """
+    체크포인트 하나를 torch.load 와 mmap 으로 각각 로드해 시간 / RSS 증가량 비교
+
+    각 방식은 별도 프로세스에서 측정합니다 (이전 로드의 메모리가 섞이지 않도록).
+    """
+    import subprocess
+
+    results = {}
+    for mode in ("torch_load", "mmap"):
+        code = (
+            "import json, time, torch\n"
+            "from talking_head import checkpoints\n"
+            f"mode, path, store_dir = {mode!r}, {os.path.abspath(path)!r}, {store_dir!r}\n"
+            "before = checkpoints.memory_usage()\n"
+            "if mode == 'mmap':\n"
+            "    checkpoints.install(store_dir)\n"
+            "start = time.time()\n"
+            "obj = torch.load(path, map_location='cpu')\n"
+            "elapsed = time.time() - start\n"
+            "after = checkpoints.memory_usage()\n"
+            "print(json.dumps({'load_time': round(elapsed, 4),\n"
+            "    'rss_anon_delta_mb': round(after.get('rss_anon', 0) - before.get('rss_anon', 0), 1),\n"
+            "    'rss_file_delta_mb': round(after.get('rss_file', 0) - before.get('rss_file', 0), 1)}))\n"
+        )
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if proc.returncode != 0:
+            results[mode] = {"error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+        else:
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped checkpoint conversion")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help=".pth → safetensors")
+    convert_parser.add_argument("--model", choices=sorted(MODEL_DIRS), required=True)
+    convert_parser.add_argument("--output-dir", default=DEFAULT_STORE_DIR)
+
+    bench_parser = subparsers.add_parser("bench", help="torch.load vs mmap 로드 시간 / RSS 비교")
+    bench_parser.add_argument("path")
+    bench_parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "convert":
+        results = convert(args.model, args.output_dir)
+        print(json.dumps(results, indent=2))
+        return 0 if any("error" not in r for r in results.values()) else 1
+
+    print(json.dumps(bench(args.path, args.store_dir), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+단일 워커 멀티 잡 CPU 분할 스케줄러
+
+inference.py 서브프로세스는 기본 torch 스레딩으로 모든 코어를 사용하므로, 여러 잡을 동시에
+돌리면 과다 구독(oversubscription)이 발생합니다. 이 스케줄러는 워커의 CPU 를 물리 코어 단위로
+N 개의 서로 겹치지 않는 슬롯으로 나누고, 잡마다 슬롯 하나를 할당합니다.
+
+- 런처는 TALKING_HEAD_CPUS 에 지정된 CPU 로 affinity 를 고정하고 torch 스레드 수를 맞춥니다.
+- N 은 잡마다 측정한 처리량(오디오 초 / 실행 초)으로 고릅니다. 측정이 부족한 N 부터 탐색하고,
+  모두 측정되면 N × (슬롯당 처리량) 이 최대인 값을 사용합니다. 잡이 슬롯을 반납할 때마다 다시 고르며,
+  바뀐 분할의 슬롯은 이전 분할에서 아직 실행 중인 잡의 CPU 와 겹치지 않을 때만 할당합니다.
+- runpod 의 concurrency_modifier 로 현재 N (실제 슬롯 수, 물리 코어 수 이하)을 알려줍니다.
+
+사용법 (핸들러):
+    CPU_SCHEDULER = shared_scheduler()
+    with CPU_SCHEDULER.slot() as slot:
+        env = slot.apply(env)
+        ...
+    runpod.serverless.start({
+        "handler": async_handler(handler, CPU_SCHEDULER.max_concurrency),
+        "concurrency_modifier": CPU_SCHEDULER.concurrency_modifier,
+    })
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from talking_head.launcher import ORT_INTRA_OP_THREADS_ENV
+
+logger = logging.getLogger(__name__)
+
+# 런처용 환경 변수
+CPUS_ENV = "TALKING_HEAD_CPUS"
+NUM_THREADS_ENV = "TALKING_HEAD_NUM_THREADS"
+
+# 워커 설정용 환경 변수
+MAX_CONCURRENCY_ENV = "TALKING_HEAD_MAX_CONCURRENCY"
+CPU_PROFILE_ENV = "TALKING_HEAD_CPU_PROFILE"
+
+DEFAULT_PROFILE_PATH = "/tmp/talking_head_cpu_profile.json"
+
+# 잡 하나에 최소로 배정할 물리 코어 수
+MIN_CORES_PER_JOB = 2
+
+# N 을 확정하기 전에 필요한 측정 횟수
+MIN_SAMPLES = 3
+
+# 처리량 지수 이동 평균 계수
+EWMA_ALPHA = 0.3
+
+# 서브프로세스의 BLAS / OpenMP 스레드 수를 제어하는 환경 변수
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def parse_cpu_list(text):
+    """'0-3,8' 형식 → CPU 번호 리스트"""
+    cpus = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def format_cpu_list(cpus):
+    """CPU 번호 리스트 → '0-3,8' 형식"""
+    cpus = sorted(cpus)
+    ranges = []
+    for cpu in cpus:
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def available_cpus():
+    """현재 프로세스가 사용할 수 있는 CPU 목록"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def physical_core_groups(cpus):
+    """
+    하이퍼스레딩 형제 CPU 를 하나의 물리 코어로 묶음
+
+    슬롯끼리 같은 물리 코어를 나눠 쓰지 않도록 sysfs topology 를 사용합니다.
+    """
+    cpus = set(cpus)
+    groups, seen = [], set()
+    for cpu in sorted(cpus):
+        if cpu in seen:
+            continue
+        siblings = {cpu}
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                siblings = set(parse_cpu_list(f.read())) & cpus
+        except (OSError, ValueError):
+            pass
+        groups.append(sorted(siblings))
+        seen.update(siblings)
+    return groups
+
+
+def partition(cpus, count):
+    """물리 코어 그룹을 count 개의 연속 구간으로 균등 분할"""
+    groups = physical_core_groups(cpus)
+    count = max(1, min(count, len(groups)))
+    base, extra = divmod(len(groups), count)
+    slots, start = [], 0
+    for i in range(count):
+        size = base + (1 if i < extra else 0)
+        slots.append(sorted(cpu for group in groups[start:start + size] for cpu in group))
+        start += size
+    return slots
+
+
+class CpuSlot:
+    """잡 하나에 할당된 CPU 집합"""
+
+    def __init__(self, index, cpus, concurrency, generation):
+        self.index = index
+        self.cpus = cpus
+        self.concurrency = concurrency
+        self.generation = generation
+
+    @property
+    def threads(self):
+        return len(self.cpus)
+
+    def apply(self, env):
+        """서브프로세스 환경 변수에 CPU 고정 및 스레드 수 설정"""
+        env = dict(env)
+        env[CPUS_ENV] = format_cpu_list(self.cpus)
+        env[NUM_THREADS_ENV] = str(self.threads)
+        for name in THREAD_ENV_VARS:
+            env[name] = str(self.threads)
+        # 요청에서 명시하지 않았으면 ONNX Runtime 스레드도 슬롯 크기에 맞춤
+        env.setdefault(ORT_INTRA_OP_THREADS_ENV, str(self.threads))
+        return env
+
+    def info(self):
+        return {
+            "cpus": format_cpu_list(self.cpus),
+            "threads": self.threads,
+            "concurrency": self.concurrency,
+        }
+
+
+class ThroughputProfile:
+    """동시 실행 수(N)별 슬롯당 처리량 측정값 (JSON 파일에 저장)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def samples(self, concurrency):
+        return self.data.get(str(concurrency), {}).get("samples", 0)
+
+    def rate(self, concurrency):
+        return self.data.get(str(concurrency), {}).get("rate", 0.0)
+
+    def record(self, concurrency, rate):
+        entry = self.data.setdefault(str(concurrency), {"rate": rate, "samples": 0})
+        if entry["samples"]:
+            entry["rate"] = (1 - EWMA_ALPHA) * entry["rate"] + EWMA_ALPHA * rate
+        entry["samples"] += 1
+        self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save CPU profile: {e}")
+
+
+class CpuScheduler:
+    """N 개의 서로 겹치지 않는 CPU 슬롯으로 잡을 동시 실행"""
+
+    def __init__(self, max_concurrency=None, profile_path=None):
+        self.cpus = available_cpus()
+        cores = len(physical_core_groups(self.cpus))
+        default_max = max(1, cores // MIN_CORES_PER_JOB)
+        # 물리 코어보다 많은 슬롯은 만들 수 없음 (partition 이 코어 수로 줄임)
+        self.max_concurrency = max(1, min(cores, int(max_concurrency or os.environ.get(MAX_CONCURRENCY_ENV,
+                                                                                       default_max))))
+        self.profile = ThroughputProfile(
+            profile_path or os.environ.get(CPU_PROFILE_ENV, DEFAULT_PROFILE_PATH))
+
+        self._cond = threading.Condition()
+        self._active = []
+        self._generation = 0
+        self._plan = self._make_slots(self.choose_concurrency())
+        self.concurrency = len(self._plan)
+
+        logger.info(f"CPU scheduler: {len(self.cpus)} CPUs, concurrency {self.concurrency} "
+                    f"(max {self.max_concurrency})")
+
+    def candidates(self):
+        """탐색할 동시 실행 수 후보 (2의 거듭제곱 + 최댓값)"""
+        values, n = {self.max_concurrency}, 1
+        while n < self.max_concurrency:
+            values.add(n)
+            n *= 2
+        return sorted(values)
+
+    def choose_concurrency(self):
+        """측정이 부족한 후보를 먼저 탐색하고, 이후에는 총 처리량이 최대인 N 선택"""
+        candidates = self.candidates()
+        for n in candidates:
+            if self.profile.samples(n) < MIN_SAMPLES:
+                return n
+        return max(candidates, key=lambda n: n * self.profile.rate(n))
+
+    def _make_slots(self, concurrency):
+        parts = partition(self.cpus, concurrency)
+        return [CpuSlot(i, cpus, len(parts), self._generation) for i, cpus in enumerate(parts)]
+
+    def _free_slots(self):
+        """현재 분할에서 비어 있고, 이전 분할로 실행 중인 잡과 CPU 가 겹치지 않는 슬롯"""
+        used = {s.index for s in self._active if s.generation == self._generation}
+        busy = {cpu for s in self._active if s.generation != self._generation for cpu in s.cpus}
+        return [s for s in self._plan if s.index not in used and busy.isdisjoint(s.cpus)]
+
+    def _replan(self):
+        new_concurrency = self.choose_concurrency()
+        if new_concurrency != self.concurrency:
+            logger.info(f"CPU scheduler: concurrency {self.concurrency} -> {new_concurrency}")
+            self._generation += 1
+            self._plan = self._make_slots(new_concurrency)
+            self.concurrency = len(self._plan)
+
+    @contextmanager
+    def slot(self):
+        """빈 슬롯이 생길 때까지 기다렸다가 할당"""
+        with self._cond:
+            while not self._free_slots():
+                self._cond.wait()
+            slot = self._free_slots()[0]
+            self._active.append(slot)
+
+        try:
+            yield slot
+        finally:
+            with self._cond:
+                self._active.remove(slot)
+                # 전체가 쉴 때까지 기다리지 않고 반납 시점마다 N 을 다시 고름 (계속 부하가 있어도 탐색 진행)
+                self._replan()
+                self._cond.notify_all()
+
+    def record(self, slot, work_units, elapsed):
+        """
+        잡 처리량 기록
+
+        Args:
+            slot: 잡이 사용한 슬롯
+            work_units: 처리한 작업량 (오디오 초, 알 수 없으면 None - 단위가 섞이지 않도록 기록하지 않음)
+            elapsed: 실행 시간 (초)
+        """
+        if not work_units or elapsed <= 0:
+            return
+        with self._cond:
+            self.profile.record(slot.concurrency, work_units / elapsed)
+
+    def concurrency_modifier(self, current_concurrency):
+        """runpod concurrency_modifier: 현재 목표 동시 실행 수 반환"""
+        return self.concurrency
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "cpus": len(self.cpus),
+            "throughput_per_slot": {n: round(self.profile.rate(n), 4) for n in self.candidates()},
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """프로세스 전체에서 공유하는 CpuScheduler (한 워커에서 두 모델 핸들러를 함께 쓸 때)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = CpuScheduler()
+        return _shared
+
+
+def async_handler(handler, max_workers):
+    """
+    동기 핸들러를 runpod 동시 실행용 async 핸들러로 변환
+
+    runpod 는 async 핸들러만 동시에 실행하므로 스레드 풀에서 동기 핸들러를 실행합니다.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def run(job):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, handler, job)
+
+    return run
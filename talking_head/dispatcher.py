@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+여러 엔드포인트에 대한 재시도 / hedged 요청 디스패처 (클라이언트용)
+
+runsync 한 번으로 엔드포인트 하나만 호출하면 느린 콜드 워커 하나가 꼬리 지연 시간을 결정합니다.
+디스패처는 모델별로 여러 엔드포인트 ID 를 받아 /run 으로 잡을 제출하고 /status 로 확인하며,
+
+- 일시적 오류(연결 오류, 타임아웃, 429 / 5xx)는 jitter 를 준 지수 백오프로 재시도하고
+  (잡 제출 /run 은 중복 잡을 만들지 않도록 읽기 타임아웃은 재시도하지 않음),
+- 최근 완료 시간의 백분위수(기본 p95)만큼 기다려도 끝나지 않으면 다른 엔드포인트에 같은 잡을 한 번 더
+  보낸 뒤(hedge), 먼저 끝난 쪽을 사용하고 나머지는 /cancel 로 취소합니다.
+
+stats() 는 hedge 없이 첫 번째 요청만 기다렸을 때의 지연 시간과 실제 지연 시간의 p50 / p99 를 비교합니다.
+bench 명령은 hedge 가 이긴 경우에도 첫 번째 요청을 끝까지 실행해 (measure_unhedged) 실제 값을 측정합니다.
+
+사용법:
+    dispatcher = EndpointDispatcher(api_key, {"wav2lip": ["ep1", "ep2"]})
+    result = dispatcher.run("wav2lip", {"input": {...}}, timeout=600)
+
+    python -m talking_head.dispatcher bench wav2lip --endpoints ep1,ep2 --requests 50
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://api.runpod.ai/v2"
+
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT"}
+
+# 재시도할 HTTP 상태
+TRANSIENT_HTTP_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# hedge 지연을 백분위수로 계산하기 위한 최소 완료 기록 수 (그 전에는 initial_hedge_delay)
+MIN_HISTORY = 10
+
+
+class TransientError(Exception):
+    """재시도 가능한 오류"""
+
+
+def percentile(values, pct):
+    """선형 보간 백분위수 (values 가 비어 있으면 None)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class _Attempt:
+    """엔드포인트 하나에 제출한 잡"""
+
+    def __init__(self, endpoint_id, hedge):
+        self.endpoint_id = endpoint_id
+        self.hedge = hedge
+        self.job_id = None
+        self.started = time.time()
+        self.done = False
+        self.cancelled = threading.Event()
+
+
+class EndpointDispatcher:
+    """모델별 여러 엔드포인트로 잡을 보내는 재시도 / hedge 디스패처"""
+
+    def __init__(self, api_key, endpoints, hedge_percentile=95.0, initial_hedge_delay=60.0,
+                 min_hedge_delay=5.0, max_retries=3, backoff_base=1.0, backoff_max=30.0,
+                 poll_interval=1.0, history_size=200, hedge=True, measure_unhedged=False):
+        """
+        Args:
+            endpoints: 모델명 → 엔드포인트 ID 목록
+            hedge_percentile: 최근 완료 시간의 이 백분위수만큼 기다린 뒤 hedge 요청
+            initial_hedge_delay: 완료 기록이 충분하지 않을 때의 hedge 지연 (초)
+            max_retries: 일시적 오류 재시도 횟수 (요청 하나당)
+            measure_unhedged: hedge 가 이겨도 primary 를 취소하지 않고 끝까지 실행해 hedge 없는 경우의
+                지연 시간을 측정 (벤치마크용, 잡 하나를 더 실행하는 비용)
+        """
+        self.api_key = api_key
+        self.endpoints = {model: list(ids) for model, ids in endpoints.items()}
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.hedge = hedge
+        self.measure_unhedged = measure_unhedged
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+        self._lock = threading.Lock()
+        self._round_robin = {model: itertools.cycle(range(len(ids))) for model, ids in self.endpoints.items()}
+        self._history = {model: deque(maxlen=history_size) for model in self.endpoints}
+        self._records = []
+        self._observers = []
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _request(self, method, url, idempotent=True, **kwargs):
+        """
+        요청 하나 (일시적 오류는 jitter 를 준 지수 백오프로 재시도)
+
+        idempotent=False (POST /run) 이면 읽기 타임아웃은 재시도하지 않습니다. 요청이 이미 전달되어 잡이
+        생성됐을 수 있어 다시 보내면 아무도 확인하지 않는 중복 잡이 남기 때문입니다.
+        연결 오류 / 연결 타임아웃과 일시적 HTTP 상태만 재시도합니다.
+        """
+        retryable = (requests.ConnectionError, requests.Timeout) if idempotent else (requests.ConnectionError,)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = requests.request(method, url, headers=self.headers, timeout=30, **kwargs)
+                if response.status_code in TRANSIENT_HTTP_STATUSES:
+                    raise TransientError(f"HTTP {response.status_code}: {response.text[:200]}")
+                response.raise_for_status()
+                return response.json()
+            except (*retryable, TransientError) as e:
+                if attempt == self.max_retries:
+                    raise TransientError(f"{method} {url} failed after {attempt + 1} attempts: {e}")
+                # full jitter: 0 ~ min(max, base * 2^attempt)
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logger.warning(f"{method} {url} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _cancel(self, attempt):
+        attempt.cancelled.set()
+        if attempt.job_id:
+            try:
+                self._request("POST", f"{BASE_URL}/{attempt.endpoint_id}/cancel/{attempt.job_id}")
+            except Exception as e:
+                logger.warning(f"Cancel {attempt.job_id} on {attempt.endpoint_id} failed: {e}")
+
+    def _run_attempt(self, attempt, payload, deadline, results):
+        """제출 후 종료 상태가 될 때까지 /status 확인 (결과는 results 큐로 전달)"""
+        def finish(status):
+            attempt.done = True
+            results.put((attempt, status))
+
+        try:
+            job = self._request("POST", f"{BASE_URL}/{attempt.endpoint_id}/run", idempotent=False, json=payload)
+            attempt.job_id = job["id"]
+            if attempt.cancelled.is_set():
+                # 제출 중에 다른 요청이 먼저 끝남
+                self._cancel(attempt)
+                return
+            status = job
+            while status.get("status") not in TERMINAL_STATUSES:
+                if attempt.cancelled.is_set():
+                    return
+                if time.time() > deadline:
+                    finish({"status": "TIMED_OUT", "error": "dispatcher timeout"})
+                    return
+                time.sleep(self.poll_interval)
+                status = self._request("GET", f"{BASE_URL}/{attempt.endpoint_id}/status/{attempt.job_id}")
+            finish(status)
+        except Exception as e:
+            finish({"status": "FAILED", "error": str(e), "transient": isinstance(e, TransientError)})
+
+    # ------------------------------------------------------------------
+    # 디스패치
+    # ------------------------------------------------------------------
+
+    def hedge_delay(self, model):
+        """hedge 요청 전 대기 시간 (최근 완료 시간의 백분위수)"""
+        with self._lock:
+            history = list(self._history[model])
+        if len(history) < MIN_HISTORY:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, percentile(history, self.hedge_percentile))
+
+    def _next_endpoint(self, model, exclude=()):
+        ids = self.endpoints[model]
+        with self._lock:
+            for _ in range(len(ids)):
+                endpoint_id = ids[next(self._round_robin[model])]
+                if endpoint_id not in exclude:
+                    return endpoint_id
+        # 엔드포인트가 하나뿐이면 같은 엔드포인트의 다른 워커로 hedge
+        return ids[0]
+
+    def run(self, model, payload, timeout=1800):
+        """
+        잡 하나 실행
+
+        Returns:
+            /status 응답 (status, output, executionTime, delayTime) + dispatch 항목
+            (시도 수, hedge 여부, 사용된 엔드포인트, 취소된 잡, 지연 시간)
+        """
+        if model not in self.endpoints or not self.endpoints[model]:
+            raise ValueError(f"No endpoints configured for {model}")
+
+        start_time = time.time()
+        deadline = start_time + timeout
+        results = queue.Queue()
+        attempts = []
+
+        def launch(hedge):
+            used = [a.endpoint_id for a in attempts]
+            attempt = _Attempt(self._next_endpoint(model, exclude=used), hedge)
+            attempts.append(attempt)
+            threading.Thread(target=self._run_attempt, args=(attempt, payload, deadline, results),
+                             daemon=True).start()
+            return attempt
+
+        primary = launch(hedge=False)
+        hedge_at = start_time + self.hedge_delay(model) if self.hedge else None
+        pending, winner, last_failure = 1, None, None
+
+        while pending and time.time() < deadline:
+            wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+            try:
+                attempt, status = results.get(timeout=max(0.0, wait_until - time.time()))
+            except queue.Empty:
+                if hedge_at is not None and time.time() >= hedge_at:
+                    logger.info(f"{model} job exceeded hedge delay, sending hedged request")
+                    launch(hedge=True)
+                    pending += 1
+                    hedge_at = None
+                continue
+
+            pending -= 1
+            if status.get("status") == "COMPLETED":
+                winner = (attempt, status)
+                break
+            last_failure = (attempt, status)
+            # 일시적 오류로 실패했고 hedge 가 아직 없으면 바로 다른 엔드포인트로 다시 보냄
+            if status.get("transient") and hedge_at is not None and not pending:
+                launch(hedge=True)
+                pending += 1
+                hedge_at = None
+
+        latency = time.time() - start_time
+        attempt, status = winner or last_failure or (primary, {"status": "TIMED_OUT",
+                                                               "error": "dispatcher timeout"})
+        if winner:
+            with self._lock:
+                self._history[model].append(latency)
+
+        # hedge 없이 첫 요청만 기다렸다면 걸렸을 시간 (primary 가 지면 취소 시점까지의 하한)
+        record = {
+            "model": model,
+            "latency": latency,
+            "primary_latency": latency,
+            "primary_censored": attempt is not primary,
+            "hedged": len(attempts) > 1,
+            "success": winner is not None,
+        }
+        with self._lock:
+            self._records.append(record)
+
+        observe_primary = self.measure_unhedged and attempt is not primary and not primary.done
+        cancelled = []
+        for loser in attempts:
+            # 아직 실행 중인 나머지 요청 취소 (큐 / 워커 점유 방지)
+            if loser.done or (observe_primary and loser is primary):
+                continue
+            self._cancel(loser)
+            if loser.job_id:
+                cancelled.append(loser.job_id)
+
+        if observe_primary:
+            # 벤치마크용: primary 를 끝까지 실행해 hedge 없는 경우의 실제 지연 시간 기록
+            observer = threading.Thread(target=self._observe_primary,
+                                        args=(record, primary, results, start_time, deadline), daemon=True)
+            observer.start()
+            self._observers.append(observer)
+
+        result = dict(status)
+        result["dispatch"] = {
+            "endpoint_id": attempt.endpoint_id,
+            "job_id": attempt.job_id,
+            "attempts": len(attempts),
+            "hedged": len(attempts) > 1,
+            "winner_is_hedge": attempt.hedge,
+            "cancelled_jobs": cancelled,
+            "latency": round(latency, 3),
+        }
+        return result
+
+    def _observe_primary(self, record, primary, results, start_time, deadline):
+        while time.time() < deadline:
+            try:
+                attempt, status = results.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            if attempt is primary:
+                if status.get("status") == "COMPLETED":
+                    with self._lock:
+                        record["primary_latency"] = time.time() - start_time
+                        record["primary_censored"] = False
+                return
+
+    def wait_for_observers(self):
+        """measure_unhedged 로 계속 실행 중인 primary 요청이 모두 끝날 때까지 대기"""
+        for observer in self._observers:
+            observer.join()
+        self._observers = []
+
+    def stats(self, model=None):
+        """실제 / hedge 없는 경우의 p50 / p99 지연 시간과 p99 개선율"""
+        with self._lock:
+            records = [r for r in self._records if model is None or r["model"] == model]
+        if not records:
+            return {"requests": 0}
+
+        observed = [r["latency"] for r in records]
+        primary = [r["primary_latency"] for r in records]
+        p99, primary_p99 = percentile(observed, 99), percentile(primary, 99)
+        return {
+            "requests": len(records),
+            "success_rate": round(sum(r["success"] for r in records) / len(records), 4),
+            "hedge_rate": round(sum(r["hedged"] for r in records) / len(records), 4),
+            "p50": round(percentile(observed, 50), 3),
+            "p99": round(p99, 3),
+            "unhedged_p50": round(percentile(primary, 50), 3),
+            "unhedged_p99": round(primary_p99, 3),
+            # 취소된 primary 는 취소 시점까지만 알 수 있으므로, 이 값이 0 보다 크면 unhedged_p99 는 하한
+            # (실제 개선은 p99_improvement 이상). 정확히 재려면 measure_unhedged=True
+            "censored_fraction": round(sum(r["primary_censored"] for r in records) / len(records), 4),
+            "p99_improvement": round(1 - p99 / primary_p99, 4) if primary_p99 else None,
+        }
+
+
+def endpoints_from_env():
+    """SADTALKER_ENDPOINT / WAV2LIP_ENDPOINT (또는 *_ID) 의 쉼표로 구분된 엔드포인트 ID 목록"""
+    endpoints = {}
+    for model in ("sadtalker", "wav2lip"):
+        name = f"{model.upper()}_ENDPOINT"
+        value = os.getenv(name) or os.getenv(f"{name}_ID")
+        if value:
+            endpoints[model] = [e.strip() for e in value.split(",") if e.strip()]
+    return endpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedged RunPod dispatcher")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench_parser = subparsers.add_parser("bench", help="요청을 반복 실행하고 hedge 전/후 p99 비교")
+    bench_parser.add_argument("model", choices=["sadtalker", "wav2lip"])
+    bench_parser.add_argument("--endpoints", help="엔드포인트 ID 목록 (쉼표 구분, 기본: 환경 변수)")
+    bench_parser.add_argument("--requests", type=int, default=20)
+    bench_parser.add_argument("--concurrency", type=int, default=4)
+    bench_parser.add_argument("--payload", help="요청 JSON 파일 (기본: assets 테스트 입력)")
+    bench_parser.add_argument("--hedge-percentile", type=float, default=95.0)
+    bench_parser.add_argument("--initial-hedge-delay", type=float, default=60.0)
+    bench_parser.add_argument("--timeout", type=int, default=1800)
+    bench_parser.add_argument("--cancel-losers", action="store_true",
+                              help="hedge 가 이기면 primary 도 취소 (p99 개선은 하한으로만 보고)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    api_key = os.getenv("RUNPOD_API_KEY")
+    endpoints = ({args.model: args.endpoints.split(",")} if args.endpoints else endpoints_from_env())
+    if not api_key or not endpoints.get(args.model):
+        print("RUNPOD_API_KEY and endpoint IDs (--endpoints or *_ENDPOINT) are required")
+        return 2
+
+    if args.payload:
+        with open(args.payload) as f:
+            payload = json.load(f)
+    else:
+        base = "https://raw.githubusercontent.com/Su-minn/runpod-talking-head-test/main/assets"
+        payload = {"input": {"input_image_url": f"{base}/profile.png",
+                             "input_audio_url": f"{base}/test.wav",
+                             "options": {"use_cache": False}}}
+
+    dispatcher = EndpointDispatcher(api_key, endpoints, hedge_percentile=args.hedge_percentile,
+                                    initial_hedge_delay=args.initial_hedge_delay,
+                                    measure_unhedged=not args.cancel_losers)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda _: dispatcher.run(args.model, payload, args.timeout), range(args.requests)))
+
+    dispatcher.wait_for_observers()
+    print(json.dumps(dispatcher.stats(args.model), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+SadTalker GFPGAN 얼굴 향상 단계 (추론과 분리된 파이프라인 단계)
+
+업스트림 --enhancer gfpgan 은 완성된 영상을 프레임마다 하나씩 GFPGANer.enhance 로 처리합니다
+(전체 프레임 얼굴 검출 → 정렬 → GFPGAN → 붙여넣기 → 2배 업스케일). 여기서는 같은 GFPGANv1.4 모델과
+2배 업스케일 출력을 유지하면서
+
+- 얼굴 영역 제한: 몇 프레임에서 검출한 얼굴 박스(여유 포함) 안에서만 검출 / 정렬 / 붙여넣기, 나머지는 LANCZOS 업스케일만
+- 배치: 정렬된 512x512 얼굴 crop 을 batch_size 개씩 묶어 GFPGAN 을 한 번에 호출
+- 키프레임: keyframe_interval > 1 이면 키프레임에서만 GFPGAN 을 실행하고, 사이 프레임에는 직전 키프레임의
+  향상 잔차(향상 결과 - 정렬 crop)를 더해 전파
+- 프로세스 풀: CPU 에서는 프레임을 연속 구간으로 나눠 workers 개 프로세스(각자 모델 로드)에서 처리
+
+으로 처리하고, 프레임당 향상 시간을 메트릭의 enhance 항목으로 기록합니다.
+핸들러가 예약한 CPU 슬롯(TALKING_HEAD_CPUS / TALKING_HEAD_NUM_THREADS)에 맞춰 워커 / 스레드 수를 정하고,
+런처와 같은 환경 변수로 체크포인트 mmap 과 ONNX 백엔드(gfpgan 컴포넌트)를 적용합니다.
+
+사용법 (SadTalker 리포지토리에서 실행 - gfpgan/weights 의 체크포인트 사용):
+    python -m talking_head.enhance run input.mp4 output.mp4 --batch-size 8 --workers 4 --keyframe-interval 1
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from talking_head import launcher
+from talking_head.cpu_scheduler import CPUS_ENV, NUM_THREADS_ENV, parse_cpu_list
+from talking_head.launcher import BACKEND_ENV, MMAP_CHECKPOINTS_ENV, MODEL_DIRS
+from talking_head.metrics import METRICS_PATH_ENV, read_metrics, report
+from talking_head.rusage import run_with_rusage
+
+logger = logging.getLogger(__name__)
+
+# SadTalker src/utils/face_enhancer.py 와 같은 모델 / 업스케일
+GFPGAN_MODEL = "GFPGANv1.4"
+GFPGAN_URL = "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.0/GFPGANv1.4.pth"
+UPSCALE = 2
+FIDELITY_WEIGHT = 0.5
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_KEYFRAME_INTERVAL = 1
+# 얼굴 영역: 검출 박스 크기 대비 양쪽 여유 비율 / 영역 검출에 쓰는 프레임 수
+REGION_MARGIN = 0.5
+REGION_SAMPLES = 5
+MAX_CPU_WORKERS = 4
+
+_restorer = None
+_onnx_components = []
+
+
+def model_path():
+    """업스트림과 같은 순서로 GFPGAN 체크포인트 탐색 (없으면 URL → GFPGANer 가 다운로드)"""
+    for directory in ("gfpgan/weights", "checkpoints"):
+        path = os.path.join(directory, f"{GFPGAN_MODEL}.pth")
+        if os.path.isfile(path):
+            return path
+    return GFPGAN_URL
+
+
+def _install_patches():
+    """런처 / 상주 워커와 같이 환경 변수로 고른 체크포인트 mmap / ONNX 백엔드 패치 설치 (GFPGANer 생성 전)"""
+    if os.environ.get(MMAP_CHECKPOINTS_ENV, "1") != "0":
+        # 빌드 시 변환된 gfpgan/weights/*.pth safetensors 를 mmap 으로 로드
+        from talking_head import checkpoints
+        checkpoints.install()
+
+    backend = os.environ.get(BACKEND_ENV, "pytorch")
+    if backend in ("onnx", "int8"):
+        from talking_head import onnx_backend
+        _onnx_components.extend(onnx_backend.install("sadtalker", precision="int8" if backend == "int8" else "fp32",
+                                                     names=("gfpgan",)))
+
+
+def _get_restorer():
+    global _restorer
+    if _restorer is None:
+        from gfpgan import GFPGANer
+
+        # 프로세스 풀 워커는 spawn 으로 시작하므로 프로세스마다 설치
+        _install_patches()
+
+        _restorer = GFPGANer(model_path=model_path(), upscale=UPSCALE, arch="clean",
+                             channel_multiplier=2, bg_upsampler=None)
+    return _restorer
+
+
+def read_frames(path, start=0, end=None):
+    """영상의 [start, end) 프레임 (BGR) 과 fps"""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    frames, index = [], 0
+    while end is None or index < end:
+        if index < start:
+            ok = capture.grab()
+        else:
+            ok, frame = capture.read()
+            if ok:
+                frames.append(frame)
+        if not ok:
+            break
+        index += 1
+    capture.release()
+    return frames, fps
+
+
+def frame_count(path):
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return count
+
+
+def face_region(helper, frames, samples=REGION_SAMPLES, margin=REGION_MARGIN):
+    """샘플 프레임에서 검출한 얼굴 박스의 합집합 + 여유 (x0, y0, x1, y1), 얼굴이 없으면 None"""
+    import numpy as np
+
+    boxes = []
+    for index in np.linspace(0, len(frames) - 1, min(samples, len(frames))).astype(int):
+        helper.clean_all()
+        helper.read_image(frames[index])
+        helper.get_face_landmarks_5(only_center_face=False, eye_dist_threshold=5)
+        boxes.extend(face[:4] for face in helper.det_faces)
+    if not boxes:
+        return None
+    boxes = np.array(boxes)
+    x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+    x1, y1 = boxes[:, 2].max(), boxes[:, 3].max()
+    pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+    height, width = frames[0].shape[:2]
+    return (int(max(0, x0 - pad_x)), int(max(0, y0 - pad_y)),
+            int(min(width, x1 + pad_x)), int(min(height, y1 + pad_y)))
+
+
+def _restore_faces(restorer, faces, batch_size):
+    """정렬된 얼굴 crop 목록을 batch_size 개씩 GFPGAN 에 통과"""
+    import torch
+    from basicsr.utils import img2tensor, tensor2img
+    from torchvision.transforms.functional import normalize
+
+    restored = []
+    for start in range(0, len(faces), batch_size):
+        batch = []
+        for face in faces[start:start + batch_size]:
+            tensor = img2tensor(face / 255., bgr2rgb=True, float32=True)
+            normalize(tensor, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+            batch.append(tensor)
+        with torch.no_grad():
+            output = restorer.gfpgan(torch.stack(batch).to(restorer.device), return_rgb=False,
+                                     weight=FIDELITY_WEIGHT)[0]
+        restored.extend(tensor2img(image, rgb2bgr=True, min_max=(-1, 1)).astype("uint8") for image in output)
+    return restored
+
+
+def _enhance_chunk(task):
+    """
+    프로세스 풀 작업: [start, end) 프레임을 향상해 frame_dir/%06d.png 로 저장하고 시간 통계 반환
+
+    프레임을 batch_size × keyframe_interval 개씩 묶어 (1) 영역 안 얼굴 정렬 (2) 키프레임 얼굴 배치 GFPGAN
+    (3) 잔차 전파 / 붙여넣기 순서로 처리합니다.
+    """
+    video_path, start, end, frame_dir, batch_size, keyframe_interval, threads = task
+    import cv2
+    import numpy as np
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    timings = {"load_time": 0.0, "align_time": 0.0, "network_time": 0.0, "paste_time": 0.0, "io_time": 0.0}
+    clock = time.time()
+    restorer = _get_restorer()
+    helper = restorer.face_helper
+    timings["load_time"] = time.time() - clock
+
+    clock = time.time()
+    frames, _ = read_frames(video_path, start, end)
+    timings["io_time"] += time.time() - clock
+
+    clock = time.time()
+    region = face_region(helper, frames) if frames else None
+    timings["align_time"] += time.time() - clock
+
+    keyframes = faces = 0
+    group_size = batch_size * keyframe_interval
+    for group_start in range(0, len(frames), group_size):
+        group = range(group_start, min(group_start + group_size, len(frames)))
+
+        # (1) 얼굴 영역 crop 에서 검출 / 정렬
+        clock = time.time()
+        aligned = {}
+        for index in group:
+            if region is None:
+                continue
+            x0, y0, x1, y1 = region
+            crop = frames[index][y0:y1, x0:x1]
+            helper.clean_all()
+            helper.read_image(crop)
+            helper.get_face_landmarks_5(only_center_face=False, eye_dist_threshold=5)
+            helper.align_warp_face()
+            aligned[index] = (crop, list(helper.affine_matrices), list(helper.cropped_faces))
+        timings["align_time"] += time.time() - clock
+
+        # (2) 키프레임 (구간 첫 프레임 기준 keyframe_interval 간격 + 청크 마지막 프레임, 직전 키프레임과 얼굴 수가
+        #     다르면 그 프레임도 키프레임) 의 얼굴만 배치로 GFPGAN
+        keys, last_key = [], None
+        for index in group:
+            if index not in aligned:
+                continue
+            is_key = (index % keyframe_interval == 0 or index == len(frames) - 1 or last_key is None
+                      or len(aligned[index][2]) != len(aligned[last_key][2]))
+            if is_key:
+                keys.append(index)
+                last_key = index
+        clock = time.time()
+        key_faces = [face for index in keys for face in aligned[index][2]]
+        restored_flat = _restore_faces(restorer, key_faces, batch_size) if key_faces else []
+        timings["network_time"] += time.time() - clock
+        keyframes += len(keys)
+
+        restored, offset = {}, 0
+        for index in keys:
+            count = len(aligned[index][2])
+            restored[index] = restored_flat[offset:offset + count]
+            offset += count
+
+        # (3) 잔차 전파 + 붙여넣기 + 2배 업스케일
+        clock = time.time()
+        last_key = None
+        for index in group:
+            frame = frames[index]
+            height, width = frame.shape[:2]
+            output = cv2.resize(frame, (width * UPSCALE, height * UPSCALE), interpolation=cv2.INTER_LANCZOS4)
+            if index in aligned and aligned[index][2]:
+                crop, affine_matrices, cropped_faces = aligned[index]
+                if index in restored:
+                    last_key = index
+                    restored_faces = restored[index]
+                else:
+                    key_crops, key_restored = aligned[last_key][2], restored[last_key]
+                    restored_faces = [
+                        np.clip(face.astype(np.int16) + key_out.astype(np.int16) - key_in.astype(np.int16),
+                                0, 255).astype(np.uint8)
+                        for face, key_in, key_out in zip(cropped_faces, key_crops, key_restored)
+                    ]
+                faces += len(restored_faces)
+                helper.clean_all()
+                helper.read_image(crop)
+                helper.affine_matrices = affine_matrices
+                helper.cropped_faces = cropped_faces
+                for face in restored_faces:
+                    helper.add_restored_face(face)
+                helper.get_inverse_affine(None)
+                pasted = helper.paste_faces_to_input_image(upsample_img=None)
+                x0, y0, x1, y1 = region
+                output[y0 * UPSCALE:y1 * UPSCALE, x0 * UPSCALE:x1 * UPSCALE] = pasted[:(y1 - y0) * UPSCALE,
+                                                                                    :(x1 - x0) * UPSCALE]
+            timings["paste_time"] += time.time() - clock
+            clock = time.time()
+            cv2.imwrite(os.path.join(frame_dir, f"{start + index:06d}.png"), output,
+                        [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            timings["io_time"] += time.time() - clock
+            clock = time.time()
+
+    return dict(timings, frames=len(frames), keyframes=keyframes, faces=faces,
+                onnx_calls=sum(component.calls for component in _onnx_components),
+                onnx_fallbacks=sum(component.fallbacks for component in _onnx_components),
+                region=list(region) if region else None, frame_size=list(frames[0].shape[:2][::-1]) if frames else None)
+
+
+def slot_cpus():
+    """스케줄러가 할당한 CPU 슬롯의 코어 수 (TALKING_HEAD_CPUS, 없으면 현재 affinity)"""
+    if os.environ.get(CPUS_ENV):
+        return len(parse_cpu_list(os.environ[CPUS_ENV]))
+    return len(os.sched_getaffinity(0))
+
+
+def slot_threads():
+    """CPU 슬롯의 torch 스레드 수 (TALKING_HEAD_NUM_THREADS, 없으면 슬롯 코어 수)"""
+    if os.environ.get(NUM_THREADS_ENV):
+        return int(os.environ[NUM_THREADS_ENV])
+    return slot_cpus()
+
+
+def default_workers():
+    """GPU 는 1 (배치로 충분), CPU 는 할당된 슬롯의 코어를 나눠 최대 MAX_CPU_WORKERS 개 프로세스"""
+    import torch
+
+    if torch.cuda.is_available():
+        return 1
+    return max(1, min(MAX_CPU_WORKERS, slot_cpus() // 2))
+
+
+def encode_video(frame_dir, fps, audio_source, output_path):
+    """향상된 프레임 PNG 시퀀스 + 원본 오디오 → mp4"""
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-framerate", f"{fps:g}", "-i", os.path.join(frame_dir, "%06d.png"),
+         "-i", audio_source, "-map", "0:v", "-map", "1:a?", "-c:v", "libx264", "-pix_fmt", "yuv420p",
+         "-c:a", "copy", "-shortest", output_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg encode failed: {result.stderr}")
+
+
+def enhance_video(input_path, output_path, batch_size=DEFAULT_BATCH_SIZE, workers=None,
+                  keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    """
+    영상 전체 얼굴 향상 (업스트림 enhancer_generator_with_len + 영상 저장 대체)
+
+    Returns:
+        통계 딕셔너리 (메트릭의 enhance 항목에도 기록)
+    """
+    start_time = time.time()
+    workers = workers or default_workers()
+    keyframe_interval = max(1, int(keyframe_interval))
+    total = frame_count(input_path)
+    _, fps = read_frames(input_path, 0, 0)
+
+    # 청크 경계가 키프레임 간격에 맞도록 나눔 (마지막 청크는 끝까지 읽음 - 프레임 수 메타데이터 오차 대비)
+    workers = max(1, min(workers, total // max(batch_size, 1) or 1))
+    step = -(-max(total, 1) // workers)
+    step = -(-step // keyframe_interval) * keyframe_interval
+    bounds = [(start, start + step) for start in range(0, max(total, 1), step)]
+    bounds[-1] = (bounds[-1][0], None)
+    # 슬롯의 스레드 수를 워커끼리 나눔 (한 프로세스면 _apply_cpu_slot 이 설정한 값 그대로)
+    threads = max(1, slot_threads() // len(bounds)) if len(bounds) > 1 else None
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as frame_dir:
+        tasks = [(input_path, start, end, frame_dir, batch_size, keyframe_interval, threads) for start, end in bounds]
+        if len(tasks) == 1:
+            results = [_enhance_chunk(tasks[0])]
+        else:
+            # 각 프로세스가 GFPGAN / 얼굴 검출 모델을 따로 로드 (fork 후 torch 스레드 풀 문제를 피하려고 spawn)
+            with ProcessPoolExecutor(max_workers=len(tasks), mp_context=get_context("spawn")) as pool:
+                results = list(pool.map(_enhance_chunk, tasks))
+
+        encode_start = time.time()
+        encode_video(frame_dir, fps, input_path, output_path)
+        encode_time = time.time() - encode_start
+
+    frames = sum(result["frames"] for result in results)
+    wall_time = time.time() - start_time
+    timing_keys = ("load_time", "align_time", "network_time", "paste_time", "io_time")
+    stats = {
+        "frames": frames,
+        "keyframes": sum(result["keyframes"] for result in results),
+        "faces": sum(result["faces"] for result in results),
+        "batch_size": batch_size,
+        "workers": len(tasks),
+        "keyframe_interval": keyframe_interval,
+        "threads": threads,
+        "backend": os.environ.get(BACKEND_ENV, "pytorch"),
+        "onnx_calls": sum(result["onnx_calls"] for result in results),
+        "onnx_fallbacks": sum(result["onnx_fallbacks"] for result in results),
+        # 워커별 합계 (병렬 실행이므로 wall_time 보다 클 수 있음)
+        **{key: round(sum(result[key] for result in results), 3) for key in timing_keys},
+        "encode_time": round(encode_time, 3),
+        "wall_time": round(wall_time, 3),
+        "per_frame_time": round(wall_time / frames, 4) if frames else None,
+        "per_frame_network_time": (round(sum(result["network_time"] for result in results) / frames, 4)
+                                   if frames else None),
+        "regions": [result["region"] for result in results],
+        "frame_size": results[0]["frame_size"] if results else None,
+    }
+    report("enhance", **stats)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# 핸들러용
+# ---------------------------------------------------------------------------
+
+def enhance_command(input_path, output_path, options):
+    """options 의 enhance_* 설정으로 향상 단계 명령어 구성"""
+    cmd = ["python", "-m", "talking_head.enhance", "run", input_path, output_path,
+           "--batch-size", str(int(options.get("enhance_batch_size", DEFAULT_BATCH_SIZE))),
+           "--keyframe-interval", str(int(options.get("enhance_keyframe_interval", DEFAULT_KEYFRAME_INTERVAL)))]
+    if options.get("enhance_workers"):
+        cmd.extend(["--workers", str(int(options["enhance_workers"]))])
+    return cmd
+
+
+def enhance_metrics_path(output_path):
+    """향상 단계 메트릭 파일 경로 (출력 영상 옆)"""
+    return f"{output_path}.metrics.json"
+
+
+def run_enhancement(input_path, output_path, options, env, timeout=1200):
+    """
+    핸들러용: 향상 단계를 서브프로세스로 실행 (SadTalker 리포지토리에서, 주어진 CPU 슬롯 환경으로)
+
+    Returns:
+        향상 통계 (resource_usage 포함)
+    """
+    metrics_path = enhance_metrics_path(output_path)
+    env = dict(env)
+    env[METRICS_PATH_ENV] = metrics_path
+    result = run_with_rusage(enhance_command(input_path, output_path, options), cwd=MODEL_DIRS["sadtalker"],
+                             env=env, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"Face enhancement failed: {result.stderr}")
+    if not os.path.exists(output_path):
+        raise RuntimeError("Face enhancement produced no output video")
+    stats = read_metrics(metrics_path).get("enhance", {})
+    stats["resource_usage"] = result.rusage
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched, region-limited GFPGAN face enhancement")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="영상 얼굴 향상 (2배 업스케일)")
+    run_parser.add_argument("input")
+    run_parser.add_argument("output")
+    run_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    run_parser.add_argument("--workers", type=int, help="프로세스 수 (기본: GPU 1, CPU 슬롯 코어 수 / 2, 최대 4)")
+    run_parser.add_argument("--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL,
+                            help="N 프레임마다 GFPGAN 실행, 사이 프레임은 잔차 전파")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # 핸들러가 예약한 CPU 슬롯에 고정 (spawn 워커도 affinity 를 물려받음)
+    launcher._apply_cpu_slot()
+
+    stats = enhance_video(args.input, args.output, batch_size=args.batch_size, workers=args.workers,
+                          keyframe_interval=args.keyframe_interval)
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Wav2Lip 얼굴 검출 백엔드 선택 (options.face_detector)
+
+Wav2Lip inference.py 의 face_detect 는 face_detection.FaceAlignment(...).get_detections_for_batch 로 s3fd 를 실행합니다.
+런처가 FaceAlignment 를 이 모듈의 어댑터로 교체하면 잡마다 TALKING_HEAD_FACE_DETECTOR 로 백엔드를 고를 수 있습니다.
+
+- s3fd: 업스트림 그대로 (기본, 가장 정확하지만 CPU 에서 무거움)
+- yunet: OpenCV FaceDetectorYN (ONNX, 수백 KB) - CPU 용 경량 검출기
+- haar: OpenCV Haar cascade (opencv-python 에 포함, 추가 파일 없음)
+- hog: face_recognition (dlib HOG)
+
+검출기마다 박스를 잡는 범위가 달라 (이마 / 턱 포함 여부) s3fd 박스 기준으로 맞추는 보정값을
+벤치마크가 계산해 calibration.json 으로 저장하고, 런타임에 있으면 적용합니다.
+
+사용법 (Wav2Lip 리포지토리에서 실행, 라벨 JSON 은 선택 - {파일명: [[x1, y1, x2, y2], ...]}):
+    python -m talking_head.face_detectors bench --images faces/ --labels labels.json \
+        --calibration-output /workspace/face_detectors/calibration.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from talking_head.metrics import METRICS_PATH_ENV, report
+
+logger = logging.getLogger(__name__)
+
+FACE_DETECTOR_ENV = "TALKING_HEAD_FACE_DETECTOR"
+DETECTOR_DIR = os.environ.get("TALKING_HEAD_FACE_DETECTOR_DIR", "/workspace/face_detectors")
+CALIBRATION_FILE = "calibration.json"
+DETECTORS = ("s3fd", "yunet", "haar", "hog")
+DEFAULT_DETECTOR = "s3fd"
+
+# OpenCV 4.8 부터 YuNet 출력 형식이 바뀌어 버전에 맞는 모델 사용
+YUNET_MODELS = {"legacy": "face_detection_yunet_2022mar.onnx", "current": "face_detection_yunet_2023mar.onnx"}
+YUNET_SCORE_THRESHOLD = 0.6
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FaceDetector:
+    """BGR 이미지 → 얼굴 박스 목록 [(x1, y1, x2, y2, score), ...] (점수 높은 / 큰 순)"""
+
+    name = None
+
+    def detect(self, image):
+        raise NotImplementedError
+
+    def detect_batch(self, images):
+        """Wav2Lip get_detections_for_batch 형식: 이미지마다 가장 유력한 박스 (x1, y1, x2, y2) 또는 None"""
+        results = []
+        for image in images:
+            faces = self.detect(image)
+            results.append(tuple(int(v) for v in faces[0][:4]) if faces else None)
+        return results
+
+
+class S3FDDetector(FaceDetector):
+    """업스트림 s3fd (face_detection.FaceAlignment)"""
+
+    name = "s3fd"
+
+    def __init__(self, device="cpu", alignment_cls=None):
+        import face_detection
+
+        alignment_cls = alignment_cls or _original_alignment or face_detection.FaceAlignment
+        self.alignment = alignment_cls(face_detection.LandmarksType._2D, flip_input=False, device=device)
+
+    def detect(self, image):
+        import numpy as np
+
+        box = self.alignment.get_detections_for_batch(np.array([image]))[0]
+        return [tuple(box) + (1.0,)] if box is not None else []
+
+    def detect_batch(self, images):
+        import numpy as np
+
+        return self.alignment.get_detections_for_batch(np.array(images))
+
+
+class YuNetDetector(FaceDetector):
+    name = "yunet"
+
+    def __init__(self, device="cpu"):
+        import cv2
+
+        major, minor = (int(part) for part in cv2.__version__.split(".")[:2])
+        model = YUNET_MODELS["current" if (major, minor) >= (4, 8) else "legacy"]
+        self.detector = cv2.FaceDetectorYN.create(os.path.join(DETECTOR_DIR, model), "", (320, 320),
+                                                  score_threshold=YUNET_SCORE_THRESHOLD)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(image)
+        if faces is None:
+            return []
+        boxes = [(max(0, x), max(0, y), min(width, x + w), min(height, y + h), face[-1])
+                 for face in faces for x, y, w, h in [face[:4]]]
+        return sorted(boxes, key=lambda box: -box[4])
+
+
+class HaarDetector(FaceDetector):
+    name = "haar"
+
+    def __init__(self, device="cpu"):
+        import cv2
+
+        self.cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+
+    def detect(self, image):
+        import cv2
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        min_side = max(24, min(gray.shape) // 10)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side))
+        # 점수가 없으므로 큰 박스를 우선
+        boxes = [(x, y, x + w, y + h, float(w * h)) for x, y, w, h in faces]
+        return sorted(boxes, key=lambda box: -box[4])
+
+
+class HogDetector(FaceDetector):
+    name = "hog"
+
+    def __init__(self, device="cpu"):
+        import face_recognition
+
+        self.face_recognition = face_recognition
+
+    def detect(self, image):
+        rgb = image[:, :, ::-1].copy()
+        locations = self.face_recognition.face_locations(rgb, number_of_times_to_upsample=1, model="hog")
+        boxes = [(left, top, right, bottom, float((right - left) * (bottom - top)))
+                 for top, right, bottom, left in locations]
+        return sorted(boxes, key=lambda box: -box[4])
+
+
+BACKENDS = {cls.name: cls for cls in (S3FDDetector, YuNetDetector, HaarDetector, HogDetector)}
+
+
+def create(name, device="cpu"):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown face detector '{name}' (expected one of {', '.join(DETECTORS)})")
+    return BACKENDS[name](device=device)
+
+
+def load_calibration(path=None):
+    """검출기별 s3fd 기준 박스 보정값 {name: [dx1, dy1, dx2, dy2]} (박스 폭 / 높이 대비 비율)"""
+    path = path or os.path.join(DETECTOR_DIR, CALIBRATION_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def calibrate_box(box, offsets):
+    """검출 박스를 s3fd 박스 범위에 맞춤"""
+    if box is None or not offsets:
+        return box
+    x1, y1, x2, y2 = box[:4]
+    width, height = x2 - x1, y2 - y1
+    dx1, dy1, dx2, dy2 = offsets
+    return (int(round(x1 - dx1 * width)), int(round(y1 - dy1 * height)),
+            int(round(x2 - dx2 * width)), int(round(y2 - dy2 * height)))
+
+
+# ---------------------------------------------------------------------------
+# 런처: face_detection.FaceAlignment 교체
+# ---------------------------------------------------------------------------
+
+_original_alignment = None
+
+
+class DetectorAlignment:
+    """
+    face_detection.FaceAlignment 대체 어댑터
+
+    상주 워커는 FaceAlignment 인스턴스를 잡 사이에 재사용하므로 백엔드는 호출할 때마다 환경 변수로 고르고,
+    백엔드 인스턴스는 이름별로 유지합니다. 통계는 메트릭 파일(잡)이 바뀌면 초기화합니다.
+    """
+
+    def __init__(self, landmarks_type=None, flip_input=False, device="cuda", **kwargs):
+        self.device = device
+        self._detectors = {}
+        self._calibration = load_calibration()
+        self._job = None
+        self._stats = None
+
+    def _detector(self, name):
+        if name not in self._detectors:
+            self._detectors[name] = create(name, self.device)
+        return self._detectors[name]
+
+    def get_detections_for_batch(self, images):
+        name = os.environ.get(FACE_DETECTOR_ENV, DEFAULT_DETECTOR)
+        start = time.time()
+        results = self._detector(name).detect_batch(images)
+        offsets = self._calibration.get(name) if name != DEFAULT_DETECTOR else None
+        results = [calibrate_box(box, offsets) for box in results]
+        if offsets:
+            height, width = images[0].shape[:2]
+            results = [None if box is None else (max(0, box[0]), max(0, box[1]), min(width, box[2]),
+                                                 min(height, box[3])) for box in results]
+
+        elapsed = time.time() - start
+        if self._stats is None or self._job != os.environ.get(METRICS_PATH_ENV):
+            self._job = os.environ.get(METRICS_PATH_ENV)
+            self._stats = {"images": 0, "time": 0.0, "missed": 0}
+        self._stats["images"] += len(images)
+        self._stats["time"] += elapsed
+        self._stats["missed"] += sum(box is None for box in results)
+        report("face_detection", detector=name, calibrated=bool(offsets), images=self._stats["images"],
+               missed=self._stats["missed"], time=round(self._stats["time"], 3),
+               per_image_time=round(self._stats["time"] / self._stats["images"], 4))
+        return results
+
+
+def install():
+    """런처용: face_detection.FaceAlignment 를 DetectorAlignment 로 교체"""
+    global _original_alignment
+    try:
+        import face_detection
+    except ImportError as e:
+        logger.warning(f"Face detector selection unavailable: {e}")
+        return False
+    if _original_alignment is None:
+        _original_alignment = face_detection.FaceAlignment
+        face_detection.FaceAlignment = DetectorAlignment
+    return True
+
+
+# ---------------------------------------------------------------------------
+# 벤치마크
+# ---------------------------------------------------------------------------
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _image_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(os.path.join(item, name) for name in sorted(os.listdir(item))
+                         if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return paths
+
+
+def _mean(values):
+    return round(sum(values) / len(values), 4) if values else None
+
+
+def benchmark(image_paths, detectors=DETECTORS, labels=None, repeats=3, device="cpu"):
+    """
+    검출기별 속도 / s3fd 대비 박스 IoU / (라벨이 있으면) 라벨 대비 IoU
+
+    Returns:
+        (결과 딕셔너리, 검출기별 보정값)
+    """
+    import cv2
+
+    labels = labels or {}
+    images = [(os.path.basename(path), cv2.imread(path)) for path in image_paths]
+    images = [(name, image) for name, image in images if image is not None]
+    if not images:
+        raise ValueError("No readable images for the face detector benchmark")
+
+    boxes, results = {}, {}
+    # s3fd 가 기준이므로 먼저 실행
+    for name in ["s3fd"] + [d for d in detectors if d != "s3fd"]:
+        try:
+            load_start = time.time()
+            detector = create(name, device)
+            load_time = time.time() - load_start
+        except Exception as e:
+            logger.warning(f"Skipping {name}: {e}")
+            results[name] = {"error": str(e)}
+            continue
+        detector.detect(images[0][1])  # 워밍업
+
+        timings, boxes[name] = [], {}
+        for image_name, image in images:
+            start = time.time()
+            for _ in range(repeats):
+                faces = detector.detect(image)
+            timings.append((time.time() - start) / repeats)
+            boxes[name][image_name] = tuple(faces[0][:4]) if faces else None
+        results[name] = {
+            "load_time": round(load_time, 3),
+            "mean_ms": round(1000 * sum(timings) / len(timings), 2),
+            "max_ms": round(1000 * max(timings), 2),
+            "detection_rate": _mean([boxes[name][n] is not None for n, _ in images]),
+        }
+
+    calibration = {}
+    reference = boxes.get("s3fd", {})
+    for name, found in boxes.items():
+        pairs = [(found[n], reference[n]) for n in found if found[n] is not None and reference.get(n) is not None]
+        results[name]["iou_vs_s3fd"] = _mean([box_iou(a, b) for a, b in pairs])
+        if name != "s3fd" and pairs:
+            # s3fd 박스로 옮기는 평균 변위 (박스 크기 대비)
+            offsets = [[(a[0] - b[0]) / (a[2] - a[0]), (a[1] - b[1]) / (a[3] - a[1]),
+                        (a[2] - b[2]) / (a[2] - a[0]), (a[3] - b[3]) / (a[3] - a[1])] for a, b in pairs]
+            calibration[name] = [round(sum(column) / len(column), 4) for column in zip(*offsets)]
+            results[name]["iou_vs_s3fd_calibrated"] = _mean(
+                [box_iou(calibrate_box(a, calibration[name]), b) for a, b in pairs])
+        if labels:
+            ious = []
+            for image_name, box in found.items():
+                if image_name in labels:
+                    truth = labels[image_name]
+                    ious.append(max((box_iou(box, t) for t in truth), default=0.0) if box else 0.0)
+            results[name]["iou_vs_labels"] = _mean(ious)
+
+    speedup_base = results.get("s3fd", {}).get("mean_ms")
+    for name, result in results.items():
+        if speedup_base and result.get("mean_ms"):
+            result["speedup_vs_s3fd"] = round(speedup_base / result["mean_ms"], 2)
+    return {"images": len(images), "repeats": repeats, "detectors": results}, calibration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector backends for Wav2Lip")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench_parser = subparsers.add_parser("bench", help="검출기별 속도 / s3fd 대비 IoU 비교")
+    bench_parser.add_argument("--images", nargs="+", required=True, help="이미지 파일 또는 디렉토리")
+    bench_parser.add_argument("--labels", help="라벨 JSON ({파일명: [[x1, y1, x2, y2], ...]})")
+    bench_parser.add_argument("--detectors", nargs="+", choices=DETECTORS, default=list(DETECTORS))
+    bench_parser.add_argument("--repeats", type=int, default=3)
+    bench_parser.add_argument("--device", default="cpu")
+    bench_parser.add_argument("--calibration-output", help="s3fd 기준 박스 보정값 저장 경로 (런타임에 적용)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # s3fd (face_detection 패키지) 는 Wav2Lip 리포지토리에 있음
+    from talking_head.launcher import MODEL_DIRS
+    sys.path.insert(0, MODEL_DIRS["wav2lip"])
+
+    labels = None
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    results, calibration = benchmark(_image_paths(args.images), args.detectors, labels, args.repeats, args.device)
+    if args.calibration_output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.calibration_output)), exist_ok=True)
+        with open(args.calibration_output, "w", encoding="utf-8") as f:
+            json.dump(calibration, f, indent=2)
+    results["calibration"] = calibration
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
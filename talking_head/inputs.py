@@ -0,0 +1,151 @@
+"""
+잡 입력 파일 준비 (URL 다운로드 / 인라인 base64)
+
+핸들러는 입력 이미지 / 오디오를 두 가지 방식으로 받습니다.
+
+- input_image_url / input_audio_url: 워커가 HTTP 로 다운로드 (기존 방식)
+- input_image_base64 / input_audio_base64: 요청 본문에 담긴 base64 또는 data URI
+  ("data:audio/wav;base64,...") — 클라이언트가 이미 가진 짧은 클립은 호스팅 / 다운로드 왕복 없이 전달
+
+인라인 입력은 전체를 한 번에 디코딩하지 않고 청크 단위로 작업 디렉토리 파일에 바로 쓰며,
+디코딩된 크기가 한도(TALKING_HEAD_MAX_INLINE_IMAGE_MB / TALKING_HEAD_MAX_INLINE_AUDIO_MB)를 넘으면
+쓰기 전에 거부합니다. input_*_url 에 data URI 를 넣어도 같은 방식으로 처리합니다.
+"""
+
+import base64
+import binascii
+import logging
+import mimetypes
+import os
+
+logger = logging.getLogger(__name__)
+
+# 디코딩 후 최대 크기 (MB), RunPod 요청 본문 한도(/run 10MB, /runsync 20MB)보다 크게 둘 필요는 없음
+MAX_INLINE_MB_ENV = {
+    "image": "TALKING_HEAD_MAX_INLINE_IMAGE_MB",
+    "audio": "TALKING_HEAD_MAX_INLINE_AUDIO_MB",
+}
+DEFAULT_MAX_INLINE_MB = {"image": 10, "audio": 20}
+
+# 한 번에 디코딩할 base64 문자 수 (4 의 배수)
+CHUNK_CHARS = 64 * 1024
+
+DATA_URI_PREFIX = "data:"
+
+
+class InputTooLarge(ValueError):
+    """인라인 입력이 크기 한도를 넘음"""
+
+
+def max_inline_bytes(kind):
+    """입력 종류별 디코딩 후 최대 바이트 수"""
+    megabytes = float(os.environ.get(MAX_INLINE_MB_ENV[kind], DEFAULT_MAX_INLINE_MB[kind]))
+    return int(megabytes * 1024 * 1024)
+
+
+def split_data_uri(value):
+    """
+    data URI → (미디어 타입, base64 본문)
+
+    data URI 가 아닌 문자열은 그대로 base64 본문으로 봅니다 (미디어 타입 None).
+    """
+    if not value.startswith(DATA_URI_PREFIX):
+        return None, value
+    header, sep, data = value.partition(",")
+    if not sep or not header.endswith(";base64"):
+        raise ValueError("Only base64 data URIs are supported")
+    return header[len(DATA_URI_PREFIX):-len(";base64")] or None, data
+
+
+def decode_to_file(encoded, destination, max_bytes):
+    """
+    base64 문자열을 청크 단위로 디코딩해 파일에 기록
+
+    공백 / 줄바꿈은 무시하고, 디코딩된 크기가 max_bytes 를 넘으면 InputTooLarge 를 발생시키고 파일을 지웁니다.
+
+    Returns:
+        기록한 바이트 수
+    """
+    # 패딩을 빼고도 한도를 넘는 길이면 디코딩 없이 바로 거부
+    if (len(encoded) - sum(encoded.count(c) for c in " \t\r\n")) // 4 * 3 > max_bytes + 3:
+        raise InputTooLarge(f"Inline input exceeds {max_bytes} bytes")
+
+    written = 0
+    pending = ""
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    try:
+        with open(destination, "wb") as f:
+            for start in range(0, len(encoded), CHUNK_CHARS):
+                pending += "".join(encoded[start:start + CHUNK_CHARS].split())
+                usable = len(pending) - len(pending) % 4
+                if not usable:
+                    continue
+                data = base64.b64decode(pending[:usable], validate=True)
+                pending = pending[usable:]
+                written += len(data)
+                if written > max_bytes:
+                    raise InputTooLarge(f"Inline input exceeds {max_bytes} bytes")
+                f.write(data)
+        if pending:
+            raise ValueError("Invalid base64 input: length is not a multiple of 4")
+    except binascii.Error as e:
+        os.remove(destination)
+        raise ValueError(f"Invalid base64 input: {e}")
+    except ValueError:
+        os.remove(destination)
+        raise
+    return written
+
+
+def has_input(input_data, kind):
+    """input_<kind>_url 또는 input_<kind>_base64 가 있는지"""
+    return bool(input_data.get(f"input_{kind}_base64") or input_data.get(f"input_{kind}_url"))
+
+
+def describe_input(input_data, kind):
+    """로그 / 응답용 입력 설명 (URL 또는 인라인 크기)"""
+    inline = input_data.get(f"input_{kind}_base64")
+    url = input_data.get(f"input_{kind}_url")
+    if inline or (url and url.startswith(DATA_URI_PREFIX)):
+        return f"inline ({len(inline or url)} base64 chars)"
+    return url
+
+
+def fetch_input(input_data, kind, destination, download):
+    """
+    잡 입력 파일을 destination 에 준비
+
+    Args:
+        input_data: event['input']
+        kind: 'image' 또는 'audio'
+        destination: 작업 디렉토리 안의 파일 경로
+        download: URL 입력에 사용할 다운로드 함수 (url, destination)
+
+    Returns:
+        destination
+    """
+    inline = input_data.get(f"input_{kind}_base64")
+    url = input_data.get(f"input_{kind}_url")
+    if not inline and url and url.startswith(DATA_URI_PREFIX):
+        inline = url
+
+    if inline:
+        media_type, encoded = split_data_uri(inline)
+        size = decode_to_file(encoded, destination, max_inline_bytes(kind))
+        logger.info(f"Decoded inline {kind} ({media_type or 'unknown type'}, {size} bytes) to {destination}")
+        return destination
+
+    if not url:
+        raise ValueError(f"input_{kind}_url or input_{kind}_base64 is required")
+    download(url, destination)
+    return destination
+
+
+def encode_file(path, media_type=None):
+    """
+    로컬 파일 → data URI (클라이언트에서 input_*_base64 로 보낼 때 사용)
+    """
+    if media_type is None:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        return f"{DATA_URI_PREFIX}{media_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
@@ -0,0 +1,220 @@
+"""
+내부 프레임레이트 감소 + 프레임 보간 (options.render_fps)
+
+생성 네트워크를 stride (= 25 / render_fps) 프레임마다 한 번만 실행하고, 사이 프레임은 앞뒤 키프레임으로 합성합니다.
+보간은 생성기 출력(얼굴 crop)에만 적용되고, 이후 업스트림 코드가 원래처럼 원본 프레임에 붙여 25fps 로 인코딩합니다.
+
+- blend: 선형 블렌딩 (가장 빠름)
+- flow: OpenCV DIS optical flow 로 두 키프레임을 중간 시점으로 warp 한 뒤 블렌딩 (입 모양이 크게 바뀔 때 잔상 감소)
+
+wav2lip: 생성기 배치(연속 프레임)에서 키프레임 행만 실행 - talking_head.silence 의 forward 래퍼에서 처리
+sadtalker: make_animation 의 구동 계수 시퀀스를 키프레임만 남겨 렌더링한 뒤 전체 프레임으로 보간
+"""
+
+import importlib
+import logging
+import os
+import time
+
+from talking_head.metrics import report
+
+logger = logging.getLogger(__name__)
+
+RENDER_FPS_ENV = "TALKING_HEAD_RENDER_FPS"
+INTERPOLATION_ENV = "TALKING_HEAD_INTERPOLATION"
+
+OUTPUT_FPS = 25
+METHODS = ("blend", "flow")
+
+# sadtalker 렌더링 루프 (animate.py 가 from ... import make_animation 으로 가져가므로 두 곳 모두 교체)
+MAKE_ANIMATION_TARGETS = (
+    "src.facerender.modules.make_animation.make_animation",
+    "src.facerender.animate.make_animation",
+)
+
+_active = None
+_installed = False
+
+
+def stride_for(render_fps):
+    """내부 프레임레이트 → 키프레임 간격 (1 이면 모든 프레임 렌더링)"""
+    render_fps = float(render_fps)
+    if render_fps <= 0:
+        raise ValueError(f"render_fps must be positive, got {render_fps}")
+    return max(1, round(OUTPUT_FPS / render_fps))
+
+
+def keyframe_positions(length, stride):
+    """길이 length 시퀀스의 키프레임 위치 (마지막 프레임은 항상 포함해 뒤쪽 외삽이 없도록)"""
+    if length <= 0:
+        return []
+    return sorted(set(range(0, length, stride)) | {length - 1})
+
+
+def env_settings():
+    """런처 / 상주 워커용: (stride, method), 비활성이면 None"""
+    if not os.environ.get(RENDER_FPS_ENV):
+        return None
+    stride = stride_for(os.environ[RENDER_FPS_ENV])
+    if stride == 1:
+        return None
+    return stride, os.environ.get(INTERPOLATION_ENV, "blend")
+
+
+def _flow_interpolate(first, second, t):
+    import cv2
+    import numpy as np
+    import torch
+
+    a = np.ascontiguousarray(first.detach().float().cpu().numpy().transpose(1, 2, 0))
+    b = np.ascontiguousarray(second.detach().float().cpu().numpy().transpose(1, 2, 0))
+    gray_a = (a.mean(axis=2) * 255).clip(0, 255).astype(np.uint8)
+    gray_b = (b.mean(axis=2) * 255).clip(0, 255).astype(np.uint8)
+    flow = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST).calc(gray_a, gray_b, None)
+
+    height, width = gray_a.shape
+    grid_x, grid_y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    # 중간 시점 픽셀 x 는 a 의 x - t·F, b 의 x + (1-t)·F 에서 온다고 근사 (F: a→b flow)
+    warped_a = cv2.remap(a, grid_x - t * flow[..., 0], grid_y - t * flow[..., 1],
+                         cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    warped_b = cv2.remap(b, grid_x + (1 - t) * flow[..., 0], grid_y + (1 - t) * flow[..., 1],
+                         cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    if warped_a.ndim == 2:
+        warped_a, warped_b = warped_a[..., None], warped_b[..., None]
+    blended = (1 - t) * warped_a + t * warped_b
+    return torch.from_numpy(blended.transpose(2, 0, 1).copy()).to(first.device, first.dtype)
+
+
+def interpolate(first, second, t, method="blend"):
+    """두 키프레임 (C, H, W) 사이 t (0~1) 시점의 프레임"""
+    if method == "flow":
+        return _flow_interpolate(first, second, t)
+    return first * (1 - t) + second * t
+
+
+def fill(frames, known, method="blend"):
+    """
+    frames (N, C, H, W) 에서 known 행(렌더링된 키프레임)을 제외한 행을 보간으로 채움
+
+    첫 / 마지막 키프레임 바깥 행은 가장 가까운 키프레임을 복사합니다.
+    """
+    known = sorted(known)
+    if not known:
+        return frames
+    for row in range(known[0]):
+        frames[row] = frames[known[0]]
+    for row in range(known[-1] + 1, frames.shape[0]):
+        frames[row] = frames[known[-1]]
+    for left, right in zip(known, known[1:]):
+        for row in range(left + 1, right):
+            frames[row] = interpolate(frames[left], frames[right], (row - left) / (right - left), method)
+    return frames
+
+
+def _select_time(value, index, frames):
+    """(B, T, ...) 텐서의 시간 축에서 index 프레임만 선택 (시간 축이 없는 인자는 그대로)"""
+    import torch
+
+    if isinstance(value, torch.Tensor) and value.dim() > 1 and value.shape[1] == frames:
+        return value.index_select(1, index.to(value.device))
+    return value
+
+
+def _wrap_make_animation(original):
+    def make_animation(source_image, source_semantics, target_semantics, *args, **kwargs):
+        import torch
+
+        if _active is None:
+            return original(source_image, source_semantics, target_semantics, *args, **kwargs)
+
+        stride, method, stats = _active
+        frames = target_semantics.shape[1]
+        keys = keyframe_positions(frames, stride)
+        index = torch.tensor(keys, device=target_semantics.device)
+
+        # 무음 생략이 함께 켜져 있으면 렌더러 호출 순번 → 프레임 번호 매핑에 사용
+        from talking_head import silence
+        silence.set_keyframes(keys)
+
+        start = time.time()
+        predictions = original(source_image, source_semantics, _select_time(target_semantics, index, frames),
+                               *[_select_time(arg, index, frames) for arg in args],
+                               **{k: _select_time(v, index, frames) for k, v in kwargs.items()})
+        stats["model_time"] += time.time() - start
+
+        start = time.time()
+        output = predictions.new_empty((predictions.shape[0], frames) + tuple(predictions.shape[2:]))
+        output[:, keys] = predictions
+        for row in range(output.shape[0]):
+            fill(output[row], keys, method)
+        stats["interpolation_time"] += time.time() - start
+        stats["frames"] += frames * output.shape[0]
+        stats["rendered_frames"] += len(keys) * output.shape[0]
+        return output
+
+    return make_animation
+
+
+def install(model):
+    """sadtalker 렌더링 루프를 키프레임 렌더링 + 보간 래퍼로 교체 (begin() 전에는 원래대로 동작)"""
+    global _installed
+    if model != "sadtalker" or _installed:
+        return _installed
+    wrapped = None
+    for target in MAKE_ANIMATION_TARGETS:
+        module_name, attr = target.rsplit(".", 1)
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning(f"Frame interpolation unavailable for {target}: {e}")
+            continue
+        if wrapped is None:
+            wrapped = _wrap_make_animation(getattr(module, attr))
+        setattr(module, attr, wrapped)
+    _installed = wrapped is not None
+    return _installed
+
+
+def begin_from_env(model, inference_args):
+    """
+    런처 / 상주 워커용: TALKING_HEAD_RENDER_FPS 가 25 미만이면 sadtalker 래퍼 활성화
+
+    wav2lip 은 생성기 배치 단위로 처리하므로 talking_head.silence.begin_from_env 가 같은 설정을 읽습니다.
+    """
+    global _active
+    settings = env_settings()
+    if settings is None or model != "sadtalker" or not install(model):
+        return False
+    stride, method = settings
+    _active = (stride, method, {"frames": 0, "rendered_frames": 0, "model_time": 0.0, "interpolation_time": 0.0})
+    return True
+
+
+def summarize(stride, method, frames, rendered, model_time, interpolation_time):
+    """보간 통계 (time_saved: 렌더링한 키프레임 평균 네트워크 시간 × 보간한 프레임 수로 추정)"""
+    interpolated = frames - rendered
+    per_frame = model_time / rendered if rendered else 0.0
+    return {
+        "render_fps": round(OUTPUT_FPS / stride, 2),
+        "stride": stride,
+        "method": method,
+        "frames": frames,
+        "rendered_frames": rendered,
+        "interpolated_frames": interpolated,
+        "interpolated_fraction": round(interpolated / frames, 4) if frames else 0.0,
+        "model_time": round(model_time, 3),
+        "interpolation_time": round(interpolation_time, 3),
+        "time_saved": round(per_frame * interpolated - interpolation_time, 3),
+    }
+
+
+def end():
+    """잡 종료: 보간 통계 기록"""
+    global _active
+    if _active is not None:
+        stride, method, stats = _active
+        summary = summarize(stride, method, stats["frames"], stats["rendered_frames"],
+                            stats["model_time"], stats["interpolation_time"])
+        report("interpolation", **summary)
+        logger.info(f"Frame interpolation: {summary}")
+        _active = None
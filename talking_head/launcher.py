@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+inference.py 실행 런처
+
+사용법:
+    python -m talking_head.launcher wav2lip --face face.png --audio audio.wav ...
+    python -m talking_head.launcher sadtalker --driven_audio audio.wav --source_image face.png ...
+    python -m talking_head.launcher serve wav2lip   # 상주 워커 (talking_head.residency)
+
+업스트림 inference.py 를 그대로 실행하되, 환경 변수로 요청된 패치
+(ONNX Runtime 백엔드 등)를 먼저 설치합니다. 패치가 없으면 원본 스크립트와 동일하게 동작합니다.
+"""
+
+import logging
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+from talking_head import interpolation, mel, silence
+from talking_head.face_detectors import DETECTORS as FACE_DETECTORS, FACE_DETECTOR_ENV
+from talking_head.mel import ENGINES as MEL_ENGINES, MEL_ENGINE_ENV
+from talking_head.metrics import METRICS_PATH_ENV, report
+from talking_head.paste import ENGINES as PASTE_ENGINES, PASTE_ENGINE_ENV
+from talking_head.pipeline import AudioPrefetch
+from talking_head.profiling import PROFILE_DIR_ENV, PROFILE_ENV, profile_mode, profile_run
+from talking_head.interpolation import INTERPOLATION_ENV, METHODS as INTERPOLATION_METHODS, RENDER_FPS_ENV
+from talking_head.silence import MIN_SILENCE_ENV, SKIP_SILENCE_ENV
+
+logger = logging.getLogger(__name__)
+
+# 업스트림 리포지토리 위치 (Docker 이미지 기준)
+MODEL_DIRS = {
+    "wav2lip": os.environ.get("WAV2LIP_DIR", "/workspace/Wav2Lip"),
+    "sadtalker": os.environ.get("SADTALKER_DIR", "/workspace/SadTalker"),
+}
+
+# 런처 설정용 환경 변수
+BACKEND_ENV = "TALKING_HEAD_BACKEND"
+ONNX_DIR_ENV = "TALKING_HEAD_ONNX_DIR"
+ORT_INTRA_OP_THREADS_ENV = "TALKING_HEAD_ORT_INTRA_OP_THREADS"
+ORT_INTER_OP_THREADS_ENV = "TALKING_HEAD_ORT_INTER_OP_THREADS"
+PARITY_CHECK_ENV = "TALKING_HEAD_PARITY_CHECK"
+QUALITY_SAMPLES_ENV = "TALKING_HEAD_QUALITY_SAMPLES"
+CALIBRATION_DIR_ENV = "TALKING_HEAD_CALIBRATION_DIR"
+MMAP_CHECKPOINTS_ENV = "TALKING_HEAD_MMAP_CHECKPOINTS"
+CHECKPOINT_STORE_ENV = "TALKING_HEAD_CHECKPOINT_STORE"
+
+# int8: 양자화 가능한 컴포넌트는 INT8 ONNX, 나머지는 FP32 ONNX/PyTorch
+BACKENDS = ("pytorch", "onnx", "int8")
+
+# talking_head 패키지가 들어있는 디렉토리 (서브프로세스 PYTHONPATH 용)
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def launcher_command(model, inference_args):
+    """핸들러용: 런처를 통해 inference.py 를 실행하는 명령어 구성"""
+    if model not in MODEL_DIRS:
+        raise ValueError(f"Unknown model: {model}")
+    return ["python", "-m", "talking_head.launcher", model] + [str(arg) for arg in inference_args]
+
+
+def launcher_env(options, metrics_path=None):
+    """
+    핸들러용: 요청 options 를 런처 환경 변수로 변환
+
+    Args:
+        options: 요청의 options 딕셔너리
+        metrics_path: 런처 메트릭을 기록할 JSON 경로
+
+    Returns:
+        subprocess 에 넘길 환경 변수 딕셔너리
+    """
+    backend = options.get("backend", "pytorch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+    env = os.environ.copy()
+    env[BACKEND_ENV] = backend
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [PACKAGE_ROOT, env.get("PYTHONPATH")] if p)
+
+    if metrics_path:
+        env[METRICS_PATH_ENV] = metrics_path
+
+    if "onnx_intra_op_threads" in options:
+        env[ORT_INTRA_OP_THREADS_ENV] = str(int(options["onnx_intra_op_threads"]))
+    if "onnx_inter_op_threads" in options:
+        env[ORT_INTER_OP_THREADS_ENV] = str(int(options["onnx_inter_op_threads"]))
+    if options.get("parity_check"):
+        env[PARITY_CHECK_ENV] = "1"
+    if "quality_samples" in options:
+        env[QUALITY_SAMPLES_ENV] = str(int(options["quality_samples"]))
+    if "mmap_checkpoints" in options:
+        env[MMAP_CHECKPOINTS_ENV] = "1" if options["mmap_checkpoints"] else "0"
+    if options.get("skip_silence"):
+        # 무음 구간은 추론 대신 원본 얼굴로 채움 (talking_head.silence)
+        env[SKIP_SILENCE_ENV] = "1"
+        if "min_silence_seconds" in options:
+            env[MIN_SILENCE_ENV] = str(float(options["min_silence_seconds"]))
+    if options.get("render_fps"):
+        # 키프레임만 렌더링하고 사이 프레임은 보간 (talking_head.interpolation)
+        method = options.get("interpolation", "blend")
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError(f"Unsupported interpolation '{method}' "
+                             f"(expected one of {', '.join(INTERPOLATION_METHODS)})")
+        interpolation.stride_for(options["render_fps"])
+        env[RENDER_FPS_ENV] = str(float(options["render_fps"]))
+        env[INTERPOLATION_ENV] = method
+
+    if "paste_engine" in options:
+        if options["paste_engine"] not in PASTE_ENGINES:
+            raise ValueError(f"Unsupported paste_engine '{options['paste_engine']}' "
+                             f"(expected one of {', '.join(PASTE_ENGINES)})")
+        env[PASTE_ENGINE_ENV] = options["paste_engine"]
+
+    if "face_detector" in options:
+        if options["face_detector"] not in FACE_DETECTORS:
+            raise ValueError(f"Unsupported face_detector '{options['face_detector']}' "
+                             f"(expected one of {', '.join(FACE_DETECTORS)})")
+        env[FACE_DETECTOR_ENV] = options["face_detector"]
+
+    if "mel_engine" in options:
+        if options["mel_engine"] not in MEL_ENGINES:
+            raise ValueError(f"Unsupported mel_engine '{options['mel_engine']}' "
+                             f"(expected one of {', '.join(MEL_ENGINES)})")
+        env[MEL_ENGINE_ENV] = options["mel_engine"]
+
+    mode = profile_mode(options.get("profile"))
+    if mode:
+        # 아티팩트는 메트릭 파일 옆 profile/ 에 기록 (talking_head.profiling.collect_artifacts)
+        base_dir = os.path.dirname(metrics_path) if metrics_path else tempfile.mkdtemp()
+        env[PROFILE_ENV] = mode
+        env[PROFILE_DIR_ENV] = os.path.join(base_dir, "profile")
+
+    return env
+
+
+def _apply_cpu_slot():
+    """스케줄러가 할당한 CPU 로 affinity 고정 및 torch 스레드 수 설정"""
+    from talking_head.cpu_scheduler import CPUS_ENV, NUM_THREADS_ENV, parse_cpu_list
+
+    if os.environ.get(CPUS_ENV):
+        cpus = parse_cpu_list(os.environ[CPUS_ENV])
+        # torch / OpenMP 스레드 풀이 생성되기 전에 고정해야 모든 워커 스레드에 적용됨
+        os.sched_setaffinity(0, cpus)
+        report("cpu_slot", cpus=os.environ[CPUS_ENV])
+
+    if os.environ.get(NUM_THREADS_ENV):
+        import torch
+
+        threads = int(os.environ[NUM_THREADS_ENV])
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+        report("cpu_slot", torch_threads=threads)
+
+
+def _profile_startup():
+    """콜드 스타트 분석용: torch import 시간 기록"""
+    start = time.time()
+    import torch  # noqa: F401
+    report("startup", torch_import=round(time.time() - start, 3))
+
+
+def _time_checkpoint_loads():
+    """콜드 스타트 분석용: 체크포인트 로드(torch.load) 시간 기록 (패치 설치 후 호출)"""
+    import torch
+
+    original_load = torch.load
+    totals = {"time": 0.0, "files": 0}
+
+    def load(*args, **kwargs):
+        load_start = time.time()
+        try:
+            return original_load(*args, **kwargs)
+        finally:
+            totals["time"] += time.time() - load_start
+            totals["files"] += 1
+            report("startup", checkpoint_load=round(totals["time"], 3), checkpoint_files=totals["files"])
+
+    torch.load = load
+
+
+def _install_patches(model, inference_args):
+    """환경 변수에 따라 업스트림 모듈에 패치 설치"""
+    backend = os.environ.get(BACKEND_ENV, "pytorch")
+
+    if os.environ.get(MMAP_CHECKPOINTS_ENV, "1") != "0":
+        # 빌드 시 변환된 safetensors 를 mmap 으로 로드 (프로세스 간 페이지 캐시 공유)
+        from talking_head import checkpoints
+        checkpoints.install()
+
+    if backend in ("onnx", "int8"):
+        from talking_head import onnx_backend
+        onnx_backend.install(model, inference_args,
+                             precision="int8" if backend == "int8" else "fp32")
+
+    if model == "wav2lip":
+        # face_detect 의 s3fd 를 잡마다 환경 변수로 고른 검출기로 교체 (기본 s3fd)
+        from talking_head import face_detectors
+        face_detectors.install()
+
+    if model == "sadtalker":
+        # preprocess=full 붙여넣기를 사전 계산 + 배치 합성 + ffmpeg overlay 로 교체 (잡마다 환경 변수로 선택)
+        from talking_head import paste
+        paste.install()
+
+    if os.environ.get(CALIBRATION_DIR_ENV):
+        # 양자화 캘리브레이션용 입력 수집 (이미지 빌드 시)
+        from talking_head import quantization
+        quantization.install_capture(model, inference_args, os.environ[CALIBRATION_DIR_ENV])
+
+    report("launcher", model=model, backend=backend)
+
+
+def main(argv=None):
+    """런처 진입점"""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) == 2 and argv[0] == "serve" and argv[1] in MODEL_DIRS:
+        # 상주 워커 모드 (talking_head.residency)
+        from talking_head.residency import serve
+        return serve(argv[1])
+
+    if not argv or argv[0] not in MODEL_DIRS:
+        print(f"Usage: python -m talking_head.launcher {{{'|'.join(MODEL_DIRS)}}} [inference.py args...]")
+        return 2
+
+    model, inference_args = argv[0], argv[1:]
+    repo_dir = MODEL_DIRS[model]
+    script = os.path.join(repo_dir, "inference.py")
+
+    # 업스트림 스크립트는 상대 경로(checkpoints/, temp/ 등)를 사용하므로 리포지토리에서 실행
+    os.chdir(repo_dir)
+    sys.path.insert(0, repo_dir)
+
+    _profile_startup()
+    _apply_cpu_slot()
+    # AudioPrefetch 가 NumPy mel 엔진을 원래 함수로 잡도록 먼저 교체
+    mel.install(model)
+    # 오디오 로드 / mel 계산을 얼굴 검출 / 모델 로드와 겹쳐 실행 (CPU 고정 이후에 스레드 생성)
+    prefetch = AudioPrefetch(model, inference_args).start()
+    _install_patches(model, inference_args)
+    _time_checkpoint_loads()
+    # onnx 패치 위에 감싸야 하므로 패치 설치 후에 시작
+    silence.begin_from_env(model, inference_args)
+    interpolation.begin_from_env(model, inference_args)
+
+    sys.argv = [script] + inference_args
+    start_time = time.time()
+    try:
+        # options.profile 이 cprofile / torch 이면 프로세스 내 프로파일러 아래에서 실행
+        with profile_run():
+            runpy.run_path(script, run_name="__main__")
+    finally:
+        from talking_head.checkpoints import memory_usage
+        prefetch.stop()
+        silence.end()
+        interpolation.end()
+        report("launcher", inference_time=round(time.time() - start_time, 3))
+        report("memory", **memory_usage())
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
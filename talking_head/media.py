@@ -0,0 +1,34 @@
+"""
+미디어 파일 정보 유틸리티
+"""
+
+import json
+import logging
+import subprocess
+import wave
+
+logger = logging.getLogger(__name__)
+
+
+def audio_duration(path):
+    """
+    오디오 길이 (초)
+
+    ffprobe 를 우선 사용하고, 없으면 WAV 헤더로 계산합니다. 알 수 없으면 None.
+    """
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode == 0:
+            return float(json.loads(result.stdout)["format"]["duration"])
+    except (OSError, ValueError, KeyError, subprocess.TimeoutExpired):
+        pass
+
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getnframes() / float(f.getframerate())
+    except (OSError, wave.Error, EOFError):
+        logger.warning(f"Could not determine audio duration: {path}")
+        return None
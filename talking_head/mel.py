@@ -0,0 +1,493 @@
+"""
+NumPy mel-spectrogram 엔진 (업스트림 audio.melspectrogram 대체)
+
+두 리포지토리의 audio.py 는 preemphasis (scipy lfilter) → librosa.stft → |D| → mel 필터뱅크 → dB → 정규화 순서로
+계산합니다. 여기서는 같은 hparams 로
+
+- hann 창과 slaney mel 필터뱅크를 한 번만 만들어 두고
+- 패딩된 신호를 sliding_window_view 로 (프레임, n_fft) 뷰로 만든 뒤 블록 단위 rfft 한 번으로 STFT 를 계산하고
+- dB / 정규화를 제자리 연산으로 처리합니다.
+
+프레임별 mel 창 (wav2lip mel_chunks, sadtalker indiv_mels) 의 sliding window 뷰 구현도 있지만, 업스트림 루프는
+inference.py / generate_batch.get_data 안에 있어 런처가 교체하지 않습니다. parity 에서 창 일치를, bench 에서
+루프 대비 시간을 확인하는 용도입니다.
+
+librosa 결과와의 차이는 parity 명령으로 확인하고 (이미지 빌드 시 결과를 저장, 실패하면 런타임에 librosa 경로 사용),
+bench 명령으로 긴 오디오에서 속도를 비교합니다.
+
+사용법:
+    python -m talking_head.mel parity --audio test.wav --output /workspace/mel_parity.json
+    python -m talking_head.mel bench --seconds 600
+"""
+
+import argparse
+import importlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+
+from talking_head.metrics import report
+
+logger = logging.getLogger(__name__)
+
+MEL_ENGINE_ENV = "TALKING_HEAD_MEL_ENGINE"
+ENGINES = ("numpy", "librosa")
+PARITY_REPORT = os.environ.get("TALKING_HEAD_MEL_PARITY_REPORT", "/workspace/mel_parity.json")
+
+# 정규화된 mel 값 범위는 [-max_abs_value, max_abs_value] (기본 ±4)
+PARITY_TOLERANCE = 1e-3
+# 한 번에 FFT 하는 프레임 수 (긴 오디오에서 메모리 상한)
+BLOCK_FRAMES = 8192
+
+# wav2lip / sadtalker audio.py 의 hparams 기본값 (업스트림 모듈을 읽을 수 없을 때 사용)
+DEFAULT_HPARAMS = {
+    "num_mels": 80,
+    "n_fft": 800,
+    "hop_size": 200,
+    "win_size": 800,
+    "sample_rate": 16000,
+    "preemphasize": True,
+    "preemphasis": 0.97,
+    "fmin": 55,
+    "fmax": 7600,
+    "ref_level_db": 20,
+    "min_level_db": -100,
+    "signal_normalization": True,
+    "allow_clipping_in_normalization": True,
+    "symmetric_mels": True,
+    "max_abs_value": 4.0,
+}
+
+AUDIO_MODULES = {"wav2lip": "audio", "sadtalker": "src.utils.audio"}
+
+MEL_STEP_SIZE = 16
+FPS = 25
+
+_engines = {}
+
+
+def librosa_pad_mode():
+    """설치된 librosa.stft 의 pad_mode 기본값 (버전에 따라 'reflect' / 'constant')"""
+    try:
+        import librosa
+        return inspect.signature(librosa.stft).parameters["pad_mode"].default
+    except (ImportError, KeyError, ValueError):
+        return "constant"
+
+
+def hparams_from(module):
+    """업스트림 audio 모듈의 hp 값 (없는 항목은 기본값)"""
+    hp = getattr(module, "hp", None)
+    values = dict(DEFAULT_HPARAMS)
+    for key in values:
+        try:
+            values[key] = getattr(hp, key)
+        except (AttributeError, KeyError):
+            # wav2lip HParams.__getattr__ 는 없는 키에 KeyError
+            pass
+    return values
+
+
+def hz_to_mel(frequencies):
+    """slaney mel 척도 (librosa.hz_to_mel, htk=False)"""
+    import numpy as np
+
+    frequencies = np.asanyarray(frequencies, dtype=np.float64)
+    f_sp = 200.0 / 3
+    mels = frequencies / f_sp
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    return np.where(frequencies >= min_log_hz,
+                    min_log_mel + np.log(np.maximum(frequencies, min_log_hz) / min_log_hz) / logstep, mels)
+
+
+def mel_to_hz(mels):
+    import numpy as np
+
+    mels = np.asanyarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    return np.where(mels >= min_log_mel, min_log_hz * np.exp(logstep * (mels - min_log_mel)), f_sp * mels)
+
+
+def mel_filterbank(sample_rate, n_fft, num_mels, fmin, fmax):
+    """slaney 정규화 삼각 필터뱅크 (num_mels, 1 + n_fft // 2) - librosa.filters.mel 기본 설정과 같은 값"""
+    import numpy as np
+
+    fft_freqs = np.linspace(0, sample_rate / 2, 1 + n_fft // 2)
+    mel_freqs = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), num_mels + 2))
+    widths = np.diff(mel_freqs)
+    ramps = mel_freqs[:, None] - fft_freqs[None, :]
+    lower = -ramps[:-2] / widths[:-1, None]
+    upper = ramps[2:] / widths[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_freqs[2:num_mels + 2] - mel_freqs[:num_mels]))[:, None]
+    return weights.astype(np.float32)
+
+
+class MelEngine:
+    """hparams 별로 창 / 필터뱅크 / dB 상수를 미리 계산해 두는 mel-spectrogram 계산기"""
+
+    def __init__(self, hparams=None, pad_mode=None, block_frames=BLOCK_FRAMES):
+        import numpy as np
+
+        self.hp = dict(DEFAULT_HPARAMS, **(hparams or {}))
+        self.pad_mode = pad_mode or librosa_pad_mode()
+        self.block_frames = block_frames
+        n_fft, win_size = self.hp["n_fft"], self.hp["win_size"]
+
+        # periodic hann 창 (scipy.signal.get_window('hann', fftbins=True)), win_size < n_fft 이면 가운데 정렬
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(win_size) / win_size)
+        offset = (n_fft - win_size) // 2
+        self.window = np.zeros(n_fft, dtype=np.float32)
+        self.window[offset:offset + win_size] = window
+        self.mel_basis_t = np.ascontiguousarray(mel_filterbank(
+            self.hp["sample_rate"], n_fft, self.hp["num_mels"], self.hp["fmin"], self.hp["fmax"]).T)
+        self.min_level = np.float32(np.exp(self.hp["min_level_db"] / 20 * np.log(10)))
+
+        try:
+            from scipy import fft as fft_module
+            self._rfft = lambda frames: fft_module.rfft(frames, axis=1, workers=-1)
+        except ImportError:
+            self._rfft = lambda frames: np.fft.rfft(frames, axis=1)
+
+    def _frames(self, wav):
+        """preemphasis + center 패딩 후 (프레임 수, n_fft) 스트라이드 뷰"""
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        n_fft, hop = self.hp["n_fft"], self.hp["hop_size"]
+        y = np.asarray(wav, dtype=np.float32)
+        if self.hp["preemphasize"]:
+            emphasized = np.empty_like(y)
+            emphasized[:1] = y[:1]
+            np.subtract(y[1:], np.float32(self.hp["preemphasis"]) * y[:-1], out=emphasized[1:])
+            y = emphasized
+        y = np.pad(y, n_fft // 2, mode=self.pad_mode)
+        return sliding_window_view(y, n_fft)[::hop]
+
+    def _normalize(self, S):
+        import numpy as np
+
+        max_abs, min_db = self.hp["max_abs_value"], self.hp["min_level_db"]
+        if self.hp["symmetric_mels"]:
+            S -= min_db
+            S *= (2 * max_abs) / -min_db
+            S -= max_abs
+            lower = -max_abs
+        else:
+            S -= min_db
+            S *= max_abs / -min_db
+            lower = 0
+        if self.hp["allow_clipping_in_normalization"]:
+            np.clip(S, lower, max_abs, out=S)
+        return S
+
+    def melspectrogram_t(self, wav):
+        """(프레임 수, num_mels) float32 - 시간 축이 연속이라 프레임별 창을 뷰로 꺼내기 좋은 배치"""
+        import numpy as np
+
+        frames = self._frames(wav)
+        mel = np.empty((frames.shape[0], self.hp["num_mels"]), dtype=np.float32)
+        for start in range(0, frames.shape[0], self.block_frames):
+            block = frames[start:start + self.block_frames] * self.window
+            magnitude = np.abs(self._rfft(block)).astype(np.float32, copy=False)
+            np.matmul(magnitude, self.mel_basis_t, out=mel[start:start + len(block)])
+
+        # _amp_to_db(...) - ref_level_db → _normalize
+        np.maximum(mel, self.min_level, out=mel)
+        np.log10(mel, out=mel)
+        mel *= 20
+        mel -= self.hp["ref_level_db"]
+        if self.hp["signal_normalization"]:
+            mel = self._normalize(mel)
+        return mel
+
+    def melspectrogram(self, wav):
+        """업스트림 audio.melspectrogram 과 같은 (num_mels, 프레임 수) 배열 (전치 뷰)"""
+        return self.melspectrogram_t(wav).T
+
+
+def engine_for(hparams=None):
+    key = json.dumps(hparams or {}, sort_keys=True, default=str)
+    if key not in _engines:
+        _engines[key] = MelEngine(hparams)
+    return _engines[key]
+
+
+# ---------------------------------------------------------------------------
+# 프레임별 mel 창
+# ---------------------------------------------------------------------------
+
+def wav2lip_chunk_starts(mel_frames, fps=FPS, step=MEL_STEP_SIZE):
+    """Wav2Lip inference.py 의 mel_chunks 루프와 같은 창 시작 위치 (마지막 창은 끝에 맞춤)"""
+    import numpy as np
+
+    multiplier = 80.0 / fps
+    last = mel_frames - step
+    if last < 0:
+        return np.zeros(0, dtype=int)
+    count = int(last // multiplier) + 2
+    starts = (np.arange(count) * multiplier).astype(int)
+    starts = starts[starts <= last]
+    return np.append(starts, last)
+
+
+def wav2lip_chunks(mel, fps=FPS, step=MEL_STEP_SIZE):
+    """mel (num_mels, T) → 프레임별 (num_mels, step) 창 목록 (각 창은 mel 의 뷰)"""
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    windows = sliding_window_view(mel, step, axis=1)
+    return [windows[:, start] for start in wav2lip_chunk_starts(mel.shape[1], fps, step)]
+
+
+def sadtalker_chunk_starts(num_frames, fps=FPS):
+    """SadTalker generate_batch 의 indiv_mels 창 시작 위치 (두 프레임 앞에서 시작, 범위 밖은 끝 값으로 고정)"""
+    import numpy as np
+
+    return (80.0 * ((np.arange(num_frames) - 2) / float(fps))).astype(int)
+
+
+def sadtalker_chunks(mel_t, num_frames, fps=FPS, step=MEL_STEP_SIZE):
+    """
+    mel_t (T, num_mels) → (num_frames, num_mels, step) indiv_mels
+
+    가장자리 값으로 양쪽을 늘린 mel 의 sliding window 뷰에서 창을 한 번에 모읍니다
+    (창 간격이 3.2 프레임이라 하나의 스트라이드로는 표현할 수 없어 모으는 복사 한 번은 필요).
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    starts = sadtalker_chunk_starts(num_frames, fps)
+    if not len(starts):
+        return np.zeros((0, mel_t.shape[1], step), dtype=mel_t.dtype)
+    before = max(0, -int(starts.min()))
+    after = max(0, int(starts.max()) + step - mel_t.shape[0])
+    padded = np.pad(mel_t, ((before, after), (0, 0)), mode="edge") if before or after else mel_t
+    return sliding_window_view(padded, step, axis=0)[starts + before]
+
+
+# ---------------------------------------------------------------------------
+# librosa 참조 구현 / 패치
+# ---------------------------------------------------------------------------
+
+def reference_melspectrogram(wav, hparams=None):
+    """업스트림 audio.melspectrogram 과 같은 계산 (librosa / scipy), parity 기준"""
+    import librosa
+    import numpy as np
+    from scipy import signal
+
+    hp = dict(DEFAULT_HPARAMS, **(hparams or {}))
+    y = signal.lfilter([1, -hp["preemphasis"]], [1], wav) if hp["preemphasize"] else wav
+    D = librosa.stft(y=y, n_fft=hp["n_fft"], hop_length=hp["hop_size"], win_length=hp["win_size"])
+    mel_basis = librosa.filters.mel(sr=hp["sample_rate"], n_fft=hp["n_fft"], n_mels=hp["num_mels"],
+                                    fmin=hp["fmin"], fmax=hp["fmax"])
+    S = np.dot(mel_basis, np.abs(D))
+    min_level = np.exp(hp["min_level_db"] / 20 * np.log(10))
+    S = 20 * np.log10(np.maximum(min_level, S)) - hp["ref_level_db"]
+    if not hp["signal_normalization"]:
+        return S
+    max_abs, min_db = hp["max_abs_value"], hp["min_level_db"]
+    if hp["symmetric_mels"]:
+        S = (2 * max_abs) * ((S - min_db) / (-min_db)) - max_abs
+        return np.clip(S, -max_abs, max_abs) if hp["allow_clipping_in_normalization"] else S
+    S = max_abs * ((S - min_db) / (-min_db))
+    return np.clip(S, 0, max_abs) if hp["allow_clipping_in_normalization"] else S
+
+
+def _parity_ok():
+    """이미지 빌드 시 저장한 parity 결과 (없거나 읽을 수 없으면 검증되지 않은 것으로 간주)"""
+    try:
+        with open(PARITY_REPORT, encoding="utf-8") as f:
+            return json.load(f).get("passed") is True
+    except (OSError, ValueError):
+        return False
+
+
+def install(model):
+    """
+    런처 / 상주 워커용: 업스트림 audio.melspectrogram 을 NumPy 엔진으로 교체 (프레임별 mel 창 루프는 그대로)
+
+    잡마다 TALKING_HEAD_MEL_ENGINE=librosa 로 원래 함수를 고를 수 있습니다. AudioPrefetch 가 교체된 함수를
+    원래 함수로 잡도록 그보다 먼저 호출해야 합니다.
+    """
+    try:
+        module = importlib.import_module(AUDIO_MODULES[model])
+    except ImportError as e:
+        logger.warning(f"NumPy mel engine unavailable: {e}")
+        return False
+    if getattr(module.melspectrogram, "_talking_head_mel", False):
+        return True
+    if not _parity_ok():
+        logger.warning(f"NumPy mel engine not verified by the build-time parity check ({PARITY_REPORT}), "
+                       f"using librosa")
+        return False
+
+    original = module.melspectrogram
+    engine = engine_for(hparams_from(module))
+
+    def melspectrogram(wav):
+        if os.environ.get(MEL_ENGINE_ENV, "numpy") == "librosa":
+            return original(wav)
+        start = time.time()
+        mel = engine.melspectrogram(wav)
+        report("mel", engine="numpy", frames=mel.shape[1], time=round(time.time() - start, 4))
+        return mel
+
+    melspectrogram._talking_head_mel = True
+    module.melspectrogram = melspectrogram
+    return True
+
+
+# ---------------------------------------------------------------------------
+# parity / 벤치마크
+# ---------------------------------------------------------------------------
+
+def _load_audio(path, sample_rate):
+    import librosa
+    return librosa.core.load(path, sr=sample_rate)[0]
+
+
+def _test_signal(seconds, sample_rate):
+    """음성 대역 하모닉 + 잡음 + 무음 구간이 섞인 합성 신호"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = (np.sin(2 * np.pi * 1.3 * t) > -0.3).astype(np.float64)
+    wav = 0.3 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+    return wav.astype(np.float32)
+
+
+def parity(wav, hparams=None, tolerance=PARITY_TOLERANCE):
+    """NumPy 엔진 vs librosa 참조 구현 (mel 값과 두 모델의 프레임별 창)"""
+    import numpy as np
+
+    hp = dict(DEFAULT_HPARAMS, **(hparams or {}))
+    expected = reference_melspectrogram(wav, hp)
+    actual = MelEngine(hp).melspectrogram(wav)
+    result = {"pad_mode": librosa_pad_mode(), "frames": expected.shape[1], "shape_match": expected.shape == actual.shape}
+    if result["shape_match"]:
+        diff = np.abs(expected - actual)
+        result["max_abs_diff"] = float(diff.max())
+        result["mean_abs_diff"] = float(diff.mean())
+
+        # wav2lip mel_chunks 루프 / sadtalker indiv_mels 루프를 그대로 실행한 결과와 비교
+        chunks, i = [], 0
+        while True:
+            start = int(i * 80.0 / FPS)
+            if start + MEL_STEP_SIZE > expected.shape[1]:
+                chunks.append(expected[:, expected.shape[1] - MEL_STEP_SIZE:])
+                break
+            chunks.append(expected[:, start:start + MEL_STEP_SIZE])
+            i += 1
+        result["wav2lip_chunks_match"] = all(
+            np.array_equal(a, b) for a, b in zip(chunks, wav2lip_chunks(expected))) and \
+            len(chunks) == len(wav2lip_chunks(expected))
+
+        spec = expected.T
+        num_frames = int(len(wav) / hp["sample_rate"] * FPS)
+        indiv = []
+        for i in range(num_frames):
+            start = int(80.0 * ((i - 2) / float(FPS)))
+            seq = [min(max(item, 0), spec.shape[0] - 1) for item in range(start, start + MEL_STEP_SIZE)]
+            indiv.append(spec[seq, :].T)
+        result["sadtalker_chunks_match"] = bool(np.array_equal(np.asarray(indiv), sadtalker_chunks(spec, num_frames)))
+
+    result["passed"] = bool(result["shape_match"] and result["max_abs_diff"] <= tolerance
+                            and result["wav2lip_chunks_match"] and result["sadtalker_chunks_match"])
+    return result
+
+
+def benchmark(wav, hparams=None, repeats=3):
+    """긴 오디오에서 librosa 참조 구현 / NumPy 엔진 / 프레임별 창 생성 시간 비교"""
+    import numpy as np
+
+    hp = dict(DEFAULT_HPARAMS, **(hparams or {}))
+    engine = MelEngine(hp)
+
+    def best(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.time()
+            fn()
+            times.append(time.time() - start)
+        return min(times)
+
+    reference_time = best(lambda: reference_melspectrogram(wav, hp))
+    engine_time = best(lambda: engine.melspectrogram(wav))
+
+    mel = engine.melspectrogram(wav)
+    spec = np.ascontiguousarray(mel.T)
+    num_frames = int(len(wav) / hp["sample_rate"] * FPS)
+
+    def loop_indiv():
+        indiv = []
+        for i in range(num_frames):
+            start = int(80.0 * ((i - 2) / float(FPS)))
+            seq = [min(max(item, 0), spec.shape[0] - 1) for item in range(start, start + MEL_STEP_SIZE)]
+            indiv.append(spec[seq, :].T)
+        return np.asarray(indiv)
+
+    return {
+        "audio_seconds": round(len(wav) / hp["sample_rate"], 2),
+        "mel_frames": mel.shape[1],
+        "librosa_time": round(reference_time, 4),
+        "numpy_time": round(engine_time, 4),
+        "speedup": round(reference_time / engine_time, 2) if engine_time else None,
+        "sadtalker_chunks_loop_time": round(best(loop_indiv), 4),
+        "sadtalker_chunks_view_time": round(best(lambda: sadtalker_chunks(spec, num_frames)), 4),
+        "wav2lip_chunks_view_time": round(best(lambda: wav2lip_chunks(mel)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy mel-spectrogram engine")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parity_parser = subparsers.add_parser("parity", help="librosa 참조 구현과 비교")
+    parity_parser.add_argument("--audio", help="비교할 오디오 (없으면 합성 신호)")
+    parity_parser.add_argument("--seconds", type=float, default=10.0, help="합성 신호 길이")
+    parity_parser.add_argument("--tolerance", type=float, default=PARITY_TOLERANCE)
+    parity_parser.add_argument("--output", help="결과 JSON 저장 경로 (런처가 passed 를 확인)")
+
+    bench_parser = subparsers.add_parser("bench", help="긴 오디오에서 속도 비교")
+    bench_parser.add_argument("--audio", help="오디오 파일 (없으면 합성 신호)")
+    bench_parser.add_argument("--seconds", type=float, default=600.0, help="합성 신호 길이")
+    bench_parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    sample_rate = DEFAULT_HPARAMS["sample_rate"]
+
+    if args.command == "parity":
+        try:
+            wav = _load_audio(args.audio, sample_rate) if args.audio else _test_signal(args.seconds, sample_rate)
+            result = parity(wav, tolerance=args.tolerance)
+        except Exception as e:
+            # 검사 자체가 실패해도 (librosa import 실패 등) 런처가 NumPy 엔진을 쓰지 않도록 결과를 남김
+            logger.error(f"Mel parity check failed: {e}")
+            result = {"passed": False, "error": str(e)}
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+        print(json.dumps(result, indent=2))
+        return 0 if result["passed"] else 1
+
+    wav = _load_audio(args.audio, sample_rate) if args.audio else _test_signal(args.seconds, sample_rate)
+    print(json.dumps(benchmark(wav, repeats=args.repeats), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+런처 → 핸들러 메트릭 전달
+
+inference.py 서브프로세스 안에서 수집한 값을 JSON 파일로 남기고,
+핸들러가 작업 종료 후 읽어서 응답에 포함합니다.
+"""
+
+import atexit
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH_ENV = "TALKING_HEAD_METRICS_PATH"
+
+_metrics = {}
+_before_write = []
+
+
+def report(section, **values):
+    """섹션 단위로 메트릭 기록 (같은 키는 덮어씀)"""
+    _metrics.setdefault(section, {}).update(values)
+
+
+def before_write(callback):
+    """저장 직전에 호출할 콜백 등록 (누적 통계를 마지막에 report 하는 용도)"""
+    _before_write.append(callback)
+
+
+def reset_metrics():
+    """수집된 메트릭 비우기 (상주 워커에서 잡 단위로 기록할 때)"""
+    _metrics.clear()
+
+
+def write_metrics(path=None):
+    """수집된 메트릭을 파일로 저장"""
+    for callback in _before_write:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Metrics callback failed: {e}")
+    path = path or os.environ.get(METRICS_PATH_ENV)
+    if not path or not _metrics:
+        return
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(_metrics, f, indent=2, default=str)
+    except Exception as e:
+        logger.error(f"Failed to write launcher metrics: {e}")
+
+
+def read_metrics(path):
+    """핸들러 측: 런처가 남긴 메트릭 읽기 (없으면 빈 dict)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+atexit.register(write_metrics)
@@ -0,0 +1,241 @@
+"""
+SadTalker preprocess=full 붙여넣기 (src.utils.paste_pic.paste_pic 대체)
+
+업스트림 paste_pic 은 생성된 얼굴 crop 을 프레임마다 원본 크기로 resize 한 뒤 cv2.seamlessClone (Poisson 풀이) 으로
+원본 이미지 전체에 합성하고 cv2.VideoWriter 로 씁니다 (프레임마다 전체 이미지 복사 + Poisson 풀이).
+원본 이미지는 정지 이미지이므로 여기서는
+
+- 붙여넣을 영역, 경계 샘플 위치, 경계 → 내부 가중치 (mean-value coordinates), 가장자리 feather 마스크를 한 번만 계산
+- 프레임 배치 단위 NumPy 연산으로 경계에서의 (원본 - 생성) 차이를 MVC 가중치로 내부에 퍼뜨린 membrane 을 더해
+  Poisson 합성과 같은 색 / 밝기 맞춤을 근사 (Farbman et al. 2009, Coordinates for Instant Image Cloning)
+- 얼굴 영역 패치만 ffmpeg 에 rawvideo 로 보내 overlay 필터로 정지 원본 위에 합성 (전체 프레임 복사 없음)
+
+합니다. 원본이 영상이거나 crop 정보가 없으면 업스트림 함수를 그대로 호출합니다.
+"""
+
+import logging
+import os
+import subprocess
+import tempfile
+import time
+
+from talking_head.metrics import report
+
+logger = logging.getLogger(__name__)
+
+PASTE_ENGINE_ENV = "TALKING_HEAD_PASTE_ENGINE"
+ENGINES = ("vectorized", "upstream")
+
+# animate.py 가 from ... import paste_pic 으로 가져가므로 두 곳 모두 교체
+TARGETS = ("src.utils.paste_pic.paste_pic", "src.facerender.animate.paste_pic")
+
+IMAGE_EXTENSIONS = ("jpg", "png", "jpeg")
+# membrane 격자 크기 / 경계 샘플 주변 평균 반경 / feather 폭 (패치 짧은 변 대비)
+GRID_SIZE = 32
+SAMPLE_RADIUS = 2
+FEATHER_FRACTION = 0.03
+BATCH_FRAMES = 32
+
+
+def mvc_weights(points, polygon):
+    """
+    내부 점 (P, 2) 의 닫힌 다각형 (N, 2) 꼭짓점에 대한 mean-value coordinates (P, N), 행 합 1
+
+    w_i = (tan(α_{i-1} / 2) + tan(α_i / 2)) / |p_i - x|, α_i 는 x 에서 본 p_i 와 p_{i+1} 사이 각.
+    """
+    import numpy as np
+
+    delta = polygon[None, :, :] - points[:, None, :]
+    radius = np.maximum(np.linalg.norm(delta, axis=2), 1e-6)
+    following = np.roll(delta, -1, axis=1)
+    cross = delta[..., 0] * following[..., 1] - delta[..., 1] * following[..., 0]
+    dot = (delta * following).sum(axis=2)
+    tan_half = np.tan(np.arctan2(cross, dot) / 2)
+    weights = (np.roll(tan_half, 1, axis=1) + tan_half) / radius
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+class PasteEngine:
+    """정지 원본 이미지 위에 생성 프레임을 합성하기 위한 사전 계산"""
+
+    def __init__(self, full_img, box, grid_size=GRID_SIZE):
+        import numpy as np
+
+        self.box = box
+        x1, y1, x2, y2 = box
+        self.width, self.height = x2 - x1, y2 - y1
+        self.background = full_img[y1:y2, x1:x2].astype(np.float32)
+        grid = min(grid_size, self.width, self.height)
+        self.grid = grid
+
+        # cv2.resize (INTER_LINEAR) 가 격자 칸 (i, j) 를 놓는 패치 좌표 (가장자리 칸은 경계로 당김)
+        xs = np.clip((np.arange(grid) + 0.5) * self.width / grid - 0.5, 0, self.width - 1)
+        ys = np.clip((np.arange(grid) + 0.5) * self.height / grid - 0.5, 0, self.height - 1)
+        xs[0], xs[-1], ys[0], ys[-1] = 0, self.width - 1, 0, self.height - 1
+
+        # 경계 칸: 시계 방향 (위 → 오른쪽 → 아래 → 왼쪽), 꼭짓점 중복 없이
+        border = ([(0, j) for j in range(grid)] + [(i, grid - 1) for i in range(1, grid)]
+                  + [(grid - 1, j) for j in range(grid - 2, -1, -1)] + [(i, 0) for i in range(grid - 2, 0, -1)])
+        interior = [(i, j) for i in range(1, grid - 1) for j in range(1, grid - 1)]
+        self.border_cells = np.array([i * grid + j for i, j in border])
+        self.interior_cells = np.array([i * grid + j for i, j in interior], dtype=int)
+        polygon = np.array([(xs[j], ys[i]) for i, j in border], dtype=np.float64)
+        if interior:
+            points = np.array([(xs[j], ys[i]) for i, j in interior], dtype=np.float64)
+            self.weights = mvc_weights(points, polygon).astype(np.float32)
+        else:
+            self.weights = np.zeros((0, len(border)), dtype=np.float32)
+
+        # 경계 샘플마다 주변 (2r+1)^2 픽셀 평균 (생성 프레임 잡음이 membrane 에 번지지 않도록)
+        offsets = np.arange(-SAMPLE_RADIUS, SAMPLE_RADIUS + 1)
+        sample_x = np.clip(np.rint(polygon[:, 0])[:, None, None] + offsets[None, None, :], 0, self.width - 1)
+        sample_y = np.clip(np.rint(polygon[:, 1])[:, None, None] + offsets[None, :, None], 0, self.height - 1)
+        self.sample_index = (sample_y * self.width + sample_x).astype(int).reshape(len(border), -1)
+        self.background_samples = self.background.reshape(-1, 3)[self.sample_index].mean(axis=1)
+
+        # 가장자리 feather: 경계에서 0 → FEATHER 폭 안쪽에서 1 (경계는 원본과 정확히 이어짐)
+        feather = max(1.0, FEATHER_FRACTION * min(self.width, self.height))
+        ramp_x = np.minimum(np.arange(self.width), np.arange(self.width)[::-1]) / feather
+        ramp_y = np.minimum(np.arange(self.height), np.arange(self.height)[::-1]) / feather
+        self.alpha = np.clip(np.minimum(ramp_y[:, None], ramp_x[None, :]), 0, 1).astype(np.float32)[..., None]
+
+    def composite(self, crops):
+        """
+        생성 crop 배치 → 붙여넣을 패치 배치 (T, H, W, 3) uint8
+
+        resize 만 프레임별 cv2 호출이고, 경계 차이 / membrane / 합성은 배치 연산입니다.
+        """
+        import cv2
+        import numpy as np
+
+        patches = np.stack([cv2.resize(crop, (self.width, self.height)) for crop in crops]).astype(np.float32)
+        count = patches.shape[0]
+        samples = patches.reshape(count, -1, 3)[:, self.sample_index].mean(axis=2)
+        boundary = self.background_samples[None] - samples
+
+        coarse = np.zeros((count, self.grid * self.grid, 3), dtype=np.float32)
+        coarse[:, self.border_cells] = boundary
+        if len(self.interior_cells):
+            coarse[:, self.interior_cells] = np.einsum("pn,tnc->tpc", self.weights, boundary)
+        coarse = coarse.reshape(count, self.grid, self.grid, 3)
+        membrane = np.stack([cv2.resize(grid, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+                             for grid in coarse])
+
+        patches += membrane
+        patches -= self.background
+        patches *= self.alpha
+        patches += self.background
+        return np.clip(patches, 0, 255).astype(np.uint8)
+
+
+def paste_box(crop_info, extended_crop):
+    """업스트림 paste_pic 과 같은 붙여넣기 영역 (x1, y1, x2, y2)"""
+    clx, cly, crx, cry = crop_info[1]
+    lx, ly, rx, ry = (int(value) for value in crop_info[2])
+    if extended_crop:
+        return int(clx), int(cly), int(crx), int(cry)
+    return int(clx + lx), int(cly + ly), int(clx + rx), int(cly + ry)
+
+
+def paste_video(video_path, full_img, box, audio_path, output_path, batch_frames=BATCH_FRAMES):
+    """생성 crop 영상을 정지 원본 위에 합성하고 오디오와 함께 인코딩"""
+    import cv2
+
+    stats = {"engine": "vectorized", "frames": 0}
+    start = time.time()
+    engine = PasteEngine(full_img, box)
+    stats["precompute_time"] = round(time.time() - start, 3)
+
+    capture = cv2.VideoCapture(video_path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    x1, y1, _, _ = box
+    composite_time = 0.0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        background_path = os.path.join(temp_dir, "background.png")
+        cv2.imwrite(background_path, full_img)
+        log_path = os.path.join(temp_dir, "ffmpeg.log")
+        cmd = [
+            "ffmpeg", "-y", "-v", "error",
+            "-loop", "1", "-framerate", f"{fps:g}", "-i", background_path,
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{engine.width}x{engine.height}",
+            "-framerate", f"{fps:g}", "-i", "-",
+            "-i", audio_path,
+            "-filter_complex",
+            f"[0:v][1:v]overlay={x1}:{y1}:shortest=1,crop=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p[v]",
+            "-map", "[v]", "-map", "2:a", "-c:v", "libx264", "-c:a", "aac", "-shortest", output_path,
+        ]
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=log)
+            try:
+                while True:
+                    crops = []
+                    while len(crops) < batch_frames:
+                        ok, frame = capture.read()
+                        if not ok:
+                            break
+                        crops.append(frame)
+                    if not crops:
+                        break
+                    clock = time.time()
+                    patches = engine.composite(crops)
+                    composite_time += time.time() - clock
+                    process.stdin.write(patches.tobytes())
+                    stats["frames"] += len(crops)
+            finally:
+                capture.release()
+                process.stdin.close()
+                returncode = process.wait()
+        if returncode != 0:
+            with open(log_path) as log:
+                raise RuntimeError(f"ffmpeg overlay failed: {log.read()}")
+
+    total = time.time() - start
+    stats.update({
+        "composite_time": round(composite_time, 3),
+        "total_time": round(total, 3),
+        "per_frame_time": round(total / stats["frames"], 4) if stats["frames"] else None,
+        "patch_size": [engine.width, engine.height],
+        "image_size": [full_img.shape[1], full_img.shape[0]],
+    })
+    return stats
+
+
+def _wrap_paste_pic(original):
+    def paste_pic(video_path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop=False):
+        import cv2
+
+        if (os.environ.get(PASTE_ENGINE_ENV, "vectorized") == "upstream"
+                or pic_path.split(".")[-1].lower() not in IMAGE_EXTENSIONS or len(crop_info) != 3):
+            return original(video_path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop)
+
+        full_img = cv2.imread(pic_path)
+        x1, y1, x2, y2 = box = paste_box(crop_info, extended_crop)
+        if full_img is None or x1 < 0 or y1 < 0 or x2 > full_img.shape[1] or y2 > full_img.shape[0] \
+                or x2 - x1 < 2 or y2 - y1 < 2:
+            logger.warning(f"Paste box {box} does not fit the source image, using upstream paste_pic")
+            return original(video_path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop)
+
+        stats = paste_video(video_path, full_img, box, new_audio_path, full_video_path)
+        report("paste", **stats)
+        logger.info(f"Vectorized paste-back: {stats['frames']} frames in {stats['total_time']}s")
+
+    return paste_pic
+
+
+def install():
+    """런처용: sadtalker paste_pic 을 벡터화된 붙여넣기로 교체 (환경 변수로 잡마다 업스트림 선택 가능)"""
+    import importlib
+
+    wrapped = None
+    for target in TARGETS:
+        module_name, attr = target.rsplit(".", 1)
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning(f"Vectorized paste-back unavailable for {target}: {e}")
+            continue
+        if wrapped is None:
+            wrapped = _wrap_paste_pic(getattr(module, attr))
+        setattr(module, attr, wrapped)
+    return wrapped is not None
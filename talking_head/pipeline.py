@@ -0,0 +1,255 @@
+"""
+잡 단계 DAG 실행 / 오디오 특징 선계산
+
+핸들러 (Pipeline):
+    입력 다운로드 → 추론 → 결과 저장을 순서대로 실행하는 대신, 의존 관계만 선언하고 의존 단계가 모두 끝나는
+    즉시 시작합니다 (이미지 / 오디오 다운로드, 오디오 길이 측정, 캐시 키 해시가 서로 겹쳐 실행).
+    report() 는 단계별 시작 / 소요 시간과 임계 경로(마지막으로 끝난 단계에서 가장 늦게 끝난 의존 단계를 따라
+    거슬러 올라간 경로)를 돌려주므로 실제로 지연 시간을 결정하는 단계를 알 수 있습니다.
+
+    pipeline = Pipeline()
+    pipeline.add("image", lambda: fetch_input(...))
+    pipeline.add("audio", lambda: fetch_input(...))
+    pipeline.add("audio_seconds", audio_duration, deps=("audio",))
+    results = pipeline.run()
+
+런처 (AudioPrefetch):
+    inference.py 는 얼굴 검출 / 모델 로드와 오디오 로드 / mel 계산을 순서대로 실행합니다.
+    런처가 시작하자마자 백그라운드 스레드에서 load_wav / melspectrogram 을 미리 계산하고, 업스트림 audio 모듈의
+    두 함수를 같은 입력이면 미리 계산된 결과를 돌려주도록 교체합니다 (입력이 다르면 원래 함수로 계산).
+"""
+
+import importlib
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from talking_head.metrics import report
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class Pipeline:
+    """의존 관계가 있는 단계들을 스레드 풀에서 실행"""
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.results = {}
+        self._stages = {}
+        self._timings = {}
+        self._children = {}
+        # 이전 run() 에서 마지막으로 끝난 단계 (나중 run() 의 단계는 그 이후에야 시작할 수 있음)
+        self._barrier = {}
+
+    def add(self, name, fn, deps=()):
+        """
+        단계 추가
+
+        fn 은 deps 순서대로 의존 단계의 결과를 인자로 받습니다. 의존 단계는 먼저 추가되어 있어야 합니다
+        (순환 방지). 이미 run() 으로 실행된 단계에도 의존할 수 있습니다.
+        """
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        unknown = [dep for dep in deps if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = (fn, tuple(deps))
+        return self
+
+    def attach(self, name, child):
+        """단계 안에서 실행한 하위 Pipeline 기록 (report 의 임계 경로에 펼쳐서 포함)"""
+        self._children[name] = child
+
+    def _call(self, name):
+        fn, deps = self._stages[name]
+        start = time.time()
+        try:
+            return fn(*[self.results[dep] for dep in deps])
+        finally:
+            self._timings[name] = (start, time.time())
+
+    def run(self):
+        """
+        아직 실행하지 않은 단계를 모두 실행하고 결과 딕셔너리 반환
+
+        한 단계가 실패하면 시작하지 않은 단계는 실행하지 않고, 실행 중인 단계가 끝나기를 기다린 뒤 예외를 전달합니다.
+        """
+        pending = [name for name in self._stages if name not in self.results]
+        if self._timings:
+            last = max(self._timings, key=lambda n: self._timings[n][1])
+            self._barrier.update({name: last for name in pending})
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    if all(dep in self.results for dep in self._stages[name][1]):
+                        pending.remove(name)
+                        running[pool.submit(self._call, name)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        wait(running)
+                        logger.error(f"Pipeline stage {name} failed: {error}")
+                        raise error
+                    self.results[name] = future.result()
+        return self.results
+
+    def _gates(self, name):
+        """단계 시작을 막을 수 있었던 단계들 (의존 단계 + 이전 run() 의 마지막 단계)"""
+        gates = list(self._stages[name][1])
+        if name in self._barrier:
+            gates.append(self._barrier[name])
+        return [gate for gate in gates if gate in self._timings]
+
+    def critical_path(self):
+        """마지막으로 끝난 단계부터 가장 늦게 끝난 의존 단계를 따라간 경로 (실행 순서)"""
+        if not self._timings:
+            return []
+        path = []
+        name = max(self._timings, key=lambda n: self._timings[n][1])
+        while name is not None:
+            path.append(name)
+            deps = self._gates(name)
+            name = max(deps, key=lambda n: self._timings[n][1]) if deps else None
+        return path[::-1]
+
+    def report(self):
+        """
+        단계별 시간과 임계 경로
+
+        start 는 첫 단계 시작 기준 초, wait 는 의존 단계가 끝난 뒤 실제로 시작하기까지의 대기 시간.
+        serial_time 은 모든 단계를 순서대로 실행했을 때의 합, overlap_saved 는 겹쳐 실행해 줄어든 시간.
+        """
+        if not self._timings:
+            return {}
+        origin = min(start for start, _ in self._timings.values())
+        end = max(finish for _, finish in self._timings.values())
+
+        stages = {}
+        for name, (start, finish) in self._timings.items():
+            ready = max([self._timings[gate][1] for gate in self._gates(name)], default=origin)
+            stages[name] = {
+                "start": round(start - origin, 3),
+                "duration": round(finish - start, 3),
+                "wait": round(max(0.0, start - ready), 3),
+                "deps": list(self._stages[name][1]),
+            }
+            if name in self._children:
+                stages[name]["pipeline"] = self._children[name].report()
+
+        path = []
+        for name in self.critical_path():
+            child = stages[name].get("pipeline")
+            if child and child.get("critical_path"):
+                path.extend(f"{name}/{sub}" for sub in child["critical_path"])
+            else:
+                path.append(name)
+
+        serial_time = sum(finish - start for start, finish in self._timings.values())
+        return {
+            "wall_time": round(end - origin, 3),
+            "serial_time": round(serial_time, 3),
+            "overlap_saved": round(max(0.0, serial_time - (end - origin)), 3),
+            "critical_path": path,
+            "critical_path_time": round(sum(self._timings[n][1] - self._timings[n][0]
+                                            for n in self.critical_path()), 3),
+            "stages": stages,
+        }
+
+
+# ---------------------------------------------------------------------------
+# 런처: 오디오 특징 선계산
+# ---------------------------------------------------------------------------
+
+# 모델별 업스트림 오디오 모듈 / 오디오 인자 (두 리포지토리 모두 load_wav(path, sr), melspectrogram(wav))
+AUDIO_MODULES = {
+    "wav2lip": ("audio", "--audio"),
+    "sadtalker": ("src.utils.audio", "--driven_audio"),
+}
+SAMPLE_RATE = 16000
+
+
+class AudioPrefetch:
+    """inference.py 가 오디오를 읽기 전에 백그라운드 스레드에서 load_wav / melspectrogram 계산"""
+
+    def __init__(self, model, inference_args):
+        module_name, flag = AUDIO_MODULES[model]
+        self.module_name = module_name
+        self.path = None
+        if flag in inference_args:
+            index = inference_args.index(flag)
+            if index + 1 < len(inference_args):
+                self.path = inference_args[index + 1]
+        self.module = None
+        self._originals = {}
+        self._done = threading.Event()
+        self._wav = None
+        self._mel = None
+        self._stats = {"load_hit": False, "mel_hit": False, "waited": 0.0}
+
+    def start(self):
+        # wav2lip 은 wav 가 아니면 ffmpeg 로 temp/temp.wav 를 만들어 읽으므로 선계산하지 않음
+        if not self.path or not self.path.lower().endswith(".wav"):
+            return self
+        try:
+            self.module = importlib.import_module(self.module_name)
+        except ImportError as e:
+            logger.warning(f"Audio prefetch disabled: {e}")
+            return self
+
+        self._originals = {"load_wav": self.module.load_wav, "melspectrogram": self.module.melspectrogram}
+        self.module.load_wav = self._load_wav
+        self.module.melspectrogram = self._melspectrogram
+        threading.Thread(target=self._compute, name="audio-prefetch", daemon=True).start()
+        return self
+
+    def _compute(self):
+        try:
+            start = time.time()
+            wav = self._originals["load_wav"](self.path, SAMPLE_RATE)
+            self._stats["load_time"] = round(time.time() - start, 3)
+            self._wav = wav
+            start = time.time()
+            self._mel = self._originals["melspectrogram"](wav)
+            self._stats["mel_time"] = round(time.time() - start, 3)
+        except Exception as e:
+            logger.warning(f"Audio prefetch failed, falling back to inline computation: {e}")
+        finally:
+            self._done.set()
+
+    def _wait(self):
+        start = time.time()
+        self._done.wait()
+        self._stats["waited"] = round(self._stats["waited"] + time.time() - start, 3)
+
+    def _load_wav(self, path, sr):
+        if path == self.path and sr == SAMPLE_RATE:
+            self._wait()
+            if self._wav is not None:
+                self._stats["load_hit"] = True
+                return self._wav.copy()
+        return self._originals["load_wav"](path, sr)
+
+    def _melspectrogram(self, wav):
+        import numpy as np
+
+        # sadtalker 처럼 길이를 맞춘 뒤 호출하면 입력이 달라지므로 같은 배열일 때만 선계산 결과 사용
+        if self._wav is not None and wav.shape == self._wav.shape:
+            self._wait()
+            if self._mel is not None and np.array_equal(wav, self._wav):
+                self._stats["mel_hit"] = True
+                return self._mel.copy()
+        return self._originals["melspectrogram"](wav)
+
+    def stop(self):
+        """원래 함수로 복원하고 선계산 통계 기록"""
+        if self.module is not None:
+            for name, fn in self._originals.items():
+                setattr(self.module, name, fn)
+            report("audio_prefetch", **self._stats)
+            self.module = None
@@ -0,0 +1,164 @@
+"""
+요청 단위 프로파일링
+
+options.profile 이 켜진 잡은 inference 를 프로파일러 아래에서 실행하고, 결과 파일을
+비디오와 함께 응답의 profile 항목(아티팩트)으로 반환합니다.
+
+모드:
+    py-spy   - 프로세스 밖에서 샘플링 (기본, 오버헤드 낮음). flamegraph SVG
+               py-spy 가 없거나 상주 워커에서 실행되면 cprofile 로 대체
+    cprofile - 프로세스 내 cProfile. .prof (snakeviz 등) + 누적 시간 상위 함수 요약
+    torch    - torch.profiler. Chrome trace JSON (chrome://tracing, Perfetto)
+"""
+
+import base64
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from talking_head.metrics import report
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "TALKING_HEAD_PROFILE"
+PROFILE_DIR_ENV = "TALKING_HEAD_PROFILE_DIR"
+PROFILE_RATE_ENV = "TALKING_HEAD_PROFILE_RATE"
+PROFILE_OUTPUT_ENV = "TALKING_HEAD_PROFILE_OUTPUT"
+
+MODES = ("py-spy", "cprofile", "torch")
+DEFAULT_MODE = "py-spy"
+
+# py-spy 샘플링 주기 (Hz). 기본 100 보다 낮춰 운영 트래픽 샘플에도 사용할 수 있게 함
+DEFAULT_RATE = 50
+
+# 이 크기 이하의 아티팩트는 응답에 base64 로 포함
+INLINE_MAX_BYTES = 2 * 1024 * 1024
+
+# cprofile 요약에 포함할 함수 수
+SUMMARY_LINES = 30
+
+
+def profile_mode(option):
+    """options.profile 값 → 모드 (True 면 기본 모드, False/None 이면 None)"""
+    if not option:
+        return None
+    mode = DEFAULT_MODE if option is True else str(option)
+    if mode not in MODES:
+        raise ValueError(f"Unsupported profile mode '{mode}' (expected one of {', '.join(MODES)})")
+    return mode
+
+
+def wrap_command(cmd, env):
+    """
+    핸들러용: py-spy 모드면 명령어를 py-spy record 로 감쌈
+
+    py-spy 를 쓸 수 없으면 env 의 모드를 cprofile 로 바꾸고 원래 명령어를 반환합니다.
+    """
+    if env.get(PROFILE_ENV) != "py-spy":
+        return cmd
+    if not shutil.which("py-spy"):
+        logger.warning("py-spy not found, falling back to cProfile")
+        env[PROFILE_ENV] = "cprofile"
+        return cmd
+
+    os.makedirs(env[PROFILE_DIR_ENV], exist_ok=True)
+    output = os.path.join(env[PROFILE_DIR_ENV], "flamegraph.svg")
+    rate = env.get(PROFILE_RATE_ENV, str(DEFAULT_RATE))
+    # --subprocesses: inference.py 가 띄우는 하위 파이썬 프로세스까지 포함
+    return ["py-spy", "record", "--rate", rate, "--subprocesses", "--nonblocking",
+            "--output", output, "--"] + list(cmd)
+
+
+@contextmanager
+def profile_run():
+    """런처용: 환경 변수로 요청된 프로세스 내 프로파일러로 블록 실행"""
+    mode = os.environ.get(PROFILE_ENV)
+    output_dir = os.environ.get(PROFILE_DIR_ENV)
+    if mode not in ("cprofile", "torch") or not output_dir:
+        yield
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+
+    if mode == "torch":
+        import torch
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        profiler = torch.profiler.profile(activities=activities)
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            profiler.export_chrome_trace(os.path.join(output_dir, "trace.json"))
+            report("profile", mode=mode, profiled_time=round(time.time() - start_time, 3))
+        return
+
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(output_dir, "profile.prof"))
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        with open(os.path.join(output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        report("profile", mode=mode, profiled_time=round(time.time() - start_time, 3))
+
+
+def default_output_dir():
+    if os.environ.get(PROFILE_OUTPUT_ENV):
+        return os.environ[PROFILE_OUTPUT_ENV]
+    if os.path.isdir("/runpod-volume"):
+        return "/runpod-volume/talking_head_profiles"
+    return "/tmp/talking_head_profiles"
+
+
+def collect_artifacts(profile_dir, job_id, launcher_metrics=None):
+    """
+    핸들러용: 프로파일 결과를 작업 디렉토리 밖으로 옮기고 응답용 정보 반환
+
+    Args:
+        profile_dir: 런처 환경의 TALKING_HEAD_PROFILE_DIR
+        job_id: 아티팩트를 보관할 하위 디렉토리명
+        launcher_metrics: 런처 메트릭 (프로세스 내 프로파일러가 기록한 실제 모드 / 시간)
+
+    Returns:
+        mode, 파일별 경로 / 크기 (작으면 base64 포함), cprofile 요약
+    """
+    # py-spy 는 프로세스 밖에서 실행되므로 런처 메트릭에 기록이 없음
+    profile_metrics = (launcher_metrics or {}).get("profile", {})
+    mode = profile_metrics.get("mode", "py-spy")
+
+    if not os.path.isdir(profile_dir) or not os.listdir(profile_dir):
+        return {"mode": mode, "available": False, "message": "Profiler produced no output"}
+
+    target_dir = os.path.join(default_output_dir(), str(job_id))
+    os.makedirs(target_dir, exist_ok=True)
+
+    artifacts, summary = [], None
+    for name in sorted(os.listdir(profile_dir)):
+        path = shutil.move(os.path.join(profile_dir, name), os.path.join(target_dir, name))
+        size = os.path.getsize(path)
+        artifact = {"name": name, "url": f"file://{path}", "size": size}
+        if size <= INLINE_MAX_BYTES:
+            with open(path, "rb") as f:
+                artifact["content_base64"] = base64.b64encode(f.read()).decode("utf-8")
+        if name == "summary.txt":
+            with open(path, encoding="utf-8") as f:
+                summary = f.read()
+        artifacts.append(artifact)
+
+    return {"mode": mode, "available": True, "artifacts": artifacts, "summary": summary,
+            "profiled_time": profile_metrics.get("profiled_time")}
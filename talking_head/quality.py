@@ -0,0 +1,370 @@
+"""
+생성 영상 자동 품질 점수 (립싱크 / 원본 대비 충실도)
+
+- 립싱크: 입 영역 밝기 (입을 벌리면 어두워짐) 시계열과 오디오 프레임별 로그 RMS 의 상관을 ±MAX_OFFSET 프레임
+  지연마다 계산해, 가장 높은 지연을 offset, (최고 상관 - 상관 중앙값) 을 confidence 로 보고합니다
+  (SyncNet 의 offset / confidence 와 같은 형식의 저비용 근사).
+- 충실도: 입 영역을 제외한 픽셀에서 원본 이미지 대비 SSIM / PSNR (입 모양 변화는 충실도에서 제외).
+
+ffmpeg 로 축소된 그레이스케일 프레임을 배치 단위로 읽고, 배치 안의 계산 (입 영역 평균, 적분 영상 기반 SSIM,
+PSNR) 은 NumPy 배열 연산으로 처리하므로 프레임마다 Python 루프를 돌지 않습니다.
+
+사용법:
+    python -m talking_head.quality score --video result.mp4 --image face.png
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+SCORE_QUALITY_OPTION = "score_quality"
+
+BATCH_FRAMES = 64
+# 점수 계산용 축소 크기 (긴 변)
+MAX_SIDE = 384
+SAMPLE_RATE = 16000
+# 립싱크 지연 탐색 범위 (프레임, 25fps 에서 ±0.4초)
+MAX_OFFSET = 10
+# 입 / 오디오 시계열의 느린 변화 (조명, 머리 움직임) 제거용 이동 평균 길이 (프레임)
+DETREND_FRAMES = 25
+SSIM_RADIUS = 3
+# 원본과 출력의 가로세로 비가 이보다 다르면 (preprocess=crop 등) 충실도는 계산하지 않음
+ASPECT_TOLERANCE = 0.02
+
+
+def video_info(path):
+    """(가로, 세로, fps, 프레임 수)"""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    try:
+        return (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                capture.get(cv2.CAP_PROP_FPS) or 25.0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        capture.release()
+
+
+def scaled_size(width, height, max_side=MAX_SIDE):
+    scale = min(1.0, max_side / max(width, height))
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def gray_batches(path, size, batch_frames=BATCH_FRAMES):
+    """ffmpeg 로 축소 그레이스케일 프레임을 (배치, 세로, 가로) uint8 배열로 스트리밍"""
+    import numpy as np
+
+    width, height = size
+    frame_bytes = width * height
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", path, "-vf", f"scale={width}:{height}:flags=area",
+         "-f", "rawvideo", "-pix_fmt", "gray", "-"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * batch_frames)
+            count = len(data) // frame_bytes
+            if not count:
+                break
+            yield np.frombuffer(data[:count * frame_bytes], dtype=np.uint8).reshape(count, height, width)
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def read_audio(path, sample_rate=SAMPLE_RATE):
+    """영상에 들어 있는 오디오를 모노 float32 로 디코딩 (오디오가 없으면 빈 배열)"""
+    import numpy as np
+
+    result = subprocess.run(["ffmpeg", "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate),
+                             "-f", "s16le", "-"], capture_output=True)
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def mouth_box(image, detectors=("yunet", "haar", "hog")):
+    """
+    원본 이미지 (BGR) 의 입 영역 (x1, y1, x2, y2), 찾지 못하면 None
+
+    YuNet 은 입꼬리 랜드마크를 쓰고, 다른 검출기는 얼굴 박스 아래쪽 가운데를 입 영역으로 봅니다.
+    """
+    from talking_head import face_detectors
+
+    height, width = image.shape[:2]
+    for name in detectors:
+        try:
+            detector = face_detectors.create(name)
+            if name == "yunet":
+                detector.detector.setInputSize((width, height))
+                _, faces = detector.detector.detect(image)
+                if faces is None:
+                    continue
+                face = max(faces, key=lambda f: f[-1])
+                x, y, w, h = face[:4]
+                # 랜드마크: 오른눈, 왼눈, 코끝, 오른쪽 입꼬리, 왼쪽 입꼬리 (x, y)
+                (rx, ry), (lx, ly) = face[10:12], face[12:14]
+                half = max(abs(lx - rx) * 0.8, w * 0.2)
+                cx, cy = (rx + lx) / 2, (ry + ly) / 2
+                box = (cx - half, cy - h * 0.15, cx + half, cy + h * 0.2)
+            else:
+                faces = detector.detect(image)
+                if not faces:
+                    continue
+                x1, y1, x2, y2 = faces[0][:4]
+                w, h = x2 - x1, y2 - y1
+                box = (x1 + w * 0.25, y1 + h * 0.6, x2 - w * 0.25, y2)
+        except Exception as e:
+            logger.debug(f"Mouth localisation with {name} unavailable: {e}")
+            continue
+        x1, y1, x2, y2 = (int(round(v)) for v in box)
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+        if x2 - x1 >= 4 and y2 - y1 >= 4:
+            return x1, y1, x2, y2
+    return None
+
+
+def motion_box(frames, fraction=(0.25, 0.15)):
+    """검출기가 없을 때: 시간 분산 합이 가장 큰 창 (입이 가장 많이 움직이는 영역)"""
+    import numpy as np
+
+    variance = frames.astype(np.float32).var(axis=0)
+    height, width = variance.shape
+    box_w, box_h = max(2, int(width * fraction[0])), max(2, int(height * fraction[1]))
+    integral = np.pad(variance.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    sums = (integral[box_h:, box_w:] - integral[:-box_h, box_w:]
+            - integral[box_h:, :-box_w] + integral[:-box_h, :-box_w])
+    y, x = np.unravel_index(np.argmax(sums), sums.shape)
+    return int(x), int(y), int(x + box_w), int(y + box_h)
+
+
+def _box_mean(values, radius):
+    """(B, H, W) 의 (2r+1)^2 창 평균 (적분 영상, 가장자리 r 픽셀을 제외한 valid 영역)"""
+    import numpy as np
+
+    size = 2 * radius + 1
+    # 제곱 합은 float32 누적 오차가 커서 float64 로 누적
+    integral = np.zeros((values.shape[0], values.shape[1] + 1, values.shape[2] + 1), dtype=np.float64)
+    np.cumsum(values, axis=1, dtype=np.float64, out=integral[:, 1:, 1:])
+    np.cumsum(integral[:, 1:, 1:], axis=2, out=integral[:, 1:, 1:])
+    sums = (integral[:, size:, size:] - integral[:, :-size, size:]
+            - integral[:, size:, :-size] + integral[:, :-size, :-size])
+    return (sums / (size * size)).astype(np.float32)
+
+
+class FidelityAccumulator:
+    """원본 이미지 대비 배치별 SSIM / PSNR (mask 가 1 인 픽셀만)"""
+
+    C1 = (0.01 * 255) ** 2
+    C2 = (0.03 * 255) ** 2
+
+    def __init__(self, reference, mask, radius=SSIM_RADIUS):
+        import numpy as np
+
+        self.radius = radius
+        self.reference = reference.astype(np.float32)
+        self.mask = mask.astype(np.float32)
+        self.mask_sum = float(self.mask.sum())
+        ref = self.reference[None]
+        self.mu_ref = _box_mean(ref, radius)
+        self.var_ref = _box_mean(ref * ref, radius) - self.mu_ref ** 2
+        # SSIM 맵은 valid 영역 크기이므로 mask 도 같은 영역으로 자름 (창 안에 입 영역이 걸리면 제외)
+        self.ssim_mask = (_box_mean(self.mask[None], radius)[0] > 0.999).astype(np.float32)
+        self.ssim_mask_sum = float(self.ssim_mask.sum())
+        self.ssim, self.mse = [], []
+
+    def add(self, frames):
+        import numpy as np
+
+        x = frames.astype(np.float32)
+        diff = x - self.reference
+        self.mse.append((diff * diff * self.mask).sum(axis=(1, 2)) / max(self.mask_sum, 1.0))
+
+        mu_x = _box_mean(x, self.radius)
+        var_x = _box_mean(x * x, self.radius) - mu_x ** 2
+        cov = _box_mean(x * self.reference, self.radius) - mu_x * self.mu_ref
+        ssim_map = ((2 * mu_x * self.mu_ref + self.C1) * (2 * cov + self.C2)
+                    / ((mu_x ** 2 + self.mu_ref ** 2 + self.C1) * (var_x + self.var_ref + self.C2)))
+        self.ssim.append((ssim_map * self.ssim_mask).sum(axis=(1, 2)) / max(self.ssim_mask_sum, 1.0))
+
+    def result(self):
+        import numpy as np
+
+        if not self.mse:
+            return None
+        mse = np.concatenate(self.mse)
+        psnr = 10 * np.log10(255.0 ** 2 / np.maximum(mse, 255.0 ** 2 * 1e-10))  # 최대 100dB
+        ssim = np.concatenate(self.ssim)
+        return {
+            "ssim": round(float(ssim.mean()), 4),
+            "min_ssim": round(float(ssim.min()), 4),
+            "psnr_db": round(float(psnr.mean()), 2),
+            "min_psnr_db": round(float(psnr.min()), 2),
+            "compared_fraction": round(self.mask_sum / self.mask.size, 4),
+        }
+
+
+def _detrend(values, window=DETREND_FRAMES):
+    """이동 평균을 빼고 표준화"""
+    import numpy as np
+
+    if len(values) > window:
+        values = values - np.convolve(values, np.ones(window) / window, mode="same")
+    std = values.std()
+    return (values - values.mean()) / std if std > 1e-8 else None
+
+
+def audio_envelope(wav, frames, fps, sample_rate=SAMPLE_RATE):
+    """영상 프레임별 오디오 로그 RMS"""
+    import numpy as np
+
+    per_frame = sample_rate / fps
+    count = min(frames, int(len(wav) / per_frame))
+    if not count:
+        return np.zeros(0)
+    # 프레임 경계가 정수 샘플이 아닐 수 있으므로 각 프레임 시작 위치에서 같은 길이로 자름
+    length = int(per_frame)
+    starts = (np.arange(count) * per_frame).astype(int)
+    windows = np.lib.stride_tricks.sliding_window_view(wav, length)[starts]
+    return np.log(np.sqrt((windows * windows).mean(axis=1)) + 1e-4)
+
+
+def lip_sync(mouth_signal, envelope, fps, max_offset=MAX_OFFSET):
+    """
+    입 영역 시계열 vs 오디오 포락선 지연별 상관
+
+    offset > 0 이면 입 움직임이 오디오보다 offset 프레임 늦습니다.
+    """
+    import numpy as np
+
+    count = min(len(mouth_signal), len(envelope))
+    if count < 4 * max_offset:
+        return None
+    # 입을 벌리면 입 영역이 어두워지므로 밝기에 -1 을 곱해 벌림 정도로 사용
+    mouth = _detrend(-mouth_signal[:count])
+    audio = _detrend(envelope[:count])
+    if mouth is None or audio is None:
+        return None
+
+    full = np.correlate(mouth, audio, mode="full")
+    lags = np.arange(-max_offset, max_offset + 1)
+    correlations = full[count - 1 + lags] / (count - np.abs(lags))
+    best = int(np.argmax(correlations))
+    return {
+        "offset_frames": int(lags[best]),
+        "offset_seconds": round(float(lags[best]) / fps, 3),
+        "peak_correlation": round(float(correlations[best]), 4),
+        "confidence": round(float(correlations[best] - np.median(correlations)), 4),
+    }
+
+
+def combined_score(sync, fidelity):
+    """
+    비교 / 스윕용 단일 점수 (0~1, 높을수록 좋음)
+
+    립싱크: 최고 상관 (0~1) 을 offset 1 프레임 초과분만큼 감쇠, 충실도: 입 밖 SSIM. 한쪽만 있으면 그 값.
+    """
+    parts = []
+    if sync is not None:
+        penalty = 1 + max(0, abs(sync["offset_frames"]) - 1) / 2
+        parts.append(min(1.0, max(0.0, sync["peak_correlation"])) / penalty)
+    if fidelity is not None:
+        parts.append(min(1.0, max(0.0, fidelity["ssim"])))
+    return round(sum(parts) / len(parts), 4) if parts else None
+
+
+def score_video(video_path, image_path, batch_frames=BATCH_FRAMES, max_side=MAX_SIDE):
+    """생성 영상의 립싱크 / 충실도 점수"""
+    import cv2
+    import numpy as np
+
+    start = time.time()
+    width, height, fps, _ = video_info(video_path)
+    if not width or not height:
+        raise ValueError(f"Cannot read video: {video_path}")
+    size = scaled_size(width, height, max_side)
+    scale_x, scale_y = size[0] / width, size[1] / height
+
+    image = cv2.imread(image_path)
+    comparable = image is not None and abs(image.shape[1] / image.shape[0] - width / height) <= \
+        ASPECT_TOLERANCE * (width / height)
+
+    box = None
+    reference = None
+    if comparable:
+        # 출력은 원본과 같은 화면이므로 원본 좌표의 입 영역을 축소 좌표로 변환
+        found = mouth_box(image)
+        if found is not None:
+            sx, sy = size[0] / image.shape[1], size[1] / image.shape[0]
+            box = (int(found[0] * sx), int(found[1] * sy), int(np.ceil(found[2] * sx)), int(np.ceil(found[3] * sy)))
+        reference = cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    fidelity = None
+    mouth_series = []
+    frames = 0
+    for batch in gray_batches(video_path, size, batch_frames):
+        if box is None:
+            box = motion_box(batch)
+        if reference is not None and fidelity is None:
+            mask = np.ones(size[::-1], dtype=np.float32)
+            mask[box[1]:box[3], box[0]:box[2]] = 0
+            fidelity = FidelityAccumulator(reference, mask)
+        mouth_series.append(batch[:, box[1]:box[3], box[0]:box[2]].mean(axis=(1, 2)))
+        if fidelity is not None:
+            fidelity.add(batch)
+        frames += len(batch)
+    decode_done = time.time()
+
+    if not frames:
+        raise ValueError(f"No frames decoded from {video_path}")
+
+    sync = lip_sync(np.concatenate(mouth_series), audio_envelope(read_audio(video_path), frames, fps), fps)
+    fidelity_result = fidelity.result() if fidelity is not None else None
+    elapsed = time.time() - start
+    return {
+        "quality_score": combined_score(sync, fidelity_result),
+        "lip_sync": sync,
+        "fidelity": fidelity_result,
+        "frames": frames,
+        "scored_size": list(size),
+        "mouth_box": [round(box[0] / scale_x), round(box[1] / scale_y),
+                      round(box[2] / scale_x), round(box[3] / scale_y)] if box else None,
+        "scoring_time": round(elapsed, 3),
+        "frame_time": round(decode_done - start, 3),
+        "per_frame_time": round(elapsed / frames, 5),
+    }
+
+
+def try_score(video_path, image_path):
+    """핸들러용: 점수 계산 실패가 잡 실패가 되지 않도록 오류를 결과에 기록"""
+    if not video_path or not os.path.exists(video_path):
+        return None
+    try:
+        return score_video(video_path, image_path)
+    except Exception as e:
+        logger.warning(f"Quality scoring failed for {video_path}: {e}")
+        return {"quality_score": None, "error": str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talking head lip-sync / fidelity scoring")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    score_parser = subparsers.add_parser("score", help="생성 영상 점수 계산")
+    score_parser.add_argument("--video", required=True)
+    score_parser.add_argument("--image", required=True, help="입력 (원본) 이미지")
+    score_parser.add_argument("--batch-frames", type=int, default=BATCH_FRAMES)
+    score_parser.add_argument("--max-side", type=int, default=MAX_SIDE)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(score_video(args.video, args.image, args.batch_frames, args.max_side), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+INT8 양자화 실행 모드 (CPU 전용 워커용)
+
+Wav2Lip 생성기, SadTalker audio2exp / face renderer 의 FP32 ONNX 모델을 INT8 로 양자화합니다.
+
+이미지 빌드 시 (onnx_backend export 이후):
+    # 1. assets/ 입력으로 한 번 실행하면서 각 컴포넌트 입력을 캘리브레이션 데이터로 수집
+    python -m talking_head.quantization calibrate --model wav2lip --image assets/profile.png --audio assets/test.wav
+    # 2. 정적(static) INT8 양자화 (캘리브레이션 데이터가 없는 컴포넌트는 dynamic)
+    python -m talking_head.quantization quantize --onnx-dir /workspace/onnx
+
+요청 시 options.backend = 'int8' 로 선택하며, 일부 호출을 FP32 경로와 비교한
+PSNR 이 응답의 int8_quality 에 포함됩니다.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+from talking_head.launcher import (
+    CALIBRATION_DIR_ENV,
+    MODEL_DIRS,
+    launcher_command,
+    launcher_env,
+)
+from talking_head.onnx_backend import (
+    COMPONENTS,
+    DEFAULT_ONNX_DIR,
+    _arg_value,
+    _import_attr,
+    compare_outputs,
+    summarize_comparisons,
+)
+
+logger = logging.getLogger(__name__)
+
+# 양자화 대상 (s3fd, GFPGAN 은 FP32 ONNX 로 실행)
+QUANTIZED_COMPONENTS = ("wav2lip_generator", "sadtalker_audio2exp", "sadtalker_renderer")
+
+DEFAULT_CALIBRATION_DIR = "/workspace/calibration"
+
+# 컴포넌트당 저장할 최대 캘리브레이션 샘플 수
+MAX_CALIBRATION_SAMPLES = 64
+
+# 응답의 acceptable 판정 기준 (FP32 대비 최소 PSNR)
+DEFAULT_MIN_PSNR_DB = 30.0
+
+# 양자화 후 FP32 대비 비교에 쓰는 캘리브레이션 샘플 수
+VALIDATION_SAMPLES = 8
+
+
+def int8_filename(filename):
+    """FP32 ONNX 파일명 → INT8 파일명"""
+    return filename[:-len(".onnx")] + ".int8.onnx"
+
+
+def calibration_key(name, inference_args=()):
+    """캘리브레이션 샘플 디렉토리명 (renderer 는 해상도별로 입력 크기가 다름)"""
+    if name == "sadtalker_renderer":
+        return f"{name}_{_arg_value(inference_args, '--size', '256')}"
+    return name
+
+
+def _calibration_key_for_file(filename):
+    """ONNX 파일명 → (컴포넌트명, 캘리브레이션 키)"""
+    stem = filename[:-len(".onnx")]
+    for name in QUANTIZED_COMPONENTS:
+        if stem.startswith(name):
+            # Wav2Lip 생성기는 체크포인트가 달라도 입력 분포가 같으므로 샘플 공유
+            return name, (name if name == "wav2lip_generator" else stem)
+    return None, None
+
+
+# ---------------------------------------------------------------------------
+# 캘리브레이션 입력 수집 (런처에서 설치)
+# ---------------------------------------------------------------------------
+
+class _Recorded(Exception):
+    """입력 기록 후 원본 forward 로 넘어가기 위한 신호"""
+
+
+class _InputRecorder:
+    """onnx_backend 의 forward 어댑터가 넘겨주는 텐서를 .npz 로 저장"""
+
+    def __init__(self, directory, max_samples):
+        self.directory = directory
+        self.max_samples = max_samples
+        self.count = 0
+
+    def run(self, *tensors):
+        import numpy as np
+
+        if self.count < self.max_samples:
+            path = os.path.join(self.directory, f"{self.count:04d}.npz")
+            np.savez(path, *[t.detach().cpu().numpy() for t in tensors])
+            self.count += 1
+        raise _Recorded()
+
+
+def _capture_forward(original, recorder, call):
+    def forward(self, *args, **kwargs):
+        try:
+            call(recorder, *args, **kwargs)
+        except _Recorded:
+            pass
+        return original(self, *args, **kwargs)
+
+    return forward
+
+
+def install_capture(model, inference_args, calibration_dir, max_samples=MAX_CALIBRATION_SAMPLES):
+    """런처용: 양자화 대상 컴포넌트의 입력을 calibration_dir 에 기록하도록 패치"""
+    for name in QUANTIZED_COMPONENTS:
+        spec = COMPONENTS[name]
+        if spec["model"] != model:
+            continue
+
+        directory = os.path.join(calibration_dir, calibration_key(name, inference_args))
+        os.makedirs(directory, exist_ok=True)
+
+        cls = _import_attr(spec["target"])
+        cls.forward = _capture_forward(cls.forward, _InputRecorder(directory, max_samples), spec["call"])
+        logger.info(f"Capturing calibration inputs for {name} -> {directory}")
+
+
+def calibrate(model, image_path, audio_path, calibration_dir=DEFAULT_CALIBRATION_DIR, sizes=(256,)):
+    """
+    assets 입력으로 inference.py 를 실행해 캘리브레이션 데이터 수집
+
+    Returns:
+        성공 여부
+    """
+    image_path = os.path.abspath(image_path)
+    audio_path = os.path.abspath(audio_path)
+    work_dir = tempfile.mkdtemp(prefix=f"calibration_{model}_")
+
+    if model == "wav2lip":
+        runs = [[
+            "--checkpoint_path", os.path.join(MODEL_DIRS["wav2lip"], "checkpoints", "wav2lip_gan.pth"),
+            "--face", image_path,
+            "--audio", audio_path,
+            "--outfile", os.path.join(work_dir, "calibration.mp4"),
+        ]]
+    else:
+        runs = [[
+            "--driven_audio", audio_path,
+            "--source_image", image_path,
+            "--result_dir", work_dir,
+            "--still", "--preprocess", "crop",
+            "--size", str(size),
+            "--cpu",
+        ] for size in sizes]
+
+    env = launcher_env({})
+    env[CALIBRATION_DIR_ENV] = os.path.abspath(calibration_dir)
+
+    success = True
+    for inference_args in runs:
+        result = subprocess.run(launcher_command(model, inference_args), capture_output=True,
+                                text=True, env=env)
+        if result.returncode != 0:
+            logger.error(f"Calibration run failed: {result.stderr}")
+            success = False
+
+    return success
+
+
+# ---------------------------------------------------------------------------
+# 양자화
+# ---------------------------------------------------------------------------
+
+def _load_sample(path, input_names):
+    import numpy as np
+
+    with np.load(path) as data:
+        arrays = [data[f"arr_{i}"].astype(np.float32) for i in range(len(input_names))]
+    return dict(zip(input_names, arrays))
+
+
+def check_sample_shapes(session, feeds):
+    """
+    캘리브레이션 샘플이 FP32 모델 입력 shape 과 맞는지 확인
+
+    고정 배치로 export 된 모델에 다른 배치의 샘플(예: SadTalker 기본 --batch_size 2)을 넣으면
+    정적 양자화가 실패하므로 원인을 알 수 있게 미리 검사합니다.
+    """
+    for spec in session.get_inputs():
+        shape = feeds[spec.name].shape
+        expected = spec.shape
+        if len(shape) != len(expected) or any(isinstance(dim, int) and dim != actual
+                                              for dim, actual in zip(expected, shape)):
+            raise ValueError(f"Calibration sample shape {list(shape)} does not match model input "
+                             f"'{spec.name}' {expected} (re-export with talking_head.onnx_backend export)")
+
+
+class CalibrationReader:
+    """onnxruntime.quantization 용 CalibrationDataReader (저장된 .npz 샘플 순회)"""
+
+    def __init__(self, model_path, sample_paths):
+        import onnxruntime as ort
+
+        session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = [spec.name for spec in session.get_inputs()]
+        self.sample_paths = sample_paths
+        if sample_paths:
+            check_sample_shapes(session, _load_sample(sample_paths[0], self.input_names))
+        self._iter = iter(self.sample_paths)
+
+    def get_next(self):
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        return _load_sample(path, self.input_names)
+
+    def rewind(self):
+        self._iter = iter(self.sample_paths)
+
+
+def validate(source, target, sample_paths, max_samples=VALIDATION_SAMPLES):
+    """
+    캘리브레이션 샘플로 FP32 / INT8 모델 출력을 비교 (summarize_comparisons 형식, min_psnr_db 포함)
+    """
+    import onnxruntime as ort
+
+    fp32 = ort.InferenceSession(source, providers=["CPUExecutionProvider"])
+    int8 = ort.InferenceSession(target, providers=["CPUExecutionProvider"])
+    input_names = [spec.name for spec in fp32.get_inputs()]
+    comparisons = []
+    for path in sample_paths[:max_samples]:
+        feeds = _load_sample(path, input_names)
+        comparisons.append(compare_outputs(fp32.run(None, feeds), int8.run(None, feeds)))
+    return summarize_comparisons(comparisons)
+
+
+def quantize(onnx_dir=DEFAULT_ONNX_DIR, calibration_dir=DEFAULT_CALIBRATION_DIR, mode="static",
+             min_psnr_db=DEFAULT_MIN_PSNR_DB):
+    """
+    onnx_dir 의 양자화 대상 FP32 모델을 INT8 로 변환
+
+    캘리브레이션 샘플이 있으면 FP32 대비 PSNR 을 확인하고, min_psnr_db 에 못 미치는 INT8 모델은
+    지워서 런타임에 FP32 로 실행되게 합니다.
+
+    Args:
+        onnx_dir: onnx_backend export 결과 디렉토리
+        calibration_dir: calibrate() 로 수집한 샘플 디렉토리
+        mode: 'static' (캘리브레이션 기반) 또는 'dynamic'
+        min_psnr_db: INT8 모델을 유지할 FP32 대비 최소 PSNR
+
+    Returns:
+        파일별 양자화 결과 딕셔너리
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    results = {}
+    for filename in sorted(os.listdir(onnx_dir)):
+        if not filename.endswith(".onnx") or filename.endswith(".int8.onnx"):
+            continue
+        name, key = _calibration_key_for_file(filename)
+        if name is None:
+            continue
+
+        source = os.path.join(onnx_dir, filename)
+        target = os.path.join(onnx_dir, int8_filename(filename))
+        samples = sorted(glob.glob(os.path.join(calibration_dir, key, "*.npz")))
+
+        try:
+            if mode == "static" and samples:
+                quantize_static(
+                    source, target, CalibrationReader(source, samples),
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                )
+                used_mode = "static"
+            else:
+                quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+                used_mode = "dynamic"
+            validation = validate(source, target, samples) if samples else None
+            if validation:
+                # FP32 parity 허용 오차가 아니라 INT8 PSNR 기준으로 판정
+                validation["passed"] = float(validation.get("min_psnr_db", 0)) >= min_psnr_db
+                if not validation["passed"]:
+                    raise ValueError(f"INT8 output below {min_psnr_db} dB PSNR guardrail: {validation}")
+        except Exception as e:
+            logger.error(f"Quantization failed for {filename}: {e}")
+            results[filename] = {"error": str(e)}
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+
+        results[filename] = {
+            "int8_file": os.path.basename(target),
+            "mode": used_mode,
+            "calibration_samples": len(samples) if used_mode == "static" else 0,
+            "fp32_size_mb": round(os.path.getsize(source) / (1024 * 1024), 2),
+            "int8_size_mb": round(os.path.getsize(target) / (1024 * 1024), 2),
+            "validation": validation,
+        }
+        logger.info(f"Quantized {filename}: {results[filename]}")
+
+    with open(os.path.join(onnx_dir, "quantization.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    return results
+
+
+def quality_summary(launcher_metrics, min_psnr_db=DEFAULT_MIN_PSNR_DB):
+    """
+    핸들러용: 런처 메트릭에서 INT8 vs FP32 품질 지표 요약
+
+    Returns:
+        min_psnr_db, 컴포넌트별 PSNR, acceptable 여부를 담은 딕셔너리
+    """
+    components = launcher_metrics.get("onnx", {}).get("components", {})
+    psnr = {}
+    speed = {}
+    for name, stats in components.items():
+        parity = stats.get("parity") or {}
+        if stats.get("path", "").endswith(".int8.onnx") and "min_psnr_db" in parity:
+            psnr[name] = parity["min_psnr_db"]
+            speed[name] = {"calls": stats.get("calls", 0), "total_time": stats.get("total_time", 0)}
+
+    if not psnr:
+        return {"available": False, "message": "No INT8 components were used"}
+
+    worst = min(psnr.values())
+    return {
+        "available": True,
+        "min_psnr_db": worst,
+        "components": psnr,
+        "int8_timing": speed,
+        "threshold_db": min_psnr_db,
+        "acceptable": worst >= min_psnr_db,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization for CPU workers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calibrate_parser = subparsers.add_parser("calibrate", help="assets 로 캘리브레이션 입력 수집")
+    calibrate_parser.add_argument("--model", choices=sorted(MODEL_DIRS), required=True)
+    calibrate_parser.add_argument("--image", required=True)
+    calibrate_parser.add_argument("--audio", required=True)
+    calibrate_parser.add_argument("--calibration-dir", default=DEFAULT_CALIBRATION_DIR)
+    calibrate_parser.add_argument("--sizes", type=int, nargs="+", default=[256])
+
+    quantize_parser = subparsers.add_parser("quantize", help="FP32 ONNX → INT8 ONNX")
+    quantize_parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    quantize_parser.add_argument("--calibration-dir", default=DEFAULT_CALIBRATION_DIR)
+    quantize_parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    quantize_parser.add_argument("--min-psnr-db", type=float, default=DEFAULT_MIN_PSNR_DB,
+                                 help="INT8 모델을 유지할 FP32 대비 최소 PSNR")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "calibrate":
+        ok = calibrate(args.model, args.image, args.audio, args.calibration_dir, args.sizes)
+        return 0 if ok else 1
+
+    results = quantize(args.onnx_dir, args.calibration_dir, args.mode, args.min_psnr_db)
+    print(json.dumps(results, indent=2))
+    return 0 if any("error" not in r for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
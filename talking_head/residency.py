@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+모델 상주(residency) 관리
+
+잡마다 inference.py 서브프로세스를 새로 띄우면 torch import 와 모델 로드를 매번 반복합니다.
+상주 모드에서는 모델별 워커 프로세스(python -m talking_head.launcher serve <model>)가
+inference.py 를 잡마다 다시 실행하되, 모델을 만드는 생성자 / 로더 호출을 캐시해 두 번째 잡부터는
+이미 로드된 모델을 재사용합니다.
+
+ModelRegistry 는 워커들을 메모리 한도 안에서 유지하고, 한도를 넘으면 가장 오래 사용되지 않은
+유휴 워커부터 종료합니다. 하나의 엔드포인트가 입력의 model 필드로 두 모델을 모두 처리할 수 있어
+(runpod_unified_handler.py) 유휴 용량을 두 엔드포인트로 나누지 않아도 됩니다.
+
+핸들러:
+    result = run_inference("wav2lip", inference_args, env, timeout=600)
+    # TALKING_HEAD_RESIDENT=1 이면 상주 워커, 아니면 기존처럼 서브프로세스로 실행
+"""
+
+import builtins
+import importlib
+import json
+import logging
+import os
+import resource
+import selectors
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from talking_head import interpolation, mel, silence
+from talking_head.launcher import (
+    BACKEND_ENV,
+    MMAP_CHECKPOINTS_ENV,
+    MODEL_DIRS,
+    launcher_command,
+)
+from talking_head.metrics import METRICS_PATH_ENV, report, reset_metrics, write_metrics
+from talking_head.pipeline import AudioPrefetch
+from talking_head.profiling import PROFILE_ENV, profile_run, wrap_command
+from talking_head.rusage import add_rusage, run_with_rusage, rusage_delta, rusage_dict, with_wall_time
+
+logger = logging.getLogger(__name__)
+
+RESIDENT_ENV = "TALKING_HEAD_RESIDENT"
+MEMORY_BUDGET_ENV = "TALKING_HEAD_RESIDENT_MEMORY_MB"
+MAX_WORKERS_ENV = "TALKING_HEAD_RESIDENT_MAX_WORKERS"
+
+# 상주 워커가 잡마다 받아서 적용하는 환경 변수 접두사
+JOB_ENV_PREFIXES = ("TALKING_HEAD_", "OMP_", "MKL_", "OPENBLAS_", "NUMEXPR_")
+
+# 잡 사이에 재사용할 모델 생성자 (업스트림 모듈 속성)
+RESIDENT_FACTORIES = {
+    "wav2lip": ["face_detection.FaceAlignment"],
+    "sadtalker": [
+        "src.utils.preprocess.CropAndExtract",
+        "src.test_audio2coeff.Audio2Coeff",
+        "src.facerender.animate.AnimateFromCoeff",
+        "src.utils.face_enhancer.GFPGANer",
+    ],
+}
+
+# inference.py 안에 정의된 모델 로더 (스크립트 실행 시 캐시 래퍼로 교체)
+RESIDENT_SCRIPT_FUNCTIONS = {
+    "wav2lip": ["load_model"],
+    "sadtalker": [],
+}
+
+# 모델별 워커 메모리 추정치 (MB, 실제 RSS 를 관측하기 전까지 사용)
+DEFAULT_WORKER_MEMORY_MB = {"wav2lip": 2048, "sadtalker": 6144}
+
+
+def _total_memory_mb():
+    """컨테이너 메모리 한도 (cgroup) 또는 시스템 전체 메모리 (MB)"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value != "max" and int(value) < 1 << 60:
+                return int(value) // (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return 16384
+
+
+def _process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# ---------------------------------------------------------------------------
+# 워커 프로세스 측 (launcher serve)
+# ---------------------------------------------------------------------------
+
+class _ResidentCache:
+    """생성자 / 로더 호출 결과를 인자별로 보관 (워커 프로세스 수명 동안 유지)"""
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+
+    def wrap(self, name, create):
+        def cached(*args, **kwargs):
+            key = (name, repr(args), repr(sorted(kwargs.items())))
+            if key in self.entries:
+                self.hits += 1
+            else:
+                self.entries[key] = create(*args, **kwargs)
+            return self.entries[key]
+
+        return cached
+
+    def stats(self):
+        return {"resident_objects": len(self.entries), "cache_hits": self.hits}
+
+
+class _ScriptNamespace(dict):
+    """
+    inference.py 모듈 레벨 이름 저장을 가로채는 locals 매핑
+
+    지정한 함수가 정의되는 순간 캐시 래퍼로 바꿔 globals 에 저장하므로, 스크립트의 main() 이
+    그 함수를 호출할 때 래퍼를 사용합니다. 나머지 이름은 그대로 globals 에 기록됩니다.
+    """
+
+    def __init__(self, module_globals, wrappers):
+        super().__init__()
+        self.module_globals = module_globals
+        self.wrappers = wrappers
+
+    def __setitem__(self, name, value):
+        if name in self.wrappers and callable(value):
+            value = self.wrappers[name](value)
+        self.module_globals[name] = value
+
+    def __getitem__(self, name):
+        return self.module_globals[name]
+
+    def __delitem__(self, name):
+        del self.module_globals[name]
+
+    def __contains__(self, name):
+        return name in self.module_globals
+
+    def get(self, name, default=None):
+        return self.module_globals.get(name, default)
+
+
+def run_script(script, code, wrappers):
+    """inference.py 를 __main__ 으로 실행 (지정한 모듈 레벨 함수는 래퍼로 교체)"""
+    module_globals = {
+        "__name__": "__main__",
+        "__file__": script,
+        "__builtins__": builtins,
+    }
+    exec(code, module_globals, _ScriptNamespace(module_globals, wrappers))
+
+
+def _set_thread_affinity(cpus):
+    # 이미 생성된 torch / OpenMP 스레드까지 모두 새 CPU 집합으로 이동
+    for tid in os.listdir("/proc/self/task"):
+        try:
+            os.sched_setaffinity(int(tid), cpus)
+        except OSError:
+            pass
+
+
+def serve(model):
+    """
+    상주 워커 루프
+
+    stdin 으로 한 줄에 하나씩 잡 요청(JSON)을 받아 실행하고, 결과를 한 줄 JSON 으로 돌려줍니다.
+    inference.py 의 print 출력이 응답과 섞이지 않도록 stdout 은 stderr 로 돌립니다.
+    """
+    from talking_head import launcher
+    from talking_head.checkpoints import memory_usage
+    from talking_head.cpu_scheduler import CPUS_ENV, NUM_THREADS_ENV, parse_cpu_list
+
+    responses = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    repo_dir = MODEL_DIRS[model]
+    script = os.path.join(repo_dir, "inference.py")
+    os.chdir(repo_dir)
+    sys.path.insert(0, repo_dir)
+
+    launcher._profile_startup()
+    launcher._apply_cpu_slot()
+    launcher._install_patches(model, json.loads(os.environ.get("TALKING_HEAD_RESIDENT_ARGS", "[]")))
+    mel.install(model)
+    launcher._time_checkpoint_loads()
+
+    # inference.py 가 from X import Y 로 가져가기 전에 업스트림 모듈 속성을 교체
+    cache = _ResidentCache()
+    for target in RESIDENT_FACTORIES[model]:
+        module_name, attr = target.rsplit(".", 1)
+        try:
+            module = importlib.import_module(module_name)
+            setattr(module, attr, cache.wrap(target, getattr(module, attr)))
+        except (ImportError, AttributeError) as e:
+            logger.warning(f"Cannot keep {target} resident: {e}")
+
+    wrappers = {name: (lambda fn, name=name: cache.wrap(f"inference.{name}", fn))
+                for name in RESIDENT_SCRIPT_FUNCTIONS[model]}
+
+    with open(script, encoding="utf-8") as f:
+        code = compile(f.read(), script, "exec")
+
+    responses.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+    responses.flush()
+
+    base_env = dict(os.environ)
+    for line in sys.stdin:
+        request = json.loads(line)
+        # 이전 잡의 설정이 남지 않도록 시작 시점 환경에서 다시 적용
+        os.environ.clear()
+        os.environ.update(base_env)
+        os.environ.update(request.get("env", {}))
+        if os.environ.get(PROFILE_ENV) == "py-spy":
+            # 상주 워커는 명령어를 감쌀 수 없으므로 프로세스 내 프로파일러 사용
+            os.environ[PROFILE_ENV] = "cprofile"
+        reset_metrics()
+
+        if os.environ.get(CPUS_ENV):
+            _set_thread_affinity(parse_cpu_list(os.environ[CPUS_ENV]))
+        if os.environ.get(NUM_THREADS_ENV):
+            import torch
+            torch.set_num_threads(int(os.environ[NUM_THREADS_ENV]))
+
+        sys.argv = [script] + request["args"]
+        prefetch = AudioPrefetch(model, request["args"]).start()
+        silence.begin_from_env(model, request["args"])
+        interpolation.begin_from_env(model, request["args"])
+        start_time = time.time()
+        # 한 번에 잡 하나만 실행하므로 프로세스 자신 + 자식(ffmpeg) rusage 차이가 잡 사용량
+        usage_self = rusage_dict(resource.getrusage(resource.RUSAGE_SELF))
+        usage_children = rusage_dict(resource.getrusage(resource.RUSAGE_CHILDREN))
+        returncode, error = 0, None
+        try:
+            with profile_run():
+                run_script(script, code, wrappers)
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            error = None if returncode == 0 else f"SystemExit: {e.code}"
+        except BaseException:
+            returncode, error = 1, traceback.format_exc()
+            logger.error(error)
+        finally:
+            prefetch.stop()
+            silence.end()
+            interpolation.end()
+
+        elapsed = time.time() - start_time
+        usage = add_rusage(
+            rusage_delta(usage_self, rusage_dict(resource.getrusage(resource.RUSAGE_SELF))),
+            rusage_delta(usage_children, rusage_dict(resource.getrusage(resource.RUSAGE_CHILDREN))),
+        )
+        report("launcher", model=model, inference_time=round(elapsed, 3))
+        report("residency", worker_pid=os.getpid(), **cache.stats())
+        report("memory", **memory_usage())
+        write_metrics(os.environ.get(METRICS_PATH_ENV))
+
+        responses.write(json.dumps({"returncode": returncode, "error": error,
+                                    "rusage": with_wall_time(usage, elapsed)}) + "\n")
+        responses.flush()
+
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 핸들러 측
+# ---------------------------------------------------------------------------
+
+class ResidentWorker:
+    """모델 하나를 상주시키는 launcher serve 프로세스"""
+
+    def __init__(self, model, key, env, inference_args):
+        self.model = model
+        self.key = key
+        self.busy = False
+        self.jobs = 0
+        self.last_used = time.time()
+        self.log_path = f"/tmp/talking_head_resident_{model}_{int(time.time() * 1000)}.log"
+
+        env = dict(env)
+        env["TALKING_HEAD_RESIDENT_ARGS"] = json.dumps([str(a) for a in inference_args])
+        self._log = open(self.log_path, "ab")
+        self.process = subprocess.Popen(
+            ["python", "-m", "talking_head.launcher", "serve", model],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._log,
+            text=True, env=env, cwd=MODEL_DIRS[model],
+        )
+        self._read_line(timeout=600)
+        logger.info(f"Resident {model} worker started (pid {self.process.pid})")
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def rss_mb(self):
+        return _process_rss_mb(self.process.pid)
+
+    def _read_line(self, timeout):
+        selector = selectors.DefaultSelector()
+        selector.register(self.process.stdout, selectors.EVENT_READ)
+        try:
+            if not selector.select(timeout):
+                raise subprocess.TimeoutExpired(self.process.args, timeout)
+        finally:
+            selector.close()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Resident {self.model} worker exited: {self.stderr_tail()}")
+        return json.loads(line)
+
+    def stderr_tail(self, size=4000):
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(max(0, os.path.getsize(self.log_path) - size))
+                return f.read().decode(errors="replace")
+        except OSError:
+            return ""
+
+    def run(self, inference_args, job_env, timeout):
+        """
+        잡 하나 실행
+
+        Returns:
+            subprocess.run 과 같은 형태의 CompletedProcess (stderr 에는 오류 내용)
+        """
+        offset = os.path.getsize(self.log_path)
+        request = {"args": [str(a) for a in inference_args], "env": job_env}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+        try:
+            response = self._read_line(timeout)
+        except subprocess.TimeoutExpired:
+            # 잡 상태를 알 수 없으므로 워커를 버림
+            self.stop()
+            raise
+        finally:
+            self.jobs += 1
+            self.last_used = time.time()
+
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            log = f.read().decode(errors="replace")
+        stderr = log if response["returncode"] == 0 else (response.get("error") or "") + log[-4000:]
+        result = subprocess.CompletedProcess(request["args"], response["returncode"], "", stderr)
+        result.rusage = response.get("rusage")
+        return result
+
+    def stop(self):
+        if self.alive():
+            self.process.kill()
+            self.process.wait()
+        self._log.close()
+
+    def info(self):
+        return {
+            "model": self.model,
+            "pid": self.process.pid,
+            "jobs": self.jobs,
+            "busy": self.busy,
+            "rss_mb": self.rss_mb(),
+            "idle_seconds": round(time.time() - self.last_used, 1),
+        }
+
+
+class ModelRegistry:
+    """메모리 한도 안에서 상주 워커를 유지하고 LRU 로 종료"""
+
+    def __init__(self, memory_budget_mb=None, max_workers=None):
+        self.memory_budget_mb = int(memory_budget_mb or os.environ.get(
+            MEMORY_BUDGET_ENV, int(_total_memory_mb() * 0.8)))
+        self.max_workers = int(max_workers or os.environ.get(MAX_WORKERS_ENV, 4))
+        self.workers = []
+        self.observed_mb = {}
+        self.evictions = 0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def worker_key(model, inference_args, env):
+        """같은 워커에서 실행할 수 있는 잡의 조건 (설치된 패치가 같아야 함)"""
+        from talking_head.onnx_backend import _arg_value
+
+        backend = env.get(BACKEND_ENV, "pytorch")
+        key = (model, backend, env.get(MMAP_CHECKPOINTS_ENV, "1"))
+        if backend != "pytorch":
+            # ONNX 파일이 체크포인트 / 해상도별로 다름
+            args = [str(a) for a in inference_args]
+            key += (_arg_value(args, "--checkpoint_path"), _arg_value(args, "--size"))
+        return key
+
+    def _estimate_mb(self, model):
+        return self.observed_mb.get(model, DEFAULT_WORKER_MEMORY_MB.get(model, 2048))
+
+    def _used_mb(self):
+        return sum(w.rss_mb() or self._estimate_mb(w.model) for w in self.workers)
+
+    def _evict_for(self, needed_mb):
+        # 잠금을 잡은 상태에서 호출. 유휴 워커를 오래된 순서로 종료
+        idle = sorted((w for w in self.workers if not w.busy), key=lambda w: w.last_used)
+        for worker in idle:
+            if (self._used_mb() + needed_mb <= self.memory_budget_mb
+                    and len(self.workers) < self.max_workers):
+                break
+            logger.info(f"Evicting resident {worker.model} worker (pid {worker.process.pid})")
+            self.workers.remove(worker)
+            worker.stop()
+            self.evictions += 1
+
+    @contextmanager
+    def acquire(self, model, inference_args, env):
+        """같은 조건의 유휴 워커를 찾거나, 메모리가 허용하면 새로 시작"""
+        key = self.worker_key(model, inference_args, env)
+        with self._cond:
+            while True:
+                self.workers = [w for w in self.workers if w.alive()]
+                worker = next((w for w in self.workers if w.key == key and not w.busy), None)
+                if worker:
+                    break
+                needed = self._estimate_mb(model)
+                self._evict_for(needed)
+                fits = self._used_mb() + needed <= self.memory_budget_mb
+                if (fits and len(self.workers) < self.max_workers) or not self.workers:
+                    worker = None
+                    break
+                self._cond.wait(timeout=5)
+            if worker:
+                worker.busy = True
+
+        if worker is None:
+            # 모델 로드는 오래 걸리므로 잠금 밖에서 시작
+            worker = ResidentWorker(model, key, env, inference_args)
+            worker.busy = True
+            with self._cond:
+                self.workers.append(worker)
+
+        try:
+            yield worker
+        finally:
+            with self._cond:
+                rss = worker.rss_mb()
+                if rss:
+                    self.observed_mb[model] = max(rss, self.observed_mb.get(model, 0))
+                worker.busy = False
+                self._cond.notify_all()
+
+    def run(self, model, inference_args, env, timeout):
+        job_env = {k: v for k, v in env.items() if k.startswith(JOB_ENV_PREFIXES)}
+        with self.acquire(model, inference_args, env) as worker:
+            return worker.run(inference_args, job_env, timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "memory_budget_mb": self.memory_budget_mb,
+                "used_mb": round(self._used_mb(), 1),
+                "evictions": self.evictions,
+                "workers": [w.info() for w in self.workers],
+            }
+
+    def shutdown(self):
+        with self._cond:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """프로세스 전체에서 공유하는 ModelRegistry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+def resident_enabled():
+    return os.environ.get(RESIDENT_ENV) == "1"
+
+
+def run_inference(model, inference_args, env, timeout):
+    """
+    핸들러용: inference.py 실행 (상주 워커 또는 서브프로세스)
+
+    Returns:
+        subprocess.CompletedProcess (returncode, stderr, rusage 속성에 잡 자원 사용량)
+    """
+    if resident_enabled():
+        return registry().run(model, inference_args, env, timeout)
+    # options.profile 이 py-spy 이면 런처 프로세스를 샘플링 프로파일러 아래에서 실행
+    env = dict(env)
+    cmd = wrap_command(launcher_command(model, inference_args), env)
+    return run_with_rusage(cmd, timeout=timeout, env=env)
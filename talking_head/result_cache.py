@@ -0,0 +1,217 @@
+"""
+렌더링 결과 캐시
+
+같은 이미지 / 오디오 / 옵션으로 다시 들어온 요청(재시도, 반복 마케팅 렌더)은 저장된 비디오를
+바로 반환합니다. 캐시 키는 입력 파일 내용 해시 + 기본값이 적용된 옵션 + 모델/체크포인트 버전입니다.
+
+저장 위치는 로컬 디스크 또는 여러 워커가 공유하는 네트워크 볼륨이며, 파일 잠금(fcntl.flock)으로
+동시 쓰기를 보호하고 전체 크기가 한도를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다.
+
+    <cache_dir>/<key[:2]>/<key>/output.mp4
+    <cache_dir>/<key[:2]>/<key>/meta.json
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_ENV = "TALKING_HEAD_CACHE_DIR"
+CACHE_MAX_BYTES_ENV = "TALKING_HEAD_CACHE_MAX_BYTES"
+MODEL_VERSION_ENV = "TALKING_HEAD_MODEL_VERSION"
+
+# RunPod 네트워크 볼륨이 마운트되어 있으면 워커끼리 공유
+SHARED_VOLUME_DIR = "/runpod-volume"
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+# 출력에 영향을 주지 않는 옵션 (캐시 키에서 제외)
+NON_OUTPUT_OPTIONS = {
+    "use_cache",
+    "parity_check",
+    "quality_samples",
+    "int8_min_psnr_db",
+    "onnx_intra_op_threads",
+    "onnx_inter_op_threads",
+    "mmap_checkpoints",
+    "score_quality",
+}
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """파일 내용 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(paths):
+    """
+    체크포인트 파일 목록의 버전 식별자
+
+    파일명 / 크기 / 수정 시각으로 계산하므로 큰 체크포인트를 매번 해시하지 않습니다.
+    디렉토리는 하위 파일 전체를 포함합니다.
+    """
+    entries = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    entries.append(os.path.join(root, name))
+        elif os.path.exists(path):
+            entries.append(path)
+
+    digest = hashlib.sha256(os.environ.get(MODEL_VERSION_ENV, "").encode())
+    for entry in entries:
+        stat = os.stat(entry)
+        digest.update(f"{entry}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def normalize_options(options):
+    """출력에 영향을 주는 옵션만 정렬된 JSON 으로 정규화"""
+    relevant = {k: v for k, v in options.items() if k not in NON_OUTPUT_OPTIONS}
+    return json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(model, input_paths, options, version):
+    """
+    캐시 키 계산
+
+    Args:
+        model: 모델명 (sadtalker, wav2lip)
+        input_paths: 입력 파일 경로 목록 (이미지, 오디오)
+        options: 기본값이 적용된 실제 사용 옵션
+        version: model_version() 결과
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode())
+    digest.update(version.encode())
+    for path in input_paths:
+        digest.update(file_sha256(path).encode())
+    digest.update(normalize_options(options).encode())
+    return digest.hexdigest()
+
+
+def default_cache_dir():
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.environ[CACHE_DIR_ENV]
+    if os.path.isdir(SHARED_VOLUME_DIR):
+        return os.path.join(SHARED_VOLUME_DIR, "talking_head_cache")
+    return "/tmp/talking_head_cache"
+
+
+class ResultCache:
+    """파일 잠금 + 크기 기반 LRU 삭제를 하는 디스크 캐시"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = int(max_bytes or os.environ.get(CACHE_MAX_BYTES_ENV, DEFAULT_MAX_BYTES))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    @contextmanager
+    def _lock(self, shared=False):
+        # 캐시 전체에 대한 잠금 (쓰기 / 삭제는 배타, 읽기는 공유)
+        with open(os.path.join(self.cache_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """
+        캐시 조회
+
+        Returns:
+            저장된 메타데이터 (video_path 포함) 또는 None
+        """
+        entry_dir = self._entry_dir(key)
+        with self._lock(shared=True):
+            try:
+                with open(os.path.join(entry_dir, "meta.json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                return None
+            video_path = os.path.join(entry_dir, meta.get("video_file", "output.mp4"))
+            if not os.path.exists(video_path):
+                return None
+            # LRU 판단용 마지막 사용 시각
+            os.utime(entry_dir, None)
+
+        meta["video_path"] = video_path
+        return meta
+
+    def put(self, key, video_path, metadata=None):
+        """
+        결과 저장 후 한도를 넘으면 오래된 항목 삭제
+
+        Returns:
+            캐시에 저장된 비디오 경로
+        """
+        entry_dir = self._entry_dir(key)
+        video_file = "output" + os.path.splitext(video_path)[1]
+        tmp_dir = f"{entry_dir}.tmp.{os.getpid()}.{int(time.time() * 1000)}"
+
+        os.makedirs(tmp_dir, exist_ok=True)
+        shutil.copy2(video_path, os.path.join(tmp_dir, video_file))
+        meta = dict(metadata or {})
+        meta.update({"key": key, "video_file": video_file, "created_at": time.time()})
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, default=str)
+
+        with self._lock():
+            if os.path.exists(entry_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+                os.rename(tmp_dir, entry_dir)
+            self._evict()
+
+        return os.path.join(entry_dir, video_file)
+
+    def _entries(self):
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if prefix.startswith(".") or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if ".tmp." in name:
+                    continue
+                entry_dir = os.path.join(prefix_dir, name)
+                size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+                yield entry_dir, size, os.path.getmtime(entry_dir)
+
+    def _evict(self):
+        # 잠금을 잡은 상태에서 호출
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for entry_dir, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Evicting cache entry {entry_dir} ({size} bytes)")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        with self._lock(shared=True):
+            entries = list(self._entries())
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "total_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
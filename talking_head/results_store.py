@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+성능 결과 저장소 (SQLite)
+
+벤치마크 / 비교 테스트의 잡별 측정값을 모델, 옵션, 이미지 버전, 호스트 프로파일별로 누적하고,
+기준(baseline)과 후보(candidate) 사이의 지연 시간 / 비용 차이를 bootstrap 신뢰 구간으로 비교합니다.
+
+기록하는 쪽:
+    test_comparison.py, sweep_benchmark.py, python -m talking_head.workload bench
+
+조회 / 비교:
+    python -m talking_head.results_store runs
+    python -m talking_head.results_store trend --model wav2lip --metric latency
+    python -m talking_head.results_store compare --baseline v1.2 --candidate v1.3
+    # 후보가 유의하게 느려지거나 비싸지면 종료 코드 1
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DB_ENV = "TALKING_HEAD_RESULTS_DB"
+IMAGE_VERSION_ENV = "TALKING_HEAD_IMAGE_VERSION"
+
+DEFAULT_DB_PATH = "talking_head_results.sqlite"
+
+METRICS = ("latency", "cost", "file_size", "max_rss_mb")
+
+# 저장 키에서 제외할 옵션 (성능과 무관)
+IGNORED_OPTIONS = {"use_cache", "profile"}
+
+BOOTSTRAP_SAMPLES = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    model TEXT NOT NULL,
+    options TEXT NOT NULL,
+    options_hash TEXT NOT NULL,
+    image_version TEXT NOT NULL,
+    host_profile TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    latency REAL,
+    cost REAL,
+    file_size INTEGER,
+    max_rss_mb REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS results_key
+    ON results (model, options_hash, image_version, host_profile, timestamp);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+
+def default_db_path():
+    return os.environ.get(RESULTS_DB_ENV, DEFAULT_DB_PATH)
+
+
+def image_version(default="unknown"):
+    """결과를 만든 이미지 버전 (TALKING_HEAD_IMAGE_VERSION, 빌드 태그 / 커밋 등)"""
+    return os.environ.get(IMAGE_VERSION_ENV, default)
+
+
+def host_profile(gpu_type=None, endpoint_id=None):
+    """
+    측정 환경 식별자
+
+    원격 엔드포인트 결과는 GPU 타입 / 엔드포인트, 이미지 안에서 실행한 결과는 CPU 모델 / 코어 수 / 메모리로 구분합니다.
+    """
+    if gpu_type or endpoint_id:
+        return "/".join(part for part in ("runpod", gpu_type, endpoint_id) if part)
+
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    try:
+        memory_gb = round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3)
+    except (ValueError, OSError):
+        memory_gb = None
+    return f"{cpu}/{len(os.sched_getaffinity(0))}cpu/{memory_gb}GB"
+
+
+def options_key(options):
+    relevant = {k: v for k, v in (options or {}).items() if k not in IGNORED_OPTIONS}
+    text = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+    return text, hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def new_run_id(source):
+    return f"{source}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+class ResultsStore:
+    """잡별 측정값 저장 / 조회"""
+
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def record(self, run_id, source, model, options, success, latency=None, cost=None, file_size=None,
+               max_rss_mb=None, version=None, host=None, **extra):
+        """
+        잡 하나의 결과 추가
+
+        Args:
+            run_id: 같은 벤치마크 실행을 묶는 ID (new_run_id)
+            source: 기록한 도구 (comparison, sweep, workload)
+            latency: 실행 시간 (초)
+            version: 이미지 버전 (기본: TALKING_HEAD_IMAGE_VERSION)
+            host: host_profile() 결과 (기본: 현재 호스트)
+            extra: 그 밖에 함께 남길 값 (JSON)
+        """
+        options_text, options_hash = options_key(options)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO results (run_id, source, timestamp, model, options, options_hash, image_version, "
+                "host_profile, success, latency, cost, file_size, max_rss_mb, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, source, time.time(), model, options_text, options_hash,
+                 version or image_version(), host or host_profile(), int(bool(success)),
+                 latency, cost, file_size, max_rss_mb, json.dumps(extra, default=str) if extra else None),
+            )
+
+    def runs(self, limit=20):
+        return self.conn.execute(
+            "SELECT run_id, source, model, image_version, host_profile, MIN(timestamp) AS started, "
+            "COUNT(*) AS jobs, SUM(success) AS succeeded, AVG(latency) AS mean_latency "
+            "FROM results GROUP BY run_id, model ORDER BY started DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def trend(self, model, metric="latency", options_hash=None, host=None, limit=30):
+        """이미지 버전 / 실행별 지표 추이 (최근 순)"""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}' (expected one of {', '.join(METRICS)})")
+        query = (f"SELECT run_id, image_version, host_profile, options, MIN(timestamp) AS started, "
+                 f"COUNT({metric}) AS samples, AVG({metric}) AS mean, MIN({metric}) AS min, "
+                 f"MAX({metric}) AS max FROM results WHERE model = ? AND success = 1 AND {metric} IS NOT NULL")
+        params = [model]
+        if options_hash:
+            query += " AND options_hash = ?"
+            params.append(options_hash)
+        if host:
+            query += " AND host_profile = ?"
+            params.append(host)
+        query += " GROUP BY run_id, options_hash ORDER BY started DESC LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(query, params).fetchall()
+
+    def samples(self, selector, metric, model=None, options_hash=None, host=None):
+        """
+        선택자(run_id 또는 image_version)에 해당하는 성공 잡의 측정값을 (model, options_hash, host_profile) 별로 반환
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}' (expected one of {', '.join(METRICS)})")
+        query = (f"SELECT model, options_hash, options, host_profile, {metric} AS value FROM results "
+                 f"WHERE success = 1 AND {metric} IS NOT NULL AND (run_id = ? OR image_version = ?)")
+        params = [selector, selector]
+        for column, value in (("model", model), ("options_hash", options_hash), ("host_profile", host)):
+            if value:
+                query += f" AND {column} = ?"
+                params.append(value)
+
+        groups = {}
+        for row in self.conn.execute(query, params):
+            # 다른 호스트의 결과는 섞지 않음
+            group = groups.setdefault((row["model"], row["options_hash"], row["host_profile"]),
+                                      {"options": json.loads(row["options"]), "values": []})
+            group["values"].append(row["value"])
+        return groups
+
+    def history(self, model=None, source=None, host_prefix=None, version=None, success=None, limit=None):
+        """
+        잡별 기록 (오래된 순, options / extra 는 dict 로 변환)
+
+        host_prefix 는 host_profile 앞부분 일치 (예: "runpod/" 는 원격 엔드포인트 기록만)
+        """
+        query = "SELECT * FROM results WHERE 1 = 1"
+        params = []
+        for column, value in (("model", model), ("source", source), ("image_version", version)):
+            if value:
+                query += f" AND {column} = ?"
+                params.append(value)
+        if host_prefix:
+            query += " AND host_profile LIKE ?"
+            params.append(host_prefix.replace("%", r"\%").replace("_", r"\_") + "%")
+            query += r" ESCAPE '\'"
+        if success is not None:
+            query += " AND success = ?"
+            params.append(int(bool(success)))
+        query += " ORDER BY timestamp DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = []
+        for row in self.conn.execute(query, params):
+            entry = dict(row)
+            entry["options"] = json.loads(entry["options"])
+            entry["extra"] = json.loads(entry["extra"]) if entry["extra"] else {}
+            rows.append(entry)
+        rows.reverse()
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+# ---------------------------------------------------------------------------
+# 통계 비교
+# ---------------------------------------------------------------------------
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def bootstrap_ratio(baseline, candidate, samples=BOOTSTRAP_SAMPLES, confidence=0.95, seed=0):
+    """
+    candidate 평균 / baseline 평균 비율의 bootstrap 신뢰 구간
+
+    Returns:
+        ratio, low, high (1 보다 크면 후보가 더 큼)
+    """
+    rng = random.Random(seed)
+    ratios = []
+    for _ in range(samples):
+        base = _mean([rng.choice(baseline) for _ in baseline])
+        cand = _mean([rng.choice(candidate) for _ in candidate])
+        if base > 0:
+            ratios.append(cand / base)
+    ratios.sort()
+    alpha = (1 - confidence) / 2
+    low = ratios[int(alpha * (len(ratios) - 1))]
+    high = ratios[int((1 - alpha) * (len(ratios) - 1))]
+    base_mean = _mean(baseline)
+    return {
+        "ratio": round(_mean(candidate) / base_mean, 4) if base_mean > 0 else None,
+        "low": round(low, 4),
+        "high": round(high, 4),
+    }
+
+
+def compare(store, baseline, candidate, metrics=("latency", "cost"), threshold=0.05, min_samples=3,
+            confidence=0.95, model=None, host=None):
+    """
+    기준 / 후보 비교
+
+    같은 (모델, 옵션, 호스트) 조합끼리 비교하며, 비율 신뢰 구간의 하한이 1 + threshold 를 넘으면 regression 입니다.
+    지원하지 않는 지표가 있으면 ValueError 입니다.
+
+    Returns:
+        comparisons (조합 / 지표별 결과), regressions (regression 인 항목 수)
+    """
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric(s) {', '.join(unknown)} (expected one of {', '.join(METRICS)})")
+
+    comparisons, regressions = [], 0
+    for metric in metrics:
+        base_groups = store.samples(baseline, metric, model=model, host=host)
+        cand_groups = store.samples(candidate, metric, model=model, host=host)
+        for key in sorted(set(base_groups) & set(cand_groups)):
+            base_values, cand_values = base_groups[key]["values"], cand_groups[key]["values"]
+            entry = {
+                "model": key[0],
+                "options": base_groups[key]["options"],
+                "host_profile": key[2],
+                "metric": metric,
+                "baseline_samples": len(base_values),
+                "candidate_samples": len(cand_values),
+            }
+            if len(base_values) < min_samples or len(cand_values) < min_samples:
+                entry["status"] = "insufficient_samples"
+            else:
+                entry.update(bootstrap_ratio(base_values, cand_values, confidence=confidence))
+                if entry["low"] > 1 + threshold:
+                    entry["status"] = "regression"
+                    regressions += 1
+                elif entry["high"] < 1 - threshold:
+                    entry["status"] = "improvement"
+                else:
+                    entry["status"] = "no_significant_change"
+            comparisons.append(entry)
+    return {"comparisons": comparisons, "regressions": regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talking head performance results store")
+    parser.add_argument("--db", default=None, help=f"SQLite 경로 (기본: ${RESULTS_DB_ENV} 또는 {DEFAULT_DB_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = subparsers.add_parser("runs", help="최근 실행 목록")
+    runs_parser.add_argument("--limit", type=int, default=20)
+
+    trend_parser = subparsers.add_parser("trend", help="모델 / 옵션별 지표 추이")
+    trend_parser.add_argument("--model", required=True)
+    trend_parser.add_argument("--metric", choices=METRICS, default="latency")
+    trend_parser.add_argument("--options-hash")
+    trend_parser.add_argument("--host")
+    trend_parser.add_argument("--limit", type=int, default=30)
+
+    compare_parser = subparsers.add_parser("compare", help="기준 / 후보 bootstrap 비교 (regression 이면 종료 코드 1)")
+    compare_parser.add_argument("--baseline", required=True, help="run_id 또는 image_version")
+    compare_parser.add_argument("--candidate", required=True, help="run_id 또는 image_version")
+    compare_parser.add_argument("--metrics", default="latency,cost")
+    compare_parser.add_argument("--threshold", type=float, default=0.05, help="허용 증가율 (기본 5%%)")
+    compare_parser.add_argument("--confidence", type=float, default=0.95)
+    compare_parser.add_argument("--min-samples", type=int, default=3)
+    compare_parser.add_argument("--model")
+    compare_parser.add_argument("--host")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    store = ResultsStore(args.db)
+
+    if args.command == "runs":
+        for row in store.runs(args.limit):
+            started = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["started"]))
+            mean = f"{row['mean_latency']:.2f}s" if row["mean_latency"] is not None else "-"
+            print(f"{started}  {row['run_id']:<40} {row['model']:<10} {row['image_version']:<12} "
+                  f"{row['succeeded']}/{row['jobs']}  {mean}")
+        return 0
+
+    if args.command == "trend":
+        for row in store.trend(args.model, args.metric, args.options_hash, args.host, args.limit):
+            started = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["started"]))
+            print(f"{started}  {row['image_version']:<12} n={row['samples']:<3} mean={row['mean']:.3f} "
+                  f"min={row['min']:.3f} max={row['max']:.3f}  {row['options']}")
+        return 0
+
+    try:
+        result = compare(store, args.baseline, args.candidate, metrics=args.metrics.split(","),
+                         threshold=args.threshold, min_samples=args.min_samples, confidence=args.confidence,
+                         model=args.model, host=args.host)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if not result["comparisons"]:
+        print("No comparable (model, options, host) groups between baseline and candidate")
+        return 2
+    return 1 if result["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
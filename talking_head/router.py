@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+지연 시간 / 비용 예산 라우터 (클라이언트용)
+
+호출하는 쪽이 SadTalker / Wav2Lip 엔드포인트를 직접 고르는 대신, 오디오 길이와 지연 시간 또는 비용 예산을
+주면 성능 결과 저장소(talking_head.results_store)에 쌓인 잡별 기록으로 (모델, 옵션) 조합마다 실행 시간을
+예측하고, 예산을 만족하는 조합 중 가장 싼 것으로 보냅니다.
+
+예측 모델 (조합별):
+    실행 시간 = fixed + rate * audio_seconds    (workload 와 같은 최소제곱 직선, 길이가 한 가지면 비율)
+    지연 시간 = 실행 시간 + 큐 대기(delayTime 중앙값)
+    비용     = 실행 시간 * 기록된 초당 비용 (없으면 GPU 시간당 요금)
+
+예산 비교에는 잔차 표준편차로 구한 상한(기본 90% 단측)을 씁니다. 예산을 만족하는 조합이 없으면
+지연 예산이 있을 때는 가장 빠른 조합, 아니면 가장 싼 조합을 budget_met=False 로 고릅니다.
+
+실행 결과는 예측값 / 예측 오차와 함께 source="router" 로 저장소에 다시 기록되므로, 다음 적합에 그대로
+반영되고 errors 명령으로 모델별 오차를 확인할 수 있습니다.
+
+핸들러 응답의 audio_seconds 와 pipeline 단계 시간이 필요하므로 test_comparison.py / sweep_benchmark.py 로
+기록한 결과를 사용합니다 (workload bench 기록은 --host-prefix 로 해당 호스트를 지정하면 오디오 길이 축
+audio_seconds_* 기록만 사용, 이미지 해상도 축 image_pixels_* 는 제외).
+
+사용법:
+    python -m talking_head.router predict --audio-seconds 30 --latency-budget 60
+    python -m talking_head.router run --image face.png --audio speech.wav --cost-budget 0.02
+    python -m talking_head.router replay          # 기록된 시간만으로 시간순 예측 오차 재현 (로컬)
+    python -m talking_head.router errors
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from statistics import NormalDist, median
+
+logger = logging.getLogger(__name__)
+
+MODELS = ("sadtalker", "wav2lip")
+
+# 조합 구분에서 제외할 옵션 (출력 / 실행 시간과 무관하거나 workload 기록용)
+EXCLUDED_OPTIONS = {"use_cache", "profile", "score_quality", "axis", "input_size"}
+
+# 원격 엔드포인트 기록만 사용 (로컬 / 이미지 안 벤치마크 제외)
+DEFAULT_HOST_PREFIX = "runpod/"
+
+# 조합별 최소 기록 수 / 적합에 쓸 최근 기록 수
+MIN_SAMPLES = 3
+WINDOW = 200
+
+DEFAULT_CONFIDENCE = 0.9
+
+# 기록에 비용이 없을 때 쓰는 GPU 시간당 요금 (test_comparison.py 와 같은 값)
+GPU_HOURLY_COSTS = {"rtx_4090": 1.10, "rtx_4080": 0.89, "a100": 2.89}
+DEFAULT_HOURLY_COST = GPU_HOURLY_COSTS["rtx_4090"]
+
+
+def options_label(options):
+    return json.dumps(options, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def route_options(options):
+    """조합 구분에 쓰는 옵션 (EXCLUDED_OPTIONS 제외)"""
+    return {k: v for k, v in (options or {}).items() if k not in EXCLUDED_OPTIONS}
+
+
+def hourly_cost(host):
+    """host_profile("runpod/<gpu>/<endpoint>") 의 GPU 시간당 요금"""
+    parts = (host or "").split("/")
+    return GPU_HOURLY_COSTS.get(parts[1] if len(parts) > 1 else "", DEFAULT_HOURLY_COST)
+
+
+def sample_from_row(row):
+    """
+    저장소 기록 → 적합용 표본 (성공했고 오디오 길이 / 실행 시간이 있는 기록만, 캐시 적중 제외)
+    """
+    extra = row["extra"]
+    options = row["options"]
+    if not row["success"] or row["latency"] is None or extra.get("cache_hit"):
+        return None
+
+    audio_seconds = extra.get("audio_seconds")
+    if audio_seconds is None and "axis" in options:
+        # workload bench 기록은 축(audio_seconds_<kind> / image_pixels_<kind>)의 입력 크기를 input_size 로 남김
+        if not str(options["axis"]).startswith("audio_seconds"):
+            return None
+        audio_seconds = options.get("input_size")
+    if not audio_seconds:
+        return None
+
+    return {
+        "model": row["model"],
+        "options": route_options(options),
+        "audio_seconds": float(audio_seconds),
+        "execution": float(row["latency"]),
+        "delay": float(extra.get("delay_time") or 0.0),
+        "cost": row["cost"],
+        "host": row["host_profile"],
+        "timestamp": row["timestamp"],
+        "source": row["source"],
+    }
+
+
+def load_samples(store, host_prefix=DEFAULT_HOST_PREFIX, version=None, model=None):
+    samples = []
+    for row in store.history(model=model, host_prefix=host_prefix, version=version, success=True):
+        sample = sample_from_row(row)
+        if sample:
+            samples.append(sample)
+    return samples
+
+
+class RuntimeModel:
+    """(모델, 옵션) 조합 하나의 실행 시간 / 큐 대기 / 비용 예측"""
+
+    def __init__(self, model, options, samples, confidence=DEFAULT_CONFIDENCE):
+        from talking_head.workload import _linear_fit
+
+        self.model = model
+        self.options = options
+        self.samples = len(samples)
+        xs = [s["audio_seconds"] for s in samples]
+        ys = [s["execution"] for s in samples]
+
+        if len(set(xs)) > 1:
+            self.rate, self.fixed, self.r2 = _linear_fit(xs, ys)
+        else:
+            self.rate, self.fixed, self.r2 = 0.0, 0.0, None
+        if len(set(xs)) == 1 or self.rate < 0 or self.fixed < 0:
+            # 길이가 한 가지이거나 직선이 물리적으로 맞지 않으면 초당 비율로 (고정 비용은 rate 에 포함)
+            self.rate, self.fixed, self.r2 = median(y / x for x, y in zip(xs, ys)), 0.0, None
+
+        residuals = [y - self.fixed - self.rate * x for x, y in zip(xs, ys)]
+        dof = max(1, len(residuals) - (2 if self.r2 is not None else 1))
+        self.residual_std = math.sqrt(sum(r * r for r in residuals) / dof)
+        self.margin = NormalDist().inv_cdf(confidence) * self.residual_std
+
+        self.delay = median(s["delay"] for s in samples)
+        cost_rates = [s["cost"] / s["execution"] for s in samples if s["cost"] and s["execution"] > 0]
+        self.cost_per_second = (median(cost_rates) if cost_rates
+                                else hourly_cost(samples[-1]["host"]) / 3600)
+
+    def predict(self, audio_seconds):
+        execution = self.fixed + self.rate * audio_seconds
+        return {
+            "model": self.model,
+            "options": self.options,
+            "predicted_execution": round(execution, 3),
+            "predicted_latency": round(execution + self.delay, 3),
+            "predicted_latency_upper": round(execution + self.delay + self.margin, 3),
+            "predicted_cost": round(execution * self.cost_per_second, 6),
+            "samples": self.samples,
+        }
+
+    def describe(self):
+        return {
+            "model": self.model,
+            "options": self.options,
+            "samples": self.samples,
+            "fixed": round(self.fixed, 3),
+            "rate": round(self.rate, 4),
+            "r2": round(self.r2, 4) if self.r2 is not None else None,
+            "residual_std": round(self.residual_std, 3),
+            "delay": round(self.delay, 3),
+            "cost_per_second": round(self.cost_per_second, 8),
+        }
+
+
+def fit_models(samples, min_samples=MIN_SAMPLES, window=WINDOW, confidence=DEFAULT_CONFIDENCE):
+    """표본을 (모델, 옵션) 별로 묶어 최근 window 개로 적합 (min_samples 미만인 조합은 제외)"""
+    groups = {}
+    for sample in samples:
+        groups.setdefault((sample["model"], options_label(sample["options"])), []).append(sample)
+    models = {}
+    for key, group in groups.items():
+        if len(group) >= min_samples:
+            models[key] = RuntimeModel(key[0], group[0]["options"], group[-window:], confidence)
+    return models
+
+
+def select(predictions, latency_budget=None, cost_budget=None):
+    """
+    예산을 만족하는 조합 중 가장 싼 것 (같으면 빠른 것)
+
+    Returns:
+        (선택한 예측, budget_met)
+    """
+    if not predictions:
+        return None, False
+    fits = [p for p in predictions
+            if (latency_budget is None or p["predicted_latency_upper"] <= latency_budget)
+            and (cost_budget is None or p["predicted_cost"] <= cost_budget)]
+    if fits:
+        return min(fits, key=lambda p: (p["predicted_cost"], p["predicted_latency"])), True
+    if latency_budget is not None:
+        return min(predictions, key=lambda p: (p["predicted_latency"], p["predicted_cost"])), False
+    return min(predictions, key=lambda p: (p["predicted_cost"], p["predicted_latency"])), False
+
+
+class LatencyRouter:
+    """
+    예산 기반 모델 / 옵션 선택과 실행
+
+    Args:
+        store: ResultsStore (기본: TALKING_HEAD_RESULTS_DB)
+        host_prefix: 적합에 사용할 기록의 host_profile 접두어
+        version: 이미지 버전 (없으면 모든 버전)
+        models: 후보 모델 (기본: 전부)
+    """
+
+    def __init__(self, store=None, host_prefix=DEFAULT_HOST_PREFIX, version=None, models=MODELS,
+                 min_samples=MIN_SAMPLES, window=WINDOW, confidence=DEFAULT_CONFIDENCE):
+        from talking_head.results_store import ResultsStore
+
+        self.store = store or ResultsStore()
+        self.host_prefix = host_prefix
+        self.version = version
+        self.models = set(models)
+        self.min_samples = min_samples
+        self.window = window
+        self.confidence = confidence
+        self.fitted = {}
+
+    def fit(self):
+        samples = [s for s in load_samples(self.store, self.host_prefix, self.version)
+                   if s["model"] in self.models]
+        self.fitted = fit_models(samples, self.min_samples, self.window, self.confidence)
+        logger.info(f"Fitted {len(self.fitted)} model/option combinations from {len(samples)} samples")
+        return self.fitted
+
+    def predict(self, audio_seconds):
+        if not self.fitted:
+            self.fit()
+        return sorted((m.predict(audio_seconds) for m in self.fitted.values()),
+                      key=lambda p: (p["predicted_cost"], p["predicted_latency"]))
+
+    def choose(self, audio_seconds, latency_budget=None, cost_budget=None):
+        """
+        Returns:
+            선택한 조합의 예측 + audio_seconds / 예산 / budget_met / 후보 수
+        """
+        predictions = self.predict(audio_seconds)
+        choice, budget_met = select(predictions, latency_budget, cost_budget)
+        if choice is None:
+            raise RuntimeError(f"No model/option combination has {self.min_samples}+ recorded samples "
+                               f"with audio_seconds (run test_comparison.py or sweep_benchmark.py first)")
+        decision = dict(choice, audio_seconds=audio_seconds, latency_budget=latency_budget,
+                        cost_budget=cost_budget, budget_met=budget_met, candidates=len(predictions))
+        if not budget_met:
+            logger.warning(f"No combination meets the budget for {audio_seconds:.1f}s audio, "
+                           f"falling back to {choice['model']} {options_label(choice['options'])}")
+        return decision
+
+    def observe(self, decision, success, execution_time=None, delay_time=None, total_time=None, cost=None,
+                host=None, run_id=None, **extra):
+        """
+        실행 결과를 예측값 / 예측 오차와 함께 저장소에 기록하고 해당 조합을 다시 적합
+
+        prediction_error 는 실제 지연(실행 + 큐 대기) - 예측 지연 (양수면 예측보다 느림)
+        """
+        from talking_head.results_store import new_run_id
+
+        latency = (execution_time or 0.0) + (delay_time or 0.0) if execution_time is not None else None
+        error = latency - decision["predicted_latency"] if success and latency is not None else None
+        if error is not None:
+            logger.info(f"Router {decision['model']} predicted {decision['predicted_latency']:.2f}s, "
+                        f"actual {latency:.2f}s (error {error:+.2f}s)")
+
+        self.store.record(
+            run_id or new_run_id("router"), "router", decision["model"], decision["options"], success,
+            latency=execution_time, cost=cost, host=host,
+            audio_seconds=decision["audio_seconds"], delay_time=delay_time, total_time=total_time,
+            predicted_execution=decision["predicted_execution"],
+            predicted_latency=decision["predicted_latency"],
+            predicted_cost=decision["predicted_cost"],
+            prediction_error=round(error, 3) if error is not None else None,
+            relative_error=round(error / latency, 4) if error is not None and latency > 0 else None,
+            latency_budget=decision["latency_budget"], cost_budget=decision["cost_budget"],
+            budget_met=decision["budget_met"],
+            within_budget=(decision["latency_budget"] is None or latency <= decision["latency_budget"])
+            if latency is not None else None,
+            **extra,
+        )
+        if success:
+            self.fit()
+        return error
+
+    def run(self, image, audio, latency_budget=None, cost_budget=None, audio_seconds=None, api_key=None,
+            endpoints=None, timeout=1800, gpu_type=None):
+        """
+        예산에 맞는 조합을 골라 디스패처로 실행하고 결과를 기록
+
+        Args:
+            image / audio: 로컬 파일 경로(base64 로 전달) 또는 URL
+            audio_seconds: 오디오 길이 (없으면 로컬 audio 파일에서 측정)
+            endpoints: 모델명 → 엔드포인트 ID 목록 (기본: SADTALKER_ENDPOINT / WAV2LIP_ENDPOINT)
+        """
+        from talking_head.dispatcher import EndpointDispatcher, endpoints_from_env
+        from talking_head.inputs import encode_file
+        from talking_head.results_store import host_profile
+
+        if audio_seconds is None:
+            from talking_head.media import audio_duration
+            audio_seconds = audio_duration(audio)
+
+        endpoints = endpoints or endpoints_from_env()
+        self.models &= {model for model, ids in endpoints.items() if ids}
+        if not self.models:
+            raise ValueError("No endpoints configured (set SADTALKER_ENDPOINT / WAV2LIP_ENDPOINT)")
+        self.fit()
+        decision = self.choose(audio_seconds, latency_budget, cost_budget)
+
+        payload = {"input": {}}
+        for kind, source in (("image", image), ("audio", audio)):
+            if os.path.isfile(source):
+                payload["input"][f"input_{kind}_base64"] = encode_file(source)
+            else:
+                payload["input"][f"input_{kind}_url"] = source
+        if decision["options"]:
+            payload["input"]["options"] = decision["options"]
+
+        dispatcher = EndpointDispatcher(api_key or os.environ.get("RUNPOD_API_KEY"),
+                                        {decision["model"]: endpoints[decision["model"]]})
+        start_time = time.time()
+        result = dispatcher.run(decision["model"], payload, timeout=timeout)
+        total_time = time.time() - start_time
+
+        success = result.get("status") == "COMPLETED"
+        execution_time = result["executionTime"] / 1000 if "executionTime" in result else None
+        delay_time = result["delayTime"] / 1000 if "delayTime" in result else None
+        gpu_type = gpu_type or os.environ.get("GPU_TYPE", "rtx_4090")
+        cost = (execution_time / 3600 * GPU_HOURLY_COSTS.get(gpu_type, DEFAULT_HOURLY_COST)
+                if execution_time is not None else None)
+        output = result.get("output") or {}
+        error = self.observe(decision, success, execution_time, delay_time, total_time, cost,
+                             host=host_profile(gpu_type=gpu_type, endpoint_id=result["dispatch"]["endpoint_id"]),
+                             cache_hit=output.get("cache_hit"), endpoint_id=result["dispatch"]["endpoint_id"])
+        return {
+            "decision": decision,
+            "status": result.get("status"),
+            "output": output,
+            "execution_time": execution_time,
+            "delay_time": delay_time,
+            "total_time": round(total_time, 3),
+            "cost": cost,
+            "prediction_error": error,
+        }
+
+
+# ---------------------------------------------------------------------------
+# 기록 기반 평가 (로컬)
+# ---------------------------------------------------------------------------
+
+def _error_summary(errors):
+    """errors: (실제, 예측, 상한) 목록"""
+    if not errors:
+        return {"samples": 0}
+    relative = [abs(actual - predicted) / actual for actual, predicted, _ in errors if actual > 0]
+    return {
+        "samples": len(errors),
+        "mape": round(sum(relative) / len(relative), 4) if relative else None,
+        "bias": round(sum(actual - predicted for actual, predicted, _ in errors) / len(errors), 3),
+        "upper_coverage": round(sum(actual <= upper for actual, _, upper in errors) / len(errors), 4),
+    }
+
+
+def replay(samples, min_samples=MIN_SAMPLES, window=WINDOW, confidence=DEFAULT_CONFIDENCE):
+    """
+    기록된 시간만으로 라우터 예측을 시간순으로 재현
+
+    각 기록을 그 이전 기록만으로 적합한 모델로 예측해 (조합별 표본이 min_samples 이상일 때부터)
+    모델별 MAPE / bias(실제 - 예측 평균) / 상한 적중률을 계산합니다. 실제 엔드포인트 호출은 없습니다.
+    """
+    samples = sorted(samples, key=lambda s: s["timestamp"])
+    errors = {}
+    for i, sample in enumerate(samples):
+        key = (sample["model"], options_label(sample["options"]))
+        history = [s for s in samples[:i] if (s["model"], options_label(s["options"])) == key]
+        if len(history) < min_samples:
+            continue
+        prediction = RuntimeModel(sample["model"], sample["options"], history[-window:],
+                                  confidence).predict(sample["audio_seconds"])
+        actual = sample["execution"] + sample["delay"]
+        errors.setdefault(sample["model"], []).append(
+            (actual, prediction["predicted_latency"], prediction["predicted_latency_upper"]))
+
+    summary = {model: _error_summary(values) for model, values in sorted(errors.items())}
+    summary["all"] = _error_summary([e for values in errors.values() for e in values])
+    return summary
+
+
+def error_stats(store, model=None):
+    """source="router" 기록의 모델별 예측 오차 / 예산 준수율"""
+    rows = [r for r in store.history(model=model, source="router", success=True)
+            if r["extra"].get("prediction_error") is not None]
+    stats = {}
+    for name in sorted({r["model"] for r in rows}):
+        selected = [r for r in rows if r["model"] == name]
+        errors = [r["extra"]["prediction_error"] for r in selected]
+        relative = [abs(r["extra"]["relative_error"]) for r in selected
+                    if r["extra"].get("relative_error") is not None]
+        budgeted = [r["extra"]["within_budget"] for r in selected if r["extra"].get("latency_budget")]
+        stats[name] = {
+            "samples": len(selected),
+            "mape": round(sum(relative) / len(relative), 4) if relative else None,
+            "bias": round(sum(errors) / len(errors), 3),
+            "recent_mape": round(sum(relative[-20:]) / len(relative[-20:]), 4) if relative else None,
+            "within_latency_budget": round(sum(map(bool, budgeted)) / len(budgeted), 4) if budgeted else None,
+        }
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency / cost budget router")
+    parser.add_argument("--db", default=None, help="성능 결과 저장소 경로 (기본: TALKING_HEAD_RESULTS_DB)")
+    parser.add_argument("--host-prefix", default=DEFAULT_HOST_PREFIX,
+                        help="적합에 사용할 host_profile 접두어 (빈 문자열이면 전부)")
+    parser.add_argument("--version", help="이미지 버전 (기본: 모든 버전)")
+    parser.add_argument("--models", default=",".join(MODELS))
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES)
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                        help="예산 비교에 쓰는 예측 상한의 단측 신뢰 수준")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    predict_parser = subparsers.add_parser("predict", help="조합별 예측과 예산에 따른 선택 (호출 없음)")
+    predict_parser.add_argument("--audio-seconds", type=float, required=True)
+    predict_parser.add_argument("--latency-budget", type=float, help="지연 시간 예산 (초, 큐 대기 포함)")
+    predict_parser.add_argument("--cost-budget", type=float, help="비용 예산 (달러)")
+
+    run_parser = subparsers.add_parser("run", help="예산에 맞는 조합으로 실행하고 예측 오차 기록")
+    run_parser.add_argument("--image", required=True, help="이미지 경로 또는 URL")
+    run_parser.add_argument("--audio", required=True, help="음성 경로 또는 URL")
+    run_parser.add_argument("--audio-seconds", type=float, help="음성 길이 (URL 이면 필수)")
+    run_parser.add_argument("--latency-budget", type=float)
+    run_parser.add_argument("--cost-budget", type=float)
+    run_parser.add_argument("--gpu-type", default=None, help="비용 계산용 GPU 타입 (기본: $GPU_TYPE)")
+    run_parser.add_argument("--timeout", type=int, default=1800)
+
+    subparsers.add_parser("replay", help="기록된 시간으로 시간순 예측 오차 재현 (로컬)")
+    subparsers.add_parser("errors", help="라우터 실행의 모델별 예측 오차")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from talking_head.results_store import ResultsStore
+
+    store = ResultsStore(args.db)
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    router = LatencyRouter(store, host_prefix=args.host_prefix or None, version=args.version, models=models,
+                           min_samples=args.min_samples, confidence=args.confidence)
+    try:
+        if args.command == "predict":
+            router.fit()
+            result = {
+                "fits": [m.describe() for m in router.fitted.values()],
+                "predictions": router.predict(args.audio_seconds),
+                "decision": router.choose(args.audio_seconds, args.latency_budget, args.cost_budget),
+            }
+        elif args.command == "run":
+            if args.audio_seconds is None and not os.path.isfile(args.audio):
+                parser.error("--audio-seconds is required when --audio is a URL")
+            result = router.run(args.image, args.audio, args.latency_budget, args.cost_budget,
+                                audio_seconds=args.audio_seconds, timeout=args.timeout, gpu_type=args.gpu_type)
+        elif args.command == "replay":
+            samples = [s for s in load_samples(store, args.host_prefix or None, args.version)
+                       if s["model"] in models]
+            result = replay(samples, min_samples=args.min_samples, confidence=args.confidence)
+        else:
+            result = error_stats(store)
+    finally:
+        store.close()
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.command == "run":
+        return 0 if result["status"] == "COMPLETED" else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
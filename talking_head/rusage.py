@@ -0,0 +1,150 @@
+"""
+잡별 자원 사용량 (rusage)
+
+inference.py 서브프로세스를 os.wait4 로 회수해 자식 프로세스(및 그 자식인 ffmpeg 등)의
+CPU user/sys 시간, 최대 RSS, 컨텍스트 스위치 수, 블록 I/O 를 기록합니다.
+핸들러 응답의 resource_usage 로 반환하고, 용량 계획용으로 JSONL 로그에 누적합니다.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+USAGE_LOG_ENV = "TALKING_HEAD_USAGE_LOG"
+
+# ru_inblock / ru_oublock 단위
+_BLOCK_SIZE = 512
+
+
+def rusage_dict(ru):
+    """resource.struct_rusage → 응답용 딕셔너리 (Linux: ru_maxrss 는 KB)"""
+    return {
+        "cpu_user": round(ru.ru_utime, 3),
+        "cpu_sys": round(ru.ru_stime, 3),
+        "max_rss_mb": round(ru.ru_maxrss / 1024, 1),
+        "voluntary_ctx_switches": ru.ru_nvcsw,
+        "involuntary_ctx_switches": ru.ru_nivcsw,
+        "io_read_bytes": ru.ru_inblock * _BLOCK_SIZE,
+        "io_write_bytes": ru.ru_oublock * _BLOCK_SIZE,
+    }
+
+
+def rusage_delta(before, after):
+    """
+    같은 프로세스에서 잰 두 rusage 의 차이 (상주 워커의 잡 단위 측정용)
+
+    ru_maxrss 는 누적 최댓값이므로 after 값을 그대로 사용합니다.
+    """
+    usage = {key: value - before[key] for key, value in after.items() if key != "max_rss_mb"}
+    usage["cpu_user"] = round(usage["cpu_user"], 3)
+    usage["cpu_sys"] = round(usage["cpu_sys"], 3)
+    usage["max_rss_mb"] = after["max_rss_mb"]
+    return usage
+
+
+def add_rusage(first, second):
+    """프로세스 자신 + 자식 프로세스 사용량 합산 (최대 RSS 는 큰 값)"""
+    usage = {key: first[key] + second[key] for key in first if key != "max_rss_mb"}
+    usage["cpu_user"] = round(usage["cpu_user"], 3)
+    usage["cpu_sys"] = round(usage["cpu_sys"], 3)
+    usage["max_rss_mb"] = max(first["max_rss_mb"], second["max_rss_mb"])
+    return usage
+
+
+def with_wall_time(usage, wall_time):
+    usage = dict(usage)
+    usage["wall_time"] = round(wall_time, 3)
+    cpu_time = usage["cpu_user"] + usage["cpu_sys"]
+    # 평균 사용 코어 수
+    usage["cpu_utilization"] = round(cpu_time / wall_time, 2) if wall_time > 0 else None
+    return usage
+
+
+def run_with_rusage(cmd, timeout=None, **popen_kwargs):
+    """
+    subprocess.run(capture_output=True, text=True) 와 같지만 os.wait4 로 회수해 rusage 기록
+
+    Returns:
+        CompletedProcess (rusage 속성에 자원 사용량)
+    """
+    start_time = time.time()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               **popen_kwargs)
+
+    output = {}
+
+    def drain(name, stream):
+        output[name] = stream.read()
+        stream.close()
+
+    readers = [threading.Thread(target=drain, args=(name, stream), daemon=True)
+               for name, stream in (("stdout", process.stdout), ("stderr", process.stderr))]
+    for reader in readers:
+        reader.start()
+
+    reaped = threading.Event()
+    timed_out = []
+
+    def kill():
+        if not reaped.is_set():
+            timed_out.append(True)
+            process.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        _, status, ru = os.wait4(process.pid, 0)
+    finally:
+        reaped.set()
+        if timer:
+            timer.cancel()
+
+    # Popen 이 같은 pid 를 다시 wait 하지 않도록 종료 코드 설정
+    process.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+
+    if timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout, output.get("stdout"), output.get("stderr"))
+
+    result = subprocess.CompletedProcess(cmd, process.returncode, output.get("stdout", ""),
+                                         output.get("stderr", ""))
+    result.rusage = with_wall_time(rusage_dict(ru), time.time() - start_time)
+    return result
+
+
+def default_usage_log():
+    if os.environ.get(USAGE_LOG_ENV):
+        return os.environ[USAGE_LOG_ENV]
+    if os.path.isdir("/runpod-volume"):
+        return "/runpod-volume/talking_head_usage.jsonl"
+    return "/tmp/talking_head_usage.jsonl"
+
+
+def record_usage(model, usage, **context):
+    """
+    용량 계획용 JSONL 로그에 잡 하나의 자원 사용량 추가
+
+    Args:
+        model: 모델명
+        usage: run_with_rusage 결과의 rusage
+        context: backend, audio_seconds 등 함께 남길 값
+    """
+    if not usage:
+        return
+    entry = dict(context, model=model, timestamp=time.time(), **usage)
+    audio_seconds = context.get("audio_seconds")
+    if audio_seconds:
+        entry["cpu_seconds_per_audio_second"] = round(
+            (usage["cpu_user"] + usage["cpu_sys"]) / audio_seconds, 3)
+    try:
+        with open(default_usage_log(), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+    except OSError as e:
+        logger.warning(f"Failed to record resource usage: {e}")
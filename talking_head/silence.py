@@ -0,0 +1,353 @@
+"""
+무음 구간 추론 생략 (options.skip_silence)
+
+구동 오디오에 에너지 기반 음성 구간 검출(VAD)을 돌려 비디오 프레임(1/25초) 단위로 말하는 구간을 찾고,
+충분히 긴 무음 구간의 프레임은 생성 네트워크를 실행하지 않고 원본 얼굴(idle 프레임)로 채웁니다.
+
+- wav2lip: Wav2Lip 생성기 입력의 참조 얼굴 채널 (입 모양을 바꾸지 않은 원본 얼굴 crop)
+- sadtalker: 렌더러 입력의 source_image (정렬된 원본 얼굴, still_mode 에서 가장 자연스러움)
+
+말하는 구간과 무음 구간 경계의 ramp_frames 프레임은 네트워크 출력과 idle 프레임을 선형으로 섞어 전환을 부드럽게 하고,
+말하기 직전 / 직후의 입 움직임을 위해 말하는 구간을 pad_frames 만큼 넓힙니다.
+생략한 프레임 비율과 (렌더링한 프레임당 네트워크 시간 × 생략한 프레임 수로 추정한) 절약 시간은
+런처 메트릭의 silence 항목으로 기록됩니다.
+
+wav2lip 의 내부 프레임레이트 감소(talking_head.interpolation)도 같은 forward 래퍼에서 처리합니다
+(무음이 아닌 프레임 중 키프레임 행만 네트워크로 렌더링하고 나머지는 보간).
+"""
+
+import importlib
+import logging
+import math
+import os
+import time
+
+from talking_head import interpolation
+from talking_head.metrics import report
+
+logger = logging.getLogger(__name__)
+
+SKIP_SILENCE_ENV = "TALKING_HEAD_SKIP_SILENCE"
+MIN_SILENCE_ENV = "TALKING_HEAD_MIN_SILENCE_SECONDS"
+
+SAMPLE_RATE = 16000
+FPS = 25
+SAMPLES_PER_FRAME = SAMPLE_RATE // FPS
+
+# 이보다 짧은 무음(단어 사이 쉼)은 말하는 구간으로 취급
+DEFAULT_MIN_SILENCE_SECONDS = 0.5
+PAD_FRAMES = 3
+RAMP_FRAMES = 3
+# 소음 바닥(하위 10% 프레임 에너지) + MARGIN_DB, 최대 에너지 - DYNAMIC_RANGE_DB 중 큰 값을 넘으면 음성
+MARGIN_DB = 10.0
+DYNAMIC_RANGE_DB = 45.0
+
+# 패치 대상 (onnx_backend 가 먼저 forward 를 교체했으면 그 위에 감쌈)
+TARGETS = {
+    "wav2lip": "models.wav2lip.Wav2Lip",
+    "sadtalker": "src.facerender.modules.generator.OcclusionAwareSPADEGenerator",
+}
+AUDIO_ARGS = {"wav2lip": "--audio", "sadtalker": "--driven_audio"}
+
+_plan = None
+_installed = set()
+
+
+def frame_energy_db(wav):
+    """프레임(1/25초)별 RMS 에너지 (dB)"""
+    import numpy as np
+
+    frames = len(wav) // SAMPLES_PER_FRAME
+    if frames == 0:
+        return np.zeros(0)
+    blocks = np.asarray(wav[:frames * SAMPLES_PER_FRAME], dtype=np.float64).reshape(frames, SAMPLES_PER_FRAME)
+    rms = np.sqrt(np.mean(blocks ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _runs(mask, value):
+    """mask 에서 value 가 연속되는 구간 [start, end) 목록"""
+    runs, start = [], None
+    for i, item in enumerate(list(mask) + [not value]):
+        if item == value and start is None:
+            start = i
+        elif item != value and start is not None:
+            runs.append((start, i))
+            start = None
+    return runs
+
+
+def detect_speech(wav, min_silence_frames, pad_frames=PAD_FRAMES):
+    """
+    프레임별 음성 여부
+
+    에너지 임계값으로 판정한 뒤 음성 구간을 pad_frames 만큼 넓히고, min_silence_frames 보다 짧은 무음은 음성으로 채웁니다.
+    """
+    import numpy as np
+
+    energy = frame_energy_db(wav)
+    if energy.size == 0:
+        return np.zeros(0, dtype=bool)
+    threshold = max(np.percentile(energy, 10) + MARGIN_DB, energy.max() - DYNAMIC_RANGE_DB)
+    speech = energy > threshold
+
+    padded = speech.copy()
+    for start, end in _runs(speech, True):
+        padded[max(0, start - pad_frames):end + pad_frames] = True
+    for start, end in _runs(padded, False):
+        if end - start < min_silence_frames:
+            padded[start:end] = True
+    return padded
+
+
+def idle_weights(speech, ramp_frames=RAMP_FRAMES):
+    """
+    프레임별 idle 프레임 비중 (0: 네트워크 출력, 1: idle 프레임만 → 추론 생략)
+
+    무음 구간 안에서 가장 가까운 음성 프레임까지의 거리 d 가 ramp_frames 이하이면 d / (ramp_frames + 1).
+    """
+    import numpy as np
+
+    weights = np.where(speech, 0.0, 1.0)
+    speech_idx = np.flatnonzero(speech)
+    if speech_idx.size == 0:
+        return weights
+    for i in np.flatnonzero(~speech):
+        nearest = np.abs(speech_idx - i).min()
+        if nearest <= ramp_frames:
+            weights[i] = nearest / (ramp_frames + 1)
+    return weights
+
+
+class SilencePlan:
+    """잡 하나의 프레임별 idle 비중 / 키프레임 선택과 생략 통계"""
+
+    def __init__(self, model, inference_args, min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS,
+                 skip_silence=True, stride=1, method="blend"):
+        self.model = model
+        self.skip_silence = skip_silence
+        self.stride = stride
+        self.method = method
+        # sadtalker + 보간: 렌더러 호출 순번 → 행 안의 프레임 위치 (interpolation 이 make_animation 에서 설정)
+        self.keyframes = None
+        self.audio_path = _arg_value(inference_args, AUDIO_ARGS[model])
+        self.batch_size = int(_arg_value(inference_args, "--batch_size", 2))
+        self.min_silence_frames = max(1, round(min_silence_seconds * FPS))
+        self.weights = None
+        self.calls = 0
+        self.next_frame = 0
+        self.rendered = 0
+        self.skipped = 0
+        self.interpolated = 0
+        self.model_time = 0.0
+        self.interpolation_time = 0.0
+        self.vad_time = 0.0
+
+    def _load(self):
+        """첫 forward 호출 시 오디오 VAD (런처의 AudioPrefetch 가 읽어둔 오디오를 재사용)"""
+        from talking_head.pipeline import AUDIO_MODULES
+
+        start = time.time()
+        audio = importlib.import_module(AUDIO_MODULES[self.model][0])
+        wav = audio.load_wav(self.audio_path, SAMPLE_RATE)
+        self.weights = idle_weights(detect_speech(wav, self.min_silence_frames))
+        self.vad_time = time.time() - start
+
+    def frame_indices(self, batch):
+        """forward 호출의 배치 행 → 비디오 프레임 번호"""
+        if self.model == "wav2lip":
+            # 프레임 순서대로 wav2lip_batch_size 개씩
+            indices = list(range(self.next_frame, self.next_frame + batch))
+            self.next_frame += batch
+        else:
+            # sadtalker 는 프레임을 batch_size 개 행으로 나눠 행마다 같은 순번의 프레임을 한 번에 렌더링
+            total = len(self.weights) if self.weights is not None else 0
+            per_row = math.ceil(total / self.batch_size)
+            position = self.keyframes[self.calls] if self.keyframes else self.calls
+            indices = [row * per_row + position for row in range(batch)]
+        self.calls += 1
+        return indices
+
+    def weights_for(self, indices):
+        if not self.skip_silence:
+            return [0.0] * len(indices)
+        # wav2lip 의 범위 밖 프레임은 렌더링, sadtalker 의 범위 밖(배치 채움용) 프레임은 버려지므로 생략
+        outside = 0.0 if self.model == "wav2lip" else 1.0
+        return [float(self.weights[i]) if i < len(self.weights) else outside for i in indices]
+
+    def forward(self, original, module, args, kwargs):
+        import torch
+
+        if self.weights is None and self.skip_silence:
+            self._load()
+
+        if self.model == "wav2lip":
+            face_sequences = args[1]
+            if face_sequences.dim() > 4:
+                return original(module, *args, **kwargs)
+            idle = face_sequences[:, 3:]
+            batch = face_sequences.shape[0]
+        else:
+            source_image = args[0] if args else kwargs["source_image"]
+            idle = source_image
+            batch = source_image.shape[0]
+
+        indices = self.frame_indices(batch)
+        weights = self.weights_for(indices)
+        candidates = [i for i, w in enumerate(weights) if w < 1.0]
+        render = self._keyframe_rows(candidates, indices)
+        self.rendered += len(render)
+        self.skipped += batch - len(candidates)
+        self.interpolated += len(candidates) - len(render)
+
+        if not render:
+            output = idle.clone()
+        else:
+            start = time.time()
+            if len(render) == batch:
+                result = original(module, *args, **kwargs)
+            else:
+                index = torch.tensor(render, device=idle.device)
+                result = original(module, *_select(args, index), **_select(kwargs, index))
+            self.model_time += time.time() - start
+
+            prediction = result["prediction"] if isinstance(result, dict) else result
+            if len(render) == batch:
+                output = prediction
+            else:
+                output = idle.clone()
+                output[index] = prediction.to(output.dtype)
+            if len(render) < len(candidates):
+                start = time.time()
+                for run in _runs([i in candidates for i in range(batch)], True):
+                    keys = [row - run[0] for row in range(*run) if row in render]
+                    interpolation.fill(output[run[0]:run[1]], keys, self.method)
+                self.interpolation_time += time.time() - start
+
+            if len(render) == batch and max(weights) == 0.0:
+                return result
+
+        blend = torch.tensor(weights, dtype=output.dtype, device=output.device).view(-1, 1, 1, 1)
+        output = output * (1 - blend) + idle.to(output.dtype) * blend
+        return {"prediction": output} if self.model == "sadtalker" else output
+
+    def _keyframe_rows(self, candidates, indices):
+        """렌더링할 행: 보간이 꺼져 있으면 무음이 아닌 행 전부, 켜져 있으면 연속 구간의 양 끝 + stride 간격 행"""
+        if self.stride == 1 or self.model != "wav2lip":
+            return candidates
+        chosen = set(candidates)
+        return [row for row in candidates
+                if indices[row] % self.stride == 0 or row - 1 not in chosen or row + 1 not in chosen]
+
+    def stats(self):
+        frames = self.rendered + self.interpolated + self.skipped
+        per_frame = self.model_time / self.rendered if self.rendered else 0.0
+        speech = [w for w in (self.weights if self.weights is not None else []) if w == 0.0]
+        return {
+            "frames": frames,
+            "rendered_frames": self.rendered,
+            "skipped_frames": self.skipped,
+            "skipped_fraction": round(self.skipped / frames, 4) if frames else 0.0,
+            "speech_fraction": (round(len(speech) / len(self.weights), 4)
+                                if self.weights is not None and len(self.weights) else None),
+            "model_time": round(self.model_time, 3),
+            # 생략한 프레임을 렌더링했다면 걸렸을 네트워크 시간 (렌더링한 프레임 평균으로 추정)
+            "time_saved": round(per_frame * self.skipped, 3),
+            "vad_time": round(self.vad_time, 3),
+        }
+
+
+def _arg_value(args, flag, default=None):
+    if flag in args:
+        index = list(args).index(flag)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+
+def _select(value, index):
+    """배치 차원 기준으로 텐서 (및 텐서를 담은 dict / list) 에서 index 행만 선택"""
+    import torch
+
+    if isinstance(value, torch.Tensor):
+        return value.index_select(0, index.to(value.device)) if value.dim() else value
+    if isinstance(value, dict):
+        return {k: _select(v, index) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_select(v, index) for v in value)
+    return value
+
+
+def install(model):
+    """
+    런처 / 상주 워커용: 생성기 forward 를 무음 생략 래퍼로 감쌈
+
+    begin() 으로 잡을 시작하지 않았으면 원래 forward 를 그대로 호출합니다.
+    """
+    if model in _installed:
+        return True
+    try:
+        module_name, attr = TARGETS[model].rsplit(".", 1)
+        cls = getattr(importlib.import_module(module_name), attr)
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"Silence skipping unavailable for {model}: {e}")
+        return False
+
+    original = cls.forward
+
+    def forward(self, *args, **kwargs):
+        plan = _plan
+        if plan is None:
+            return original(self, *args, **kwargs)
+        return plan.forward(original, self, args, kwargs)
+
+    cls.forward = forward
+    _installed.add(model)
+    return True
+
+
+def begin(model, inference_args, min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS,
+          skip_silence=True, stride=1, method="blend"):
+    """잡 시작: 이 잡의 오디오로 무음 생략 / 키프레임 계획 생성"""
+    global _plan
+    _plan = (SilencePlan(model, inference_args, min_silence_seconds, skip_silence, stride, method)
+             if install(model) else None)
+
+
+def begin_from_env(model, inference_args):
+    """
+    런처 / 상주 워커용: TALKING_HEAD_SKIP_SILENCE=1 이거나 wav2lip 에 TALKING_HEAD_RENDER_FPS 가 설정되면 begin()
+    """
+    skip_silence = os.environ.get(SKIP_SILENCE_ENV) == "1"
+    stride, method = interpolation.env_settings() or (1, "blend")
+    if model != "wav2lip":
+        # sadtalker 보간은 interpolation 의 make_animation 래퍼가 처리
+        stride = 1
+    if not skip_silence and stride == 1:
+        return False
+    begin(model, inference_args, float(os.environ.get(MIN_SILENCE_ENV, DEFAULT_MIN_SILENCE_SECONDS)),
+          skip_silence, stride, method)
+    return _plan is not None
+
+
+def set_keyframes(keyframes):
+    """sadtalker 보간용: 이번 렌더링 루프에서 렌더러가 호출될 프레임 위치"""
+    if _plan is not None:
+        _plan.keyframes = list(keyframes)
+        _plan.calls = 0
+
+
+def end():
+    """잡 종료: 생략 통계 기록"""
+    global _plan
+    if _plan is not None:
+        if _plan.skip_silence:
+            stats = _plan.stats()
+            report("silence", **stats)
+            logger.info(f"Silence skipping: {stats}")
+        if _plan.stride > 1:
+            summary = interpolation.summarize(_plan.stride, _plan.method, _plan.rendered + _plan.interpolated,
+                                              _plan.rendered, _plan.model_time, _plan.interpolation_time)
+            report("interpolation", **summary)
+            logger.info(f"Frame interpolation: {summary}")
+        _plan = None
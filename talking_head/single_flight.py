@@ -0,0 +1,96 @@
+"""
+동일 잡 합치기 (single-flight)
+
+같은 입력 해시 + 옵션의 잡이 동시에 들어오면 (클라이언트 재시도, 동시 반복 렌더) 첫 번째 잡만
+추론을 실행하고, 나머지 잡은 그 결과를 기다렸다가 그대로 받습니다. 결과 캐시(result_cache)는
+완료된 결과를, single-flight 는 아직 실행 중인 결과를 공유합니다.
+
+사용법 (핸들러):
+    IN_FLIGHT = SingleFlight()
+    response, flight = IN_FLIGHT.do(key, render)
+    flight.leader       # 직접 실행했으면 True
+    flight.coalesced    # 이 실행에 합쳐진 다른 잡 수
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """실행 중인 계산 하나 (리더 1명 + 대기 잡 N명)"""
+
+    def __init__(self, key, leader_id=None):
+        self.key = key
+        self.leader_id = leader_id
+        self.leader = True
+        self.coalesced = 0
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def info(self):
+        return {
+            "leader": self.leader,
+            "leader_job_id": self.leader_id,
+            "coalesced_jobs": self.coalesced,
+        }
+
+
+class SingleFlight:
+    """키별로 동시에 하나의 계산만 실행하고 결과를 모든 대기 잡에 전달"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.total_coalesced = 0
+
+    def do(self, key, fn, job_id=None):
+        """
+        key 에 대해 실행 중인 계산이 있으면 기다렸다가 결과를 받고, 없으면 fn() 실행
+
+        리더의 예외는 대기 잡에도 그대로 전달됩니다.
+
+        Returns:
+            (결과, 잡별 Flight 정보) — 대기 잡의 Flight 는 leader=False 인 복사본
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = Flight(key, job_id)
+                self._flights[key] = flight
+                is_leader = True
+            else:
+                flight.coalesced += 1
+                self.total_coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            logger.info(f"Job {job_id} coalesced into in-flight job {flight.leader_id} ({key[:12]})")
+            flight._done.wait()
+            follower = Flight(key, flight.leader_id)
+            follower.leader = False
+            follower.coalesced = flight.coalesced
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, follower
+
+        try:
+            flight.result = fn()
+            return flight.result, flight
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # 완료 후 들어온 잡은 새로 실행하거나 결과 캐시에서 받음
+            with self._lock:
+                del self._flights[key]
+            flight._done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "total_coalesced": self.total_coalesced,
+            }
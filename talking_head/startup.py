@@ -0,0 +1,171 @@
+"""
+콜드 스타트 프로파일러 / 워밍업
+
+콜드 스타트 시간이 어디에 쓰이는지 (인터프리터 시작, 모듈 import, 워밍업 잡의 torch import /
+체크포인트 로드) 단계별로 기록하고, runpod.serverless.start 전에 짧은 합성 잡을 한 번 실행해
+체크포인트 / 공유 라이브러리 / 바이트코드를 미리 캐시에 올립니다.
+기록된 시간은 워커가 처리하는 첫 번째 잡의 응답 startup 항목에 포함됩니다.
+
+사용법 (핸들러):
+    STARTUP = StartupProfiler()
+    with STARTUP.phase("import_talking_head"):
+        from talking_head.launcher import ...
+
+    if __name__ == "__main__":
+        STARTUP.warmup("wav2lip", build_warmup_args)
+        with STARTUP.phase("import_runpod"):
+            import runpod
+        runpod.serverless.start({"handler": STARTUP.attach(handler)})
+"""
+
+import logging
+import math
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import wave
+from contextlib import contextmanager
+
+from talking_head.launcher import launcher_env
+from talking_head.metrics import read_metrics
+from talking_head.residency import run_inference
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENV = "TALKING_HEAD_WARMUP"
+WARMUP_IMAGE_ENV = "TALKING_HEAD_WARMUP_IMAGE"
+
+# 이미지 빌드 시 COPY 되는 테스트 이미지
+DEFAULT_WARMUP_IMAGE = "/workspace/assets/profile.png"
+
+# 합성 워밍업 오디오 길이 (초)
+WARMUP_AUDIO_SECONDS = 1.0
+
+
+def _process_start_age(pid="self"):
+    """프로세스가 시작된 후 경과 시간 (초, /proc 기반). 알 수 없으면 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # comm 필드에 공백이 있을 수 있으므로 ')' 뒤부터 파싱 (starttime 은 22번째 필드)
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def synthetic_audio(path, seconds=WARMUP_AUDIO_SECONDS, sample_rate=16000):
+    """워밍업용 짧은 사인파 WAV 생성"""
+    frames = int(seconds * sample_rate)
+    samples = (int(8000 * math.sin(2 * math.pi * 220 * i / sample_rate)) for i in range(frames))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"".join(struct.pack("<h", s) for s in samples))
+    return path
+
+
+class StartupProfiler:
+    """워커 시작 단계별 소요 시간 기록"""
+
+    def __init__(self):
+        self.created_at = time.time()
+        # 프로파일러 생성 전까지 = 인터프리터 시작 + 핸들러 모듈 이전 import
+        self.interpreter_start = _process_start_age()
+        # 컨테이너 init(PID 1) 시작 ~ 핸들러 프로세스 시작
+        container_age = _process_start_age(1)
+        self.container_init = (round(container_age - self.interpreter_start, 3)
+                               if container_age is not None and self.interpreter_start is not None
+                               else None)
+        self.phases = {}
+        self.warmups = {}
+        self.ready_at = None
+        self._lock = threading.Lock()
+        self._reported = False
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.time() - start, 3)
+
+    def mark_ready(self):
+        """runpod.serverless.start 직전 호출 (트래픽을 받을 준비 완료)"""
+        self.ready_at = time.time()
+        logger.info(f"Worker ready: {self.report()}")
+
+    def warmup(self, model, build_args, timeout=600):
+        """
+        합성 잡으로 런처를 한 번 실행
+
+        Args:
+            model: 'wav2lip' 또는 'sadtalker'
+            build_args: (image_path, audio_path, work_dir) → inference.py 인자 리스트
+        """
+        if os.environ.get(WARMUP_ENV, "1") == "0":
+            self.warmups[model] = {"skipped": True, "reason": f"{WARMUP_ENV}=0"}
+            return self.warmups[model]
+
+        image_path = os.environ.get(WARMUP_IMAGE_ENV, DEFAULT_WARMUP_IMAGE)
+        if not os.path.exists(image_path):
+            logger.warning(f"Warmup image not found: {image_path}")
+            self.warmups[model] = {"skipped": True, "reason": f"missing {image_path}"}
+            return self.warmups[model]
+
+        work_dir = f"/tmp/{model}_warmup"
+        os.makedirs(work_dir, exist_ok=True)
+        metrics_path = os.path.join(work_dir, "launcher_metrics.json")
+        audio_path = synthetic_audio(os.path.join(work_dir, "warmup.wav"))
+        inference_args = build_args(image_path, audio_path, work_dir)
+
+        # 상주 모드에서는 이 잡으로 워커가 시작되어 모델이 메모리에 남음
+        logger.info(f"Running {model} warmup job")
+        try:
+            with self.phase(f"warmup_{model}"):
+                result = run_inference(model, inference_args, launcher_env({}, metrics_path), timeout)
+            self.warmups[model] = {
+                "success": result.returncode == 0,
+                # 워밍업 잡 내부의 torch import / 체크포인트 로드 시간
+                "launcher_metrics": read_metrics(metrics_path),
+            }
+            if result.returncode != 0:
+                logger.warning(f"Warmup job failed: {result.stderr[-2000:]}")
+        except subprocess.TimeoutExpired:
+            self.warmups[model] = {"success": False, "error": f"timeout ({timeout}s)"}
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return self.warmups[model]
+
+    def report(self):
+        startup_time = None
+        if self.ready_at is not None and self.interpreter_start is not None:
+            startup_time = round(self.interpreter_start + self.ready_at - self.created_at, 3)
+        return {
+            "container_init": self.container_init,
+            "interpreter_start": (round(self.interpreter_start, 3)
+                                  if self.interpreter_start is not None else None),
+            "phases": dict(self.phases),
+            "warmup": dict(self.warmups),
+            "startup_time": startup_time,
+        }
+
+    def attach(self, handler):
+        """첫 번째 잡의 응답에 startup 항목을 추가하는 핸들러 래퍼"""
+        def wrapped(event):
+            response = handler(event)
+            with self._lock:
+                first = not self._reported
+                self._reported = True
+            if first and isinstance(response, dict):
+                response["startup"] = self.report()
+            return response
+
+        return wrapped
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+라이브 스트리밍 모드: 오디오 조각 입력 → 몇 초 단위 fMP4 / HLS 세그먼트 출력
+
+전체 오디오를 받아 MP4 하나를 돌려주는 대신, 오디오 조각이 들어오는 대로 segment_seconds 단위로 모아 렌더링하고
+세그먼트를 바로 yield 합니다 (runpod_streaming_handler.py, RunPod 제너레이터 핸들러 → /stream 으로 수신).
+
+오디오 조각 입력 방식:
+- input_audio_chunks: 조각 목록 (URL, base64, data URI) — 미리 나눠 보낸 경우
+- input_audio_chunk_url: "{seq}" 가 들어간 URL 템플릿 — 호출자가 조각을 올리는 대로 0, 1, 2... 순서로 가져옴
+  (404 면 chunk_timeout 까지 재시도, 204 는 스트림 끝)
+- input_audio_url / input_audio_base64: 오디오 전체 (segment_seconds 단위로 잘라 스트리밍)
+
+세그먼트 사이에 이어지는 상태:
+- 오디오 문맥: wav2lip 의 프레임 i mel 창은 mel[:, int(i*3.2):int(i*3.2)+16] 로 약 0.2초 앞을 보므로,
+  다음 context_seconds 만큼의 오디오를 뒤에 붙여 렌더링하고 그 프레임은 잘라냄
+  (세그먼트 끝 프레임이 잘린 mel 창 없이 렌더링되어 세그먼트마다 정확히 duration * 25 프레임).
+  뒤 오디오가 도착할 때까지 세그먼트 출력을 미루고, 스트림이 끝나면 무음으로 채움
+- 타임라인: 세그먼트마다 지금까지 내보낸 길이만큼 타임스탬프 오프셋 적용 (이어 붙여 재생 가능)
+
+세그먼트 형식 (options.segment_format):
+- fmp4: 각 세그먼트가 독립적으로 재생 가능한 fragmented MP4 (MSE SourceBuffer 에 순서대로 append)
+- hls: MPEG-TS 세그먼트 + 세그먼트마다 갱신된 EVENT 플레이리스트 (m3u8)
+
+클라이언트 (첫 세그먼트까지 걸린 시간 측정):
+    python -m talking_head.streaming client --endpoint <id> --image assets/profile.png \\
+        --audio assets/test.wav --chunk-seconds 1 --output-dir stream_segments
+"""
+
+import argparse
+import base64
+import json
+import logging
+import math
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_FORMATS = ("fmp4", "hls")
+DEFAULT_SEGMENT_FORMAT = "fmp4"
+DEFAULT_SEGMENT_SECONDS = 2.0
+# wav2lip mel 창(16 mel 프레임 ≈ 0.2초)을 덮는 다음 오디오 길이 (lookahead)
+DEFAULT_CONTEXT_SECONDS = 0.2
+DEFAULT_CHUNK_TIMEOUT = 10.0
+POLL_INTERVAL = 0.2
+
+# wav2lip 입력 규격 (정지 이미지 입력 시 25fps, 16kHz 오디오)
+SAMPLE_RATE = 16000
+FPS = 25
+SAMPLES_PER_FRAME = SAMPLE_RATE // FPS
+SAMPLE_WIDTH = 2
+
+_END = object()
+
+
+def to_pcm_wav(source, destination):
+    """오디오 조각을 16kHz mono 16-bit WAV 로 변환"""
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-i", source, "-ac", "1", "-ar", str(SAMPLE_RATE),
+         "-acodec", "pcm_s16le", destination],
+        check=True, capture_output=True, timeout=60
+    )
+    return destination
+
+
+def _fetch_chunk(value, destination, download):
+    """조각 하나 (URL 이면 다운로드, 아니면 base64 / data URI 디코딩)"""
+    from talking_head.inputs import decode_to_file, max_inline_bytes, split_data_uri
+
+    if value.startswith(("http://", "https://")):
+        download(value, destination)
+    else:
+        _, encoded = split_data_uri(value)
+        decode_to_file(encoded, destination, max_inline_bytes("audio"))
+    return destination
+
+
+def _poll_chunk(template, seq, destination, timeout):
+    """
+    URL 템플릿에서 seq 번째 조각을 가져옴
+
+    Returns:
+        destination, 스트림이 끝났으면 (204 또는 timeout 동안 없음) None
+    """
+    import requests
+
+    url = template.format(seq=seq)
+    deadline = time.time() + timeout
+    while True:
+        response = requests.get(url, timeout=30)
+        if response.status_code == 204:
+            return None
+        if response.status_code == 200:
+            with open(destination, "wb") as f:
+                f.write(response.content)
+            return destination
+        if response.status_code != 404:
+            response.raise_for_status()
+        if time.time() >= deadline:
+            logger.info(f"No audio chunk {seq} within {timeout}s, ending stream")
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def chunk_sources(input_data, work_dir, download, chunk_timeout=DEFAULT_CHUNK_TIMEOUT):
+    """입력 방식에 관계없이 도착 순서대로 16kHz WAV 조각 경로를 yield"""
+    from talking_head.inputs import fetch_input
+
+    chunk_dir = os.path.join(work_dir, "chunks")
+    os.makedirs(chunk_dir, exist_ok=True)
+
+    def raw_chunks():
+        if input_data.get("input_audio_chunks"):
+            for seq, value in enumerate(input_data["input_audio_chunks"]):
+                yield _fetch_chunk(value, os.path.join(chunk_dir, f"{seq}.raw"), download)
+        elif input_data.get("input_audio_chunk_url"):
+            seq = 0
+            while True:
+                path = _poll_chunk(input_data["input_audio_chunk_url"], seq,
+                                   os.path.join(chunk_dir, f"{seq}.raw"), chunk_timeout)
+                if path is None:
+                    return
+                yield path
+                seq += 1
+        else:
+            yield fetch_input(input_data, "audio", os.path.join(chunk_dir, "0.raw"), download)
+
+    for seq, path in enumerate(raw_chunks()):
+        yield to_pcm_wav(path, os.path.join(chunk_dir, f"{seq}.wav"))
+
+
+class AudioAccumulator:
+    """
+    오디오 조각을 세그먼트 단위로 모음
+
+    세그먼트 길이는 비디오 프레임 경계(1/25초)에 맞추고, 다음 context_seconds 만큼의 오디오(lookahead)를
+    뒤에 붙여 돌려줍니다. lookahead 가 도착해야 ready 이며, 스트림 끝에서는 무음으로 채웁니다.
+    """
+
+    def __init__(self, segment_seconds=DEFAULT_SEGMENT_SECONDS, context_seconds=DEFAULT_CONTEXT_SECONDS):
+        self.segment_bytes = max(1, round(segment_seconds * FPS)) * SAMPLES_PER_FRAME * SAMPLE_WIDTH
+        self.context_bytes = math.ceil(context_seconds * FPS) * SAMPLES_PER_FRAME * SAMPLE_WIDTH
+        self.pending = b""
+
+    def add(self, wav_path):
+        with wave.open(wav_path, "rb") as f:
+            self.pending += f.readframes(f.getnframes())
+
+    def ready(self):
+        return len(self.pending) >= self.segment_bytes + self.context_bytes
+
+    def take(self, final=False):
+        """
+        다음 세그먼트 오디오
+
+        Returns:
+            (lookahead 포함 PCM, 세그먼트 오디오 길이(초)), 남은 오디오가 없으면 None
+        """
+        if not self.pending or (not final and not self.ready()):
+            return None
+        size = min(len(self.pending), self.segment_bytes)
+        size -= size % SAMPLE_WIDTH
+        data, self.pending = self.pending[:size], self.pending[size:]
+        lookahead = self.pending[:self.context_bytes]
+        # 스트림 끝: 뒤 오디오가 없으므로 무음 lookahead
+        lookahead += b"\0" * (self.context_bytes - len(lookahead))
+        return data + lookahead, len(data) / (SAMPLE_WIDTH * SAMPLE_RATE)
+
+
+def write_wav(pcm, path):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(SAMPLE_WIDTH)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm)
+    return path
+
+
+def video_frame_count(path):
+    """비디오 스트림 패킷 수 (디코딩 없이 세그먼트 프레임 수 확인)"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets",
+         "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", path],
+        check=True, capture_output=True, text=True, timeout=60
+    )
+    return int(result.stdout.strip().split(",")[0])
+
+
+def mux_segment(rendered, destination, segment_format, duration, offset):
+    """렌더링 결과에서 lookahead 부분을 잘라내고 타임라인 오프셋을 적용해 세그먼트로 인코딩"""
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", rendered,
+           "-t", f"{duration:.3f}", "-frames:v", str(round(duration * FPS)),
+           "-output_ts_offset", f"{offset:.3f}",
+           "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-c:a", "aac"]
+    if segment_format == "fmp4":
+        cmd += ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4"]
+    else:
+        cmd += ["-f", "mpegts"]
+    subprocess.run(cmd + [destination], check=True, capture_output=True, timeout=120)
+    return destination
+
+
+def hls_playlist(segments, ended):
+    """EVENT 타입 HLS 플레이리스트 (세그먼트 파일명 = uri)"""
+    target = max([math.ceil(s["duration"]) for s in segments] or [1])
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT",
+             f"#EXT-X-TARGETDURATION:{target}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for segment in segments:
+        lines += [f"#EXTINF:{segment['duration']:.3f},", segment["uri"]]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def stream_segments(input_data, work_dir, render, download, options, start_time):
+    """
+    오디오 조각을 받는 대로 세그먼트를 렌더링해 yield 하는 제너레이터
+
+    조각 수신은 백그라운드 스레드에서 진행되므로 세그먼트 k 를 렌더링하는 동안 조각 k+1 이 도착할 수 있습니다.
+
+    Args:
+        render: (오디오 WAV 경로, 출력 MP4 경로) → 렌더링 (실패 시 예외)
+        download: URL 조각 다운로드 함수 (url, destination)
+        start_time: 잡 시작 시각 (time_to_first_segment 기준)
+    """
+    segment_format = options.get("segment_format", DEFAULT_SEGMENT_FORMAT)
+    if segment_format not in SEGMENT_FORMATS:
+        raise ValueError(f"Unsupported segment_format '{segment_format}' "
+                         f"(expected one of {', '.join(SEGMENT_FORMATS)})")
+    accumulator = AudioAccumulator(options.get("segment_seconds", DEFAULT_SEGMENT_SECONDS),
+                                   options.get("context_seconds", DEFAULT_CONTEXT_SECONDS))
+    segment_dir = os.path.join(work_dir, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+
+    chunks = queue.Queue()
+
+    def receive():
+        try:
+            for path in chunk_sources(input_data, work_dir, download,
+                                      options.get("chunk_timeout", DEFAULT_CHUNK_TIMEOUT)):
+                chunks.put(path)
+            chunks.put(_END)
+        except Exception as e:
+            chunks.put(e)
+
+    threading.Thread(target=receive, name="audio-chunks", daemon=True).start()
+
+    segments = []
+    offset = 0.0
+    render_time = 0.0
+    first_segment_at = None
+    ended = False
+    extension = "m4s" if segment_format == "fmp4" else "ts"
+
+    while True:
+        if not ended and not accumulator.ready():
+            item = chunks.get()
+            if item is _END:
+                ended = True
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                accumulator.add(item)
+                continue
+
+        taken = accumulator.take(final=ended)
+        if taken is None:
+            if ended:
+                break
+            continue
+
+        pcm, duration = taken
+        seq = len(segments)
+        audio_path = write_wav(pcm, os.path.join(segment_dir, f"{seq}.wav"))
+        rendered = os.path.join(segment_dir, f"{seq}_rendered.mp4")
+        segment_path = os.path.join(segment_dir, f"segment_{seq:05d}.{extension}")
+
+        render_start = time.time()
+        render(audio_path, rendered)
+        mux_segment(rendered, segment_path, segment_format, duration, offset)
+        segment_render_time = time.time() - render_start
+        frames = video_frame_count(segment_path)
+        if frames != round(duration * FPS):
+            logger.warning(f"Segment {seq} has {frames} video frames, expected {round(duration * FPS)}")
+        render_time += segment_render_time
+
+        now = time.time()
+        if first_segment_at is None:
+            first_segment_at = now
+        segment = {"uri": os.path.basename(segment_path), "duration": round(duration, 3)}
+        segments.append(segment)
+        with open(segment_path, "rb") as f:
+            data = f.read()
+
+        output = {
+            "type": "segment",
+            "sequence": seq,
+            "format": segment_format,
+            "uri": segment["uri"],
+            "start": round(offset, 3),
+            "duration": round(duration, 3),
+            "frames": frames,
+            "render_time": round(segment_render_time, 3),
+            "time_since_start": round(now - start_time, 3),
+            "time_to_first_segment": round(first_segment_at - start_time, 3),
+            "segment_base64": base64.b64encode(data).decode("ascii"),
+        }
+        if segment_format == "hls":
+            output["playlist"] = hls_playlist(segments, ended=False)
+        offset += duration
+        for path in (audio_path, rendered, segment_path):
+            os.remove(path)
+        yield output
+
+    summary = {
+        "type": "summary",
+        "status": "success",
+        "format": segment_format,
+        "segments": len(segments),
+        "audio_seconds": round(offset, 3),
+        "time_to_first_segment": round(first_segment_at - start_time, 3) if first_segment_at else None,
+        "total_time": round(time.time() - start_time, 3),
+        # 1 보다 작으면 실시간보다 빠르게 렌더링
+        "real_time_factor": round(render_time / offset, 3) if offset else None,
+    }
+    if segment_format == "hls":
+        summary["playlist"] = hls_playlist(segments, ended=True)
+    yield summary
+
+
+# ---------------------------------------------------------------------------
+# 클라이언트
+# ---------------------------------------------------------------------------
+
+def split_wav(path, chunk_seconds):
+    """로컬 WAV → chunk_seconds 단위 data URI 목록 (조각을 나눠 보내는 호출자 흉내)"""
+    import io
+
+    chunks = []
+    with wave.open(path, "rb") as f:
+        params = f.getparams()
+        frames_per_chunk = max(1, int(chunk_seconds * f.getframerate()))
+        while True:
+            frames = f.readframes(frames_per_chunk)
+            if not frames:
+                break
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as out:
+                out.setparams(params)
+                out.writeframes(frames)
+            chunks.append("data:audio/wav;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"))
+    return chunks
+
+
+def consume_stream(api_key, endpoint_id, payload, output_dir, timeout=600, poll_interval=0.5):
+    """
+    /run 으로 스트리밍 잡을 제출하고 /stream 으로 세그먼트를 받아 output_dir 에 저장
+
+    Returns:
+        서버 summary + 클라이언트에서 측정한 client_time_to_first_segment / client_total_time
+    """
+    import requests
+
+    base_url = f"https://api.runpod.ai/v2/{endpoint_id}"
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    os.makedirs(output_dir, exist_ok=True)
+
+    start_time = time.time()
+    response = requests.post(f"{base_url}/run", headers=headers, json=payload, timeout=60)
+    response.raise_for_status()
+    job_id = response.json()["id"]
+
+    summary, first_segment_at = None, None
+    deadline = start_time + timeout
+    while time.time() < deadline:
+        response = requests.get(f"{base_url}/stream/{job_id}", headers=headers, timeout=60)
+        response.raise_for_status()
+        body = response.json()
+        for item in body.get("stream", []):
+            output = item.get("output", {})
+            if output.get("type") == "segment":
+                if first_segment_at is None:
+                    first_segment_at = time.time()
+                with open(os.path.join(output_dir, output["uri"]), "wb") as f:
+                    f.write(base64.b64decode(output["segment_base64"]))
+                if "playlist" in output:
+                    with open(os.path.join(output_dir, "playlist.m3u8"), "w") as f:
+                        f.write(output["playlist"])
+                logger.info(f"Segment {output['sequence']} ({output['duration']}s) "
+                            f"at {time.time() - start_time:.2f}s")
+            elif output.get("type") == "summary" or output.get("status") == "error":
+                summary = output
+                if "playlist" in output:
+                    with open(os.path.join(output_dir, "playlist.m3u8"), "w") as f:
+                        f.write(output["playlist"])
+        if summary is not None or body.get("status") in ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT"):
+            break
+        time.sleep(poll_interval)
+
+    summary = dict(summary or {"status": "error", "error": "stream ended without summary"})
+    summary["job_id"] = job_id
+    summary["client_time_to_first_segment"] = (round(first_segment_at - start_time, 3)
+                                               if first_segment_at else None)
+    summary["client_total_time"] = round(time.time() - start_time, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talking head live streaming client")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    client_parser = subparsers.add_parser("client", help="스트리밍 잡을 실행하고 세그먼트 저장")
+    client_parser.add_argument("--endpoint", default=os.getenv("STREAMING_ENDPOINT"),
+                               help="스트리밍 엔드포인트 ID (기본: STREAMING_ENDPOINT)")
+    client_parser.add_argument("--image", required=True, help="얼굴 이미지 (로컬 경로 또는 URL)")
+    client_parser.add_argument("--audio", required=True, help="오디오 (로컬 WAV 경로 또는 URL)")
+    client_parser.add_argument("--chunk-seconds", type=float, default=1.0,
+                               help="로컬 WAV 를 이 길이의 조각으로 나눠 전송")
+    client_parser.add_argument("--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS)
+    client_parser.add_argument("--format", choices=SEGMENT_FORMATS, default=DEFAULT_SEGMENT_FORMAT)
+    client_parser.add_argument("--output-dir", default="stream_segments")
+    client_parser.add_argument("--timeout", type=int, default=600)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    api_key = os.getenv("RUNPOD_API_KEY")
+    if not api_key or not args.endpoint:
+        print("RUNPOD_API_KEY and --endpoint (or STREAMING_ENDPOINT) are required")
+        return 2
+
+    from talking_head.inputs import encode_file
+
+    job_input = {"options": {"segment_seconds": args.segment_seconds, "segment_format": args.format}}
+    if os.path.isfile(args.image):
+        job_input["input_image_base64"] = encode_file(args.image)
+    else:
+        job_input["input_image_url"] = args.image
+    if os.path.isfile(args.audio):
+        job_input["input_audio_chunks"] = split_wav(args.audio, args.chunk_seconds)
+    else:
+        job_input["input_audio_url"] = args.audio
+
+    summary = consume_stream(api_key, args.endpoint, {"input": job_input}, args.output_dir, args.timeout)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary.get("status") == "success" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
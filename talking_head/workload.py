@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+합성 워크로드 생성 / 스케일링 벤치마크
+
+assets/ 의 고정 입력(9초 오디오, 이미지 한 장)만으로는 입력 크기에 따라 실행 시간이 어떻게 늘어나는지
+알 수 없으므로, 길이별 오디오(1초 ~ 10분, 음성형 / 무음 위주)와 해상도별 얼굴 이미지를 결정적으로
+생성하고 모델별로 실행 시간 / 최대 RSS 를 입력 크기에 대해 적합합니다.
+
+적합 모델은 y = fixed + k * x^exponent 입니다. fixed 는 모델 로드 등 입력과 무관한 비용으로,
+이를 빼지 않고 log-log 기울기를 구하면 exponent 가 과소 추정됩니다.
+exponent 가 1 + tolerance 를 넘으면 super_linear 로 표시합니다.
+
+생성:
+    python -m talking_head.workload generate --output-dir /tmp/workload
+
+벤치마크 (이미지 안에서 실행, 잡마다 새 런처 프로세스):
+    python -m talking_head.workload bench wav2lip --durations 1,10,60,300 --resolutions 256,512,1024
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import wave
+
+from talking_head.launcher import MODEL_DIRS, PACKAGE_ROOT, launcher_command, launcher_env
+from talking_head.metrics import read_metrics
+from talking_head.rusage import run_with_rusage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = "/tmp/talking_head_workload"
+DEFAULT_SOURCE_IMAGE = os.path.join(PACKAGE_ROOT, "assets", "profile.png")
+
+SAMPLE_RATE = 16000
+SEED = 1234
+
+# 생성할 오디오 길이 (초) / 이미지 긴 변 (px)
+AUDIO_DURATIONS = [1, 5, 10, 30, 60, 120, 300, 600]
+IMAGE_RESOLUTIONS = [256, 512, 768, 1024, 1536, 2048]
+
+# speech: 음절 / 짧은 쉼 반복, silence: 발화 30% + 무음 70%
+AUDIO_KINDS = {"speech": 0.85, "silence": 0.3}
+
+# 한 축을 바꿀 때 다른 축의 고정값
+BASE_DURATION = 10
+BASE_RESOLUTION = 512
+
+# 모음 포먼트 (F1, F2, F3 Hz)
+_VOWELS = [(730, 1090, 2440), (270, 2290, 3010), (300, 870, 2240), (530, 1840, 2480), (570, 840, 2410)]
+
+MANIFEST_FILE = "manifest.json"
+
+# 입력 크기에 대해 적합할 지표 (SadTalker 는 향상 단계 enhance_time 도)
+FIT_METRICS = ("wall_time", "inference_time", "cpu_time", "max_rss_mb")
+
+# 탐색할 exponent 범위 (0.01 단위)
+MIN_EXPONENT = 0.1
+MAX_EXPONENT = 3.0
+
+
+# ---------------------------------------------------------------------------
+# 생성
+# ---------------------------------------------------------------------------
+
+def _formant_gain(freq, formants, bandwidth=90.0):
+    """포먼트 공진 근사 (주파수별 진폭)"""
+    return sum(1.0 / (1.0 + ((freq - f) / bandwidth) ** 2) for f in formants) + 0.02
+
+
+def synthetic_speech(path, seconds, kind="speech", seed=SEED):
+    """
+    음성 형태의 합성 오디오 WAV 생성
+
+    기본 주파수(F0)가 흔들리는 성대 진동의 배음을 모음 포먼트로 가중해 음절(80~250ms)을 만들고,
+    음절 사이에 쉼을 둡니다. 같은 인자에는 항상 같은 파일이 생성됩니다.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed + int(seconds * 1000) + (0 if kind == "speech" else 1))
+    voiced_ratio = AUDIO_KINDS[kind]
+    total = int(seconds * SAMPLE_RATE)
+    signal = np.zeros(total, dtype=np.float32)
+
+    position = 0
+    while position < total:
+        if rng.random() < voiced_ratio:
+            length = min(int(rng.uniform(0.08, 0.25) * SAMPLE_RATE), total - position)
+            t = np.arange(length) / SAMPLE_RATE
+            f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 6) * t))
+            phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+            formants = _VOWELS[rng.integers(len(_VOWELS))]
+            mean_f0 = float(f0.mean())
+            syllable = np.zeros(length, dtype=np.float32)
+            for harmonic in range(1, int(4000 / mean_f0) + 1):
+                syllable += _formant_gain(harmonic * mean_f0, formants) * np.sin(harmonic * phase) / harmonic
+            # 자음 구간 (짧은 잡음)
+            onset = min(length, int(0.02 * SAMPLE_RATE))
+            syllable[:onset] += rng.normal(0, 0.3, onset)
+            envelope = np.sin(np.pi * np.arange(length) / length) ** 0.5
+            signal[position:position + length] = syllable * envelope
+        else:
+            # 쉼 (무음 위주 워크로드에서는 길게)
+            scale = 0.15 if kind == "speech" else 1.5
+            length = min(int(rng.uniform(0.05, 1.0) * scale * SAMPLE_RATE), total - position)
+            signal[position:position + length] = rng.normal(0, 0.002, length)
+        position += length
+
+    peak = float(np.abs(signal).max()) or 1.0
+    samples = (signal / peak * 0.6 * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def scaled_image(source, path, resolution):
+    """원본 얼굴 이미지를 긴 변이 resolution 이 되도록 크기 조정"""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        scale = resolution / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image.resize(size, Image.LANCZOS).save(path, optimize=False)
+    return path
+
+
+def generate(output_dir=DEFAULT_OUTPUT_DIR, durations=None, resolutions=None, source_image=None):
+    """
+    워크로드 파일 생성 (이미 있는 파일은 건너뜀)
+
+    Returns:
+        manifest (audio: 종류 / 길이 / 경로, images: 해상도 / 픽셀 수 / 경로)
+    """
+    durations = durations or AUDIO_DURATIONS
+    resolutions = resolutions or IMAGE_RESOLUTIONS
+    source_image = source_image or DEFAULT_SOURCE_IMAGE
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {"seed": SEED, "sample_rate": SAMPLE_RATE, "audio": [], "images": []}
+    for kind in AUDIO_KINDS:
+        for seconds in durations:
+            path = os.path.join(output_dir, f"audio_{kind}_{seconds}s.wav")
+            if not os.path.exists(path):
+                synthetic_speech(path, seconds, kind)
+            manifest["audio"].append({"kind": kind, "seconds": seconds, "path": path})
+
+    for resolution in resolutions:
+        path = os.path.join(output_dir, f"face_{resolution}.png")
+        if not os.path.exists(path):
+            scaled_image(source_image, path, resolution)
+        from PIL import Image
+        with Image.open(path) as image:
+            pixels = image.width * image.height
+        manifest["images"].append({"resolution": resolution, "pixels": pixels, "path": path})
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Generated {len(manifest['audio'])} audio clips and {len(manifest['images'])} images "
+                f"in {output_dir}")
+    return manifest
+
+
+# ---------------------------------------------------------------------------
+# 적합
+# ---------------------------------------------------------------------------
+
+def _linear_fit(xs, ys):
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    if sxx == 0:
+        return 0.0, mean_y, 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sxx
+    intercept = mean_y - slope * mean_x
+    ss_tot = sum((y - mean_y) ** 2 for y in ys)
+    ss_res = sum((y - intercept - slope * x) ** 2 for x, y in zip(xs, ys))
+    r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 1.0
+    return slope, intercept, r2
+
+
+def fit_scaling(points, tolerance=0.15):
+    """
+    (입력 크기, 측정값) → y = fixed + k * x^exponent 적합
+
+    Returns:
+        fixed, exponent, r2, super_linear (점이 3개 미만이면 None)
+    """
+    points = [(x, y) for x, y in points if x and y is not None and x > 0]
+    if len({x for x, _ in points}) < 3:
+        return None
+
+    xs, ys = [x for x, _ in points], [y for _, y in points]
+
+    # exponent 를 고정하면 y = fixed + k * x^exponent 는 x^exponent 에 대한 선형 회귀이므로,
+    # exponent 후보마다 회귀해 원래 단위의 오차가 가장 작은 값을 선택 (fixed 는 0 이상)
+    best = None
+    for step in range(int(MIN_EXPONENT * 100), int(MAX_EXPONENT * 100) + 1):
+        candidate = step / 100
+        powers = [x ** candidate for x in xs]
+        k, fixed, _ = _linear_fit(powers, ys)
+        if fixed < 0:
+            k = sum(p * y for p, y in zip(powers, ys)) / sum(p * p for p in powers)
+            fixed = 0.0
+        error = sum((fixed + k * p - y) ** 2 for p, y in zip(powers, ys))
+        if best is None or error < best[0]:
+            best = (error, candidate, k, fixed)
+
+    error, exponent, k, fixed = best
+    mean_y = sum(ys) / len(ys)
+    ss_tot = sum((y - mean_y) ** 2 for y in ys)
+    r2 = 1 - error / ss_tot if ss_tot > 0 else 1.0
+    return {
+        "fixed": round(fixed, 3),
+        "coefficient": round(k, 6),
+        "exponent": round(exponent, 3),
+        "r2": round(r2, 4),
+        "super_linear": exponent > 1 + tolerance,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 벤치마크
+# ---------------------------------------------------------------------------
+
+def inference_args(model, image_path, audio_path, work_dir):
+    """
+    벤치마크 잡 인자 (핸들러 기본 옵션과 같은 설정)
+
+    SadTalker 의 GFPGAN 얼굴 향상은 핸들러처럼 inference.py 밖의 향상 단계로 따로 측정합니다 (_time_enhancement).
+    """
+    if model == "wav2lip":
+        return [
+            "--checkpoint_path", os.path.join(MODEL_DIRS["wav2lip"], "checkpoints", "wav2lip_gan.pth"),
+            "--face", image_path,
+            "--audio", audio_path,
+            "--outfile", os.path.join(work_dir, "result.mp4"),
+            "--pad_bottom", "10",
+        ]
+    return [
+        "--driven_audio", audio_path,
+        "--source_image", image_path,
+        "--result_dir", work_dir,
+        "--still", "--preprocess", "crop",
+        "--size", "256",
+        "--pose_style", "0",
+    ]
+
+
+def _time_enhancement(work_dir, options, env):
+    """SadTalker 결과 영상에 핸들러와 같은 향상 단계(run_enhancement)를 실행한 시간 / 메모리"""
+    from talking_head.enhance import run_enhancement
+
+    videos = sorted(os.path.join(root, name) for root, _, files in os.walk(work_dir)
+                    for name in files if name.endswith(".mp4"))
+    if not videos:
+        return {"success": False, "error": "No output video generated"}
+    try:
+        stats = run_enhancement(videos[0], os.path.join(work_dir, "result_enhanced.mp4"), options, env)
+    except RuntimeError as e:
+        return {"success": False, "error": str(e)[-2000:]}
+    return {
+        "enhance_time": stats["resource_usage"]["wall_time"],
+        "enhance_max_rss_mb": stats["resource_usage"]["max_rss_mb"],
+        "enhance_per_frame_time": stats.get("per_frame_time"),
+    }
+
+
+def run_job(model, image_path, audio_path, options=None, timeout=3600):
+    """잡 하나를 새 런처 프로세스에서 실행하고 실행 시간 / 자원 사용량 반환"""
+    work_dir = f"/tmp/{model}_workload_{int(time.time() * 1000)}"
+    os.makedirs(work_dir, exist_ok=True)
+    metrics_path = os.path.join(work_dir, "launcher_metrics.json")
+    env = launcher_env(options or {}, metrics_path)
+    try:
+        result = run_with_rusage(
+            launcher_command(model, inference_args(model, image_path, audio_path, work_dir)),
+            timeout=timeout,
+            env=env,
+        )
+        launcher_metrics = read_metrics(metrics_path)
+        run = {
+            "success": result.returncode == 0,
+            "error": result.stderr[-2000:] if result.returncode != 0 else None,
+            "wall_time": result.rusage["wall_time"],
+            "inference_time": launcher_metrics.get("launcher", {}).get("inference_time"),
+            "max_rss_mb": result.rusage["max_rss_mb"],
+            "cpu_time": round(result.rusage["cpu_user"] + result.rusage["cpu_sys"], 3),
+        }
+        if model == "sadtalker" and run["success"]:
+            run.update(_time_enhancement(work_dir, options or {}, env))
+        return run
+    except subprocess.TimeoutExpired:
+        return {"success": False, "error": f"timeout ({timeout}s)"}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _closest(entries, key, value):
+    return min(entries, key=lambda e: abs(e[key] - value))
+
+
+def bench(model, manifest, kinds=("speech",), repeats=1, options=None, tolerance=0.15, timeout=3600):
+    """
+    오디오 길이 축 / 이미지 해상도 축을 각각 바꿔 실행하고 적합
+
+    Returns:
+        runs (잡별 측정값), fits (축 / 지표별 적합 결과)
+    """
+    base_image = _closest(manifest["images"], "resolution", BASE_RESOLUTION)
+    runs = []
+
+    for kind in kinds:
+        base_audio = _closest([a for a in manifest["audio"] if a["kind"] == kind], "seconds", BASE_DURATION)
+        axes = {
+            f"audio_seconds_{kind}": [(a["seconds"], base_image["path"], a["path"])
+                                      for a in manifest["audio"] if a["kind"] == kind],
+            f"image_pixels_{kind}": [(i["pixels"], i["path"], base_audio["path"])
+                                     for i in manifest["images"]],
+        }
+        for axis, jobs in axes.items():
+            for size, image_path, audio_path in jobs:
+                for repeat in range(repeats):
+                    logger.info(f"{model} {axis}={size} (run {repeat + 1}/{repeats})")
+                    run = run_job(model, image_path, audio_path, options, timeout)
+                    run.update({"axis": axis, "size": size})
+                    runs.append(run)
+
+    fits = {}
+    for axis in sorted({r["axis"] for r in runs}):
+        succeeded = [r for r in runs if r["axis"] == axis and r["success"]]
+        fits[axis] = {
+            metric: fit_scaling([(r["size"], r[metric]) for r in succeeded], tolerance)
+            for metric in FIT_METRICS + (("enhance_time",) if model == "sadtalker" else ())
+        }
+    return {"model": model, "runs": runs, "fits": fits}
+
+
+def record_results(results, options=None):
+    """bench 결과를 성능 결과 저장소에 기록 (축 / 입력 크기는 옵션 키에 포함)"""
+    from talking_head.results_store import ResultsStore, new_run_id
+
+    run_id = new_run_id("workload")
+    store = ResultsStore()
+    try:
+        for run in results["runs"]:
+            store.record(run_id, "workload", results["model"],
+                         dict(options or {}, axis=run["axis"], input_size=run["size"]), run["success"],
+                         latency=run.get("wall_time"), max_rss_mb=run.get("max_rss_mb"),
+                         cpu_time=run.get("cpu_time"), inference_time=run.get("inference_time"),
+                         enhance_time=run.get("enhance_time"))
+    finally:
+        store.close()
+    logger.info(f"Recorded {len(results['runs'])} runs as {run_id}")
+    return run_id
+
+
+def _parse_list(value, cast=int):
+    return [cast(v) for v in value.split(",")] if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic workloads and scaling benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="길이별 오디오 / 해상도별 이미지 생성")
+    generate_parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    generate_parser.add_argument("--durations", help="오디오 길이 목록 (초, 쉼표 구분)")
+    generate_parser.add_argument("--resolutions", help="이미지 긴 변 목록 (px, 쉼표 구분)")
+    generate_parser.add_argument("--source-image", default=DEFAULT_SOURCE_IMAGE)
+
+    bench_parser = subparsers.add_parser("bench", help="입력 크기별 실행 시간 / 메모리 적합")
+    bench_parser.add_argument("model", choices=sorted(MODEL_DIRS))
+    bench_parser.add_argument("--workload-dir", default=DEFAULT_OUTPUT_DIR)
+    bench_parser.add_argument("--durations", default="1,5,10,30,60")
+    bench_parser.add_argument("--resolutions", default="256,512,1024,2048")
+    bench_parser.add_argument("--kinds", default="speech", help="speech,silence")
+    bench_parser.add_argument("--repeats", type=int, default=1)
+    bench_parser.add_argument("--options", help="런처 options JSON (예: '{\"backend\": \"onnx\"}')")
+    bench_parser.add_argument("--tolerance", type=float, default=0.15, help="super-linear 판정 여유")
+    bench_parser.add_argument("--output", help="결과 JSON 경로")
+    bench_parser.add_argument("--no-store", action="store_true", help="성능 결과 저장소(SQLite)에 기록하지 않음")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "generate":
+        manifest = generate(args.output_dir, _parse_list(args.durations), _parse_list(args.resolutions),
+                            args.source_image)
+        print(json.dumps({k: len(v) if isinstance(v, list) else v for k, v in manifest.items()}, indent=2))
+        return 0
+
+    manifest = generate(args.workload_dir, _parse_list(args.durations), _parse_list(args.resolutions))
+    kinds = _parse_list(args.kinds, str)
+    results = bench(args.model, manifest, kinds=kinds, repeats=args.repeats,
+                    options=json.loads(args.options) if args.options else None, tolerance=args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if not args.no_store:
+        record_results(results, options=json.loads(args.options) if args.options else None)
+    print(json.dumps(results["fits"], indent=2))
+
+    flagged = [f"{axis}.{metric}" for axis, fits in results["fits"].items()
+               for metric, fit in fits.items() if fit and fit["super_linear"]]
+    if flagged:
+        print(f"Super-linear scaling: {', '.join(flagged)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
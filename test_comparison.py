@@ -7,12 +7,19 @@ SadTalker vs Wav2Lip 비교 테스트 스크립트
 """
 
 import requests
+import base64
 import json
 import time
 import os
+import tempfile
 from datetime import datetime
 from typing import Dict, Optional
 
+from talking_head.dispatcher import EndpointDispatcher
+from talking_head.inputs import encode_file
+from talking_head.quality import score_video
+from talking_head.results_store import ResultsStore, host_profile, new_run_id
+
 class TalkingHeadTester:
     def __init__(self, api_key: str):
         """
@@ -34,18 +41,23 @@ class TalkingHeadTester:
             "rtx_4080": 0.89,  # 16GB VRAM
             "a100": 2.89       # 80GB VRAM
         }
+        
+        # 엔드포인트 ID 를 쉼표로 여러 개 주면 hedged 디스패처 사용 (모델별로 hedge 지연 기록 유지)
+        self.dispatchers = {}
     
     def test_endpoint(self, endpoint_id: str, image_url: str, audio_url: str, 
-                     model_name: str, timeout: int = 1800) -> Optional[Dict]:
+                     model_name: str, timeout: int = 1800,
+                     options: Optional[Dict] = None) -> Optional[Dict]:
         """
         RunPod 엔드포인트 테스트
         
         Args:
-            endpoint_id: RunPod 엔드포인트 ID
-            image_url: 이미지 URL
-            audio_url: 음성 URL  
+            endpoint_id: RunPod 엔드포인트 ID (쉼표로 여러 개면 재시도 / hedge 디스패처로 실행)
+            image_url: 이미지 URL (로컬 파일 경로면 base64 로 요청에 직접 포함)
+            audio_url: 음성 URL (로컬 파일 경로면 base64 로 요청에 직접 포함)
             model_name: 모델명 (sadtalker 또는 wav2lip)
             timeout: 타임아웃 (초)
+            options: 핸들러 options (없으면 기본 옵션)
             
         Returns:
             결과 딕셔너리 또는 None
@@ -55,27 +67,41 @@ class TalkingHeadTester:
             start_time = time.time()
             
             # 작업 요청
-            payload = {
-                "input": {
-                    "input_image_url": image_url,
-                    "input_audio_url": audio_url
-                }
-            }
+            payload = {"input": {}}
+            for kind, source in (("image", image_url), ("audio", audio_url)):
+                if os.path.isfile(source):
+                    # 파일 호스팅 / 워커 다운로드 없이 요청 본문으로 전달
+                    payload["input"][f"input_{kind}_base64"] = encode_file(source)
+                else:
+                    payload["input"][f"input_{kind}_url"] = source
+            if options:
+                payload["input"]["options"] = options
             
             print(f"요청 전송 중...")
-            response = requests.post(
-                f"{self.base_url}/{endpoint_id}/runsync",
-                headers=self.headers,
-                json=payload,
-                timeout=timeout
-            )
-            
-            if response.status_code != 200:
-                print(f"API 오류: {response.status_code}")
-                print(f"응답: {response.text}")
-                return None
-            
-            result = response.json()
+            endpoint_ids = [e.strip() for e in endpoint_id.split(",") if e.strip()]
+            if len(endpoint_ids) > 1:
+                dispatcher = self.dispatchers.get(model_name)
+                if dispatcher is None or dispatcher.endpoints[model_name] != endpoint_ids:
+                    dispatcher = EndpointDispatcher(self.api_key, {model_name: endpoint_ids})
+                    self.dispatchers[model_name] = dispatcher
+                result = dispatcher.run(model_name, payload, timeout=timeout)
+                dispatch = result["dispatch"]
+                if dispatch["hedged"]:
+                    print(f"   hedge 요청 {dispatch['attempts']}개, 사용: {dispatch['endpoint_id']}")
+            else:
+                response = requests.post(
+                    f"{self.base_url}/{endpoint_id}/runsync",
+                    headers=self.headers,
+                    json=payload,
+                    timeout=timeout
+                )
+                
+                if response.status_code != 200:
+                    print(f"API 오류: {response.status_code}")
+                    print(f"응답: {response.text}")
+                    return None
+                
+                result = response.json()
             total_time = time.time() - start_time
             
             if result.get('status') == 'COMPLETED':
@@ -88,19 +114,26 @@ class TalkingHeadTester:
                 print(f"   지연 시간: {delay_time:.2f}초")
                 print(f"   총 시간: {total_time:.2f}초")
                 
-                if output.get('output_file_size'):
-                    size_mb = output['output_file_size'] / (1024 * 1024)
+                # handler.py 는 output_file_size, handler_runpod.py 는 file_size
+                file_size = output.get('output_file_size') or output.get('file_size', 0)
+                if file_size:
+                    size_mb = file_size / (1024 * 1024)
                     print(f"   파일 크기: {size_mb:.2f}MB")
                 
                 return {
                     "model": model_name,
+                    "options": options or {},
                     "success": True,
                     "execution_time": execution_time,
                     "delay_time": delay_time,
                     "total_time": total_time,
                     "output_url": output.get('output_video_url'),
-                    "file_size": output.get('output_file_size', 0),
-                    "processing_details": output
+                    "file_size": file_size,
+                    "processing_details": output,
+                    "dispatch": result.get('dispatch'),
+                    # 핸들러가 options.score_quality 로 계산한 자동 품질 점수 (없으면 score_output 으로 로컬 계산)
+                    "quality": output.get('quality'),
+                    "quality_score": output.get('quality_score')
                 }
             else:
                 error_msg = result.get('error', '알 수 없는 오류')
@@ -129,6 +162,54 @@ class TalkingHeadTester:
                 "total_time": time.time() - start_time
             }
     
+    def _fetch(self, source: str, destination: str) -> Optional[str]:
+        """URL / file:// / 로컬 경로를 로컬 파일로 (가져올 수 없으면 None)"""
+        if source.startswith("file://"):
+            source = source[len("file://"):]
+        if os.path.isfile(source):
+            return source
+        if source.startswith(("http://", "https://")):
+            response = requests.get(source, timeout=300)
+            response.raise_for_status()
+            with open(destination, "wb") as f:
+                f.write(response.content)
+            return destination
+        return None
+    
+    def score_output(self, result: Dict, image_url: str) -> Optional[float]:
+        """
+        핸들러가 품질 점수를 주지 않았으면 출력 영상을 받아 로컬에서 계산 (talking_head.quality)
+        
+        Args:
+            result: test_endpoint 결과 (quality / quality_score 를 채움)
+            image_url: 요청에 사용한 이미지 URL 또는 로컬 경로
+            
+        Returns:
+            quality_score 또는 None
+        """
+        if not result or not result.get('success') or result.get('quality_score') is not None:
+            return (result or {}).get('quality_score')
+        output = result.get('processing_details') or {}
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                video = os.path.join(temp_dir, "output.mp4")
+                if output.get('video_base64'):
+                    with open(video, "wb") as f:
+                        f.write(base64.b64decode(output['video_base64']))
+                else:
+                    video = self._fetch(result.get('output_url') or "", video)
+                    if not video:
+                        return None
+                image = self._fetch(image_url, os.path.join(temp_dir, "input_image"))
+                if not image:
+                    return None
+                result['quality'] = score_video(video, image)
+        except Exception as e:
+            print(f"   품질 점수 계산 실패: {e}")
+            return None
+        result['quality_score'] = result['quality']['quality_score']
+        return result['quality_score']
+    
     def calculate_cost(self, execution_time: float, gpu_type: str = "rtx_4090") -> float:
         """
         비용 계산
@@ -143,6 +224,45 @@ class TalkingHeadTester:
         hourly_rate = self.gpu_costs.get(gpu_type, 1.10)
         return (execution_time / 3600) * hourly_rate
     
+    def record_results(self, results: Dict[str, Dict], endpoints: Dict[str, str],
+                       gpu_type: str = "rtx_4090", source: str = "comparison") -> str:
+        """
+        결과를 성능 결과 저장소(SQLite)에 기록
+        
+        Args:
+            results: 모델명 → test_endpoint 결과
+            endpoints: 모델명 → 엔드포인트 ID
+            gpu_type: 비용 계산 / 호스트 구분용 GPU 타입
+            source: 기록한 도구
+            
+        Returns:
+            run_id (talking_head.results_store compare 의 --baseline / --candidate 로 사용)
+        """
+        run_id = new_run_id(source)
+        store = ResultsStore()
+        try:
+            for model_name, result in results.items():
+                execution_time = result.get('execution_time')
+                details = result.get('processing_details') or {}
+                store.record(
+                    run_id, source, model_name, result.get('options') or {}, result.get('success'),
+                    latency=execution_time,
+                    cost=self.calculate_cost(execution_time, gpu_type) if execution_time else None,
+                    file_size=result.get('file_size'),
+                    # 핸들러가 이미지 버전을 알려주면 사용 (없으면 TALKING_HEAD_IMAGE_VERSION)
+                    version=details.get('image_version'),
+                    host=host_profile(gpu_type=gpu_type, endpoint_id=endpoints.get(model_name)),
+                    delay_time=result.get('delay_time'),
+                    total_time=result.get('total_time'),
+                    # talking_head.router 의 실행 시간 예측용 (오디오 길이 / 캐시 적중 / 단계 시간)
+                    audio_seconds=details.get('audio_seconds'),
+                    cache_hit=details.get('cache_hit'),
+                    critical_path_time=(details.get('pipeline') or {}).get('critical_path_time'),
+                )
+        finally:
+            store.close()
+        return run_id
+    
     def compare_results(self, sadtalker_result: Dict, wav2lip_result: Dict) -> None:
         """
         결과 비교 분석
@@ -191,6 +311,20 @@ class TalkingHeadTester:
                  f"기준",
                  f"{sad_cost/wav_cost:.1f}배 저렴" if wav_cost > 0 else "N/A")
             ])
+            
+            # 자동 품질 점수 (talking_head.quality)
+            def quality_cell(result, section, key, fmt):
+                quality = result.get('quality') or {}
+                value = result.get('quality_score') if section is None else (quality.get(section) or {}).get(key)
+                return fmt.format(value) if value is not None else "N/A"
+            
+            for label, section, key, fmt in (("품질 점수", None, None, "{:.3f}"),
+                                             ("립싱크 오프셋", "lip_sync", "offset_frames", "{:+d}프레임"),
+                                             ("립싱크 신뢰도", "lip_sync", "confidence", "{:.2f}"),
+                                             ("입 밖 SSIM", "fidelity", "ssim", "{:.3f}"),
+                                             ("입 밖 PSNR", "fidelity", "psnr_db", "{:.1f}dB")):
+                models_data.append((label, quality_cell(sadtalker_result, section, key, fmt),
+                                    quality_cell(wav2lip_result, section, key, fmt)))
         
         # 테이블 출력
         for row in models_data:
@@ -238,7 +372,8 @@ class TalkingHeadTester:
             image_url, 
             audio_url, 
             "sadtalker",
-            timeout=1800  # 30분
+            timeout=1800,  # 30분
+            options={"score_quality": True}
         )
         
         # Wav2Lip 테스트
@@ -247,9 +382,14 @@ class TalkingHeadTester:
             image_url,
             audio_url,
             "wav2lip", 
-            timeout=600   # 10분
+            timeout=600,  # 10분
+            options={"score_quality": True}
         )
         
+        # 핸들러가 품질 점수를 계산하지 않았으면 (handler.py 등) 출력 영상으로 로컬 계산
+        self.score_output(sadtalker_result, image_url)
+        self.score_output(wav2lip_result, image_url)
+        
         # 결과 비교
         if sadtalker_result and wav2lip_result:
             self.compare_results(sadtalker_result, wav2lip_result)
@@ -270,6 +410,12 @@ class TalkingHeadTester:
                 json.dump(results, f, indent=2, ensure_ascii=False)
             
             print(f"\n💾 결과 저장됨: test_results_{timestamp}.json")
+            
+            run_id = self.record_results(
+                {"sadtalker": sadtalker_result, "wav2lip": wav2lip_result},
+                {"sadtalker": sadtalker_endpoint, "wav2lip": wav2lip_endpoint}
+            )
+            print(f"📈 결과 저장소 기록: {run_id} (python -m talking_head.results_store runs)")
         else:
             print("\n❌ 테스트 실패")
 
@@ -284,9 +430,9 @@ def main():
     SADTALKER_ENDPOINT = os.getenv("SADTALKER_ENDPOINT", "your-sadtalker-endpoint-id")
     WAV2LIP_ENDPOINT = os.getenv("WAV2LIP_ENDPOINT", "your-wav2lip-endpoint-id")
     
-    # 테스트 파일 URL (GitHub raw URL 사용 예정)
-    IMAGE_URL = "https://raw.githubusercontent.com/your-username/repo/main/assets/profile.png"
-    AUDIO_URL = "https://raw.githubusercontent.com/your-username/repo/main/assets/test.wav"
+    # 테스트 파일 URL (GitHub raw URL 사용 예정, 로컬 파일 경로를 주면 요청에 직접 포함)
+    IMAGE_URL = os.getenv("TEST_IMAGE", "https://raw.githubusercontent.com/your-username/repo/main/assets/profile.png")
+    AUDIO_URL = os.getenv("TEST_AUDIO", "https://raw.githubusercontent.com/your-username/repo/main/assets/test.wav")
     
     if API_KEY == "your-runpod-api-key":
         print("⚠️  환경 변수 설정이 필요합니다:")
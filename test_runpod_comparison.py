@@ -72,6 +72,17 @@ def run_comparison_test(audio_format: str = "wav") -> Dict[str, Any]:
     result = call_runpod_api(RUNPOD_ENDPOINT_ID, RUNPOD_API_KEY, payload)
     return result
 
+def _quality_detail(quality: Dict[str, Any]) -> str:
+    """자동 품질 점수 요약 (립싱크 오프셋 / 신뢰도, 입 밖 SSIM / PSNR)"""
+    parts = []
+    sync = quality.get('lip_sync') or {}
+    if sync:
+        parts.append(f"sync offset {sync['offset_frames']:+d}f, conf {sync['confidence']:.2f}")
+    fidelity = quality.get('fidelity') or {}
+    if fidelity:
+        parts.append(f"SSIM {fidelity['ssim']:.3f}, PSNR {fidelity['psnr_db']:.1f}dB")
+    return "; ".join(parts) or "N/A"
+
 def analyze_results(result: Dict[str, Any]) -> None:
     """결과 분석 및 출력"""
     
@@ -107,6 +118,8 @@ def analyze_results(result: Dict[str, Any]) -> None:
     print(f"   📁 Output Size: {sadtalker.get('output_file_size_mb', 0)} MB")
     if sadtalker.get('error'):
         print(f"   ❌ Error: {sadtalker['error']}")
+    if sadtalker.get('quality_score') is not None:
+        print(f"   🎯 Quality Score: {sadtalker['quality_score']} ({_quality_detail(sadtalker.get('quality') or {})})")
     
     print(f"\n💋 Wav2Lip Results:")
     wav2lip = comparison.get('wav2lip', {})
@@ -115,6 +128,8 @@ def analyze_results(result: Dict[str, Any]) -> None:
     print(f"   📁 Output Size: {wav2lip.get('output_file_size_mb', 0)} MB")
     if wav2lip.get('error'):
         print(f"   ❌ Error: {wav2lip['error']}")
+    if wav2lip.get('quality_score') is not None:
+        print(f"   🎯 Quality Score: {wav2lip['quality_score']} ({_quality_detail(wav2lip.get('quality') or {})})")
     
     # 분석 결과
     analysis = output.get('analysis', {})
@@ -122,6 +137,8 @@ def analyze_results(result: Dict[str, Any]) -> None:
     print(f"   🏆 Faster Model: {analysis.get('faster_model', 'N/A').upper()}")
     print(f"   ⏰ Time Difference: {analysis.get('time_difference', 0)} seconds")
     print(f"   ✅ Both Succeeded: {analysis.get('both_succeeded', False)}")
+    if analysis.get('higher_quality_model'):
+        print(f"   🎯 Higher Quality Model: {analysis['higher_quality_model'].upper()}")
     
     # 비용 추정 (대략적)
     total_time_minutes = output.get('total_processing_time', 0) / 60
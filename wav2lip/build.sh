@@ -22,13 +22,14 @@ docker info | grep Username || {
 }
 
 # Docker 빌드 (M1 Mac용 크로스 플랫폼 빌드)
+# 공용 talking_head/ 패키지를 복사하기 위해 리포지토리 루트를 빌드 컨텍스트로 사용
 echo "Docker 이미지 빌드 중..."
 if [[ $(uname -m) == "arm64" ]]; then
     echo "M1/M2 Mac 감지됨 - linux/amd64 플랫폼으로 빌드"
-    docker buildx build --platform linux/amd64 -t ${FULL_IMAGE_NAME} .
+    docker buildx build --platform linux/amd64 -f Dockerfile -t ${FULL_IMAGE_NAME} ..
 else
     echo "x86_64 플랫폼에서 빌드"
-    docker build -t ${FULL_IMAGE_NAME} .
+    docker build -f Dockerfile -t ${FULL_IMAGE_NAME} ..
 fi
 
 echo "빌드 완료!"
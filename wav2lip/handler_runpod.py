@@ -4,19 +4,48 @@ RunPod Serverless Handler: Wav2Lip
 사용할 Docker 이미지: devxpy/cog-wav2lip 또는 rudrabha/wav2lip
 """
 
-import runpod
 import os
 import time
 import subprocess
-import requests
 import json
 import logging
 from urllib.parse import urlparse
 
+# 콜드 스타트 단계별 시간 기록 (첫 잡 응답의 startup 항목)
+from talking_head.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
+with STARTUP.phase("import_requests"):
+    import requests
+
+with STARTUP.phase("import_talking_head"):
+    from talking_head.cpu_scheduler import async_handler, shared_scheduler
+    from talking_head.inputs import fetch_input, has_input
+    from talking_head.launcher import launcher_command, launcher_env
+    from talking_head.media import audio_duration
+    from talking_head.metrics import read_metrics
+    from talking_head.pipeline import Pipeline
+    from talking_head.profiling import PROFILE_DIR_ENV, collect_artifacts, profile_mode
+    from talking_head.quality import try_score
+    from talking_head.residency import resident_enabled, run_inference
+    from talking_head.result_cache import ResultCache, cache_key, model_version
+    from talking_head.rusage import record_usage
+    from talking_head.single_flight import SingleFlight
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+with STARTUP.phase("init"):
+    # 워커 내 동시 잡 CPU 분할 (잡마다 겹치지 않는 코어 집합 할당)
+    CPU_SCHEDULER = shared_scheduler()
+
+    # 입력 해시 + 옵션 기반 결과 캐시 (네트워크 볼륨이 있으면 워커끼리 공유)
+    RESULT_CACHE = ResultCache()
+
+    # 동시에 들어온 동일 잡은 실행 중인 추론 하나에 합침
+    IN_FLIGHT = SingleFlight()
+
 def download_file(url, destination):
     """URL에서 파일 다운로드"""
     try:
@@ -41,6 +70,7 @@ def handler(event):
     {
         'input_image_url': 'https://example.com/face.png',
         'input_audio_url': 'https://example.com/audio.wav',
+        # URL 대신 'input_image_base64' / 'input_audio_base64' (base64 또는 data URI) 로 직접 전달 가능
         'options': {
             'quality': 'high',  # 'low', 'medium', 'high'
             'pad_top': 0,       # 상단 패딩
@@ -48,7 +78,23 @@ def handler(event):
             'pad_left': 0,      # 좌측 패딩
             'pad_right': 0,     # 우측 패딩
             'resize_factor': 1, # 크기 조정 비율
-            'nosmooth': False   # 부드러움 비활성화
+            'nosmooth': False,  # 부드러움 비활성화
+            'backend': 'pytorch',  # 실행 백엔드 ('pytorch', 'onnx', 'int8')
+            'onnx_intra_op_threads': 8,  # ONNX Runtime intra-op 스레드 수 (기본: 할당된 CPU 수)
+            'onnx_inter_op_threads': 1,  # ONNX Runtime inter-op 스레드 수
+            'parity_check': False,  # ONNX 출력을 PyTorch 출력과 비교
+            'quality_samples': 2,  # int8: FP32 경로와 비교할 호출 수
+            'int8_min_psnr_db': 30.0,  # int8: 허용 최소 PSNR (응답의 acceptable 판정)
+            'use_cache': True,  # 같은 입력/옵션의 이전 결과 재사용
+            'mmap_checkpoints': True,  # 변환된 체크포인트를 mmap 으로 로드 (프로세스 간 메모리 공유)
+            'skip_silence': False,  # 무음 구간은 추론 없이 원본 얼굴로 채움 (결과는 silence 항목)
+            'min_silence_seconds': 0.5,  # skip_silence: 이보다 짧은 무음은 그대로 렌더링
+            'render_fps': 12.5,  # 내부 렌더링 프레임레이트 (기본 25: 모든 프레임 추론, 낮추면 키프레임만 추론하고 보간)
+            'interpolation': 'blend',  # render_fps: 'blend' 또는 'flow' (optical flow warp)
+            'mel_engine': 'numpy',  # mel-spectrogram 계산: 'numpy' (배치 FFT) 또는 'librosa' (업스트림)
+            'score_quality': False,  # 립싱크 / 입 밖 SSIM·PSNR 자동 점수 (결과는 quality, quality_score 항목)
+            'face_detector': 's3fd',  # 얼굴 검출기 ('s3fd', 'yunet', 'haar', 'hog'), 결과는 face_detection 항목
+            'profile': False  # 프로파일러 아래에서 실행 (True/'py-spy', 'cprofile', 'torch'), 결과는 profile 항목
         }
     }
     """
@@ -57,12 +103,11 @@ def handler(event):
     try:
         # 입력 파라미터 받기
         input_data = event.get('input', {})
-        image_url = input_data.get('input_image_url')
-        audio_url = input_data.get('input_audio_url')
         options = input_data.get('options', {})
         
-        if not image_url or not audio_url:
-            raise ValueError("input_image_url and input_audio_url are required")
+        if not has_input(input_data, 'image') or not has_input(input_data, 'audio'):
+            raise ValueError("input_image_url (or input_image_base64) and input_audio_url "
+                             "(or input_audio_base64) are required")
         
         # 작업 디렉토리 생성
         job_id = event.get('id', str(int(time.time())))
@@ -71,10 +116,6 @@ def handler(event):
         
         logger.info(f"Starting Wav2Lip job {job_id}")
         
-        # 파일 다운로드
-        image_path = download_file(image_url, f"{work_dir}/input_face.png")
-        audio_path = download_file(audio_url, f"{work_dir}/input_audio.wav")
-        
         # Wav2Lip 옵션 설정
         quality = options.get('quality', 'high')
         pad_top = options.get('pad_top', 0)
@@ -83,6 +124,7 @@ def handler(event):
         pad_right = options.get('pad_right', 0)
         resize_factor = options.get('resize_factor', 1)
         nosmooth = options.get('nosmooth', False)
+        backend = options.get('backend', 'pytorch')
         
         # 출력 파일 경로
         output_path = f"{work_dir}/result.mp4"
@@ -94,60 +136,224 @@ def handler(event):
         else:
             checkpoint_path = "/workspace/Wav2Lip/checkpoints/wav2lip.pth"
         
-        # Wav2Lip 실행 명령 구성
-        cmd = [
-            "python", "/workspace/Wav2Lip/inference.py",
-            "--checkpoint_path", checkpoint_path,
-            "--face", image_path,
-            "--audio", audio_path,
-            "--outfile", output_path,
-            "--resize_factor", str(resize_factor),
-            "--pad_top", str(pad_top),
-            "--pad_bottom", str(pad_bottom),
-            "--pad_left", str(pad_left),
-            "--pad_right", str(pad_right)
-        ]
+        # 캐시 / single-flight 키 (기본값이 적용된 실제 옵션 + 입력 내용 + 체크포인트 버전)
+        use_cache = options.get('use_cache', True)
+        # 프로파일링 요청은 실제로 실행해야 하므로 캐시 조회 / 다른 잡과의 합치기를 하지 않음
+        profile = profile_mode(options.get('profile'))
+        effective_options = {
+            'quality': quality,
+            'pad_top': pad_top,
+            'pad_bottom': pad_bottom,
+            'pad_left': pad_left,
+            'pad_right': pad_right,
+            'resize_factor': resize_factor,
+            'nosmooth': nosmooth,
+            'backend': backend
+        }
+        if options.get('skip_silence'):
+            # 출력이 달라지므로 캐시 키에 포함 (기본값이면 키를 바꾸지 않음)
+            effective_options['skip_silence'] = True
+            effective_options['min_silence_seconds'] = float(options.get('min_silence_seconds', 0.5))
+        if options.get('render_fps'):
+            effective_options['render_fps'] = float(options['render_fps'])
+            effective_options['interpolation'] = options.get('interpolation', 'blend')
+        if options.get('mel_engine', 'numpy') != 'numpy':
+            effective_options['mel_engine'] = options['mel_engine']
+        face_detector = options.get('face_detector', 's3fd')
+        if face_detector != 's3fd':
+            effective_options['face_detector'] = face_detector
+        version_paths = [checkpoint_path] + (["/workspace/onnx"] if backend != 'pytorch' else [])
+        if face_detector != 's3fd':
+            # 벤치마크가 갱신하는 박스 보정값 (calibration.json) 도 출력에 영향
+            version_paths.append("/workspace/face_detectors")
         
-        if nosmooth:
-            cmd.append("--nosmooth")
+        # 잡 단계 DAG: 입력 준비 (URL 다운로드 또는 인라인 base64 디코딩), 오디오 길이 측정, 캐시 키 해시를
+        # 의존 관계대로 겹쳐 실행하고 응답의 pipeline 항목에 임계 경로 기록
+        pipeline = Pipeline()
+        pipeline.add("image", lambda: fetch_input(input_data, 'image', f"{work_dir}/input_face.png", download_file))
+        pipeline.add("audio", lambda: fetch_input(input_data, 'audio', f"{work_dir}/input_audio.wav", download_file))
+        pipeline.add("audio_seconds", audio_duration, deps=("audio",))
+        pipeline.add("model_version", lambda: model_version(version_paths))
+        pipeline.add("cache_key", lambda image, audio, version: cache_key("wav2lip", [image, audio],
+                                                                          effective_options, version),
+                     deps=("image", "audio", "model_version"))
+        pipeline.run()
+        image_path, audio_path, key = (pipeline.results[name] for name in ("image", "audio", "cache_key"))
+        audio_seconds = pipeline.results["audio_seconds"]
         
-        logger.info(f"Executing Wav2Lip: {' '.join(cmd)}")
+        if use_cache and not profile:
+            cached = RESULT_CACHE.get(key)
+            if cached:
+                processing_time = time.time() - start_time
+                logger.info(f"Wav2Lip cache hit {key[:12]} in {processing_time:.2f}s")
+                return {
+                    "status": "success",
+                    "output_video_url": f"file://{cached['video_path']}",
+                    "processing_time": processing_time,
+                    "file_size": os.path.getsize(cached['video_path']),
+                    "model": "wav2lip",
+                    "backend": backend,
+                    "options_used": options,
+                    "cache_hit": True,
+                    "audio_seconds": audio_seconds,
+                    "cached_processing_time": cached.get('processing_time'),
+                    "pipeline": pipeline.report(),
+                    "message": f"Wav2Lip result served from cache in {processing_time:.2f} seconds"
+                }
         
-        # Wav2Lip 실행
-        result = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True, 
-            timeout=600  # 10분 타임아웃 (Wav2Lip이 더 빠름)
-        )
+        def render():
+            # Wav2Lip 실행 인자 구성
+            inference_args = [
+                "--checkpoint_path", checkpoint_path,
+                "--face", image_path,
+                "--audio", audio_path,
+                "--outfile", output_path,
+                "--resize_factor", str(resize_factor),
+                "--pad_top", str(pad_top),
+                "--pad_bottom", str(pad_bottom),
+                "--pad_left", str(pad_left),
+                "--pad_right", str(pad_right)
+            ]
         
-        if result.returncode != 0:
-            logger.error(f"Wav2Lip failed: {result.stderr}")
-            raise Exception(f"Wav2Lip execution failed: {result.stderr}")
+            if nosmooth:
+                inference_args.append("--nosmooth")
         
-        # 결과 파일 확인
-        if not os.path.exists(output_path):
-            raise Exception("No output video generated")
+            # 런처를 통해 실행 (백엔드 패치 적용)
+            cmd = launcher_command("wav2lip", inference_args)
+            metrics_path = f"{work_dir}/launcher_metrics.json"
+            env = launcher_env(options, metrics_path)
         
-        file_size = os.path.getsize(output_path)
+            logger.info(f"Executing Wav2Lip ({backend}): {' '.join(cmd)}")
         
-        # 실제 환경에서는 S3나 다른 스토리지에 업로드
-        # 여기서는 임시로 로컬 경로 반환
-        output_url = f"file://{output_path}"
+            def inference():
+                # Wav2Lip 실행 (할당된 CPU 슬롯에 고정, TALKING_HEAD_RESIDENT=1 이면 상주 워커에서 실행)
+                with CPU_SCHEDULER.slot() as slot:
+                    run_start = time.time()
+                    result = run_inference(
+                        "wav2lip",
+                        inference_args,
+                        slot.apply(env),
+                        timeout=600,  # 10분 타임아웃 (Wav2Lip이 더 빠름)
+                    )
+                    if result.returncode == 0:
+                        CPU_SCHEDULER.record(slot, audio_seconds, time.time() - run_start)
         
-        processing_time = time.time() - start_time
+                if result.returncode != 0:
+                    logger.error(f"Wav2Lip failed: {result.stderr}")
+                    raise Exception(f"Wav2Lip execution failed: {result.stderr}")
         
-        logger.info(f"Wav2Lip completed in {processing_time:.2f}s")
+                # 결과 파일 확인
+                if not os.path.exists(output_path):
+                    raise Exception("No output video generated")
+                return result, slot
         
-        return {
-            "status": "success",
-            "output_video_url": output_url,
-            "processing_time": processing_time,
-            "file_size": file_size,
-            "model": "wav2lip",
-            "options_used": options,
-            "message": f"Wav2Lip processing completed successfully in {processing_time:.2f} seconds"
-        }
+            def store(_):
+                # 실제 환경에서는 S3나 다른 스토리지에 업로드
+                # 여기서는 임시로 로컬 경로 반환 (캐시에 저장하면 작업 디렉토리 정리 후에도 유지됨)
+                if not use_cache:
+                    return f"file://{output_path}"
+                cached_path = RESULT_CACHE.put(key, output_path, {"processing_time": time.time() - start_time,
+                                                                   "options": effective_options})
+                return f"file://{cached_path}"
+        
+            def usage(inference_result):
+                # 자식 프로세스 CPU / 메모리 / I/O 사용량 (용량 계획용 로그에도 기록)
+                result, slot = inference_result
+                resource_usage = getattr(result, 'rusage', None)
+                record_usage("wav2lip", resource_usage, backend=backend, audio_seconds=audio_seconds,
+                             concurrency=slot.concurrency, threads=slot.threads, resident=resident_enabled())
+                return read_metrics(metrics_path), resource_usage
+        
+            def artifacts(usage_result):
+                # flamegraph / cProfile / torch trace (작업 디렉토리 정리 전에 보관 위치로 이동)
+                return collect_artifacts(env[PROFILE_DIR_ENV], job_id, usage_result[0]) if profile else None
+        
+            # 결과 저장과 메트릭 / 프로파일 수집은 추론이 끝나면 동시에 진행
+            stages = Pipeline()
+            stages.add("inference", inference)
+            stages.add("store", store, deps=("inference",))
+            stages.add("usage", usage, deps=("inference",))
+            stages.add("profile", artifacts, deps=("usage",))
+            if options.get('score_quality'):
+                stages.add("quality", lambda _: try_score(output_path, image_path), deps=("inference",))
+            stages.run()
+            pipeline.attach("render", stages)
+        
+            result, slot = stages.results["inference"]
+            output_url = stages.results["store"]
+            launcher_metrics, resource_usage = stages.results["usage"]
+            file_size = os.path.getsize(output_path)
+            processing_time = time.time() - start_time
+        
+            logger.info(f"Wav2Lip completed in {processing_time:.2f}s")
+        
+            response = {
+                "status": "success",
+                "output_video_url": output_url,
+                "processing_time": processing_time,
+                "file_size": file_size,
+                "model": "wav2lip",
+                "backend": backend,
+                "options_used": options,
+                "launcher_metrics": launcher_metrics,
+                "cpu_slot": slot.info(),
+                "resident": resident_enabled(),
+                "image_version": os.environ.get("TALKING_HEAD_IMAGE_VERSION"),
+                "resource_usage": resource_usage,
+                "cache_hit": False,
+                "audio_seconds": audio_seconds,
+                "message": f"Wav2Lip processing completed successfully in {processing_time:.2f} seconds"
+            }
+        
+            if profile:
+                response["profile"] = stages.results["profile"]
+
+            if options.get('score_quality'):
+                # 자동 품질 점수 (talking_head.quality, sweep_benchmark 의 quality_score)
+                response["quality"] = stages.results["quality"]
+                response["quality_score"] = (stages.results["quality"] or {}).get("quality_score")
+
+            if options.get('skip_silence'):
+                # 생략한 프레임 비율 / 추정 절약 시간 (talking_head.silence)
+                response["silence"] = launcher_metrics.get("silence")
+        
+            if options.get('render_fps'):
+                # 보간한 프레임 비율 / 추정 절약 시간 (talking_head.interpolation)
+                response["interpolation"] = launcher_metrics.get("interpolation")
+
+            if face_detector != 's3fd':
+                # 검출기별 이미지당 시간 / 검출 실패 수 (talking_head.face_detectors)
+                response["face_detection"] = launcher_metrics.get("face_detection")
+        
+            if backend in ('onnx', 'int8'):
+                # 이미지 빌드 시 export 단계에서 기록된 PyTorch 대비 정확도
+                from talking_head.onnx_backend import load_parity_report
+                response["onnx_parity"] = load_parity_report()
+        
+            if backend == 'int8':
+                # FP32 경로 대비 품질 (테넌트별 INT8 사용 여부 판단용)
+                from talking_head.quantization import DEFAULT_MIN_PSNR_DB, quality_summary
+                response["int8_quality"] = quality_summary(
+                    launcher_metrics, options.get('int8_min_psnr_db', DEFAULT_MIN_PSNR_DB)
+                )
+        
+            return response
+        
+        # 같은 키의 잡이 이미 실행 중이면 그 결과를 함께 받음
+        flight_key = f"{key}:profile:{job_id}" if profile else key
+        pipeline.add("render", lambda _: IN_FLIGHT.do(flight_key, render, job_id), deps=("cache_key",))
+        pipeline.run()
+        response, flight = pipeline.results["render"]
+        response = dict(response)
+        response["single_flight"] = flight.info()
+        response["pipeline"] = pipeline.report()
+        if not flight.leader:
+            processing_time = time.time() - start_time
+            response["processing_time"] = processing_time
+            response["message"] = (f"Wav2Lip result shared from in-flight job {flight.leader_id} "
+                                   f"in {processing_time:.2f} seconds")
+        
+        return response
         
     except subprocess.TimeoutExpired:
         return {
@@ -173,6 +379,23 @@ def handler(event):
         except:
             pass
 
-# RunPod 시작
+def warmup_args(image_path, audio_path, work_dir):
+    """워밍업 잡 인자 (기본 요청과 같은 체크포인트 / 검출기 경로 사용)"""
+    return [
+        "--checkpoint_path", "/workspace/Wav2Lip/checkpoints/wav2lip_gan.pth",
+        "--face", image_path,
+        "--audio", audio_path,
+        "--outfile", f"{work_dir}/warmup.mp4",
+        "--nosmooth"
+    ]
+
+# RunPod 시작 (워밍업 잡을 먼저 실행한 뒤 트래픽 수신)
 if __name__ == "__main__":
-    runpod.serverless.start({"handler": handler}) 
\ No newline at end of file
+    STARTUP.warmup("wav2lip", warmup_args)
+    with STARTUP.phase("import_runpod"):
+        import runpod
+    STARTUP.mark_ready()
+    runpod.serverless.start({
+        "handler": async_handler(STARTUP.attach(handler), CPU_SCHEDULER.max_concurrency),
+        "concurrency_modifier": CPU_SCHEDULER.concurrency_modifier
+    }) 
\ No newline at end of file